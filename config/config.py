@@ -80,11 +80,12 @@ class Config:
             },
             "user": {"name": user_settings["name"], "city": user_settings["city"]},
             "audio": {"input_device": None, "output_device": None, "volume": 0.8},
-            "ui": {"simulate_streaming": True, "stream_interval_ms": 16, "stream_chunk": 2},
+            "ui": {"simulate_streaming": True, "stream_interval_ms": 16, "stream_chunk": 2, "stream_frame_ms": 16},
             "history": {
                 "max_messages": 50,
                 "save_to_file": True,
-                "auto_save_interval": 5,
+                "journal": {"compact_after_records": 200, "fsync": False},
+                "search_index": {"enabled": True},
             },
             "logging": {
                 "level": "INFO",
@@ -127,6 +127,7 @@ class I18N:
             "Arvis печатает…": "Arvis is typing…",
             "Arvis думает…": "Arvis is thinking…",
             "Чат очищен. Как дела?": "Chat cleared. How are you?",
+            "Загрузка языковой модели…": "Loading language model…",
             "История разговоров": "Chat history",
             "Всего": "Total",
             "От вас": "From you",
@@ -21,6 +21,7 @@ from i18n.i18n import apply_to_widget_tree
 from src.gui.main_window import MainWindow
 from src.gui.splash_screen import SplashScreen
 from utils.logger import setup_logger
+from utils.performance_monitor import performance_monitor
 from version import get_app_name, get_version
 
 
@@ -177,6 +178,21 @@ class ArvisApp:
             self.logger.error(f"Ошибка диалога входа: {e}")
             return False
 
+    def start_performance_monitoring(self):
+        """Мониторинг CPU/памяти и локальный endpoint метрик (performance.*)"""
+        try:
+            if not self.config.get("performance.monitoring_enabled", True):
+                return
+            performance_monitor.configure(self.config)
+            performance_monitor.start_monitoring()
+            if self.config.get("performance.metrics_endpoint.enabled", False):
+                performance_monitor.start_metrics_server(
+                    str(self.config.get("performance.metrics_endpoint.host", "127.0.0.1") or "127.0.0.1"),
+                    int(self.config.get("performance.metrics_endpoint.port", 9465) or 9465),
+                )
+        except Exception as e:
+            self.logger.warning(f"Performance monitoring unavailable: {e}")
+
     def show_loading_screen(self):
         """Show loading screen and initialize components"""
         try:
@@ -325,18 +341,19 @@ class ArvisApp:
                 self.logger.warning(f"i18n apply failed: {e}")
 
             self.logger.info("GUI инициализирован. Запуск цикла событий...")
+            self.start_performance_monitoring()
 
             # Start the event loop
             result = self.app.exec() if self.app is not None else 1
 
-            # Временно отключаем мониторинг производительности
-            # performance_monitor.stop_monitoring()
-            #
-            # # Показываем отчёт о производительности
-            # report = performance_monitor.get_performance_report()
-            # self.logger.info(f"Performance report: uptime={report['uptime']:.1f}s, "
-            #                f"avg_cpu={report['avg_cpu']:.1f}%, "
-            #                f"avg_memory={report['avg_memory']:.1f}%")
+            if performance_monitor.is_monitoring:
+                performance_monitor.stop_monitoring()
+                # Показываем отчёт о производительности
+                report = performance_monitor.get_performance_report()
+                self.logger.info(
+                    f"Performance report: uptime={report['uptime']:.1f}s, "
+                    f"avg_cpu={report['avg_cpu']:.1f}%, avg_memory={report['avg_memory']:.1f}%"
+                )
 
             return result
 
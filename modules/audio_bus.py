@@ -0,0 +1,497 @@
+"""
+Shared microphone capture bus
+
+Один поток захвата держит микрофон открытым и пишет PCM (16-bit mono) в кольцевой
+буфер последних секунд звука. Потребители (wake word, запись STT, VAD) подписываются
+на шину и читают буфер независимо, каждый со своей позицией:
+- переключение «слушаю wake word» -> «запись» не переоткрывает устройство;
+- подписка может начаться с pre-roll (последние ~500 мс уже записанного звука),
+  поэтому начало фразы сразу после ключевого слова не теряется;
+- источник подменяется WAV-файлом (audio.capture.source_file) для проверки без микрофона.
+"""
+
+import math
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+from utils.logger import ModuleLogger
+
+_SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+class AudioSource(ABC):
+    """Источник PCM 16-bit mono для шины"""
+
+    sample_rate: int = 16000
+
+    @abstractmethod
+    def open(self):
+        """Открыть устройство/файл; может уточнить sample_rate"""
+
+    @abstractmethod
+    def read(self, frames: int) -> bytes:
+        """Прочитать до frames кадров PCM (пустые байты — данных пока нет)"""
+
+    def close(self):
+        pass
+
+    def describe(self) -> str:
+        return self.__class__.__name__
+
+
+class PyAudioSource(AudioSource):
+    """Микрофон через PyAudio (устройство из audio.input_device: индекс или часть имени)"""
+
+    def __init__(
+        self, sample_rate: int = 16000, chunk_size: int = 1024, input_device=None, fallback_rates=(44100, 48000)
+    ):
+        self.sample_rate = int(sample_rate)
+        self.chunk_size = int(chunk_size)
+        self.input_device = input_device
+        self.fallback_rates = tuple(r for r in fallback_rates if r != self.sample_rate)
+        self._interface = None
+        self._stream = None
+        self.logger = ModuleLogger("AudioBus")
+
+    def open(self):
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is not installed. Please install pyaudio to enable microphone input.")
+        self._interface = pyaudio.PyAudio()
+        device_index = self._resolve_input_device_index()
+        last_error: Optional[Exception] = None
+        for rate in (self.sample_rate,) + self.fallback_rates:
+            try:
+                self._stream = self._interface.open(
+                    format=pyaudio.paInt16,
+                    channels=1,
+                    rate=rate,
+                    input=True,
+                    input_device_index=device_index,
+                    frames_per_buffer=self.chunk_size,
+                )
+                if rate != self.sample_rate:
+                    self.logger.warning(f"Microphone does not support {self.sample_rate} Hz, capturing at {rate} Hz")
+                self.sample_rate = rate
+                return
+            except Exception as e:
+                last_error = e
+                self.logger.debug(f"Failed to open input stream at {rate} Hz: {e}")
+        self.close()
+        raise RuntimeError(f"Failed to open microphone: {last_error}")
+
+    def read(self, frames: int) -> bytes:
+        return self._stream.read(frames, exception_on_overflow=False)
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop_stream()
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+        if self._interface is not None:
+            try:
+                self._interface.terminate()
+            except Exception:
+                pass
+            self._interface = None
+
+    def describe(self) -> str:
+        device = "default" if self.input_device in (None, "", "default") else self.input_device
+        return f"microphone ({device}, {self.sample_rate} Hz)"
+
+    def _resolve_input_device_index(self) -> Optional[int]:
+        """Определить индекс входного устройства на основе предпочтения пользователя."""
+        pref = self.input_device
+        if pref is None or pref == "" or str(pref).lower() == "default":
+            return None
+        try:
+            device_count = self._interface.get_device_count()
+            # Если указан индекс
+            if isinstance(pref, int) or (isinstance(pref, str) and pref.isdigit()):
+                idx = int(pref)
+                return idx if 0 <= idx < device_count else None
+            # Иначе — по имени (частичное совпадение, без регистра)
+            pref_low = str(pref).lower()
+            for i in range(device_count):
+                try:
+                    info = self._interface.get_device_info_by_index(i)
+                    if int(info.get("maxInputChannels", 0)) > 0 and pref_low in str(info.get("name", "")).lower():
+                        return i
+                except Exception:
+                    continue
+        except Exception:
+            pass
+        return None
+
+
+class WavFileSource(AudioSource):
+    """WAV-файл вместо микрофона (mono, 16-bit); после конца файла — тишина или повтор"""
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False):
+        self.path = str(path)
+        self.realtime = realtime
+        self.loop = loop
+        self._wav = None
+        self._next_ts = 0.0
+
+    def open(self):
+        wav = wave.open(self.path, "rb")
+        if wav.getnchannels() != 1 or wav.getsampwidth() != _SAMPLE_WIDTH:
+            wav.close()
+            raise ValueError(f"Audio source file must be mono 16-bit PCM: {self.path}")
+        self._wav = wav
+        self.sample_rate = wav.getframerate()
+        self._next_ts = time.monotonic()
+
+    def read(self, frames: int) -> bytes:
+        data = self._wav.readframes(frames)
+        if len(data) < frames * _SAMPLE_WIDTH and self.loop:
+            self._wav.rewind()
+            data += self._wav.readframes(frames - len(data) // _SAMPLE_WIDTH)
+        if len(data) < frames * _SAMPLE_WIDTH:
+            data += b"\x00" * (frames * _SAMPLE_WIDTH - len(data))
+        if self.realtime:
+            # Темп как у настоящего микрофона: чанк не раньше, чем он «прозвучал»
+            self._next_ts += frames / float(self.sample_rate)
+            delay = self._next_ts - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+    def close(self):
+        if self._wav is not None:
+            try:
+                self._wav.close()
+            except Exception:
+                pass
+            self._wav = None
+
+    def describe(self) -> str:
+        return f"file {self.path} ({self.sample_rate} Hz)"
+
+
+class AudioRingBuffer:
+    """Кольцо последних N чанков: один писатель, любое число читателей без блокировок
+
+    Писатель кладёт чанк в слот и только затем публикует новый номер (присваивание
+    под GIL атомарно). Читатель, которого обогнали больше чем на ёмкость, получает None
+    и перескакивает вперёд.
+    """
+
+    def __init__(self, capacity: int, start_seq: int = 0):
+        self.capacity = max(2, int(capacity))
+        self._slots: List[Optional[Tuple[float, bytes]]] = [None] * self.capacity
+        # Нумерация продолжается после перезапуска захвата: позиции подписчиков остаются валидными
+        self._start = int(start_seq)
+        self._seq = self._start
+
+    @property
+    def head(self) -> int:
+        """Номер следующего чанка (всего записано чанков)"""
+        return self._seq
+
+    @property
+    def oldest(self) -> int:
+        # Слот head % capacity писатель может перезаписывать прямо сейчас — он уже не читается
+        return max(self._start, self._seq - self.capacity + 1)
+
+    def write(self, timestamp: float, data: bytes):
+        seq = self._seq
+        self._slots[seq % self.capacity] = (timestamp, data)
+        self._seq = seq + 1
+
+    def get(self, seq: int) -> Optional[Tuple[float, bytes]]:
+        if not self.oldest <= seq < self._seq:
+            return None
+        item = self._slots[seq % self.capacity]
+        # Слот могли перезаписать, пока мы его читали
+        if seq < self.oldest:
+            return None
+        return item
+
+
+class AudioSubscription:
+    """Независимый читатель шины со своей позицией в кольце"""
+
+    def __init__(self, bus: "AudioBus", name: str, start_seq: int, since: Optional[float] = None):
+        self._bus = bus
+        self.name = name
+        self._pos = start_seq
+        self._since = since
+        self.dropped_chunks = 0
+        self.closed = False
+
+    @property
+    def sample_rate(self) -> int:
+        return self._bus.sample_rate
+
+    @property
+    def chunk_size(self) -> int:
+        return self._bus.chunk_size
+
+    def is_active(self) -> bool:
+        """Подписка открыта и захват идёт (иначе новых чанков не будет)"""
+        return not self.closed and self._bus.is_running()
+
+    def read(self, timeout: float = 0.5) -> Optional[bytes]:
+        """Следующий чанк PCM или None по таймауту/после закрытия"""
+        ring = self._bus.ring
+        deadline = time.monotonic() + timeout
+        while not self.closed:
+            if self._pos < ring.oldest:
+                self.dropped_chunks += ring.oldest - self._pos
+                self._pos = ring.oldest
+            if self._pos < ring.head:
+                item = ring.get(self._pos)
+                self._pos += 1
+                if item is None:
+                    self.dropped_chunks += 1
+                    continue
+                timestamp, data = item
+                if self._since is not None and timestamp < self._since:
+                    continue
+                return data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._bus.wait_for_data(self._pos, remaining):
+                return None
+        return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._bus._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AudioBus:
+    """Общий захват микрофона с раздачей чанков подписчикам"""
+
+    def __init__(self, config=None, source_factory: Optional[Callable[[], AudioSource]] = None):
+        self.config = config
+        self.logger = ModuleLogger("AudioBus")
+        get = config.get if config is not None else (lambda key, default=None: default)
+
+        self.sample_rate = int(get("audio.capture.sample_rate", 16000) or 16000)
+        self.chunk_size = max(128, int(get("audio.capture.chunk_size", 1024) or 1024))
+        self.buffer_sec = max(1.0, float(get("audio.capture.buffer_sec", 4.0) or 4.0))
+        self.preroll_ms = max(0, int(get("audio.capture.preroll_ms", 500) or 0))
+        # Без подписчиков поток захвата живёт ещё немного: wake word -> подтверждение -> запись
+        self.idle_stop_sec = max(0.0, float(get("audio.capture.idle_stop_sec", 10.0) or 0.0))
+        self._source_factory = source_factory or self._default_source_factory
+
+        self.ring = AudioRingBuffer(1)
+        self._source: Optional[AudioSource] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.RLock()
+        self._data_ready = threading.Condition(threading.Lock())
+        self._subscribers: Dict[int, AudioSubscription] = {}
+        self._idle_since: Optional[float] = None
+        self.read_errors = 0
+
+    def _default_source_factory(self) -> AudioSource:
+        get = self.config.get if self.config is not None else (lambda key, default=None: default)
+        source_file = get("audio.capture.source_file", None)
+        if source_file:
+            return WavFileSource(
+                source_file,
+                realtime=bool(get("audio.capture.source_realtime", True)),
+                loop=bool(get("audio.capture.source_loop", False)),
+            )
+        return PyAudioSource(self.sample_rate, self.chunk_size, get("audio.input_device", None))
+
+    # ------------------------------------------------------------------
+    # Управление захватом
+    # ------------------------------------------------------------------
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> bool:
+        """Открыть источник и запустить поток захвата (если ещё не запущен)"""
+        with self._lock:
+            if self._running:
+                return True
+            source = self._source_factory()
+            try:
+                source.open()
+            except Exception as e:
+                self.logger.error(f"Failed to open audio source: {e}")
+                source.close()
+                return False
+            self._source = source
+            self.sample_rate = int(source.sample_rate)
+            chunk_sec = self.chunk_size / float(self.sample_rate)
+            self.ring = AudioRingBuffer(int(math.ceil(self.buffer_sec / chunk_sec)), start_seq=self.ring.head)
+            self._running = True
+            self._idle_since = None
+            self._thread = threading.Thread(target=self._capture_loop, name="ArvisAudioCapture", daemon=True)
+            self._thread.start()
+            self.logger.info(f"Audio capture started: {source.describe()}, chunk {self.chunk_size} frames")
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            thread = self._thread
+            self._thread = None
+            # Берём источник под блокировкой: после её снятия subscribe() может открыть новый
+            source, self._source = self._source, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        if source is not None:
+            source.close()
+        with self._data_ready:
+            self._data_ready.notify_all()
+        self.logger.info("Audio capture stopped")
+
+    def shutdown(self):
+        with self._lock:
+            for subscription in list(self._subscribers.values()):
+                subscription.closed = True
+            self._subscribers.clear()
+        self.stop()
+
+    def set_source_factory(self, factory: Callable[[], AudioSource]):
+        """Подменить источник (например, WavFileSource); захват перезапускается при необходимости"""
+        with self._lock:
+            restart = self._running
+            self.stop()
+            self._source_factory = factory
+            if restart:
+                self.start()
+
+    def _capture_loop(self):
+        source = self._source
+        consecutive_errors = 0
+        while self._running and source is not None:
+            try:
+                data = source.read(self.chunk_size)
+                consecutive_errors = 0
+            except Exception as e:
+                self.read_errors += 1
+                consecutive_errors += 1
+                if consecutive_errors == 1 or consecutive_errors % 50 == 0:
+                    self.logger.debug(f"Audio read error: {e}")
+                time.sleep(0.05)
+                continue
+            if not data:
+                continue
+            self.ring.write(time.monotonic(), data)
+            with self._data_ready:
+                self._data_ready.notify_all()
+            if self._should_idle_stop():
+                self.logger.debug("No audio subscribers, releasing microphone")
+                with self._lock:
+                    if self._subscribers:
+                        continue
+                    self._running = False
+                    self._thread = None
+                    if self._source is source:
+                        self._source = None
+                # Закрываем только свой источник — не тот, что мог открыть последующий start()
+                source.close()
+                with self._data_ready:
+                    self._data_ready.notify_all()
+                return
+
+    def _should_idle_stop(self) -> bool:
+        if self._subscribers or self._idle_since is None:
+            return False
+        return time.monotonic() - self._idle_since >= self.idle_stop_sec
+
+    def wait_for_data(self, seq: int, timeout: float) -> bool:
+        """Дождаться чанка с номером seq (False — таймаут или захват остановлен)"""
+        with self._data_ready:
+            self._data_ready.wait_for(lambda: self.ring.head > seq or not self._running, timeout)
+        return self.ring.head > seq
+
+    # ------------------------------------------------------------------
+    # Подписки
+    # ------------------------------------------------------------------
+
+    def subscribe(
+        self, name: str, preroll_ms: Optional[int] = 0, since: Optional[float] = None
+    ) -> Optional[AudioSubscription]:
+        """Подписаться на звук; preroll_ms=None — pre-roll из настроек, since — не раньше момента monotonic()"""
+        with self._lock:
+            if not self.start():
+                return None
+            if preroll_ms is None:
+                preroll_ms = self.preroll_ms
+            chunk_ms = 1000.0 * self.chunk_size / self.sample_rate
+            back = int(math.ceil(max(0, preroll_ms) / chunk_ms)) if preroll_ms else 0
+            start_seq = max(self.ring.oldest, self.ring.head - back)
+            subscription = AudioSubscription(self, name, start_seq, since)
+            self._subscribers[id(subscription)] = subscription
+            self._idle_since = None
+            self.logger.debug(f"Audio subscriber '{name}' attached (pre-roll {back} chunks)")
+            return subscription
+
+    def _unsubscribe(self, subscription: AudioSubscription):
+        with self._lock:
+            self._subscribers.pop(id(subscription), None)
+            if not self._subscribers:
+                self._idle_since = time.monotonic()
+                if self.idle_stop_sec <= 0:
+                    threading.Thread(target=self.stop, daemon=True).start()
+        with self._data_ready:
+            self._data_ready.notify_all()
+        if subscription.dropped_chunks:
+            self.logger.debug(f"Audio subscriber '{subscription.name}' dropped {subscription.dropped_chunks} chunks")
+
+    def get_status(self) -> dict:
+        return {
+            "running": self._running,
+            "source": self._source.describe() if self._source is not None else None,
+            "sample_rate": self.sample_rate,
+            "chunk_size": self.chunk_size,
+            "subscribers": [s.name for s in list(self._subscribers.values())],
+            "read_errors": self.read_errors,
+        }
+
+
+def list_input_devices() -> List[dict]:
+    """Входные аудиоустройства (индекс, имя, каналы)"""
+    if pyaudio is None:
+        return []
+    interface = pyaudio.PyAudio()
+    try:
+        devices = []
+        for i in range(interface.get_device_count()):
+            info = interface.get_device_info_by_index(i)
+            if info.get("maxInputChannels", 0) > 0:
+                devices.append({"index": i, "name": info["name"], "channels": info["maxInputChannels"]})
+        return devices
+    finally:
+        interface.terminate()
+
+
+_audio_bus: Optional[AudioBus] = None
+_audio_bus_lock = threading.Lock()
+
+
+def get_audio_bus(config=None) -> Optional[AudioBus]:
+    """Общая шина захвата микрофона (создаётся при первом вызове с config)"""
+    global _audio_bus
+    with _audio_bus_lock:
+        if _audio_bus is None and config is not None:
+            _audio_bus = AudioBus(config)
+        return _audio_bus
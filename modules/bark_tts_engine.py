@@ -35,6 +35,7 @@ class BarkTTSEngine(TTSEngineBase):
         """
         self.config = config
         self.logger = logger or ModuleLogger("BarkTTSEngine")
+        self.engine_name = "bark"
         
         # Configuration
         self.use_small_model = config.get("tts.bark.use_small_model", True)
@@ -185,11 +186,18 @@ class BarkTTSEngine(TTSEngineBase):
             try:
                 self.logger.info(f"Starting Bark TTS for: {text[:50]}...")
                 
+                cached = self._cache_lookup(text, voice)
+                if cached is not None:
+                    self.logger.info(f"Using cached Bark audio for: {text[:50]}...")
+                    self._play_audio_async(cached)
+                    return True
+
                 if not self.is_ready_flag:
                     self.logger.warning("Bark not ready, trying anyway...")
                 
                 # Synthesize
                 audio = self._synthesize(text, voice)
+                self._cache_store(text, voice, audio)
                 if audio is not None:
                     self._play_audio_async(audio)
                     return True
@@ -208,6 +216,32 @@ class BarkTTSEngine(TTSEngineBase):
         unique_task_name = f"bark_speak_{int(time.time() * 1000)}"
         task_manager.run_async(unique_task_name, tts_task)
 
+    def synthesize_audio(self, text: str, voice: Optional[str] = None) -> Optional[np.ndarray]:
+        """Synthesize text to a float32 array without playing it (used by the streaming pipeline)
+
+        Args:
+            text: Text to synthesize
+            voice: Optional voice name
+
+        Returns:
+            Audio array or None
+        """
+        if not text or not text.strip():
+            return None
+        cached = self._cache_lookup(text, voice)
+        if cached is not None:
+            return cached
+        audio = self._synthesize(text, voice)
+        if audio is None:
+            return None
+        audio = np.asarray(audio, dtype=np.float32)
+        self._cache_store(text, voice, audio)
+        return audio
+
+    def get_sample_rate(self) -> int:
+        """Sample rate used for Bark playback"""
+        return int(self.config.get("tts.sample_rate", 24000) or 24000)
+
     def speak_streaming(self, text_chunk: str, voice: Optional[str] = None):
         """Speak text chunk for streaming mode with buffering
         
@@ -534,4 +568,5 @@ class BarkTTSEngine(TTSEngineBase):
             "device": self.device,
             "voice": self.voice,
             "available_voices": self.get_available_voices(),
+            "cache": self.get_cache_stats(),
         }
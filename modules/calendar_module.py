@@ -3,7 +3,6 @@ Calendar module for Arvis with AI-powered reminders
 """
 
 import json
-import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -11,11 +10,15 @@ from typing import Any, Dict, List, Optional, Tuple
 from config.config import Config
 from utils.logger import ModuleLogger
 from utils.security import AuditEventType, AuditSeverity, Permission, get_audit_logger, get_rbac_manager
+from utils.sqlite_pool import get_pool
 
 
 class CalendarModule:
     """Calendar and reminders module with AI integration"""
 
+    # На календарные фразы отвечает LLM; интент "calendar" лишь не отдаёт их веб-поиску
+    INTENT_TRIGGERS = ("календарь", "напомни", "событие")
+
     def __init__(self, config: Config):
         self.config = config
         self.logger = ModuleLogger("CalendarModule")
@@ -31,6 +34,7 @@ class CalendarModule:
         # Database setup
         self.db_path = Path("data/calendar.db")
         self.db_path.parent.mkdir(exist_ok=True)
+        self._db = get_pool(self.db_path)
 
         self.init_database()
 
@@ -43,7 +47,7 @@ class CalendarModule:
     def init_database(self):
         """Initialize SQLite database for calendar data"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
 
                 # Create reminders table
@@ -79,6 +83,20 @@ class CalendarModule:
                 """
                 )
 
+                # Индексы под выборки по времени: активные напоминания и события дня
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS idx_reminders_pending
+                    ON reminders(is_completed, datetime)
+                """
+                )
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS idx_events_start
+                    ON events(start_datetime)
+                """
+                )
+
                 conn.commit()
                 self.logger.info("Calendar database initialized")
 
@@ -108,7 +126,7 @@ class CalendarModule:
                 )
 
             # Save to database
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -221,7 +239,7 @@ class CalendarModule:
         try:
             end_date = datetime.now() + timedelta(days=days)
 
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -272,7 +290,7 @@ class CalendarModule:
     def complete_reminder(self, reminder_id: int) -> str:
         """Mark reminder as completed"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -296,7 +314,7 @@ class CalendarModule:
     def delete_reminder(self, reminder_id: int) -> str:
         """Delete reminder"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
 
@@ -323,7 +341,7 @@ class CalendarModule:
             if end_datetime_str:
                 end_datetime = self.parse_datetime(end_datetime_str)
 
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -364,18 +382,18 @@ class CalendarModule:
             today = datetime.now().date()
             tomorrow = today + timedelta(days=1)
 
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
 
-                # Get today's events
+                # Get today's events (диапазон ISO-строк вместо date(), чтобы работал индекс)
                 cursor.execute(
                     """
                     SELECT title, description, start_datetime, end_datetime, location
                     FROM events
-                    WHERE date(start_datetime) = ?
+                    WHERE start_datetime >= ? AND start_datetime < ?
                     ORDER BY start_datetime ASC
                 """,
-                    (today.isoformat(),),
+                    (today.isoformat(), tomorrow.isoformat()),
                 )
 
                 events = cursor.fetchall()
@@ -385,10 +403,10 @@ class CalendarModule:
                     """
                     SELECT title, description, datetime
                     FROM reminders
-                    WHERE date(datetime) = ? AND is_completed = FALSE
+                    WHERE is_completed = FALSE AND datetime >= ? AND datetime < ?
                     ORDER BY datetime ASC
                 """,
-                    (today.isoformat(),),
+                    (today.isoformat(), tomorrow.isoformat()),
                 )
 
                 reminders = cursor.fetchall()
@@ -498,7 +516,7 @@ class CalendarModule:
     def get_overdue_reminders(self) -> List[Tuple[int, str, str, datetime]]:
         """Get overdue reminders for notification"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -529,7 +547,7 @@ class CalendarModule:
     def get_status(self) -> Dict[str, Any]:
         """Get calendar module status"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
 
                 cursor.execute("SELECT COUNT(*) FROM reminders WHERE is_completed = FALSE")
@@ -2,13 +2,17 @@
 LLM Client for Ollama integration
 """
 
-import json
-from typing import Any, Dict, List, Optional
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
 
 import requests
 
 from config.config import Config
+from utils.fast_http import StreamHandle
 from utils.logger import ModuleLogger
+from utils.performance_monitor import performance_monitor
 
 
 class LLMClient:
@@ -36,6 +40,20 @@ class LLMClient:
         self.session.trust_env = False
         self.session.timeout = 30
 
+        # Таймаут чтения для стриминга (между чанками, а не на весь ответ)
+        self.stream_read_timeout = float(config.get("llm.stream_read_timeout_sec", 120))
+        # Метрики последнего потокового ответа (eval_count, tokens_per_sec, ...)
+        self.last_stream_stats: Optional[Dict[str, Any]] = None
+
+        # Переиспользование KV-контекста Ollama между репликами: вместо полного промпта
+        # (системный промпт + история) отправляем только новую реплику и массив `context`
+        self.context_reuse = bool(config.get("llm.context_reuse.enabled", True))
+        self.context_reuse_max_tokens = int(config.get("llm.context_reuse.max_tokens", 3072))
+        self._kv_lock = threading.Lock()
+        self._kv_context: Optional[List[int]] = None
+        self._kv_signature: Optional[str] = None
+        self._kv_last_turn: Optional[Dict[str, str]] = None
+
     def is_connected(self) -> bool:
         """Check if Ollama server is accessible (very fast)"""
         # Сначала лёгкая проверка /api/version (быстрее и менее шумная), затем /api/tags
@@ -126,25 +144,11 @@ class LLMClient:
     ) -> Optional[str]:
         """Get response from LLM"""
         try:
-            # Build prompt
-            prompt = self.build_prompt(message, context, conversation_history or [])
             # Ensure model is selected/available
             self._ensure_model_selected()
 
-            # Prepare request data
-            request_data = {
-                "model": self.default_model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": self.temperature,
-                    "num_predict": self.max_tokens,
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "repeat_last_n": 64,
-                    "repeat_penalty": 1.1,
-                },
-            }
+            # Prepare request data (full prompt or only the new turn on top of the KV context)
+            request_data, turn = self._prepare_generate_request(message, context, conversation_history, stream=False)
 
             self.logger.debug(f"Sending request to {self.base_url}/api/generate")
 
@@ -154,6 +158,7 @@ class LLMClient:
             if response.status_code == 200:
                 data = response.json()
                 llm_response = data.get("response", "").strip()
+                self._remember_context(turn, data.get("context"), llm_response)
 
                 if llm_response:
                     self.logger.info("Got response from LLM")
@@ -177,60 +182,203 @@ class LLMClient:
             self.logger.error(f"Error getting LLM response: {e}")
             return f"Произошла ошибка: {str(e)}"
 
+    def _generation_options(self) -> Dict[str, Any]:
+        """Параметры генерации Ollama (общие для обычного и потокового режима)"""
+        return {
+            "temperature": self.temperature,
+            "num_predict": self.max_tokens,
+            "top_k": 40,
+            "top_p": 0.9,
+            "repeat_last_n": 64,
+            "repeat_penalty": 1.1,
+        }
+
+    def stream_events(
+        self,
+        message: str,
+        context: str = "",
+        conversation_history: List[Dict[str, str]] = None,
+        handle: Optional[StreamHandle] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream a response as events over the pooled keep-alive connection.
+
+        Yields ``{"type": "token", "text": delta}`` for every generated fragment and
+        a final ``{"type": "done", "stats": {...}}`` with Ollama timings
+        (eval_count, eval_duration, prompt_eval_duration) and derived tokens/sec.
+        Network errors are raised to the caller. ``handle`` lets another thread
+        abort the request by closing the socket (see utils.llm_request_engine).
+        """
+        self._ensure_model_selected()
+        request_data, turn = self._prepare_generate_request(message, context, conversation_history, stream=True)
+
+        self.logger.debug(f"Starting streaming request to {self.base_url}/api/generate")
+
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+        parts: List[str] = []
+        for data in self.http_client.stream_ndjson(
+            "/api/generate", request_data, timeout=(2.0, self.stream_read_timeout), handle=handle
+        ):
+            chunk = data.get("response", "")
+            if chunk:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(chunk)
+                yield {"type": "token", "text": chunk}
+            if data.get("done", False):
+                self._remember_context(turn, data.get("context"), "".join(parts))
+                stats = self._build_stream_stats(data, started, first_token_at)
+                stats["context_reused"] = turn["reused"]
+                self.last_stream_stats = stats
+                yield {"type": "done", "stats": stats}
+                # Не прерываем цикл: дочитываем ответ, чтобы соединение вернулось в пул
+
+    # ------------------------------------------------------------------
+    # KV-контекст Ollama
+    # ------------------------------------------------------------------
+
+    def reset_context(self, reason: str = "") -> None:
+        """Сбросить сохранённый KV-контекст (очистка истории, смена пользователя/модели)"""
+        with self._kv_lock:
+            had_context = self._kv_context is not None
+            self._kv_context = None
+            self._kv_signature = None
+            self._kv_last_turn = None
+        if had_context:
+            self.logger.debug(f"LLM context reset{': ' + reason if reason else ''}")
+
+    def _context_signature(self, context: str) -> str:
+        """Отпечаток того, что зашито в начало KV-контекста: модель и системный промпт"""
+        payload = f"{self.default_model}\0{self.build_system_prompt(context)}"
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _prepare_generate_request(
+        self, message: str, context: str, conversation_history: Optional[List[Dict[str, str]]], stream: bool
+    ):
+        """Собрать тело /api/generate.
+
+        Если сохранённый контекст всё ещё соответствует разговору, отправляется только
+        новая реплика поверх `context`, иначе — полный промпт и контекст сбрасывается.
+
+        Returns:
+            (request_data, turn) — turn нужен для _remember_context() после ответа
+        """
+        history = conversation_history or []
+        signature = self._context_signature(context) if self.context_reuse else ""
+        turn = {"signature": signature, "message": message, "reused": False}
+        request_data: Dict[str, Any] = {
+            "model": self.default_model,
+            "stream": stream,
+            "options": self._generation_options(),
+        }
+
+        kv_context = None
+        if self.context_reuse:
+            with self._kv_lock:
+                reason = self._context_mismatch(signature, message, history)
+                if reason is None:
+                    kv_context = self._kv_context
+            if kv_context is None:
+                self.reset_context(reason or "")
+
+        if kv_context is not None:
+            request_data["prompt"] = f"Пользователь: {message}\n\nArvis:"
+            request_data["context"] = kv_context
+            turn["reused"] = True
+            self.logger.debug(f"Reusing LLM context ({len(kv_context)} tokens), sending only the new turn")
+        else:
+            request_data["prompt"] = self.build_prompt(message, context, history)
+        return request_data, turn
+
+    def _context_mismatch(self, signature: str, message: str, history: List[Dict[str, str]]) -> Optional[str]:
+        """Причина, по которой сохранённый контекст нельзя использовать (None — можно). Вызывать под _kv_lock"""
+        if self._kv_context is None or self._kv_last_turn is None:
+            return "no context"
+        if signature != self._kv_signature:
+            return "system prompt or model changed"
+        if len(self._kv_context) > self.context_reuse_max_tokens:
+            return f"context exceeds {self.context_reuse_max_tokens} tokens"
+
+        # История должна заканчиваться ровно той репликой, которую покрывает контекст.
+        # Текущее сообщение пользователя уже может лежать в истории — отбрасываем его.
+        entries = list(history)
+        if entries and entries[-1].get("role") == "user" and entries[-1].get("content") == message:
+            entries = entries[:-1]
+        if len(entries) < 2:
+            return "history cleared"
+        prev_user, prev_assistant = entries[-2], entries[-1]
+        last_response = self._kv_last_turn["response"]
+        if (
+            prev_user.get("role") != "user"
+            or prev_user.get("content") != self._kv_last_turn["message"]
+            or prev_assistant.get("role") != "assistant"
+            or not str(prev_assistant.get("content", "")).strip().startswith(last_response[:200])
+        ):
+            return "history diverged"
+        return None
+
+    def _remember_context(self, turn: Dict[str, Any], kv_context: Optional[List[int]], response: str) -> None:
+        """Сохранить `context` из ответа Ollama для следующей реплики"""
+        if not self.context_reuse:
+            return
+        response = (response or "").strip()
+        if not kv_context or not response:
+            self.reset_context("no context in response")
+            return
+        with self._kv_lock:
+            self._kv_context = list(kv_context)
+            self._kv_signature = turn["signature"]
+            self._kv_last_turn = {"message": turn["message"], "response": response}
+
+    def _build_stream_stats(
+        self, final: Dict[str, Any], started: float, first_token_at: Optional[float]
+    ) -> Dict[str, Any]:
+        """Собрать метрики потока из финального объекта Ollama (длительности там в наносекундах)"""
+        eval_count = int(final.get("eval_count") or 0)
+        eval_ns = int(final.get("eval_duration") or 0)
+        prompt_eval_count = int(final.get("prompt_eval_count") or 0)
+        prompt_eval_ns = int(final.get("prompt_eval_duration") or 0)
+        wall = time.perf_counter() - started
+
+        stats = {
+            "model": final.get("model", self.default_model),
+            "eval_count": eval_count,
+            "eval_duration_ms": round(eval_ns / 1e6, 1),
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration_ms": round(prompt_eval_ns / 1e6, 1),
+            "load_duration_ms": round(int(final.get("load_duration") or 0) / 1e6, 1),
+            "total_duration_ms": round(int(final.get("total_duration") or 0) / 1e6, 1),
+            "tokens_per_sec": round(eval_count / (eval_ns / 1e9), 2) if eval_ns else 0.0,
+            "prompt_tokens_per_sec": round(prompt_eval_count / (prompt_eval_ns / 1e9), 2) if prompt_eval_ns else 0.0,
+            "time_to_first_token_ms": round((first_token_at - started) * 1000.0, 1) if first_token_at else None,
+            "wall_time_ms": round(wall * 1000.0, 1),
+        }
+
+        self.logger.info(
+            f"LLM stream: {eval_count} tokens at {stats['tokens_per_sec']} tok/s, "
+            f"prompt eval {prompt_eval_count} tokens in {stats['prompt_eval_duration_ms']} ms, "
+            f"first token after {stats['time_to_first_token_ms']} ms"
+        )
+        try:
+            if first_token_at is not None:
+                performance_monitor.record_operation_time("llm_time_to_first_token", first_token_at - started)
+            if prompt_eval_ns:
+                performance_monitor.record_operation_time("llm_prompt_eval", prompt_eval_ns / 1e9)
+        except Exception:
+            pass
+        return stats
+
     def stream_response(self, message: str, context: str = "", conversation_history: List[Dict[str, str]] = None):
         """Yield response chunks from LLM using Ollama's streaming API.
 
         Yields strings (partial tokens or fragments). Caller is responsible
-        for assembling them.
+        for assembling them. Timings of the finished stream are kept in
+        ``last_stream_stats``.
         """
         try:
-            prompt = self.build_prompt(message, context, conversation_history or [])
-            self._ensure_model_selected()
-            request_data = {
-                "model": self.default_model,
-                "prompt": prompt,
-                "stream": True,
-                "options": {
-                    "temperature": self.temperature,
-                    "num_predict": self.max_tokens,
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "repeat_last_n": 64,
-                    "repeat_penalty": 1.1,
-                },
-            }
-
-            self.logger.debug(f"Starting streaming request to {self.base_url}/api/generate")
-
-            response = self.session.post(f"{self.base_url}/api/generate", json=request_data, stream=True, timeout=120)
-
-            response.raise_for_status()
-
-            try:
-                for line in response.iter_lines(decode_unicode=True, chunk_size=1024):
-                    if not line or line.isspace():
-                        continue
-
-                    try:
-                        data = json.loads(line)
-                        chunk = data.get("response", "")
-                        if chunk:
-                            yield chunk
-                        if data.get("done", False):
-                            break
-                    except json.JSONDecodeError as je:
-                        self.logger.debug(f"Non-JSON line received (ignoring): {line[:50]}...")
-                        continue
-                    except Exception as e:
-                        self.logger.warning(f"Error processing stream line: {e}")
-                        continue
-
-            finally:
-                # Ensure response is properly closed
-                try:
-                    response.close()
-                except Exception:
-                    pass
+            for event in self.stream_events(message, context, conversation_history):
+                if event["type"] == "token":
+                    yield event["text"]
 
         except requests.exceptions.Timeout:
             self.logger.warning("Streaming request timed out")
@@ -244,8 +392,23 @@ class LLMClient:
 
     def build_prompt(self, message: str, context: str, conversation_history: List[Dict[str, str]]) -> str:
         """Build complete prompt with context and history"""
-        prompt_parts = []
+        prompt_parts = [self.build_system_prompt(context)]
 
+        # Add conversation history (last 6 messages to keep context manageable)
+        if conversation_history:
+            recent_history = conversation_history[-6:]
+            for entry in recent_history:
+                role = "Пользователь" if entry["role"] == "user" else "Arvis"
+                prompt_parts.append(f"{role}: {entry['content']}")
+
+        # Current message
+        prompt_parts.append(f"Пользователь: {message}")
+        prompt_parts.append("Arvis:")
+
+        return "\n\n".join(prompt_parts)
+
+    def build_system_prompt(self, context: str) -> str:
+        """Build the system part of the prompt (personality, style, runtime context)"""
         # Определяем язык интерфейса для ответов
         ui_language = self.config.get("language.ui", "ru")
         language_map = {"ru": "русском", "uk": "украинском", "en": "английском", "es": "испанском"}
@@ -282,20 +445,7 @@ class LLMClient:
 
 Будь полезным помощником с хорошей памятью, а не болтливым роботом."""
 
-        prompt_parts.append(system_prompt)
-
-        # Add conversation history (last 6 messages to keep context manageable)
-        if conversation_history:
-            recent_history = conversation_history[-6:]
-            for entry in recent_history:
-                role = "Пользователь" if entry["role"] == "user" else "Arvis"
-                prompt_parts.append(f"{role}: {entry['content']}")
-
-        # Current message
-        prompt_parts.append(f"Пользователь: {message}")
-        prompt_parts.append("Arvis:")
-
-        return "\n\n".join(prompt_parts)
+        return system_prompt
 
     def warm_up_model(self) -> bool:
         """Warm up the model with a simple request"""
@@ -315,6 +465,8 @@ class LLMClient:
     def set_model(self, model_name: str):
         """Set the active model"""
         if self.check_model_exists(model_name):
+            if model_name != self.default_model:
+                self.reset_context("model changed")
             self.default_model = model_name
             self.config.set("llm.default_model", model_name)
             self.logger.info(f"Model set to: {model_name}")
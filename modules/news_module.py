@@ -5,15 +5,17 @@ News module for Arvis
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-import requests
-
 from config.config import Config
+from utils.fetch_cache import ERROR_CONNECTION, ERROR_TIMEOUT, get_fetcher
 from utils.logger import ModuleLogger
 
 
 class NewsModule:
     """News module using WorldNewsAPI"""
 
+    # Триггеры интента "news" (IntentRouter)
+    INTENT_TRIGGERS = ("новости", "news")
+
     def __init__(self, config: Config):
         self.config = config
         self.logger = ModuleLogger("NewsModule")
@@ -26,12 +28,39 @@ class NewsModule:
         self.language = config.get("news.language", "ru")
         self.page_size = 10
 
-        self.session = requests.Session()
+        # Общий пул соединений и кэш ответов (utils.fetch_cache)
+        self.fetcher = get_fetcher(config)
         self.request_timeout = 15
+        self.cache_ttl = float(config.get("news.cache_ttl_sec", 900) or 0)
+        self._schedule_default_refresh()
 
     def _headers(self) -> Dict[str, str]:
         return {"x-api-key": str(self.api_key or "")}
 
+    def _fetch(self, url: str, params: Dict[str, Any], ttl: Optional[float] = None, **kwargs):
+        return self.fetcher.get(
+            url,
+            params=params,
+            headers=self._headers(),
+            ttl=self.cache_ttl if ttl is None else ttl,
+            timeout=self.request_timeout,
+            **kwargs,
+        )
+
+    def _schedule_default_refresh(self):
+        """Держать главные новости по стране по умолчанию тёплыми в кэше"""
+        if not self.api_key or not self.cache_ttl or not self.config.get("fetch.refresh_defaults", True):
+            self.fetcher.unregister_refresh("news.top")
+            return
+        self.fetcher.register_refresh(
+            "news.top",
+            self.api_url_top,
+            {"language": self.language, "source-country": self.country},
+            headers=self._headers(),
+            interval=self.cache_ttl * 0.9,
+            timeout=self.request_timeout,
+        )
+
     def get_news(
         self, query: Optional[str] = None, category: Optional[str] = None, country: Optional[str] = None
     ) -> str:
@@ -53,50 +82,40 @@ class NewsModule:
                 # Необязательно, но можем подсказать страну источника
                 if country or self.country:
                     params["source-country"] = country or self.country
-                response = self.session.get(
-                    self.api_url_search, params=params, headers=self._headers(), timeout=self.request_timeout
-                )
+                result = self._fetch(self.api_url_search, params)
             else:
                 # Топ новости по стране/языку
                 params = {"language": self.language, "source-country": (country or self.country)}
-                response = self.session.get(
-                    self.api_url_top, params=params, headers=self._headers(), timeout=self.request_timeout
-                )
-
-            if response.status_code == 200:
-                data = response.json()
-                return self.format_news_response(data, query or category or "главные новости")
-            elif response.status_code == 401:
+                result = self._fetch(self.api_url_top, params)
+
+            if result.error_kind == ERROR_TIMEOUT:
+                return "❌ Превышено время ожидания при запросе новостей."
+            elif result.error_kind == ERROR_CONNECTION:
+                return "❌ Нет подключения к интернету для получения новостей."
+            elif result.error_kind:
+                raise RuntimeError(result.error)
+
+            if result.status_code == 200:
+                return self.format_news_response(result.data, query or category or "главные новости")
+            elif result.status_code == 401:
                 return "❌ Неверный API ключ для WorldNewsAPI. Проверьте настройки."
-            elif response.status_code == 429:
+            elif result.status_code == 429:
                 return "❌ Превышен лимит запросов к WorldNewsAPI. Попробуйте позже."
+            elif result.status_code == 400 and not query:
+                # Fallback: top-news вернул 400 (неподдержимая комбинация языка/страны), пробуем search-news
+                self.logger.warning("top-news rejected language/country, falling back to search-news")
+                params = {
+                    "language": self.language,
+                    "number": self.page_size,
+                    "source-country": country or self.country,
+                }
+                fallback = self._fetch(self.api_url_search, params)
+                if fallback.status_code == 200:
+                    return self.format_news_response(fallback.data, category or "главные новости")
+                return "❌ Ошибка получения новостей (fallback тоже не удался)."
             else:
-                return f"❌ Ошибка получения новостей: {response.status_code}"
+                return f"❌ Ошибка получения новостей: {result.status_code}"
 
-        except requests.exceptions.HTTPError as http_err:
-            # Fallback: если top-news вернул 400 (неподдержимая комбинация языка/страны), попробуем search-news
-            self.logger.warning(f"HTTP error in news: {http_err}")
-            try:
-                params = {"language": self.language, "number": self.page_size}
-                if not query:
-                    # Без явного текста используем только язык и страну как фильтр
-                    params["source-country"] = country or self.country
-                else:
-                    params["text"] = query
-                resp2 = self.session.get(
-                    self.api_url_search, params=params, headers=self._headers(), timeout=self.request_timeout
-                )
-                if resp2.status_code == 200:
-                    data = resp2.json()
-                    return self.format_news_response(data, query or category or "главные новости")
-            except Exception:
-                pass
-            return "❌ Ошибка получения новостей (fallback тоже не удался)."
-
-        except requests.exceptions.Timeout:
-            return "❌ Превышено время ожидания при запросе новостей."
-        except requests.exceptions.ConnectionError:
-            return "❌ Нет подключения к интернету для получения новостей."
         except Exception as e:
             self.logger.error(f"News API error: {e}")
             return f"❌ Ошибка при получении новостей: {str(e)}"
@@ -178,14 +197,13 @@ class NewsModule:
             return "❌ API ключ для новостей не настроен."
         try:
             params = {"text": query, "language": self.language, "number": self.page_size, "sort": "publish-time"}
-            response = self.session.get(
-                self.api_url_search, params=params, headers=self._headers(), timeout=self.request_timeout
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return self.format_news_response(data, f"поиск: {query}")
+            result = self._fetch(self.api_url_search, params)
+            if result.error_kind:
+                raise RuntimeError(result.error)
+            if result.status_code == 200:
+                return self.format_news_response(result.data, f"поиск: {query}")
             else:
-                return f"❌ Ошибка поиска новостей: {response.status_code}"
+                return f"❌ Ошибка поиска новостей: {result.status_code}"
         except Exception as e:
             self.logger.error(f"News search error: {e}")
             return f"❌ Ошибка поиска: {str(e)}"
@@ -205,10 +223,12 @@ class NewsModule:
             if country:
                 params["country"] = country
 
-            response = self.session.get(sources_url, params=params)
+            result = self.fetcher.get(sources_url, params=params, ttl=self.cache_ttl, timeout=self.request_timeout)
+            if result.error_kind:
+                raise RuntimeError(result.error)
 
-            if response.status_code == 200:
-                data = response.json()
+            if result.status_code == 200:
+                data = result.data or {}
                 sources = data.get("sources", [])
 
                 if not sources:
@@ -234,7 +254,7 @@ class NewsModule:
 
                 return response_text
             else:
-                return f"❌ Ошибка получения источников: {response.status_code}"
+                return f"❌ Ошибка получения источников: {result.status_code}"
 
         except Exception as e:
             self.logger.error(f"Sources API error: {e}")
@@ -264,18 +284,21 @@ class NewsModule:
         self.api_key = api_key
         self.config.set("news.api_key", api_key)
         self.logger.info("News API key updated")
+        self._schedule_default_refresh()
 
     def set_country(self, country: str):
         """Set default country for news"""
         self.country = country
         self.config.set("news.country", country)
         self.logger.info(f"Default country set to: {country}")
+        self._schedule_default_refresh()
 
     def set_language(self, language: str):
         """Set language for news"""
         self.language = language
         self.config.set("news.language", language)
         self.logger.info(f"Language set to: {language}")
+        self._schedule_default_refresh()
 
     def test_api_connection(self) -> bool:
         """Test news API connection"""
@@ -283,10 +306,9 @@ class NewsModule:
             return False
         try:
             params = {"language": self.language, "source-country": self.country}
-            response = self.session.get(
-                self.api_url_top, params=params, headers=self._headers(), timeout=self.request_timeout
-            )
-            return response.status_code == 200
+            # Тот же запрос, что и фоновое обновление главных новостей: обычно попадает в кэш
+            result = self._fetch(self.api_url_top, params)
+            return result.status_code == 200
         except Exception as e:
             self.logger.error(f"News API test failed: {e}")
             return False
@@ -319,8 +341,8 @@ class NewsModule:
     def cleanup(self):
         """Cleanup news module resources"""
         try:
-            if self.session:
-                self.session.close()
+            # Пул соединений общий (utils.fetch_cache) — снимаем только своё фоновое обновление
+            self.fetcher.unregister_refresh("news.top")
             self.logger.info("News module cleanup complete")
         except Exception as e:
             self.logger.error(f"Error during news cleanup: {e}")
@@ -5,8 +5,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-import requests
-
+from utils.fetch_cache import get_fetcher
 from utils.logger import ModuleLogger
 from utils.security import AuditEventType, AuditSeverity, Permission, get_audit_logger, get_rbac_manager
 
@@ -16,6 +15,36 @@ class SearchModule:
 
     _BASE_URL = "https://www.googleapis.com/customsearch/v1"
 
+    # Триггеры веб-поиска (интент "search" в IntentRouter — fallback после встроенных модулей)
+    TRIGGERS = (
+        "найди",
+        "поиск",
+        "поищи",
+        "загугли",
+        "google",
+        "гугл",
+        "в интернете",
+        "найди информацию",
+    )
+    # Запросы к встроенным модулям поиск не перехватывает
+    EXCLUSIONS = (
+        "погода",
+        "температура",
+        "weather",
+        "новости",
+        "news",
+        "запусти",
+        "открой",
+        "включи",
+        "выключи",
+        "громкость",
+        "звук",
+        "музыка",
+        "календарь",
+        "напомни",
+        "событие",
+    )
+
     def __init__(self, config):
         self.config = config
         self.logger = ModuleLogger("SearchModule")
@@ -27,6 +56,8 @@ class SearchModule:
         self.rbac = get_rbac_manager() if self.rbac_enabled else None
         self.audit = get_audit_logger(config)
         self.current_user = None
+        # Общий пул соединений и кэш ответов (utils.fetch_cache)
+        self.fetcher = get_fetcher(config)
 
     def set_current_user(self, user_id: Optional[str]):
         """Установить текущего пользователя для RBAC проверок"""
@@ -52,38 +83,11 @@ class SearchModule:
         lowered = message.lower()
 
         # ИСКЛЮЧАЕМ запросы, относящиеся к встроенным модулям
-        exclusions = (
-            "погода",
-            "температура",
-            "weather",
-            "новости",
-            "news",
-            "запусти",
-            "открой",
-            "включи",
-            "выключи",
-            "громкость",
-            "звук",
-            "музыка",
-            "календарь",
-            "напомни",
-            "событие",
-        )
-        if any(word in lowered for word in exclusions):
+        if any(word in lowered for word in self.EXCLUSIONS):
             return False
 
         # Триггеры для веб-поиска
-        triggers = (
-            "найди",
-            "поиск",
-            "поищи",
-            "загугли",
-            "google",
-            "гугл",
-            "в интернете",
-            "найди информацию",
-        )
-        return any(word in lowered for word in triggers)
+        return any(word in lowered for word in self.TRIGGERS)
 
     def search(self, message: str) -> Optional[Dict[str, Any]]:
         """Perform Google Custom Search request and return structured results."""
@@ -120,18 +124,18 @@ class SearchModule:
         if region:
             params["gl"] = region
 
-        try:
-            response = requests.get(self._BASE_URL, params=params, timeout=6)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as exc:
-            self.logger.error(f"Search request failed: {exc}")
+        ttl = float(self.config.get("search.cache_ttl_sec", 3600) or 0)
+        result = self.fetcher.get(self._BASE_URL, params=params, ttl=ttl, timeout=6)
+        if not result.ok or not isinstance(result.data, dict):
+            error = result.error or f"HTTP {result.status_code}"
+            self.logger.error(f"Search request failed: {error}")
             return {
                 "query": query,
                 "results": [],
-                "error": str(exc),
+                "error": error,
                 "requested_at": datetime.utcnow().isoformat(),
             }
+        data = result.data
 
         items = data.get("items", []) or []
         results = []
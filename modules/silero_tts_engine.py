@@ -30,6 +30,7 @@ if str(project_root) not in sys.path:
 
 from config.config import Config
 from modules.tts_base import TTSEngineBase, TTSStatus, HealthCheckResult
+from modules.tts_worker_client import TTSWorkerCancelled, get_tts_worker_client, is_persistent_worker_enabled
 from utils.logger import ModuleLogger
 
 
@@ -45,12 +46,14 @@ class SileroTTSEngine(TTSEngineBase):
         """
         self.config = config
         self.logger = logger or ModuleLogger("SileroTTSEngine")
+        self.engine_name = "silero"
         self.model = None
         self.sample_rate = config.get("tts.sample_rate", 48000)
         self.voice = config.get("tts.voice", "aidar")
         self.device = config.get("tts.device", "cpu")
         self.is_ready_flag = False
         self._subprocess_available = False
+        self._worker_client = None  # Постоянный TTS-воркер (создаётся лениво)
         self.is_speaking = False
         self.current_audio = None
         self.tts_mode = config.get("tts.mode", "realtime")
@@ -155,6 +158,13 @@ class SileroTTSEngine(TTSEngineBase):
 
         def tts_task():
             try:
+                # Готовый клип из общего кеша — модель даже не нужна
+                cached = self._cache_lookup(text, voice)
+                if cached is not None:
+                    self.logger.info(f"Using cached TTS audio for: {text[:50]}...")
+                    self._play_audio_async(cached)
+                    return True
+
                 # Lazy load model on first use
                 if not self._model_initialized:
                     self.logger.info("First TTS use - loading model lazily...")
@@ -179,6 +189,7 @@ class SileroTTSEngine(TTSEngineBase):
                 if audio is not None:
                     if _torch is not None and hasattr(_torch, "is_tensor") and _torch.is_tensor(audio):
                         audio = audio.cpu().numpy()
+                    self._cache_store(text, voice, audio)
 
                     # Запускаем воспроизведение в отдельном потоке
                     self._play_audio_async(audio)
@@ -196,6 +207,50 @@ class SileroTTSEngine(TTSEngineBase):
         unique_task_name = f"tts_speak_{int(time.time() * 1000)}"
         task_manager.run_async(unique_task_name, tts_task)
 
+    def synthesize_audio(self, text: str, voice: Optional[str] = None) -> Optional[np.ndarray]:
+        """Synthesize text to a float32 array without playing it (used by the streaming pipeline)"""
+        if not text or not text.strip():
+            return None
+        cached = self._cache_lookup(text, voice)
+        if cached is not None:
+            return cached
+        if not self._model_initialized:
+            self._load_model_lazy()
+
+        speaker = self._map_voice(str(voice or self.voice))
+        if self.model is not None:
+            try:
+                model_any: Any = self.model
+                audio = model_any.apply_tts(text=text, speaker=speaker, sample_rate=self.sample_rate)
+                if _torch is not None and hasattr(_torch, "is_tensor") and _torch.is_tensor(audio):
+                    audio = audio.cpu().numpy()
+                if audio is not None:
+                    audio = np.asarray(audio, dtype=np.float32)
+                    self._cache_store(text, voice, audio)
+                    return audio
+            except Exception as e:
+                self.logger.warning(f"Direct synthesis failed, trying persistent worker: {e}")
+
+        if is_persistent_worker_enabled(self.config):
+            if self._worker_client is None:
+                self._worker_client = get_tts_worker_client(self.config)
+            try:
+                audio = self._worker_client.synthesize(text, voice=speaker, sample_rate=self.sample_rate)
+            except TTSWorkerCancelled:
+                return None
+            if audio is not None and audio.size > 0:
+                self._cache_store(text, voice, audio)
+            return audio
+        return None
+
+    def _cache_voice_key(self, voice: Optional[str] = None) -> str:
+        """Ключ голоса после маппинга, чтобы legacy TTSEngine и этот движок делили клипы"""
+        return self._map_voice(str(voice or self.voice))
+
+    def get_sample_rate(self) -> int:
+        """Sample rate of audio returned by synthesize_audio()"""
+        return int(self.sample_rate)
+
     def speak_streaming(self, text_chunk: str, voice: Optional[str] = None):
         """Speak text chunk for streaming mode (realtime) with buffering
         
@@ -235,6 +290,9 @@ class SileroTTSEngine(TTSEngineBase):
     def stop(self):
         """Stop current TTS playback"""
         try:
+            # Отменяем незавершённый синтез в постоянном воркере
+            if self._worker_client is not None:
+                self._worker_client.cancel_all()
             if self.is_speaking:
                 sd.stop()
                 self.is_speaking = False
@@ -334,8 +392,39 @@ class SileroTTSEngine(TTSEngineBase):
         thread = threading.Thread(target=play, daemon=True)
         thread.start()
 
+    def _speak_via_worker(
+        self, text: str, voice: Optional[str] = None, output_filename: Optional[str] = None
+    ) -> bool:
+        """Synthesize through the persistent worker process (model stays resident between phrases)."""
+        if self._worker_client is None:
+            self._worker_client = get_tts_worker_client(self.config)
+        # Тот же маппинг, что и в synthesize_audio: воркер получает реальный id спикера
+        speaker = self._map_voice(str(voice or self.voice))
+        if output_filename:
+            return self._worker_client.synthesize_to_file(
+                text, output_filename, voice=speaker, sample_rate=self.sample_rate
+            )
+        audio = self._worker_client.synthesize(text, voice=speaker, sample_rate=self.sample_rate)
+        if audio is None or audio.size == 0:
+            return False
+        self._cache_store(text, voice, audio)
+        self._play_audio_async(audio)
+        return True
+
     def _speak_via_subprocess(self, text: str, voice: Optional[str] = None, output_filename: Optional[str] = None):
         """Use subprocess worker for fallback synthesis, respecting SAPI flag"""
+        if is_persistent_worker_enabled(self.config):
+            try:
+                if self._speak_via_worker(text, voice, output_filename):
+                    return True
+            except TTSWorkerCancelled:
+                # Фразу остановили (stop) — запасной синтез озвучил бы её всё равно
+                self.logger.info("TTS request cancelled, skipping subprocess fallback")
+                return False
+            except Exception as worker_error:
+                self.logger.debug(f"Persistent TTS worker error: {worker_error}")
+            self.logger.warning("Persistent TTS worker unavailable, falling back to one-shot subprocess")
+
         try:
             worker_path = Path(__file__).parent / "tts_worker_subprocess.py"
             if not worker_path.exists():
@@ -460,6 +549,19 @@ class SileroTTSEngine(TTSEngineBase):
             self.logger.error(f"Error saving TTS to file: {e}. Trying subprocess fallback...")
             return self._speak_via_subprocess(text, voice, output_filename=filename)
 
+    def get_status(self) -> dict:
+        """Get TTS engine status"""
+        return {
+            "engine": self.engine_name,
+            "ready": self.is_ready(),
+            "speaking": self.is_speaking,
+            "voice": self.voice,
+            "sample_rate": self.sample_rate,
+            "device": self.device,
+            "worker": self._worker_client.get_status() if self._worker_client is not None else None,
+            "cache": self.get_cache_stats(),
+        }
+
     def get_available_voices(self) -> list:
         """Get list of available voices"""
         return [
@@ -0,0 +1,212 @@
+"""
+Offline batch transcription with Vosk
+
+Пакетное распознавание WAV-файлов без GUI и микрофона: файлы делятся между
+процессами пула (ProcessPoolExecutor), каждый процесс один раз загружает модель
+Vosk в инициализаторе и дальше только создаёт KaldiRecognizer на файл. Результаты
+отдаются по мере готовности (JSONL: текст, длительность аудио, время распознавания
+и real-time factor = время / длительность).
+
+Модуль не импортирует PyQt и STTEngine, чтобы дочерние процессы (spawn) стартовали
+быстро. Запуск из командной строки:
+
+    python -m modules.stt_batch recordings/ extra.wav -o result.jsonl --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = "models/vosk-model-small-ru-0.22"
+DEFAULT_CHUNK_FRAMES = 4000
+
+# Состояние процесса-воркера: модель грузится один раз в _init_worker
+_worker_model = None
+_worker_chunk_frames = DEFAULT_CHUNK_FRAMES
+
+
+def collect_audio_files(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """Развернуть список файлов/папок в отсортированный список WAV без повторов"""
+    files: List[str] = []
+    seen = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            found = sorted(p for p in path.glob(pattern) if p.is_file() and p.suffix.lower() == ".wav")
+        else:
+            found = [path]
+        for p in found:
+            key = str(p.resolve())
+            if key not in seen:
+                seen.add(key)
+                files.append(str(p))
+    return files
+
+
+def _read_chunks(wav: wave.Wave_read, chunk_frames: int) -> Iterator[bytes]:
+    """PCM 16-bit mono чанками; многоканальный звук сводится в моно"""
+    channels = wav.getnchannels()
+    while True:
+        data = wav.readframes(chunk_frames)
+        if not data:
+            return
+        if channels > 1:
+            samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+            data = samples.mean(axis=1).astype(np.int16).tobytes()
+        yield data
+
+
+def recognize_wave(model, path: str, chunk_frames: int = DEFAULT_CHUNK_FRAMES) -> Tuple[str, float]:
+    """Распознать WAV (16-bit PCM, любая частота) моделью Vosk: (текст, длительность в секундах)"""
+    import vosk
+
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("audio must be 16-bit PCM WAV")
+        sample_rate = wav.getframerate()
+        duration = wav.getnframes() / float(sample_rate)
+        recognizer = vosk.KaldiRecognizer(model, sample_rate)
+        parts: List[str] = []
+        for data in _read_chunks(wav, chunk_frames):
+            if recognizer.AcceptWaveform(data):
+                text = json.loads(recognizer.Result()).get("text", "").strip()
+                if text:
+                    parts.append(text)
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if text:
+            parts.append(text)
+    return " ".join(parts).strip(), duration
+
+
+def _init_worker(model_path: str, chunk_frames: int):
+    global _worker_model, _worker_chunk_frames
+    import vosk
+
+    try:
+        vosk.SetLogLevel(-1)
+    except Exception:
+        pass
+    _worker_model = vosk.Model(str(model_path))
+    _worker_chunk_frames = int(chunk_frames)
+
+
+def _transcribe_in_worker(index: int, path: str) -> Dict:
+    start = time.perf_counter()
+    record = {"index": index, "file": path, "ok": False, "text": "", "pid": os.getpid()}
+    try:
+        text, duration = recognize_wave(_worker_model, path, _worker_chunk_frames)
+        record.update(ok=True, text=text, audio_sec=round(duration, 3))
+    except Exception as e:
+        record["error"] = str(e)
+    elapsed = time.perf_counter() - start
+    record["elapsed_sec"] = round(elapsed, 3)
+    audio_sec = record.get("audio_sec") or 0.0
+    record["rtf"] = round(elapsed / audio_sec, 4) if audio_sec > 0 else None
+    return record
+
+
+def default_workers(file_count: int, requested: int = 0) -> int:
+    """Число процессов: явно заданное или (ядра - 1), но не больше числа файлов"""
+    workers = int(requested or 0)
+    if workers <= 0:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    return max(1, min(workers, file_count or 1))
+
+
+def transcribe_batch(
+    files: List[str],
+    model_path: str = DEFAULT_MODEL_PATH,
+    workers: int = 0,
+    chunk_frames: int = DEFAULT_CHUNK_FRAMES,
+) -> Iterator[Dict]:
+    """Распознать файлы в пуле процессов; записи отдаются в порядке готовности (поле index — исходный порядок)"""
+    if not files:
+        return
+    if not Path(model_path).exists():
+        raise FileNotFoundError(f"Vosk model not found at: {model_path}")
+    # spawn: воркеры не наследуют потоки/Qt родителя и одинаково ведут себя на Windows и Linux
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=default_workers(len(files), workers),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(str(model_path), int(chunk_frames)),
+    ) as pool:
+        futures = [pool.submit(_transcribe_in_worker, i, path) for i, path in enumerate(files)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(records: List[Dict], wall_seconds: float) -> Dict:
+    """Итог пакета: суммарная длительность аудио, время и RTF по стене и по CPU воркеров"""
+    audio = sum(r.get("audio_sec") or 0.0 for r in records)
+    busy = sum(r.get("elapsed_sec") or 0.0 for r in records)
+    return {
+        "files": len(records),
+        "failed": sum(1 for r in records if not r.get("ok")),
+        "audio_sec": round(audio, 3),
+        "wall_sec": round(wall_seconds, 3),
+        "rtf": round(wall_seconds / audio, 4) if audio > 0 else None,
+        "worker_rtf": round(busy / audio, 4) if audio > 0 else None,
+    }
+
+
+def _default_model_path() -> str:
+    try:
+        from config.config import Config
+
+        return str(Config().get("stt.model_path", DEFAULT_MODEL_PATH) or DEFAULT_MODEL_PATH)
+    except Exception:
+        return DEFAULT_MODEL_PATH
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Arvis offline batch transcription (Vosk, JSONL output)")
+    parser.add_argument("inputs", nargs="+", help="WAV files and/or directories")
+    parser.add_argument("-o", "--output", default=None, help="JSONL output file (default: stdout)")
+    parser.add_argument("-m", "--model", default=None, help="Vosk model path (default: stt.model_path from config)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Worker processes (default: CPU count - 1)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    parser.add_argument("--chunk-frames", type=int, default=DEFAULT_CHUNK_FRAMES, help="Frames per AcceptWaveform")
+    args = parser.parse_args(argv)
+
+    files = collect_audio_files(args.inputs, recursive=args.recursive)
+    if not files:
+        print("[STT-BATCH] No WAV files found", file=sys.stderr)
+        return 1
+    model_path = args.model or _default_model_path()
+    workers = default_workers(len(files), args.workers)
+    print(f"[STT-BATCH] {len(files)} file(s), {workers} worker(s), model {model_path}", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    records: List[Dict] = []
+    start = time.perf_counter()
+    try:
+        for record in transcribe_batch(files, model_path, workers, args.chunk_frames):
+            records.append(record)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    except FileNotFoundError as e:
+        print(f"[STT-BATCH-ERROR] {e}", file=sys.stderr)
+        return 2
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = summarize(records, time.perf_counter() - start)
+    print(f"[STT-BATCH] {json.dumps(summary, ensure_ascii=False)}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 3
+
+
+if __name__ == "__main__":
+    sys.exit(main())
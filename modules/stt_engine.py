@@ -4,34 +4,19 @@ Speech-to-Text engine using Vosk
 
 import json
 import threading
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
-try:
-    import pyaudio
-except ImportError:
-    pyaudio = None
-
 import vosk
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
 
 from config.config import Config
+from modules.audio_bus import AudioSubscription, get_audio_bus, list_input_devices
+from modules.stt_batch import DEFAULT_CHUNK_FRAMES, collect_audio_files, recognize_wave, transcribe_batch
+from modules.voice_activity import SpeechGate, UtteranceEndpointer
 from utils.logger import ModuleLogger
-
-# If pyaudio is not available, define fallback constants
-if pyaudio is None:
-    class PyAudioFallback:
-        """Minimal fallback shim to avoid attribute errors when PyAudio is missing."""
-        # Standard PCM format constant used by code
-        paInt16 = 2
-
-        class PyAudio:
-            def __init__(self, *args, **kwargs):
-                # Explicit error to be caught by initialization logic
-                raise RuntimeError("PyAudio is not installed. Please install pyaudio to enable microphone input.")
-
-    # Assign the class (module-like shim), not an instance, so attribute lookups work
-    pyaudio = PyAudioFallback
+from utils.tracing import get_tracer
 
 
 class STTEngine(QObject):
@@ -62,8 +47,8 @@ class STTEngine(QObject):
         self.is_listening_for_wake_word = False
         self.model = None
         self.recognizer = None
-        self.audio_stream = None
-        self.audio_interface = None
+        # Микрофон общий (modules.audio_bus): wake word и запись — подписчики одной шины
+        self._preroll_since: Optional[float] = None
 
         # Threading
         self.recording_thread = None
@@ -88,10 +73,7 @@ class STTEngine(QObject):
             self.model = vosk.Model(str(model_path))
             self.recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
 
-            # Defer PyAudio initialization to first use to avoid startup crashes
-            self.audio_interface = None
-
-            self.logger.info("Vosk STT initialized successfully (PyAudio will init on first use)")
+            self.logger.info("Vosk STT initialized successfully (microphone opens on first use)")
 
             try:
                 self.model_ready.emit(str(model_path))
@@ -109,26 +91,13 @@ class STTEngine(QObject):
         """Provide direct access to the underlying Vosk model (if loaded)."""
         return self.model
 
-    def _ensure_audio_interface(self):
-        """Lazily initialize PyAudio interface if not yet created."""
-        if pyaudio is None or not hasattr(pyaudio, "PyAudio"):
-            self.logger.error("PyAudio not installed. Audio input will not work.")
-            return False
-            
-        if self.audio_interface is None:
-            try:
-                # Initialize PyAudio with error handling for Windows
-                self.audio_interface = pyaudio.PyAudio()
-                self.logger.info("PyAudio interface initialized successfully")
-            except Exception as e:
-                self.logger.error(f"Failed to initialize audio interface: {e}")
-                # Try to provide helpful information
-                if "ALSA" in str(e):
-                    self.logger.info("ALSA errors are usually harmless on non-Linux systems")
-                elif "PortAudio" in str(e):
-                    self.logger.error("PortAudio not properly installed. Please check audio system.")
-                return False
-        return True
+    def _subscribe(self, name: str, preroll_ms: Optional[int] = 0, since: Optional[float] = None):
+        """Подписка на общую шину захвата микрофона (None, если микрофон недоступен)"""
+        bus = get_audio_bus(self.config)
+        subscription = bus.subscribe(name, preroll_ms=preroll_ms, since=since) if bus is not None else None
+        if subscription is None:
+            self.logger.error("Audio capture unavailable: check microphone and PyAudio installation")
+        return subscription
 
     def start_wake_word_detection(self):
         """Start listening for wake word in background"""
@@ -154,23 +123,34 @@ class STTEngine(QObject):
 
     def _wake_word_loop(self):
         """Background loop for wake word detection"""
+        subscription = self._subscribe("stt_wake_word")
+        if subscription is None:
+            self.is_listening_for_wake_word = False
+            return
         try:
-            if not self._ensure_audio_interface():
-                return
-            # Create audio stream for wake word detection
-            stream = self.audio_interface.open(
-                format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True, frames_per_buffer=self.chunk_size
-            )
-
-            wake_recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+            wake_recognizer = vosk.KaldiRecognizer(self.model, subscription.sample_rate)
+            # VAD: тишина не доходит до Kaldi, конец фразы — по границе речи
+            gate = None
+            if self.config.get("stt.vad.gate_wake_word", True):
+                gate = SpeechGate.from_config(self.config, subscription.sample_rate)
 
             while self.is_listening_for_wake_word:
                 try:
-                    data = stream.read(self.chunk_size, exception_on_overflow=False)
-
-                    if wake_recognizer.AcceptWaveform(data):
-                        result = json.loads(wake_recognizer.Result())
-                        text = result.get("text", "").lower()
+                    data = subscription.read(timeout=0.5)
+                    if data is None:
+                        if not subscription.is_active():
+                            self.logger.warning("Audio capture stopped, wake word detection ended")
+                            self.is_listening_for_wake_word = False
+                            break
+                        continue
+
+                    chunks, utterance_ended = gate.feed(data) if gate is not None else ([data], False)
+                    results = [wake_recognizer.Result() for chunk in chunks if wake_recognizer.AcceptWaveform(chunk)]
+                    if utterance_ended:
+                        results.append(wake_recognizer.FinalResult())
+
+                    for raw in results:
+                        text = json.loads(raw).get("text", "").lower()
 
                         # Логируем все распознанные фразы для отладки
                         if text:
@@ -180,18 +160,24 @@ class STTEngine(QObject):
                         if any(variant in text for variant in self.wake_word_variants):
                             self.logger.info(f"Wake word detected in: '{text}'")
                             self.wake_word_detected.emit()
+                            break
 
                 except Exception as e:
                     if self.is_listening_for_wake_word:  # Only log if we're still supposed to be listening
                         self.logger.debug(f"Error in wake word detection: {e}")
 
-            stream.close()
-
         except Exception as e:
             self.logger.error(f"Error in wake word loop: {e}")
+        finally:
+            subscription.close()
 
-    def start_recording(self):
-        """Start recording for speech recognition"""
+    def start_recording(self, preroll_since: Optional[float] = None, trace_parent=None):
+        """Start recording for speech recognition
+
+        Запись начинается с pre-roll (audio.capture.preroll_ms уже захваченного звука),
+        но не раньше preroll_since (time.monotonic(), например конец фразы подтверждения).
+        trace_parent — спан хода (utils.tracing), к которому привязывается запись.
+        """
         if not self.is_ready():
             self.logger.error("STT engine not ready")
             return
@@ -201,7 +187,8 @@ class STTEngine(QObject):
             return
 
         self.is_recording = True
-        self.recording_thread = threading.Thread(target=self._recording_loop, daemon=True)
+        self._preroll_since = preroll_since
+        self.recording_thread = threading.Thread(target=self._recording_loop, args=(trace_parent,), daemon=True)
         self.recording_thread.start()
         self.recording_started.emit()
         self.logger.info("Started recording")
@@ -215,65 +202,59 @@ class STTEngine(QObject):
             self.recording_stopped.emit()
             self.logger.info("Stopped recording")
 
-    def _recording_loop(self):
+    def _recording_loop(self, trace_parent=None):
         """Main recording loop"""
+        subscription: Optional[AudioSubscription] = None
+        span = get_tracer().start_span("stt.recording", parent=trace_parent or None)
         try:
-            if not self._ensure_audio_interface():
+            subscription = self._subscribe("stt_recording", preroll_ms=None, since=self._preroll_since)
+            if subscription is None:
                 return
-            # Create audio stream for recording
-            stream = self.audio_interface.open(
-                format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True, frames_per_buffer=self.chunk_size
-            )
 
             # Create new recognizer for this session
-            session_recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+            session_recognizer = vosk.KaldiRecognizer(self.model, subscription.sample_rate)
 
-            speech_detected = False
-            silence_counter = 0
-            total_silence_counter = 0  # Счетчик полной тишины с начала записи
-            max_silence = 40  # ~2.5 seconds of silence after speech to stop (увеличено)
-            max_total_silence = 160  # ~10 seconds of complete silence from start to stop (увеличено вдвое)
+            # Конец фразы определяет VAD (stt.vad.*): end_silence_ms тишины после речи,
+            # no_speech_timeout_ms без речи с начала записи, max_utterance_ms на всю фразу
+            endpointer = UtteranceEndpointer.from_config(self.config, subscription.sample_rate)
+            lead = deque(maxlen=max(0, int(self.config.get("stt.vad.gate_lead_chunks", 2))))
+            text_parts = []
+            speech_marked = False
 
             while self.is_recording:
                 try:
-                    data = stream.read(self.chunk_size, exception_on_overflow=False)
-
-                    if session_recognizer.AcceptWaveform(data):
-                        result = json.loads(session_recognizer.Result())
-                        text = result.get("text", "").strip()
-
-                        if text:
-                            speech_detected = True
-                            silence_counter = 0
-                            total_silence_counter = 0
-                            self.logger.info(f"Recognized: {text}")
-                            self.speech_recognized.emit(text)
-                            break  # Stop after recognizing speech
-                    else:
-                        # Check for partial results to detect speech activity
-                        partial_result = json.loads(session_recognizer.PartialResult())
-                        partial_text = partial_result.get("partial", "").strip()
-
-                        if partial_text:
-                            speech_detected = True
-                            silence_counter = 0
-                            total_silence_counter = 0
-                            self.logger.debug(f"Partial: {partial_text}")
-                        else:
-                            # Тишина
-                            if speech_detected:
-                                silence_counter += 1
-                                if silence_counter > max_silence:
-                                    # Too much silence after detecting speech
-                                    self.logger.info("Stopping: silence after speech detected")
-                                    break
-                            else:
-                                # Полная тишина с начала записи
-                                total_silence_counter += 1
-                                if total_silence_counter > max_total_silence:
-                                    # Пользователь ничего не сказал за 5 секунд
-                                    self.logger.info("Stopping: no speech detected within timeout")
-                                    break
+                    data = subscription.read(timeout=0.5)
+                    if data is None:
+                        if not subscription.is_active():
+                            self.logger.warning("Audio capture stopped during recording")
+                            break
+                        continue
+
+                    state = endpointer.feed(data)
+                    if state == UtteranceEndpointer.WAITING:
+                        # До начала речи Kaldi не нужен: держим пару чанков контекста
+                        lead.append(data)
+                        continue
+                    if state == UtteranceEndpointer.TIMEOUT:
+                        self.logger.info("Stopping: no speech detected within timeout")
+                        break
+
+                    if not speech_marked:
+                        speech_marked = True
+                        span.mark("stt.speech_start")
+                    chunks = [*lead, data]
+                    lead.clear()
+                    for chunk in chunks:
+                        if session_recognizer.AcceptWaveform(chunk):
+                            text = json.loads(session_recognizer.Result()).get("text", "").strip()
+                            if text:
+                                self.logger.debug(f"Recognized segment: {text}")
+                                text_parts.append(text)
+
+                    if state == UtteranceEndpointer.END:
+                        self.logger.info("Stopping: end of speech detected")
+                        span.mark("stt.endpoint")
+                        break
 
                 except Exception as e:
                     if self.is_recording:  # Only log if we're still supposed to be recording
@@ -281,12 +262,17 @@ class STTEngine(QObject):
 
             # Get final result
             try:
-                final_result = json.loads(session_recognizer.FinalResult())
-                final_text = final_result.get("text", "").strip()
-                if final_text and not speech_detected:
-                    self.logger.info(f"Final recognized: {final_text}")
-                    self.speech_recognized.emit(final_text)
-                elif not speech_detected and not final_text:
+                if endpointer.speech_detected:
+                    with get_tracer().span("stt.final_result", parent=span):
+                        final_text = json.loads(session_recognizer.FinalResult()).get("text", "").strip()
+                    if final_text:
+                        text_parts.append(final_text)
+                full_text = " ".join(text_parts).strip()
+                span.set(chars=len(full_text), speech=endpointer.speech_detected)
+                if full_text:
+                    self.logger.info(f"Recognized: {full_text}")
+                    self.speech_recognized.emit(full_text)
+                else:
                     # Пользователь ничего не сказал
                     self.logger.info("Recording ended with no speech detected")
                     # Эмитируем пустую строку чтобы сигнализировать об отсутствии речи
@@ -294,12 +280,13 @@ class STTEngine(QObject):
             except Exception as e:
                 self.logger.debug(f"Error getting final result: {e}")
 
-            stream.close()
-
         except Exception as e:
             self.logger.error(f"Error in recording loop: {e}")
         finally:
+            if subscription is not None:
+                subscription.close()
             self.is_recording = False
+            span.end()
 
     def recognize_audio_file(self, file_path: str) -> Optional[str]:
         """Recognize speech from audio file"""
@@ -308,41 +295,7 @@ class STTEngine(QObject):
             return None
 
         try:
-            import wave
-
-            # Open audio file
-            wf = wave.open(file_path, "rb")
-
-            # Check audio format
-            if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != self.sample_rate:
-                self.logger.error("Audio file must be mono, 16-bit, 16kHz")
-                return None
-
-            # Create recognizer
-            file_recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
-
-            # Process audio
-            text_parts = []
-            while True:
-                data = wf.readframes(self.chunk_size)
-                if len(data) == 0:
-                    break
-
-                if file_recognizer.AcceptWaveform(data):
-                    result = json.loads(file_recognizer.Result())
-                    text = result.get("text", "").strip()
-                    if text:
-                        text_parts.append(text)
-
-            # Get final result
-            final_result = json.loads(file_recognizer.FinalResult())
-            final_text = final_result.get("text", "").strip()
-            if final_text:
-                text_parts.append(final_text)
-
-            wf.close()
-
-            full_text = " ".join(text_parts).strip()
+            full_text, _duration = recognize_wave(self.model, file_path, self.chunk_size)
             self.logger.info(f"File recognition result: {full_text}")
             return full_text if full_text else None
 
@@ -350,6 +303,18 @@ class STTEngine(QObject):
             self.logger.error(f"Error recognizing audio file: {e}")
             return None
 
+    def recognize_audio_files(self, file_paths, workers: Optional[int] = None):
+        """Пакетное распознавание в пуле процессов (modules.stt_batch); записи по мере готовности"""
+        if workers is None:
+            workers = int(self.config.get("stt.batch.workers", 0) or 0)
+        files = collect_audio_files(file_paths)
+        return transcribe_batch(
+            files,
+            self.model_path,
+            workers=workers,
+            chunk_frames=int(self.config.get("stt.batch.chunk_frames", DEFAULT_CHUNK_FRAMES)),
+        )
+
     def set_wake_word(self, wake_word: str):
         """Set wake word"""
         self.wake_word = wake_word.lower()
@@ -358,21 +323,11 @@ class STTEngine(QObject):
 
     def get_audio_devices(self):
         """Get available audio input devices"""
-        if not self.audio_interface:
-            return []
-
-        devices = []
         try:
-            for i in range(self.audio_interface.get_device_count()):
-                device_info = self.audio_interface.get_device_info_by_index(i)
-                if device_info["maxInputChannels"] > 0:
-                    devices.append(
-                        {"index": i, "name": device_info["name"], "channels": device_info["maxInputChannels"]}
-                    )
+            return list_input_devices()
         except Exception as e:
             self.logger.error(f"Error getting audio devices: {e}")
-
-        return devices
+            return []
 
     def test_microphone(self) -> bool:
         """Test microphone input"""
@@ -380,16 +335,17 @@ class STTEngine(QObject):
             self.logger.info("Testing microphone...")
 
             # Record for 3 seconds
-            stream = self.audio_interface.open(
-                format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True, frames_per_buffer=self.chunk_size
-            )
+            subscription = self._subscribe("stt_microphone_test")
+            if subscription is None:
+                return False
 
             frames = []
-            for i in range(0, int(self.sample_rate / self.chunk_size * 3)):
-                data = stream.read(self.chunk_size)
-                frames.append(data)
-
-            stream.close()
+            with subscription:
+                for i in range(0, int(subscription.sample_rate / subscription.chunk_size * 3)):
+                    data = subscription.read(timeout=1.0)
+                    if data is None:
+                        break
+                    frames.append(data)
 
             # Check if we got some audio data
             total_audio = b"".join(frames)
@@ -410,9 +366,6 @@ class STTEngine(QObject):
             self.stop_wake_word_detection()
             self.stop_recording()
 
-            if self.audio_interface:
-                self.audio_interface.terminate()
-
             self.logger.info("STT cleanup complete")
 
         except Exception as e:
@@ -19,6 +19,34 @@ from utils.security import AuditEventType, AuditSeverity, Permission, get_audit_
 class SystemControlModule:
     """Module for controlling system functions, applications, and browser"""
 
+    # Словари команд: по ним execute_command/control_audio выбирают действие,
+    # их же ArvisCore регистрирует в IntentRouter (интенты "system" и "audio")
+    COMMAND_TRIGGERS = ("запусти", "открой", "включи", "выключи")
+    COMMAND_KEYWORDS = {
+        "launch": ("запусти", "открой", "включи"),
+        "website": ("сайт", "веб", "браузер"),
+        "power": ("выключи", "перезагрузи", "заблокируй"),
+        "close": ("закрой", "завершить", "убить"),
+    }
+    AUDIO_TRIGGERS = ("громкость", "звук", "музыка")
+    AUDIO_KEYWORDS = {
+        "volume": ("громкость", "звук"),
+        "media": ("музыка", "плеер"),
+        "volume_up": ("больше", "увеличь", "прибавь"),
+        "volume_down": ("меньше", "уменьш", "убавь"),
+        "mute": ("выключи", "отключи", "молчан"),
+        "unmute": ("включи", "включить"),
+        "pause": ("пауза", "останов", "стоп"),
+        "play": ("играй", "воспроизведи", "включи"),
+        "next": ("следующ", "вперед"),
+        "previous": ("предыдущ", "назад"),
+    }
+    # Порядок проверки групп (первая найденная определяет действие)
+    _COMMAND_ORDER = ("launch", "website", "power", "close")
+    _VOLUME_ORDER = ("volume_up", "volume_down", "mute", "unmute")
+    _MEDIA_ORDER = ("pause", "play", "next", "previous")
+    DEFAULT_VOLUME_STEP = 10
+
     def __init__(self, config: Config):
         self.config = config
         self.logger = ModuleLogger("SystemControl")
@@ -28,6 +56,9 @@ class SystemControlModule:
         self.rbac = get_rbac_manager() if self.rbac_enabled else None
         self.audit = get_audit_logger(config) if config.get("audit.enabled", False) else None
         self.current_user = None  # Будет устанавливаться через set_current_user()
+        self._platform_info = None
+        # Первый вызов cpu_percent(interval=None) задаёт точку отсчёта для get_system_info
+        psutil.cpu_percent(interval=None)
 
         # Common applications and their paths
         self.common_apps = {
@@ -78,14 +109,38 @@ class SystemControlModule:
         """Установить текущего пользователя для аудита (v1.4.0+)"""
         self.current_user = user
 
-    def execute_command(self, command: str) -> str:
-        """Execute system control command with RBAC checks (v1.4.0+)"""
+    @classmethod
+    def detect_command_action(cls, has_group) -> Optional[str]:
+        """Действие команды по найденным группам COMMAND_KEYWORDS (has_group(name) -> bool)"""
+        return next((action for action in cls._COMMAND_ORDER if has_group(action)), None)
+
+    @classmethod
+    def detect_audio_action(cls, has_group) -> Optional[str]:
+        """Действие аудио по найденным группам AUDIO_KEYWORDS: громкость важнее медиа"""
+        if has_group("volume"):
+            return next((action for action in cls._VOLUME_ORDER if has_group(action)), None)
+        if has_group("media"):
+            return next((action for action in cls._MEDIA_ORDER if has_group(action)), None)
+        return None
+
+    @staticmethod
+    def _text_has_group(text: str, keywords: Dict[str, tuple]):
+        return lambda group: any(word in text for word in keywords.get(group, ()))
+
+    def execute_command(self, command: str, action: Optional[str] = None, app_name: Optional[str] = None) -> str:
+        """Execute system control command with RBAC checks (v1.4.0+)
+
+        action (launch/website/power/close) и app_name приходят из IntentRouter;
+        без них команда разбирается по COMMAND_KEYWORDS как раньше.
+        """
         command_lower = command.lower()
         username = self.current_user.username if self.current_user else None
+        if action is None:
+            action = self.detect_command_action(self._text_has_group(command_lower, self.COMMAND_KEYWORDS))
 
         try:
             # Application launch commands
-            if any(word in command_lower for word in ["запусти", "открой", "включи"]):
+            if action == "launch":
                 # RBAC: Проверка прав на запуск приложений
                 if self.rbac and not self.rbac.has_permission(Permission.SYSTEM_APPS):
                     self.logger.warning(f"Permission denied: SYSTEM_APPS for role {self.rbac.get_role()}")
@@ -99,7 +154,7 @@ class SystemControlModule:
                         )
                     return "❌ У вас нет прав для запуска приложений (требуется роль User или выше)"
 
-                result = self.launch_application(command_lower)
+                result = self.launch_application(command_lower, app_name=app_name)
                 if self.audit and "✅" in result:
                     self.audit.log_event(
                         AuditEventType.APP_LAUNCHED, f"Launched application: {command}", username=username
@@ -107,7 +162,7 @@ class SystemControlModule:
                 return result
 
             # Website opening commands
-            elif any(word in command_lower for word in ["сайт", "веб", "браузер"]):
+            elif action == "website":
                 # RBAC: Проверка прав на открытие сайтов
                 if self.rbac and not self.rbac.has_permission(Permission.SYSTEM_WEBSITES):
                     self.logger.warning(f"Permission denied: SYSTEM_WEBSITES for role {self.rbac.get_role()}")
@@ -127,11 +182,11 @@ class SystemControlModule:
                 return result
 
             # System commands
-            elif any(word in command_lower for word in ["выключи", "перезагрузи", "заблокируй"]):
+            elif action == "power":
                 return self.system_power_command(command_lower)
 
             # Process management
-            elif any(word in command_lower for word in ["закрой", "завершить", "убить"]):
+            elif action == "close":
                 result = self.close_application(command_lower)
                 if self.audit and "✅" in result:
                     self.audit.log_event(
@@ -149,10 +204,10 @@ class SystemControlModule:
             self.logger.error(f"Error executing command: {e}")
             return f"❌ Ошибка выполнения команды: {str(e)}"
 
-    def launch_application(self, command: str) -> str:
+    def launch_application(self, command: str, app_name: Optional[str] = None) -> str:
         """Launch an application"""
         # Extract application name from command
-        app_name = self.extract_app_name(command)
+        app_name = app_name or self.extract_app_name(command)
 
         if not app_name:
             return "❓ Не указано приложение для запуска. Попробуйте: 'запусти блокнот'"
@@ -463,30 +518,28 @@ class SystemControlModule:
                 )
             return f"❌ Ошибка блокировки: {str(e)}"
 
-    def control_audio(self, command: str) -> str:
-        """Control system audio"""
+    def control_audio(self, command: str, action: Optional[str] = None, step: Optional[int] = None) -> str:
+        """Control system audio
+
+        action (volume_up/volume_down/mute/unmute/pause/play/next/previous) и step
+        (шаг громкости в процентах) приходят из IntentRouter; без них — разбор текста.
+        """
         command_lower = command.lower()
+        if action is None:
+            action = self.detect_audio_action(self._text_has_group(command_lower, self.AUDIO_KEYWORDS))
+        step = abs(int(step)) if step else self.DEFAULT_VOLUME_STEP
 
         try:
-            if any(word in command_lower for word in ["громкость", "звук"]):
-                if any(word in command_lower for word in ["больше", "увеличь", "прибавь"]):
-                    return self.change_volume(10)
-                elif any(word in command_lower for word in ["меньше", "уменьш", "убавь"]):
-                    return self.change_volume(-10)
-                elif any(word in command_lower for word in ["выключи", "отключи", "молчан"]):
-                    return self.mute_volume()
-                elif any(word in command_lower for word in ["включи", "включить"]):
-                    return self.unmute_volume()
-
-            elif any(word in command_lower for word in ["музыка", "плеер"]):
-                if any(word in command_lower for word in ["пауза", "останов", "стоп"]):
-                    return self.control_media("pause")
-                elif any(word in command_lower for word in ["играй", "воспроизведи", "включи"]):
-                    return self.control_media("play")
-                elif any(word in command_lower for word in ["следующ", "вперед"]):
-                    return self.control_media("next")
-                elif any(word in command_lower for word in ["предыдущ", "назад"]):
-                    return self.control_media("previous")
+            if action == "volume_up":
+                return self.change_volume(step)
+            elif action == "volume_down":
+                return self.change_volume(-step)
+            elif action == "mute":
+                return self.mute_volume()
+            elif action == "unmute":
+                return self.unmute_volume()
+            elif action in self._MEDIA_ORDER:
+                return self.control_media(action)
 
             return "❓ Команда управления аудио не распознана"
 
@@ -526,12 +579,13 @@ class SystemControlModule:
 "@
             """
 
-            # Simple approach using nircmd if available
+            # Simple approach using nircmd if available (шаг 10 -> 2000 единиц nircmd, как раньше)
+            units = max(-65535, min(65535, int(delta) * 200))
             if delta > 0:
-                os.system("nircmd changesysvolume 2000")
+                os.system(f"nircmd changesysvolume {units}")
                 return f"✅ Громкость увеличена"
             else:
-                os.system("nircmd changesysvolume -2000")
+                os.system(f"nircmd changesysvolume {units}")
                 return f"✅ Громкость уменьшена"
 
         except Exception as e:
@@ -593,12 +647,10 @@ class SystemControlModule:
         try:
             import platform
 
-            # Get system info
-            system = platform.system()
-            release = platform.release()
-            version = platform.version()
-            machine = platform.machine()
-            processor = platform.processor()
+            # Get system info (не меняется за время работы — считаем один раз, processor() бывает медленным)
+            if self._platform_info is None:
+                self._platform_info = (platform.system(), platform.release(), platform.machine(), platform.processor())
+            system, release, machine, processor = self._platform_info
 
             # Get memory info
             memory = psutil.virtual_memory()
@@ -612,8 +664,8 @@ class SystemControlModule:
             disk_used = round(disk.used / (1024**3), 1)  # GB
             disk_percent = round((disk.used / disk.total) * 100, 1)
 
-            # Get CPU info
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # Get CPU info: загрузка с прошлого вызова, без секундного замера (быстрый ответ без LLM)
+            cpu_percent = psutil.cpu_percent(interval=None)
             cpu_count = psutil.cpu_count()
 
             info = f"""💻 Информация о системе:
@@ -11,6 +11,8 @@ SAPI5 TTS Движок - встроенный синтез речи Windows (fal
 
 import os
 import sys
+import tempfile
+import threading
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -82,6 +84,8 @@ class SAPITTSEngine(TTSEngineBase):
                 self.volume = 100
         else:
             self.volume = 100
+        # Частота WAV, который SAPI пишет в файл (уточняется после первого синтеза)
+        self.sample_rate = int(config.get("tts.sapi.sample_rate", 22050) or 22050)
         
         # TTS settings
         self.text_buffer = ""
@@ -173,6 +177,10 @@ class SAPITTSEngine(TTSEngineBase):
             self.logger.error("SAPI5 engine not initialized")
             return
         
+        # Короткие фразы (ответы модулей, приветствия, ошибки) проигрываем из общего кеша
+        if self._speak_cached(text):
+            return
+
         try:
             self.is_speaking = True
             self.logger.debug(f"Speaking via SAPI: {text[:50]}...")
@@ -192,6 +200,96 @@ class SAPITTSEngine(TTSEngineBase):
             self.logger.error(f"SAPI speech error: {e}")
             self.is_speaking = False
 
+    def _speak_cached(self, text: str) -> bool:
+        """Проиграть фразу через общий кеш аудио (с рендером в WAV при промахе)
+
+        Returns:
+            True если фраза проиграна, False — нужно говорить напрямую через SAPI
+        """
+        cache = self._get_audio_cache()
+        if cache is None or not cache.is_cacheable(text):
+            return False
+        try:
+            import sounddevice  # noqa: F401
+        except Exception:
+            return False
+
+        audio = self.synthesize_audio(text)
+        if audio is None:
+            return False
+        self.logger.debug(f"Speaking via SAPI cache: {text[:50]}...")
+        return self._play_audio(audio)
+
+    def synthesize_audio(self, text: str, voice: Optional[str] = None) -> Optional[Any]:
+        """Синтезировать текст в float32-массив через WAV-файл SAPI
+
+        Args:
+            text: Text to synthesize
+            voice: Ignored for SAPI (uses configured system voice)
+
+        Returns:
+            numpy.ndarray or None
+        """
+        if not text or not text.strip():
+            return None
+        cached = self._cache_lookup(text)
+        if cached is not None:
+            return cached
+
+        try:
+            import numpy as np
+            import soundfile as sf
+        except Exception:
+            return None
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".wav", prefix="sapi_")
+        os.close(fd)
+        try:
+            if not self.synthesize(text, output_path=tmp_path):
+                return None
+            audio, rate = sf.read(tmp_path, dtype="float32")
+            if audio is None or len(audio) == 0:
+                return None
+            if audio.ndim > 1:
+                audio = audio.mean(axis=1)
+            audio = np.ascontiguousarray(audio, dtype=np.float32)
+            if int(rate) != self.sample_rate:
+                self.logger.debug(f"SAPI output sample rate is {rate} Hz (configured {self.sample_rate})")
+                self.sample_rate = int(rate)
+            self._cache_store(text, None, audio)
+            return audio
+        except Exception as e:
+            self.logger.warning(f"SAPI synthesis to array failed: {e}")
+            return None
+        finally:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _cache_voice_key(self, voice: Optional[str] = None) -> str:
+        """Скорость и громкость SAPI зашиты в WAV, поэтому входят в ключ кеша"""
+        return f"{self.voice or 'default'}|rate={self.rate}|volume={self.volume}"
+
+    def _play_audio(self, audio) -> bool:
+        """Проиграть float32-клип через sounddevice (блокирующе, как и прямой SAPI)"""
+        try:
+            import sounddevice as sd
+
+            self.is_speaking = True
+            sd.play(audio, samplerate=self.sample_rate)
+            sd.wait()
+            return True
+        except Exception as e:
+            self.logger.error(f"SAPI cached playback error: {e}")
+            return False
+        finally:
+            self.is_speaking = False
+
+    def _play_audio_async(self, audio):
+        """Play a ready clip in a background thread"""
+        threading.Thread(target=self._play_audio, args=(audio,), daemon=True).start()
+
     def speak_streaming(self, text_chunk: str, voice: Optional[str] = None):
         """Speak text chunk for streaming mode with buffering
         
@@ -298,6 +396,13 @@ class SAPITTSEngine(TTSEngineBase):
                 if hasattr(self.engine, 'stop'):
                     self.engine.stop()
                 # win32com - нет встроенного stop, но можем остановить
+            if self.is_speaking:
+                # Клип из кеша играет через sounddevice
+                try:
+                    import sounddevice as sd
+                    sd.stop()
+                except Exception:
+                    pass
                 
             self.is_speaking = False
             self.logger.debug("SAPI speech stopped")
@@ -512,6 +617,7 @@ class SAPITTSEngine(TTSEngineBase):
             "volume": self.volume,
             "voice": self.voice or "default",
             "available_voices": self.get_available_voices(),
+            "cache": self.get_cache_stats(),
         }
 
     def set_mode(self, mode: str):
@@ -0,0 +1,333 @@
+"""
+Content-addressed TTS audio cache
+Кеш синтезированного аудио с адресацией по содержимому и LRU-вытеснением
+
+Ключ клипа — хеш от (движок, голос, частота дискретизации, нормализованный текст).
+Кеш общий для всех TTS движков (Silero, Bark, SAPI, legacy TTSEngine):
+- горячий уровень в памяти: готовые float32 массивы, ограничение по байтам;
+- уровень на диске: .npy файлы + index.json, LRU-вытеснение по суммарному размеру.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from utils.logger import ModuleLogger
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Как часто сбрасывать index.json, если менялось только время доступа
+_INDEX_FLUSH_INTERVAL_SEC = 30.0
+
+
+def normalize_text(text: str) -> str:
+    """Нормализовать текст для ключа кеша (Unicode NFC, схлопывание пробелов)"""
+    normalized = unicodedata.normalize("NFC", str(text or ""))
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def make_cache_key(engine: str, voice: Any, sample_rate: int, text: str) -> str:
+    """Построить ключ клипа из параметров синтеза"""
+    payload = json.dumps(
+        [str(engine or ""), str(voice or ""), int(sample_rate or 0), normalize_text(text)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    """Двухуровневый LRU-кеш синтезированных клипов (память + диск)"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_disk_bytes: int,
+        max_memory_bytes: int,
+        max_text_chars: int = 300,
+        logger: Optional[ModuleLogger] = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.max_text_chars = max(1, int(max_text_chars))
+        self.logger = logger or ModuleLogger("TTSAudioCache")
+
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> {"file", "bytes", "sample_rate", "engine", "last_access", "text"}
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._disk_bytes = 0
+        self._index_dirty = False
+        self._last_index_flush = 0.0
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "errors": 0,
+        }
+
+        self._index_path = self.cache_dir / "index.json"
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Публичный API
+    # ------------------------------------------------------------------
+
+    def is_cacheable(self, text: str) -> bool:
+        """Кешируем только короткие фразы: длинные ответы LLM почти не повторяются"""
+        normalized = normalize_text(text)
+        return bool(normalized) and len(normalized) <= self.max_text_chars
+
+    def get(self, engine: str, voice: Any, sample_rate: int, text: str) -> Optional[np.ndarray]:
+        """Найти клип в кеше. Возвращает read-only float32 массив или None"""
+        if not self.is_cacheable(text):
+            return None
+        key = make_cache_key(engine, voice, sample_rate, text)
+
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._touch(key)
+                self._stats["memory_hits"] += 1
+                return audio
+
+            entry = self._index.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+        # Чтение с диска — вне блокировки, чтобы не тормозить другие потоки
+        path = self.cache_dir / entry["file"]
+        try:
+            audio = np.load(str(path), allow_pickle=False)
+            audio = np.ascontiguousarray(audio, dtype=np.float32)
+            audio.flags.writeable = False
+        except Exception as e:
+            self.logger.debug(f"TTS cache entry unreadable, dropping {key[:12]}: {e}")
+            with self._lock:
+                self._drop_disk_entry(key)
+                self._stats["misses"] += 1
+                self._stats["errors"] += 1
+            return None
+
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._touch(key)
+            self._remember(key, audio)
+        return audio
+
+    def put(self, engine: str, voice: Any, sample_rate: int, text: str, audio: Any) -> bool:
+        """Сохранить клип в оба уровня кеша"""
+        if audio is None or not self.is_cacheable(text):
+            return False
+        try:
+            clip = np.ascontiguousarray(np.asarray(audio, dtype=np.float32).reshape(-1))
+        except Exception:
+            return False
+        if clip.size == 0:
+            return False
+        clip.flags.writeable = False
+
+        key = make_cache_key(engine, voice, sample_rate, text)
+        filename = f"{key}.npy"
+
+        with self._lock:
+            self._remember(key, clip)
+            if key in self._index or self.max_disk_bytes <= 0 or clip.nbytes > self.max_disk_bytes:
+                self._stats["stores"] += 1
+                return True
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Пишем во временный файл и переименовываем, чтобы не оставить обрезанный клип
+            tmp_path = self.cache_dir / f"{filename}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, clip, allow_pickle=False)
+            os.replace(tmp_path, self.cache_dir / filename)
+            size = (self.cache_dir / filename).stat().st_size
+        except Exception as e:
+            self.logger.debug(f"Failed to write TTS cache entry: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return False
+
+        with self._lock:
+            self._index[key] = {
+                "file": filename,
+                "bytes": int(size),
+                "sample_rate": int(sample_rate or 0),
+                "engine": str(engine or ""),
+                "last_access": time.time(),
+                "text": normalize_text(text)[:80],
+            }
+            self._disk_bytes += int(size)
+            self._stats["stores"] += 1
+            self._evict_disk()
+            self._save_index()
+        return True
+
+    def clear(self) -> None:
+        """Полностью очистить кеш (память и диск)"""
+        with self._lock:
+            for key in list(self._index.keys()):
+                self._drop_disk_entry(key)
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._save_index()
+
+    def flush(self) -> None:
+        """Сохранить index.json, если есть несохранённые изменения"""
+        with self._lock:
+            if self._index_dirty:
+                self._save_index()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий/промахов/вытеснений и текущий объём"""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            stats: Dict[str, Any] = dict(self._stats)
+            stats.update(
+                {
+                    "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                    "memory_entries": len(self._memory),
+                    "memory_bytes": self._memory_bytes,
+                    "disk_entries": len(self._index),
+                    "disk_bytes": self._disk_bytes,
+                    "max_memory_bytes": self.max_memory_bytes,
+                    "max_disk_bytes": self.max_disk_bytes,
+                }
+            )
+            return stats
+
+    # ------------------------------------------------------------------
+    # Внутренняя кухня
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, audio: np.ndarray) -> None:
+        """Положить клип в горячий уровень (вызывается под блокировкой)"""
+        if self.max_memory_bytes <= 0 or audio.nbytes > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.nbytes
+        self._memory[key] = audio
+        self._memory_bytes += audio.nbytes
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self._stats["memory_evictions"] += 1
+
+    def _touch(self, key: str) -> None:
+        """Обновить время доступа для дискового LRU (вызывается под блокировкой)"""
+        entry = self._index.get(key)
+        if entry is None:
+            return
+        entry["last_access"] = time.time()
+        self._index_dirty = True
+        if time.time() - self._last_index_flush >= _INDEX_FLUSH_INTERVAL_SEC:
+            self._save_index()
+
+    def _evict_disk(self) -> None:
+        """Удалять самые давно использованные файлы, пока не уложимся в лимит"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1].get("last_access", 0.0)):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._drop_disk_entry(key)
+            self._stats["disk_evictions"] += 1
+
+    def _drop_disk_entry(self, key: str) -> None:
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self._disk_bytes -= int(entry.get("bytes", 0))
+        self._index_dirty = True
+        try:
+            (self.cache_dir / entry["file"]).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.debug(f"Failed to remove TTS cache file {entry.get('file')}: {e}")
+
+    def _load_index(self) -> None:
+        try:
+            if not self._index_path.exists():
+                return
+            data = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except Exception as e:
+            self.logger.warning(f"TTS cache index unreadable, starting empty: {e}")
+            return
+
+        entries = data.get("entries", {}) if isinstance(data, dict) else {}
+        for key, entry in entries.items():
+            if not isinstance(entry, dict) or not entry.get("file"):
+                continue
+            if not (self.cache_dir / entry["file"]).exists():
+                self._index_dirty = True
+                continue
+            self._index[key] = entry
+            self._disk_bytes += int(entry.get("bytes", 0))
+
+        # Лимит мог уменьшиться в настройках с прошлого запуска
+        self._evict_disk()
+        self.logger.info(
+            f"TTS audio cache loaded: {len(self._index)} clip(s), {self._disk_bytes / (1024 * 1024):.1f} MB"
+        )
+
+    def _save_index(self) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._index_path.with_suffix(".json.tmp")
+            tmp_path.write_text(
+                json.dumps({"version": 1, "entries": self._index}, ensure_ascii=False), encoding="utf-8"
+            )
+            os.replace(tmp_path, self._index_path)
+            self._index_dirty = False
+            self._last_index_flush = time.time()
+        except Exception as e:
+            self.logger.debug(f"Failed to save TTS cache index: {e}")
+
+
+_tts_audio_cache: Optional[TTSAudioCache] = None
+_tts_audio_cache_lock = threading.Lock()
+
+
+def get_tts_audio_cache(config=None) -> Optional[TTSAudioCache]:
+    """Общий кеш аудио для всех TTS движков. None, если кеш выключен (tts.cache.enabled)"""
+    global _tts_audio_cache
+    if _tts_audio_cache is not None:
+        return _tts_audio_cache
+    if config is None or not config.get("tts.cache.enabled", True):
+        return None
+
+    with _tts_audio_cache_lock:
+        if _tts_audio_cache is None:
+            cache_dir = config.get("tts.cache.dir", None)
+            if not cache_dir:
+                cache_dir = Path(str(config.get("paths.temp", "temp") or "temp")) / "tts_cache"
+            _tts_audio_cache = TTSAudioCache(
+                cache_dir=Path(str(cache_dir)),
+                max_disk_bytes=int(float(config.get("tts.cache.max_disk_mb", 256)) * 1024 * 1024),
+                max_memory_bytes=int(float(config.get("tts.cache.max_memory_mb", 32)) * 1024 * 1024),
+                max_text_chars=int(config.get("tts.cache.max_text_chars", 300)),
+            )
+            atexit.register(_tts_audio_cache.flush)
+    return _tts_audio_cache
@@ -5,9 +5,11 @@ Base class for TTS engines
 
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Callable, Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 from dataclasses import dataclass
 
+from modules.tts_audio_cache import get_tts_audio_cache
+
 
 class TTSStatus(Enum):
     """Статус TTS engine"""
@@ -107,6 +109,113 @@ class TTSEngineBase(ABC):
             details=self.get_status()
         )
 
+    def synthesize_audio(self, text: str, voice: Optional[str] = None) -> Optional[Any]:
+        """
+        Синтезировать текст в float32-массив без воспроизведения.
+
+        Используется конвейером потоковой озвучки (modules/tts_pipeline.py).
+        Движки, которые не умеют отдавать PCM, возвращают None.
+
+        Args:
+            text: Текст для синтеза
+            voice: Необязательный голос
+
+        Returns:
+            numpy.ndarray (float32, mono) или None
+        """
+        return None
+
+    def get_sample_rate(self) -> int:
+        """Частота дискретизации аудио, которое возвращает synthesize_audio()"""
+        rate = getattr(self, "sample_rate", None)
+        if rate is None and getattr(self, "config", None) is not None:
+            rate = self.config.get("tts.sample_rate", 48000)
+        return int(rate or 48000)
+
+    # ------------------------------------------------------------------
+    # Общий кеш синтезированного аудио (modules/tts_audio_cache.py)
+    # ------------------------------------------------------------------
+
+    def _get_audio_cache(self):
+        """Общий кеш аудио или None, если он выключен в настройках"""
+        cache = getattr(self, "_audio_cache", None)
+        if cache is None and getattr(self, "config", None) is not None:
+            cache = get_tts_audio_cache(self.config)
+            self._audio_cache = cache
+        return cache
+
+    def _cache_voice_key(self, voice: Optional[str] = None) -> str:
+        """Голос для ключа кеша. Движки, у которых звук зависит от других настроек, расширяют ключ"""
+        return str(voice or getattr(self, "voice", "") or "")
+
+    def _cache_lookup(self, text: str, voice: Optional[str] = None) -> Optional[Any]:
+        """Найти готовый клип для текста в общем кеше"""
+        cache = self._get_audio_cache()
+        if cache is None:
+            return None
+        return cache.get(
+            getattr(self, "engine_name", "base"), self._cache_voice_key(voice), self.get_sample_rate(), text
+        )
+
+    def _cache_store(self, text: str, voice: Optional[str], audio: Any) -> None:
+        """Сохранить синтезированный клип в общий кеш"""
+        cache = self._get_audio_cache()
+        if cache is None or audio is None:
+            return
+        cache.put(
+            getattr(self, "engine_name", "base"), self._cache_voice_key(voice), self.get_sample_rate(), text, audio
+        )
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Статистика общего кеша аудио (None, если кеш выключен)"""
+        cache = self._get_audio_cache()
+        return cache.get_stats() if cache is not None else None
+
+    def preload_phrases(self, phrases: List[str], limit: int = 1) -> Dict[str, List[Any]]:
+        """
+        Подготовить клипы для коротких фраз (подтверждение wake word и т.п.).
+
+        Клипы берутся из общего кеша, при промахе синтезируются через synthesize_audio()
+        и сохраняются в кеш, поэтому повторный вызов стоит одного обращения к памяти.
+
+        Args:
+            phrases: Фразы для подготовки
+            limit: Оставлен для совместимости; на фразу возвращается один клип
+
+        Returns:
+            Dict фраза -> список float32 клипов
+        """
+        results: Dict[str, List[Any]] = {}
+        for phrase in phrases or []:
+            if not phrase:
+                continue
+            try:
+                audio = self.synthesize_audio(phrase)
+            except Exception as e:
+                self.logger.error(f"Failed to pre-generate audio for '{phrase}': {e}")
+                continue
+            if audio is not None and getattr(audio, "size", 0) > 0:
+                results[phrase] = [audio]
+
+        if results:
+            self.logger.info(
+                "Phrase audio cache prepared: "
+                + ", ".join(f"'{text}' -> {len(clips)} clip(s)" for text, clips in results.items())
+            )
+        return results
+
+    def play_audio_array(self, audio: Any) -> bool:
+        """Воспроизвести уже синтезированный клип (движки с _play_audio_async)"""
+        play = getattr(self, "_play_audio_async", None)
+        if audio is None or play is None:
+            return False
+        try:
+            play(audio)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to play cached audio: {e}")
+            return False
+
     def set_mode(self, mode: str) -> None:
         """Set TTS mode (optional, override in subclasses)
         
@@ -2,11 +2,10 @@
 Text-to-Speech engine using Silero TTS
 """
 
-import hashlib
-import json
 import os
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
@@ -25,6 +24,8 @@ except BaseException as _e:  # ImportError or OSError (DLL load failure)
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from config.config import Config
+from modules.tts_audio_cache import get_tts_audio_cache
+from modules.tts_worker_client import TTSWorkerCancelled, get_tts_worker_client, is_persistent_worker_enabled
 from utils.logger import ModuleLogger
 
 
@@ -34,12 +35,16 @@ class TTSEngine:
     def __init__(self, config: Config):
         self.config = config
         self.logger = ModuleLogger("TTSEngine")
+        # Тот же ключ движка, что у SileroTTSEngine — клипы в общем кеше взаимозаменяемы
+        self.engine_name = "silero"
         self.model = None
         self.sample_rate = config.get("tts.sample_rate", 48000)
         self.voice = config.get("tts.voice", "aidar")
         self.device = config.get("tts.device", "cpu")
         self.is_ready_flag = False
         self._subprocess_available = False
+        self._worker_client = None  # Постоянный TTS-воркер (создаётся лениво)
+        self._audio_cache = get_tts_audio_cache(config)
         self.is_speaking = False
         self.current_audio = None
         self.tts_mode = config.get("tts.mode", "realtime")
@@ -155,6 +160,12 @@ class TTSEngine:
 
         def tts_task():
             try:
+                cached = self._cache_lookup(text, voice)
+                if cached is not None:
+                    self.logger.info(f"Using cached TTS audio for: {text[:50]}...")
+                    self._play_audio_async(cached)
+                    return True
+
                 self.logger.info(f"Starting TTS for: {text[:50]}...")
 
                 # Если прямая модель не загружена, используем subprocess
@@ -174,6 +185,7 @@ class TTSEngine:
                 if audio is not None:
                     if _torch is not None and hasattr(_torch, "is_tensor") and _torch.is_tensor(audio):
                         audio = audio.cpu().numpy()
+                    self._cache_store(text, voice, audio)
 
                     # Запускаем воспроизведение в отдельном потоке
                     self._play_audio_async(audio)
@@ -192,6 +204,60 @@ class TTSEngine:
         unique_task_name = f"tts_speak_{int(time.time() * 1000)}"
         task_manager.run_async(unique_task_name, tts_task)
 
+    def synthesize_audio(self, text: str, voice: Optional[str] = None) -> Optional[np.ndarray]:
+        """Synthesize text to a float32 array without playing it (used by the streaming pipeline)"""
+        if not text or not text.strip():
+            return None
+        cached = self._cache_lookup(text, voice)
+        if cached is not None:
+            return cached
+
+        speaker = self._map_voice(str(voice or self.voice))
+        if self.model is not None:
+            try:
+                model_any: Any = self.model
+                audio = model_any.apply_tts(text=text, speaker=speaker, sample_rate=self.sample_rate)
+                if _torch is not None and hasattr(_torch, "is_tensor") and _torch.is_tensor(audio):
+                    audio = audio.cpu().numpy()
+                if audio is not None:
+                    audio = np.asarray(audio, dtype=np.float32)
+                    self._cache_store(text, voice, audio)
+                    return audio
+            except Exception as e:
+                self.logger.warning(f"Direct synthesis failed, trying persistent worker: {e}")
+
+        if is_persistent_worker_enabled(self.config):
+            if self._worker_client is None:
+                self._worker_client = get_tts_worker_client(self.config)
+            try:
+                audio = self._worker_client.synthesize(text, voice=speaker, sample_rate=self.sample_rate)
+            except TTSWorkerCancelled:
+                return None
+            if audio is not None and audio.size > 0:
+                self._cache_store(text, voice, audio)
+            return audio
+        return None
+
+    def get_sample_rate(self) -> int:
+        """Sample rate of audio returned by synthesize_audio()"""
+        return int(self.sample_rate)
+
+    def _cache_lookup(self, text: str, voice: Optional[str] = None) -> Optional[np.ndarray]:
+        """Look up a ready clip in the shared TTS audio cache"""
+        if self._audio_cache is None:
+            return None
+        return self._audio_cache.get(
+            self.engine_name, self._map_voice(str(voice or self.voice)), self.sample_rate, text
+        )
+
+    def _cache_store(self, text: str, voice: Optional[str], audio: Any) -> None:
+        """Store a synthesized clip in the shared TTS audio cache"""
+        if self._audio_cache is None or audio is None:
+            return
+        self._audio_cache.put(
+            self.engine_name, self._map_voice(str(voice or self.voice)), self.sample_rate, text, audio
+        )
+
     def speak_streaming(self, text_chunk: str, voice: Optional[str] = None):
         """Speak text chunk for streaming mode (realtime) with buffering to avoid word cutoffs"""
         if not self.tts_enabled or self.tts_mode != "realtime":
@@ -324,6 +390,9 @@ class TTSEngine:
     def stop(self):
         """Stop current TTS playback"""
         try:
+            # Отменяем незавершённый синтез в постоянном воркере
+            if self._worker_client is not None:
+                self._worker_client.cancel_all()
             if self.is_speaking:
                 sd.stop()
                 self.is_speaking = False
@@ -378,78 +447,30 @@ class TTSEngine:
             return self._speak_via_subprocess(text, voice, output_filename=filename)
 
     def preload_phrases(self, phrases: List[str], limit: int = 1) -> Dict[str, List[np.ndarray]]:
-        """Pre-generate audio clips for short acknowledgement phrases and persist them."""
-        results: Dict[str, List[np.ndarray]] = {}
-
-        if not phrases:
-            return results
-
-        try:
-            temp_value = self.config.get("paths.temp", "temp")
-            base_temp = Path(str(temp_value or "temp"))
-        except Exception:
-            base_temp = Path("temp")
+        """Prepare audio clips for short acknowledgement phrases via the shared TTS audio cache.
 
-        cache_dir = base_temp / "wake_ack"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        manifest_path = cache_dir / "manifest.json"
-        manifest: Dict[str, List[str]] = {}
-        try:
-            if manifest_path.exists():
-                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
-        except Exception as manifest_error:
-            self.logger.debug(f"Failed to read wake ack manifest: {manifest_error}")
-            manifest = {}
+        A phrase is synthesized once and then served from the cache (memory first, then disk),
+        so refills after each wake word cost a dictionary lookup. One clip per phrase is returned;
+        ``limit`` is kept for API compatibility.
+        """
+        results: Dict[str, List[np.ndarray]] = {}
 
-        for phrase in phrases:
+        for phrase in phrases or []:
             if not phrase:
                 continue
-
-            bucket: List[np.ndarray] = []
-            slug = hashlib.sha1(phrase.encode("utf-8")).hexdigest()
-            stored_files = manifest.get(phrase, [])
-
-            # Ensure we have up to 'limit' cached files per phrase
-            while len(stored_files) < max(1, limit):
-                index = len(stored_files)
-                filename = f"ack_{slug}_{index}.wav"
-                target_path = cache_dir / filename
-
-                success = self.save_to_file(phrase, str(target_path))
-                if not success:
-                    self.logger.error(f"Failed to pre-generate wake acknowledgement for '{phrase}'")
-                    break
-
-                stored_files.append(filename)
-                manifest[phrase] = stored_files
-                try:
-                    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
-                except Exception as write_error:
-                    self.logger.debug(f"Failed to update wake ack manifest: {write_error}")
-                    # Не критично — продолжаем работу
-
-            for filename in stored_files[: max(1, limit)]:
-                wav_path = cache_dir / filename
-                if not wav_path.exists():
-                    self.logger.debug(f"Wake acknowledgement file missing, regenerating: {wav_path}")
-                    if self.save_to_file(phrase, str(wav_path)) is False:
-                        continue
-                try:
-                    audio, rate = sf.read(str(wav_path), dtype="float32")
-                    if rate != self.sample_rate:
-                        self.logger.debug(
-                            f"Wake acknowledgement sample rate mismatch ({rate} != {self.sample_rate}), resaving"
-                        )
-                        # Перезаписываем файл с правильной частотой
-                        sf.write(str(wav_path), audio, self.sample_rate)
-                        audio, _ = sf.read(str(wav_path), dtype="float32")
-                    bucket.append(np.asarray(audio, dtype=np.float32))
-                except Exception as read_error:
-                    self.logger.error(f"Failed to load wake acknowledgement clip '{wav_path}': {read_error}")
-
-            if bucket:
-                results[phrase] = bucket
+            try:
+                audio = self.synthesize_audio(phrase)
+                if (audio is None or audio.size == 0) and self.model is None:
+                    if not is_persistent_worker_enabled(self.config):
+                        # Ни модели в процессе, ни постоянного воркера — разовый сабпроцесс через WAV
+                        audio = self._synthesize_via_file(phrase)
+            except Exception as synth_error:
+                self.logger.error(f"Failed to pre-generate wake acknowledgement for '{phrase}': {synth_error}")
+                continue
+            if audio is None or audio.size == 0:
+                self.logger.error(f"Failed to pre-generate wake acknowledgement for '{phrase}'")
+                continue
+            results[phrase] = [audio]
 
         if results:
             self.logger.info(
@@ -459,8 +480,63 @@ class TTSEngine:
 
         return results
 
+    def _synthesize_via_file(self, text: str, voice: Optional[str] = None) -> Optional[np.ndarray]:
+        """Synthesize through save_to_file() (one-shot subprocess) and read the WAV back into the cache."""
+        try:
+            temp_value = self.config.get("paths.temp", "temp")
+            base_temp = Path(str(temp_value or "temp"))
+        except Exception:
+            base_temp = Path("temp")
+        base_temp.mkdir(parents=True, exist_ok=True)
+        fd, wav_name = tempfile.mkstemp(prefix="tts_", suffix=".wav", dir=str(base_temp))
+        os.close(fd)
+        try:
+            if not self.save_to_file(text, wav_name, voice):
+                return None
+            # Сабпроцесс пишет WAV с --sample-rate self.sample_rate
+            audio, _ = sf.read(wav_name, dtype="float32")
+        finally:
+            try:
+                os.remove(wav_name)
+            except OSError:
+                pass
+        audio = np.asarray(audio, dtype=np.float32)
+        self._cache_store(text, voice, audio)
+        return audio
+
+    def _speak_via_worker(
+        self, text: str, voice: Optional[str] = None, output_filename: Optional[str] = None
+    ) -> bool:
+        """Synthesize through the persistent worker process (model stays resident between phrases)."""
+        if self._worker_client is None:
+            self._worker_client = get_tts_worker_client(self.config)
+        # Тот же маппинг, что и в synthesize_audio: воркер получает реальный id спикера
+        speaker = self._map_voice(str(voice or self.voice))
+        if output_filename:
+            return self._worker_client.synthesize_to_file(
+                text, output_filename, voice=speaker, sample_rate=self.sample_rate
+            )
+        audio = self._worker_client.synthesize(text, voice=speaker, sample_rate=self.sample_rate)
+        if audio is None or audio.size == 0:
+            return False
+        self._cache_store(text, voice, audio)
+        self._play_audio_async(audio)
+        return True
+
     def _speak_via_subprocess(self, text: str, voice: Optional[str] = None, output_filename: Optional[str] = None):
         """Use a dedicated subprocess worker to synthesize speech, avoiding import conflicts."""
+        if is_persistent_worker_enabled(self.config):
+            try:
+                if self._speak_via_worker(text, voice, output_filename):
+                    return True
+            except TTSWorkerCancelled:
+                # Фразу остановили (stop) — запасной синтез озвучил бы её всё равно
+                self.logger.info("TTS request cancelled, skipping subprocess fallback")
+                return False
+            except Exception as worker_error:
+                self.logger.debug(f"Persistent TTS worker error: {worker_error}")
+            self.logger.warning("Persistent TTS worker unavailable, falling back to one-shot subprocess")
+
         try:
             worker_path = Path(__file__).parent / "tts_worker_subprocess.py"
             if not worker_path.exists():
@@ -599,6 +675,8 @@ class TTSEngine:
             "sample_rate": self.sample_rate,
             "device": self.device,
             "available_voices": self.get_available_voices(),
+            "worker": self._worker_client.get_status() if self._worker_client is not None else None,
+            "cache": self._audio_cache.get_stats() if self._audio_cache is not None else None,
         }
 
 
@@ -0,0 +1,434 @@
+"""
+Sentence-pipelined streaming TTS
+Конвейер потоковой озвучки: сегментация предложений из стрима LLM →
+ограниченная очередь синтеза → очередь воспроизведения без пауз.
+
+Пока играет предложение N, предложение N+1 уже синтезируется. Порядок строгий:
+один поток синтеза и один поток воспроизведения, аудио пишется в один
+открытый OutputStream, поэтому соседние фразы звучат без щелчков и разрывов.
+"""
+
+import queue
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import ModuleLogger
+from utils.tracing import get_tracer
+
+# Конец предложения: знак препинания (или многоточие) + пробел/перевод строки, либо пустая строка
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…;])[\"'»)\]]*\s+|\n{2,}|\n(?=\s*[-*•\d])")
+
+
+class _Sentence:
+    __slots__ = ("generation", "index", "text", "final", "queued_at")
+
+    def __init__(self, generation: int, index: int, text: Optional[str], final: bool = False):
+        self.generation = generation
+        self.index = index
+        self.text = text
+        self.final = final
+        self.queued_at = time.perf_counter()
+
+
+class _Clip:
+    __slots__ = ("generation", "index", "audio", "sample_rate", "final")
+
+    def __init__(self, generation: int, index: int, audio: Optional[np.ndarray], sample_rate: int, final: bool = False):
+        self.generation = generation
+        self.index = index
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.final = final
+
+
+def split_sentences(buffer: str, max_chars: int) -> tuple:
+    """Отделить готовые предложения от хвоста буфера.
+
+    Returns:
+        (список завершённых предложений, незавершённый остаток)
+    """
+    sentences: List[str] = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(buffer):
+        piece = buffer[start : match.end()].strip()
+        start = match.end()
+        if piece:
+            sentences.append(piece)
+    rest = buffer[start:]
+
+    # Слишком длинный хвост без знаков препинания режем по последнему пробелу
+    while len(rest) > max_chars:
+        cut = rest.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        piece = rest[:cut].strip()
+        rest = rest[cut:].lstrip()
+        if piece:
+            sentences.append(piece)
+    return sentences, rest
+
+
+def merge_short_sentences(sentences: List[str], min_chars: int) -> tuple:
+    """Приклеить слишком короткие предложения («Да.») к следующим.
+
+    Returns:
+        (предложения для синтеза, короткий хвост, ждущий следующего предложения, или "")
+    """
+    merged: List[str] = []
+    carry = ""
+    for sentence in sentences:
+        text = f"{carry} {sentence}" if carry else sentence
+        if len(text) < min_chars:
+            carry = text
+            continue
+        merged.append(text)
+        carry = ""
+    return merged, carry
+
+
+class StreamingTTSPipeline:
+    """Трёхстадийный конвейер озвучки стрима LLM.
+
+    Движок должен предоставлять synthesize_audio(text, voice) -> float32 ndarray
+    и get_sample_rate(). Вызовы feed()/finish()/stop() неблокирующие и безопасны
+    из UI-потока.
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        config,
+        on_metrics: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.engine = engine
+        self.config = config
+        self.logger = ModuleLogger("TTSPipeline")
+        self.on_metrics = on_metrics
+
+        self.max_pending_sentences = max(1, int(config.get("tts.pipeline.max_pending_sentences", 4) or 4))
+        self.max_ready_clips = max(1, int(config.get("tts.pipeline.max_ready_clips", 2) or 2))
+        self.min_sentence_chars = max(1, int(config.get("tts.pipeline.min_sentence_chars", 8) or 8))
+        self.max_sentence_chars = max(40, int(config.get("tts.pipeline.max_sentence_chars", 220) or 220))
+        self.block_frames = 2048
+
+        self._cond = threading.Condition()
+        self._sentences: Deque[_Sentence] = deque()
+        self._clips: "queue.Queue[Optional[_Clip]]" = queue.Queue(maxsize=self.max_ready_clips)
+        self._text_buffer = ""
+        # Короткое завершённое предложение, которое озвучится вместе со следующим
+        self._held_sentence = ""
+        self._generation = 0
+        self._index = 0
+        self._playing = False
+        self._synthesizing = False
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+
+        # Метрики текущей реплики
+        self._utterance_started: Optional[float] = None
+        self._first_audio_at: Optional[float] = None
+        self._first_synth_ms: Optional[float] = None
+        self._synth_seconds = 0.0
+        self._audio_seconds = 0.0
+        self._sentence_count = 0
+        # Ход трассировки, к которому относится реплика (спаны синтеза и воспроизведения)
+        self._trace_parent = None
+        self.tracer = get_tracer()
+        self.last_metrics: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------ public API
+
+    def feed(self, text_chunk: str) -> None:
+        """Добавить очередной фрагмент текста из стрима LLM."""
+        if not text_chunk or self._closed:
+            return
+        self._ensure_threads()
+        with self._cond:
+            if self._utterance_started is None:
+                self._utterance_started = time.perf_counter()
+                self._trace_parent = self.tracer.current_turn() or None
+            self._text_buffer += text_chunk
+            ready, self._text_buffer = split_sentences(self._text_buffer, self.max_sentence_chars)
+            # Очень короткие фразы («Да.») не синтезируем отдельно, а приклеиваем к следующей
+            if self._held_sentence:
+                ready.insert(0, self._held_sentence)
+            ready, self._held_sentence = merge_short_sentences(ready, self.min_sentence_chars)
+            for sentence in ready:
+                self._enqueue_locked(sentence)
+
+    def finish(self) -> None:
+        """Стрим LLM завершён: озвучить остаток буфера и закрыть реплику."""
+        if self._closed:
+            return
+        self._ensure_threads()
+        with self._cond:
+            tail = f"{self._held_sentence} {self._text_buffer}".strip()
+            self._text_buffer = ""
+            self._held_sentence = ""
+            if tail:
+                self._enqueue_locked(tail)
+            if self._utterance_started is None and not self._sentences and not self._playing:
+                return
+            self._sentences.append(_Sentence(self._generation, self._index, None, final=True))
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        """Прервать текущую реплику: очистить очереди и остановить звук."""
+        with self._cond:
+            self._generation += 1
+            self._sentences.clear()
+            self._text_buffer = ""
+            self._held_sentence = ""
+            self._reset_metrics_locked()
+            self._cond.notify_all()
+        self._drain_clips()
+        # Отменяем синтез, уже отправленный движку (постоянный воркер и т.п.)
+        client = getattr(self.engine, "_worker_client", None)
+        if client is not None:
+            try:
+                client.cancel_all()
+            except Exception:
+                pass
+
+    def shutdown(self) -> None:
+        """Остановить конвейер и его потоки."""
+        self.stop()
+        self._closed = True
+        with self._cond:
+            self._cond.notify_all()
+        try:
+            self._clips.put_nowait(None)
+        except queue.Full:
+            self._drain_clips()
+            self._clips.put_nowait(None)
+
+    def is_active(self) -> bool:
+        """Есть незавершённая озвучка (в очереди, в синтезе или в воспроизведении)."""
+        with self._cond:
+            return bool(self._sentences) or self._synthesizing or self._playing or not self._clips.empty()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._sentences)
+        return {
+            "active": self.is_active(),
+            "pending_sentences": pending,
+            "ready_clips": self._clips.qsize(),
+            "last_metrics": dict(self.last_metrics),
+        }
+
+    # ------------------------------------------------------------------ internals
+
+    def _enqueue_locked(self, text: str) -> None:
+        # Ограниченная очередь синтеза: вместо блокировки UI-потока склеиваем
+        # новое предложение с последним ожидающим — порядок и текст сохраняются
+        if len(self._sentences) >= self.max_pending_sentences and self._sentences:
+            last = self._sentences[-1]
+            if not last.final and last.generation == self._generation:
+                last.text = f"{last.text} {text}"
+                return
+        self._sentences.append(_Sentence(self._generation, self._index, text))
+        self._index += 1
+        self._cond.notify_all()
+
+    def _reset_metrics_locked(self) -> None:
+        self._utterance_started = None
+        self._first_audio_at = None
+        self._first_synth_ms = None
+        self._synth_seconds = 0.0
+        self._audio_seconds = 0.0
+        self._sentence_count = 0
+        self._trace_parent = None
+
+    def _drain_clips(self) -> None:
+        try:
+            while True:
+                self._clips.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _ensure_threads(self) -> None:
+        if self._threads:
+            return
+        for target, name in ((self._synth_loop, "tts-pipeline-synth"), (self._playback_loop, "tts-pipeline-play")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _synth_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._sentences and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                item = self._sentences.popleft()
+                if item.generation != self._generation:
+                    continue
+                self._synthesizing = not item.final
+                trace_parent = self._trace_parent
+
+            sample_rate = self._engine_sample_rate()
+            if item.final:
+                self._put_clip(_Clip(item.generation, item.index, None, sample_rate, final=True))
+                continue
+
+            started = time.perf_counter()
+            audio: Optional[np.ndarray] = None
+            with self.tracer.span("tts.synthesize", parent=trace_parent, sentence=item.index, chars=len(item.text)):
+                try:
+                    audio = self.engine.synthesize_audio(item.text)
+                except Exception as e:
+                    self.logger.error(f"Sentence synthesis failed: {e}")
+            elapsed = time.perf_counter() - started
+
+            with self._cond:
+                self._synthesizing = False
+                if item.generation != self._generation:
+                    continue
+                self._synth_seconds += elapsed
+                if self._first_synth_ms is None:
+                    self._first_synth_ms = elapsed * 1000.0
+
+            if audio is None or np.asarray(audio).size == 0:
+                self.logger.warning(f"No audio for sentence #{item.index}, skipping")
+                continue
+            audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+            # Частота могла уточниться при синтезе (SAPI узнаёт её из WAV)
+            sample_rate = self._engine_sample_rate()
+            self._put_clip(_Clip(item.generation, item.index, audio, sample_rate))
+
+    def _put_clip(self, clip: _Clip) -> None:
+        # Блокирующая вставка = backpressure: синтез не уходит дальше чем на max_ready_clips вперёд
+        while not self._closed:
+            if clip.generation != self._generation:
+                return
+            try:
+                self._clips.put(clip, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _engine_sample_rate(self) -> int:
+        try:
+            getter = getattr(self.engine, "get_sample_rate", None)
+            if callable(getter):
+                return int(getter())
+            return int(getattr(self.engine, "sample_rate", 48000))
+        except Exception:
+            return 48000
+
+    def _playback_loop(self) -> None:
+        import sounddevice as sd
+
+        stream = None
+        stream_rate = None
+        while True:
+            clip = self._clips.get()
+            if clip is None:
+                break
+            if clip.generation != self._generation:
+                continue
+
+            if clip.final:
+                if stream is not None:
+                    self._close_stream(stream, drain=True)
+                    stream = None
+                self._playing = False
+                self._report_metrics(clip.generation)
+                continue
+
+            try:
+                if stream is None or stream_rate != clip.sample_rate:
+                    if stream is not None:
+                        self._close_stream(stream, drain=True)
+                    stream = sd.OutputStream(samplerate=clip.sample_rate, channels=1, dtype="float32")
+                    stream.start()
+                    stream_rate = clip.sample_rate
+                self._playing = True
+                with self._cond:
+                    if self._first_audio_at is None and clip.generation == self._generation:
+                        self._first_audio_at = time.perf_counter()
+                        self._log_first_audio_locked()
+                        if self._trace_parent is not None:
+                            self.tracer.mark("tts.playback_start", parent=self._trace_parent, sentence=clip.index)
+                    self._sentence_count += 1
+                    self._audio_seconds += clip.audio.shape[0] / float(clip.sample_rate)
+
+                audio = clip.audio
+                for offset in range(0, audio.shape[0], self.block_frames):
+                    # Проверка между блоками: stop() срабатывает за ~40 мс
+                    if clip.generation != self._generation or self._closed:
+                        break
+                    stream.write(audio[offset : offset + self.block_frames].reshape(-1, 1))
+
+                if clip.generation != self._generation and stream is not None:
+                    self._close_stream(stream, drain=False)
+                    stream = None
+                    self._playing = False
+            except Exception as e:
+                self.logger.error(f"Pipeline playback failed: {e}")
+                if stream is not None:
+                    self._close_stream(stream, drain=False)
+                    stream = None
+                self._playing = False
+
+        if stream is not None:
+            self._close_stream(stream, drain=False)
+        self._playing = False
+
+    def _close_stream(self, stream, drain: bool) -> None:
+        try:
+            if drain:
+                stream.stop()
+            else:
+                stream.abort()
+            stream.close()
+        except Exception:
+            pass
+
+    def _log_first_audio_locked(self) -> None:
+        if self._utterance_started is None:
+            return
+        ttfa_ms = (self._first_audio_at - self._utterance_started) * 1000.0
+        self.logger.info(
+            f"Time to first audio: {ttfa_ms:.0f} ms (first sentence synth {self._first_synth_ms or 0:.0f} ms)"
+        )
+        try:
+            from utils.performance_monitor import performance_monitor
+
+            performance_monitor.record_operation_time("tts_time_to_first_audio", ttfa_ms / 1000.0)
+        except Exception:
+            pass
+
+    def _report_metrics(self, generation: int) -> None:
+        with self._cond:
+            if generation != self._generation or self._utterance_started is None:
+                return
+            metrics: Dict[str, Any] = {
+                "sentences": self._sentence_count,
+                "audio_seconds": round(self._audio_seconds, 3),
+                "synth_seconds": round(self._synth_seconds, 3),
+                "first_synth_ms": round(self._first_synth_ms or 0.0, 1),
+                "time_to_first_audio_ms": (
+                    round((self._first_audio_at - self._utterance_started) * 1000.0, 1)
+                    if self._first_audio_at is not None
+                    else None
+                ),
+                "total_ms": round((time.perf_counter() - self._utterance_started) * 1000.0, 1),
+            }
+            if self._trace_parent is not None:
+                metrics["trace_id"] = self._trace_parent.trace_id
+            self.last_metrics = metrics
+            self._reset_metrics_locked()
+        self.logger.debug(f"Utterance finished: {metrics}")
+        if self.on_metrics:
+            try:
+                self.on_metrics(metrics)
+            except Exception as e:
+                self.logger.debug(f"on_metrics callback failed: {e}")
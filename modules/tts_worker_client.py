@@ -0,0 +1,490 @@
+"""
+Persistent TTS worker client
+Клиент постоянного TTS-воркера: модель Silero загружается один раз в отдельном
+процессе (tts_worker_subprocess.py --serve), а синтез идёт потоком запросов.
+
+Протокол описан в tts_worker_subprocess.serve(): JSON-запрос на строку в stdin,
+в ответ — JSON-заголовок на строку и float32 PCM указанной длины в stdout.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import ModuleLogger
+
+
+class TTSWorkerError(RuntimeError):
+    """Ошибка постоянного TTS-воркера (не запущен, упал, таймаут)."""
+
+
+class TTSWorkerCancelled(TTSWorkerError):
+    """Запрос отменён (stop/cancel_all) — это не сбой, запасной путь синтеза не нужен."""
+
+
+class _PendingRequest:
+    """Ожидающий ответа запрос к воркеру."""
+
+    __slots__ = ("request_id", "event", "header", "audio", "error", "cancelled", "created")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.event = threading.Event()
+        self.header: Dict[str, Any] = {}
+        self.audio: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.created = time.perf_counter()
+
+
+class TTSWorkerClient:
+    """Управляет долгоживущим процессом TTS-воркера.
+
+    - ленивый старт при первом запросе и ожидание загрузки модели;
+    - автоперезапуск после падения (не более max_restarts запусков за restart_window_sec);
+    - health ping (отвечается воркером даже во время синтеза) и перезапуск воркера,
+      который дольше stuck_timeout_sec занят одним запросом (зависший инференс);
+    - отмена отдельных запросов или всех сразу.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = ModuleLogger("TTSWorkerClient")
+        self.worker_path = Path(__file__).parent / "tts_worker_subprocess.py"
+
+        self.voice = str(config.get("tts.voice", "aidar") or "aidar")
+        self.sample_rate = int(config.get("tts.sample_rate", 48000) or 48000)
+        self.device = str(config.get("tts.device", "cpu") or "cpu")
+        self.startup_timeout = self._cfg_float("tts.worker.startup_timeout_sec", 180.0)
+        self.request_timeout = self._cfg_float(
+            "tts.worker.request_timeout_sec", self._cfg_float("tts.subprocess_timeout_sec", 45.0)
+        )
+        self.ping_interval = self._cfg_float("tts.worker.ping_interval_sec", 15.0)
+        self.stuck_timeout = self._cfg_float("tts.worker.stuck_timeout_sec", max(60.0, self.request_timeout * 2))
+        self.max_restarts = int(self._cfg_float("tts.worker.max_restarts", 3))
+        self.restart_window = self._cfg_float("tts.worker.restart_window_sec", 300.0)
+
+        self._proc: Optional[subprocess.Popen] = None
+        self._write_lock = threading.Lock()
+        self._state_lock = threading.RLock()
+        self._pending: Dict[str, _PendingRequest] = {}
+        self._ids = itertools.count(1)
+        self._ready = threading.Event()
+        self._ready_error: Optional[str] = None
+        self._restart_times: List[float] = []
+        self._watchdog: Optional[threading.Thread] = None
+        self._closed = False
+
+        # Статистика
+        self.started_count = 0
+        self.requests_served = 0
+        self.requests_failed = 0
+        self.requests_cancelled = 0
+        self.last_latency_ms = 0.0
+        self.last_infer_ms = 0.0
+
+    def _cfg_float(self, key: str, default: float) -> float:
+        try:
+            value = self.config.get(key, default)
+            return float(value) if value is not None else default
+        except Exception:
+            return default
+
+    # ------------------------------------------------------------------ lifecycle
+
+    def is_running(self) -> bool:
+        """Процесс воркера жив и модель загружена."""
+        proc = self._proc
+        return proc is not None and proc.poll() is None and self._ready.is_set() and not self._ready_error
+
+    def start(self) -> bool:
+        """Запустить воркер (если ещё не запущен) и дождаться загрузки модели."""
+        with self._state_lock:
+            if self._closed:
+                return False
+            if self.is_running():
+                return True
+            if self._proc is not None and self._proc.poll() is None and not self._ready_error:
+                # Уже стартует — ждём ниже
+                proc = self._proc
+            else:
+                if not self._can_restart():
+                    self.logger.error("TTS worker restart limit reached; persistent mode disabled for now")
+                    return False
+                proc = self._spawn()
+                if proc is None:
+                    return False
+
+        if not self._ready.wait(self.startup_timeout):
+            self.logger.error(f"TTS worker did not become ready within {self.startup_timeout:.0f}s")
+            self._kill(proc)
+            return False
+        if self._ready_error:
+            self.logger.error(f"TTS worker failed to start: {self._ready_error}")
+            return False
+        return proc.poll() is None
+
+    def _can_restart(self) -> bool:
+        now = time.monotonic()
+        self._restart_times = [t for t in self._restart_times if now - t < self.restart_window]
+        return len(self._restart_times) < self.max_restarts
+
+    def _spawn(self) -> Optional[subprocess.Popen]:
+        if not self.worker_path.exists():
+            self.logger.error(f"Subprocess worker not found: {self.worker_path}")
+            return None
+
+        args = [
+            sys.executable,
+            str(self.worker_path),
+            "--serve",
+            "--voice",
+            self.voice,
+            "--sample-rate",
+            str(self.sample_rate),
+            "--device",
+            self.device,
+        ]
+        try:
+            proc = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to spawn TTS worker: {e}")
+            return None
+
+        self._proc = proc
+        self._ready.clear()
+        self._ready_error = None
+        self._restart_times.append(time.monotonic())
+        self.started_count += 1
+        self.logger.info(f"Persistent TTS worker spawned (pid {proc.pid}), loading model...")
+
+        threading.Thread(target=self._read_loop, args=(proc,), name="tts-worker-stdout", daemon=True).start()
+        threading.Thread(target=self._drain_stderr, args=(proc,), name="tts-worker-stderr", daemon=True).start()
+        if self.ping_interval > 0 and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._watchdog = threading.Thread(target=self._watchdog_loop, name="tts-worker-watchdog", daemon=True)
+            self._watchdog.start()
+        return proc
+
+    def _kill(self, proc: Optional[subprocess.Popen]) -> None:
+        if proc is None:
+            return
+        try:
+            if proc.poll() is None:
+                proc.kill()
+        except Exception:
+            pass
+
+    def shutdown(self, timeout: float = 3.0) -> None:
+        """Остановить воркер: мягко через shutdown, затем kill."""
+        with self._state_lock:
+            self._closed = True
+            proc = self._proc
+        if proc is None:
+            return
+        try:
+            self._send({"op": "shutdown"})
+            proc.wait(timeout=timeout)
+        except Exception:
+            self._kill(proc)
+        self._fail_pending("worker shut down")
+
+    # ------------------------------------------------------------------ I/O threads
+
+    def _read_exact(self, stream, size: int) -> bytes:
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = stream.read(remaining)
+            if not chunk:
+                raise EOFError("worker stdout closed")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _read_loop(self, proc: subprocess.Popen) -> None:
+        stream = proc.stdout
+        try:
+            while True:
+                line = stream.readline()
+                if not line:
+                    break
+                try:
+                    header = json.loads(line.decode("utf-8"))
+                except Exception:
+                    self.logger.debug(f"TTS worker: unparsable header {line[:80]!r}")
+                    continue
+                size = int(header.get("bytes") or 0)
+                payload = self._read_exact(stream, size) if size else b""
+
+                if header.get("op") == "ready":
+                    if not header.get("ok"):
+                        self._ready_error = str(header.get("error") or "unknown error")
+                    else:
+                        self.logger.info("Persistent TTS worker ready (model resident)")
+                    self._ready.set()
+                    continue
+
+                req_id = str(header.get("id"))
+                with self._state_lock:
+                    pending = self._pending.pop(req_id, None)
+                if pending is None:
+                    continue
+                pending.header = header
+                if header.get("ok"):
+                    if payload:
+                        pending.audio = np.frombuffer(payload, dtype="<f4").astype(np.float32, copy=False)
+                elif header.get("cancelled"):
+                    pending.cancelled = True
+                else:
+                    pending.error = str(header.get("error") or "unknown worker error")
+                pending.event.set()
+        except Exception as e:
+            self.logger.debug(f"TTS worker reader stopped: {e}")
+        finally:
+            code = proc.poll()
+            if not self._closed:
+                self.logger.warning(f"Persistent TTS worker exited (code {code}); will restart on next request")
+            if not self._ready.is_set():
+                self._ready_error = self._ready_error or f"worker exited with code {code}"
+                self._ready.set()
+            if self._proc is proc:
+                self._fail_pending("worker exited")
+
+    def _drain_stderr(self, proc: subprocess.Popen) -> None:
+        # Обязательно вычитываем stderr, иначе воркер заблокируется на переполненном пайпе
+        try:
+            for raw in proc.stderr:
+                text = raw.decode("utf-8", errors="replace").rstrip()
+                if text:
+                    self.logger.debug(text)
+        except Exception:
+            pass
+
+    def _watchdog_loop(self) -> None:
+        while not self._closed:
+            time.sleep(self.ping_interval)
+            proc = self._proc
+            if proc is None or proc.poll() is not None or not self._ready.is_set():
+                continue
+            pong = self._ping(timeout=min(5.0, self.ping_interval))
+            if self._closed:
+                break
+            if pong is None:
+                self.logger.warning("TTS worker did not answer health ping, restarting it")
+                self._kill(proc)
+            elif self.stuck_timeout > 0 and float(pong.get("busy_sec") or 0.0) > self.stuck_timeout:
+                # Поток чтения воркера отвечает на ping и во время синтеза — зависание видно только по busy_sec
+                self.logger.warning(
+                    f"TTS worker busy with one request for {float(pong['busy_sec']):.0f}s "
+                    f"(limit {self.stuck_timeout:.0f}s), restarting it"
+                )
+                self._kill(proc)
+
+    def _fail_pending(self, reason: str) -> None:
+        with self._state_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for item in pending:
+            item.error = reason
+            item.event.set()
+
+    def _send(self, payload: Dict[str, Any]) -> None:
+        proc = self._proc
+        if proc is None or proc.poll() is not None or proc.stdin is None:
+            raise TTSWorkerError("worker is not running")
+        data = (json.dumps(payload, ensure_ascii=True) + "\n").encode("ascii")
+        with self._write_lock:
+            proc.stdin.write(data)
+            proc.stdin.flush()
+
+    # ------------------------------------------------------------------ requests
+
+    def _submit(self, payload: Dict[str, Any]) -> _PendingRequest:
+        if not self.start():
+            raise TTSWorkerError("worker is not available")
+        request_id = f"r{next(self._ids)}"
+        payload["id"] = request_id
+        pending = _PendingRequest(request_id)
+        with self._state_lock:
+            self._pending[request_id] = pending
+        try:
+            self._send(payload)
+        except Exception as e:
+            with self._state_lock:
+                self._pending.pop(request_id, None)
+            raise TTSWorkerError(f"failed to send request: {e}") from e
+        return pending
+
+    def _wait(self, pending: _PendingRequest, timeout: Optional[float]) -> bool:
+        wait_for = self.request_timeout if timeout is None else timeout
+        if not pending.event.wait(wait_for):
+            self.logger.error(f"TTS worker request {pending.request_id} timed out after {wait_for:.0f}s")
+            self.cancel(pending.request_id)
+            self.requests_failed += 1
+            return False
+        self.last_latency_ms = (time.perf_counter() - pending.created) * 1000.0
+        if pending.cancelled:
+            self.requests_cancelled += 1
+            raise TTSWorkerCancelled(f"request {pending.request_id} cancelled")
+        if pending.error:
+            self.logger.error(f"TTS worker request failed: {pending.error}")
+            self.requests_failed += 1
+            return False
+        self.requests_served += 1
+        try:
+            self.last_infer_ms = float(pending.header.get("infer_ms") or 0.0)
+        except Exception:
+            pass
+        return True
+
+    def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Optional[np.ndarray]:
+        """Синтезировать текст и вернуть float32 PCM (None при ошибке).
+
+        Отменённый запрос (stop/cancel_all) поднимает TTSWorkerCancelled, чтобы вызывающий
+        не принял отмену за сбой воркера и не озвучил фразу запасным путём.
+        """
+        try:
+            pending = self._submit(
+                {
+                    "op": "synth",
+                    "text": text,
+                    "voice": str(voice or self.voice),
+                    "sample_rate": int(sample_rate or self.sample_rate),
+                }
+            )
+        except TTSWorkerError as e:
+            self.logger.warning(f"Persistent TTS worker unavailable: {e}")
+            return None
+        if not self._wait(pending, timeout):
+            return None
+        return pending.audio if pending.audio is not None else np.zeros(0, dtype=np.float32)
+
+    def synthesize_to_file(
+        self,
+        text: str,
+        output_path: str,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """Синтезировать текст сразу в WAV-файл на стороне воркера (отмена — TTSWorkerCancelled)."""
+        try:
+            pending = self._submit(
+                {
+                    "op": "synth",
+                    "text": text,
+                    "voice": str(voice or self.voice),
+                    "sample_rate": int(sample_rate or self.sample_rate),
+                    "output": str(output_path),
+                }
+            )
+        except TTSWorkerError as e:
+            self.logger.warning(f"Persistent TTS worker unavailable: {e}")
+            return False
+        return self._wait(pending, timeout)
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        """Health ping; воркер отвечает даже во время синтеза."""
+        return self._ping(timeout) is not None
+
+    def _ping(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Заголовок pong (busy, busy_sec, served, ...) или None, если воркер не ответил."""
+        proc = self._proc
+        if proc is None or proc.poll() is not None or not self._ready.is_set():
+            return None
+        request_id = f"p{next(self._ids)}"
+        pending = _PendingRequest(request_id)
+        with self._state_lock:
+            self._pending[request_id] = pending
+        try:
+            self._send({"op": "ping", "id": request_id})
+        except Exception:
+            with self._state_lock:
+                self._pending.pop(request_id, None)
+            return None
+        ok = pending.event.wait(timeout) and pending.header.get("op") == "pong"
+        with self._state_lock:
+            self._pending.pop(request_id, None)
+        return pending.header if ok else None
+
+    def cancel(self, request_id: str) -> None:
+        """Отменить запрос: ожидающий вызов сразу получает отказ, воркер пропустит/отбросит результат.
+
+        Для уже завершённых (или неизвестных) запросов ничего не отправляется.
+        """
+        with self._state_lock:
+            pending = self._pending.pop(request_id, None)
+        if pending is None:
+            return
+        pending.cancelled = True
+        pending.event.set()
+        try:
+            self._send({"op": "cancel", "id": request_id})
+        except Exception:
+            pass
+
+    def cancel_all(self) -> int:
+        """Отменить все незавершённые запросы синтеза."""
+        with self._state_lock:
+            ids = [rid for rid in self._pending if rid.startswith("r")]
+        for rid in ids:
+            self.cancel(rid)
+        return len(ids)
+
+    def get_status(self) -> Dict[str, Any]:
+        proc = self._proc
+        return {
+            "running": self.is_running(),
+            "pid": proc.pid if proc is not None and proc.poll() is None else None,
+            "starts": self.started_count,
+            "pending": len(self._pending),
+            "served": self.requests_served,
+            "failed": self.requests_failed,
+            "cancelled": self.requests_cancelled,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "last_infer_ms": round(self.last_infer_ms, 1),
+        }
+
+
+_worker_client: Optional[TTSWorkerClient] = None
+_worker_client_lock = threading.Lock()
+
+
+def get_tts_worker_client(config) -> TTSWorkerClient:
+    """Получить общий (на процесс) клиент постоянного TTS-воркера."""
+    global _worker_client
+    with _worker_client_lock:
+        if _worker_client is None:
+            _worker_client = TTSWorkerClient(config)
+            atexit.register(_worker_client.shutdown)
+        return _worker_client
+
+
+def is_persistent_worker_enabled(config) -> bool:
+    """Режим постоянного воркера включён (tts.worker.persistent, по умолчанию да)."""
+    try:
+        return bool(config.get("tts.worker.persistent", True))
+    except Exception:
+        return True
@@ -1,6 +1,11 @@
 """
 Subprocess TTS worker to synthesize and play speech using Silero TTS
 This isolates Silero's 'src' imports from the main app's packages.
+
+Two modes:
+  * one-shot (default): synthesize a single text and exit;
+  * --serve: persistent daemon that keeps the model resident and answers
+    framed requests over stdin/stdout (used by modules/tts_worker_client.py).
 """
 
 import argparse
@@ -11,10 +16,15 @@ from typing import Any
 
 import contextlib
 import io
+import json
+import queue
 import shutil
+import threading
+import time
 import warnings
 import re
 
+import numpy as np
 import soundfile as sf
 
 
@@ -39,7 +49,7 @@ def map_voice(voice: str) -> str:
     v = voice.lower().strip()
     if v in {"ru_v3", "ru-v3", "v3", "default"}:
         return "aidar"
-    return voice
+    return v
 
 def preprocess_text(text: str) -> str:
     """Clean and normalize input text for Silero to avoid ValueError from tokenizer.
@@ -70,27 +80,20 @@ def preprocess_text(text: str) -> str:
         t = t[:5000]
     return t
 
-def synth_and_play(
-    text: str,
-    voice: str,
-    sample_rate: int,
-    device: str,
-    output: str | None,
-    sapi_enabled: bool = True,
-) -> None:
-    print("[TTS-WORKER] Starting synth_and_play...", file=sys.stderr)
-
-    # Optional torch import to avoid DLL crashes
+def _import_torch() -> tuple[Any, BaseException | None]:
+    """Import torch lazily; returns (module or None, import error)."""
     try:
         print("[TTS-WORKER] Importing torch...", file=sys.stderr)
         import torch as _torch  # type: ignore
-        _torch_err = None
         print("[TTS-WORKER] torch imported successfully.", file=sys.stderr)
+        return _torch, None
     except BaseException as _e:
-        _torch = None  # type: ignore
-        _torch_err = _e
         print(f"[TTS-WORKER-ERROR] torch import failed: {_e}", file=sys.stderr)
+        return None, _e
+
 
+def _prepare_environment() -> None:
+    """Silence noisy warnings and make the Silero repo importable."""
     # Подавляем предупреждения PyTorch для чистого вывода
     warnings.filterwarnings("ignore", category=UserWarning)
     warnings.filterwarnings("ignore", category=FutureWarning)
@@ -102,131 +105,158 @@ def synth_and_play(
     # Устанавливаем переменные окружения для подавления лишнего вывода
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-    # torch обязателен для Silero
-    if _torch is None:
-        raise RuntimeError(f"PyTorch not available: {_torch_err}")
 
-    def _clear_silero_cache(torch_mod: Any) -> None:
-        """Удаляем поврежденный кеш Silero из torch.hub (репо и возможные .pt чекпоинты)."""
+def _clear_silero_cache(torch_mod: Any) -> None:
+    """Удаляем поврежденный кеш Silero из torch.hub (репо и возможные .pt чекпоинты)."""
+    try:
         try:
-            try:
-                hub_dir = Path(torch_mod.hub.get_dir())  # type: ignore[attr-defined]
-            except Exception:
-                hub_dir = Path.home() / ".cache" / "torch" / "hub"
-
-            targets: list[Path] = []
-            repo_dir = hub_dir / "snakers4_silero-models_master"
-            targets.append(repo_dir)
-            checkpoints = hub_dir / "checkpoints"
-            if checkpoints.exists():
-                for p in checkpoints.glob("*.pt"):
-                    name = p.name.lower()
-                    if "silero" in name or "v3" in name or "ru" in name:
-                        targets.append(p)
-            for t in targets:
-                if t.exists():
-                    if t.is_dir():
-                        shutil.rmtree(t, ignore_errors=True)
-                        print(f"[TTS-WORKER] Cleared dir: {t}", file=sys.stderr)
-                    else:
+            hub_dir = Path(torch_mod.hub.get_dir())  # type: ignore[attr-defined]
+        except Exception:
+            hub_dir = Path.home() / ".cache" / "torch" / "hub"
+
+        targets: list[Path] = []
+        repo_dir = hub_dir / "snakers4_silero-models_master"
+        targets.append(repo_dir)
+        checkpoints = hub_dir / "checkpoints"
+        if checkpoints.exists():
+            for p in checkpoints.glob("*.pt"):
+                name = p.name.lower()
+                if "silero" in name or "v3" in name or "ru" in name:
+                    targets.append(p)
+        for t in targets:
+            if t.exists():
+                if t.is_dir():
+                    shutil.rmtree(t, ignore_errors=True)
+                    print(f"[TTS-WORKER] Cleared dir: {t}", file=sys.stderr)
+                else:
+                    try:
+                        t.unlink(missing_ok=True)
+                    except TypeError:
+                        # Python <3.8 fallback
                         try:
-                            t.unlink(missing_ok=True)
-                        except TypeError:
-                            # Python <3.8 fallback
-                            try:
-                                t.unlink()
-                            except Exception:
-                                pass
-                        print(f"[TTS-WORKER] Removed file: {t}", file=sys.stderr)
-        except Exception as clr_err:
-            print(f"[TTS-WORKER-WARN] Failed to clear silero cache: {clr_err}", file=sys.stderr)
-
-    def _load_model() -> Any:
-        buf = io.StringIO()
-        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
-            loaded = _torch.hub.load(  # type: ignore[attr-defined]
-                repo_or_dir="snakers4/silero-models",
-                model="silero_tts",
-                language="ru",
-                speaker="v3_1_ru",
-                verbose=False,
-            )
-        return loaded[0] if isinstance(loaded, (tuple, list)) else loaded
+                            t.unlink()
+                        except Exception:
+                            pass
+                    print(f"[TTS-WORKER] Removed file: {t}", file=sys.stderr)
+    except Exception as clr_err:
+        print(f"[TTS-WORKER-WARN] Failed to clear silero cache: {clr_err}", file=sys.stderr)
+
+
+def _hub_load(torch_mod: Any) -> Any:
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        loaded = torch_mod.hub.load(  # type: ignore[attr-defined]
+            repo_or_dir="snakers4/silero-models",
+            model="silero_tts",
+            language="ru",
+            speaker="v3_1_ru",
+            verbose=False,
+        )
+    return loaded[0] if isinstance(loaded, (tuple, list)) else loaded
+
 
+def load_silero_model(torch_mod: Any, device: str) -> Any:
+    """Load the Silero model (clearing a corrupted hub cache once) and move it to device."""
+    print("[TTS-WORKER] Loading Silero model...", file=sys.stderr)
     try:
-        print("[TTS-WORKER] Starting synthesis...", file=sys.stderr)
-        print("[TTS-WORKER] Loading Silero model...", file=sys.stderr)
-        try:
-            model = _load_model()
-        except Exception as load_err:
-            msg = str(load_err)
-            if (
-                "PytorchStreamReader failed" in msg
-                or "failed finding central directory" in msg
-                or "zip archive" in msg
-            ):
-                print("[TTS-WORKER] Detected corrupted Silero cache, clearing and retrying...", file=sys.stderr)
-                _clear_silero_cache(_torch)
-                model = _load_model()
-            else:
-                raise
+        model = _hub_load(torch_mod)
+    except Exception as load_err:
+        msg = str(load_err)
+        if (
+            "PytorchStreamReader failed" in msg
+            or "failed finding central directory" in msg
+            or "zip archive" in msg
+        ):
+            print("[TTS-WORKER] Detected corrupted Silero cache, clearing and retrying...", file=sys.stderr)
+            _clear_silero_cache(torch_mod)
+            model = _hub_load(torch_mod)
+        else:
+            raise
 
-        print("[TTS-WORKER] Silero model loaded.", file=sys.stderr)
-        print("[TTS-WORKER] Model loaded, preparing...", file=sys.stderr)
+    print("[TTS-WORKER] Silero model loaded.", file=sys.stderr)
 
-        # Безопасно выбираем устройство: если cuda недоступна, откатываемся на cpu
-        target_device = device
-        try:
-            if (
-                isinstance(target_device, str)
-                and target_device.lower().startswith("cuda")
-                and not _torch.cuda.is_available()
-            ):
-                target_device = "cpu"
-        except Exception:
+    # Безопасно выбираем устройство: если cuda недоступна, откатываемся на cpu
+    target_device = device
+    try:
+        if (
+            isinstance(target_device, str)
+            and target_device.lower().startswith("cuda")
+            and not torch_mod.cuda.is_available()
+        ):
             target_device = "cpu"
+    except Exception:
+        target_device = "cpu"
+
+    print(f"[TTS-WORKER] Moving model to device: {target_device}", file=sys.stderr)
+    model_any: Any = model
+    model_any.to(target_device)
+    print("[TTS-WORKER] Model moved to device.", file=sys.stderr)
+    return model_any
+
+
+def synthesize(torch_mod: Any, model: Any, text: str, voice: str, sample_rate: int) -> Any:
+    """Run Silero inference and return a float32 numpy array."""
+    voice_mapped = map_voice(voice)
+    print(f"[TTS-WORKER] Generating audio with voice '{voice_mapped}'...", file=sys.stderr)
+    # Preprocess text to avoid Silero ValueError on unexpected symbols or empty input
+    clean_text = preprocess_text(text)
+    if not clean_text:
+        raise ValueError("Empty or invalid text after preprocessing")
+    print(f"[TTS-WORKER] Clean text: {clean_text}", file=sys.stderr)
+    buf = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            audio = model.apply_tts(
+                text=clean_text,
+                speaker=voice_mapped,
+                sample_rate=sample_rate,
+                put_accent=True,
+                put_yo=True,
+            )
+    except ValueError:
+        # Retry with a minimal safe sample to verify pipeline
+        retry_text = "Привет."
+        print("[TTS-WORKER-WARN] ValueError for input text; retrying with a safe sample...", file=sys.stderr)
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            audio = model.apply_tts(
+                text=retry_text,
+                speaker=voice_mapped,
+                sample_rate=sample_rate,
+                put_accent=True,
+                put_yo=True,
+            )
+    print("[TTS-WORKER] Audio generated.", file=sys.stderr)
 
-        print(f"[TTS-WORKER] Moving model to device: {target_device}", file=sys.stderr)
-        model_any: Any = model
-        model_any.to(target_device)
-        print("[TTS-WORKER] Model moved to device.", file=sys.stderr)
-
-        voice_mapped = map_voice(voice)
-        print(f"[TTS-WORKER] Generating audio with voice '{voice_mapped}'...", file=sys.stderr)
-        # Preprocess text to avoid Silero ValueError on unexpected symbols or empty input
-        clean_text = preprocess_text(text)
-        if not clean_text:
-            raise ValueError("Empty or invalid text after preprocessing")
-        print(f"[TTS-WORKER] Clean text: {clean_text}", file=sys.stderr)
-        buf = io.StringIO()
-        try:
-            with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
-                audio = model_any.apply_tts(
-                    text=clean_text,
-                    speaker=voice_mapped,
-                    sample_rate=sample_rate,
-                    put_accent=True,
-                    put_yo=True,
-                )
-        except ValueError:
-            # Retry with a minimal safe sample to verify pipeline
-            retry_text = "Привет."
-            print("[TTS-WORKER-WARN] ValueError for input text; retrying with a safe sample...", file=sys.stderr)
-            with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
-                audio = model_any.apply_tts(
-                    text=retry_text,
-                    speaker=voice_mapped,
-                    sample_rate=sample_rate,
-                    put_accent=True,
-                    put_yo=True,
-                )
-        print("[TTS-WORKER] Audio generated.", file=sys.stderr)
+    # Convert to numpy array
+    if hasattr(torch_mod, "is_tensor") and torch_mod.is_tensor(audio):
+        audio = audio.cpu().numpy()
+    return np.asarray(audio, dtype=np.float32)
 
-        print("[TTS-WORKER] Audio generated, saving...", file=sys.stderr)
-        # Convert to numpy array
-        if hasattr(_torch, "is_tensor") and _torch.is_tensor(audio):
-            audio = audio.cpu().numpy()
 
+def synth_and_play(
+    text: str,
+    voice: str,
+    sample_rate: int,
+    device: str,
+    output: str | None,
+    sapi_enabled: bool = True,
+) -> None:
+    print("[TTS-WORKER] Starting synth_and_play...", file=sys.stderr)
+
+    # Optional torch import to avoid DLL crashes
+    _torch, _torch_err = _import_torch()
+    _prepare_environment()
+
+    # torch обязателен для Silero
+    if _torch is None:
+        raise RuntimeError(f"PyTorch not available: {_torch_err}")
+
+    try:
+        print("[TTS-WORKER] Starting synthesis...", file=sys.stderr)
+        model = load_silero_model(_torch, device)
+        audio = synthesize(_torch, model, text, voice, sample_rate)
+
+        print("[TTS-WORKER] Audio generated, saving...", file=sys.stderr)
         if output:
             print(f"[TTS-WORKER] Writing to output file: {output}", file=sys.stderr)
             sf.write(output, audio, sample_rate)
@@ -262,6 +292,161 @@ def synth_and_play(
         raise
 
 
+def serve(voice: str, sample_rate: int, device: str) -> int:
+    """Persistent worker mode: load the model once and answer framed requests.
+
+    Protocol (see modules/tts_worker_client.py):
+      stdin  - one JSON object per line:
+               {"op": "synth", "id": ..., "text": ..., "voice": ..., "sample_rate": ..., "output": ...}
+               {"op": "ping", "id": ...}
+               {"op": "cancel", "id": <id of the synth request>}
+               {"op": "shutdown"}
+      stdout - one JSON header line per reply, followed by exactly header["bytes"]
+               bytes of little-endian float32 PCM (0 when the audio was written to "output").
+    """
+    proto_out = sys.stdout.buffer
+    # Всё, что модель или библиотеки печатают в stdout, уходит в stderr — иначе сломается протокол
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+    requests_q: "queue.Queue[dict | None]" = queue.Queue()
+    # Запросы синтеза в очереди или в работе; отмена запоминается только для них
+    active: set[str] = set()
+    cancelled: set[str] = set()
+    cancelled_lock = threading.Lock()
+    state = {"model_loaded": False, "busy_id": None, "busy_since": 0.0, "served": 0}
+    started = time.monotonic()
+
+    def reply(header: dict, payload: bytes = b"") -> None:
+        header["bytes"] = len(payload)
+        line = (json.dumps(header, ensure_ascii=True) + "\n").encode("ascii")
+        with write_lock:
+            try:
+                proto_out.write(line)
+                if payload:
+                    proto_out.write(payload)
+                proto_out.flush()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def reader() -> None:
+        for raw in sys.stdin.buffer:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                req = json.loads(raw.decode("utf-8"))
+            except Exception as parse_err:
+                print(f"[TTS-WORKER-WARN] Bad request line: {parse_err}", file=sys.stderr)
+                continue
+            op = req.get("op")
+            if op == "ping":
+                # Отвечаем из потока чтения, чтобы ping работал и во время синтеза
+                reply(
+                    {
+                        "id": req.get("id"),
+                        "ok": True,
+                        "op": "pong",
+                        "model_loaded": state["model_loaded"],
+                        "busy": state["busy_id"] is not None,
+                        # Сколько длится текущий синтез: по нему клиент замечает зависший инференс
+                        "busy_sec": round(time.monotonic() - state["busy_since"], 3) if state["busy_id"] else 0.0,
+                        "served": state["served"],
+                        "uptime": round(time.monotonic() - started, 3),
+                    }
+                )
+            elif op == "cancel":
+                with cancelled_lock:
+                    req_id = str(req.get("id"))
+                    if req_id in active:
+                        cancelled.add(req_id)
+            elif op == "shutdown":
+                requests_q.put(None)
+                return
+            else:
+                if op == "synth":
+                    with cancelled_lock:
+                        active.add(str(req.get("id")))
+                requests_q.put(req)
+        requests_q.put(None)
+
+    def take_cancelled(req_id: str) -> bool:
+        with cancelled_lock:
+            if req_id in cancelled:
+                cancelled.discard(req_id)
+                return True
+        return False
+
+    def finish_request(req_id: str) -> None:
+        # Ответ отправлен: поздний cancel для этого id больше ничего не запомнит
+        with cancelled_lock:
+            active.discard(req_id)
+            cancelled.discard(req_id)
+
+    _torch, _torch_err = _import_torch()
+    _prepare_environment()
+    if _torch is None:
+        reply({"id": None, "op": "ready", "ok": False, "error": f"PyTorch not available: {_torch_err}"})
+        return 3
+
+    try:
+        model = load_silero_model(_torch, device)
+    except Exception as load_err:
+        reply({"id": None, "op": "ready", "ok": False, "error": f"Model load failed: {load_err}"})
+        return 3
+
+    state["model_loaded"] = True
+    reply({"id": None, "op": "ready", "ok": True, "pid": os.getpid()})
+    threading.Thread(target=reader, name="tts-worker-reader", daemon=True).start()
+
+    while True:
+        req = requests_q.get()
+        if req is None:
+            break
+        req_id = str(req.get("id"))
+        if req.get("op") != "synth":
+            reply({"id": req_id, "ok": False, "error": f"Unknown op: {req.get('op')}"})
+            continue
+        if take_cancelled(req_id):
+            finish_request(req_id)
+            reply({"id": req_id, "ok": False, "cancelled": True})
+            continue
+
+        state["busy_since"] = time.monotonic()
+        state["busy_id"] = req_id
+        t0 = time.perf_counter()
+        try:
+            rate = int(req.get("sample_rate") or sample_rate)
+            audio = synthesize(_torch, model, str(req.get("text") or ""), str(req.get("voice") or voice), rate)
+            infer_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+            if take_cancelled(req_id):
+                reply({"id": req_id, "ok": False, "cancelled": True})
+                continue
+            header = {
+                "id": req_id,
+                "ok": True,
+                "sample_rate": rate,
+                "samples": int(audio.shape[0]),
+                "format": "f32le",
+                "infer_ms": infer_ms,
+            }
+            output = req.get("output")
+            if output:
+                sf.write(str(output), audio, rate)
+                header["output"] = str(output)
+                reply(header)
+            else:
+                reply(header, audio.astype("<f4", copy=False).tobytes())
+        except Exception as synth_err:
+            print(f"[TTS-WORKER-ERROR] Synthesis failed for {req_id}: {synth_err}", file=sys.stderr)
+            reply({"id": req_id, "ok": False, "error": str(synth_err)})
+        finally:
+            finish_request(req_id)
+            state["busy_id"] = None
+            state["served"] += 1
+
+    return 0
+
+
 def _read_text_from_stdin() -> str:
     """Read text from stdin with robust Windows encoding fallbacks (UTF-8, CP1251, CP866)."""
     try:
@@ -291,9 +476,13 @@ def main() -> None:
     parser.add_argument("--output", default=None, help="Optional path to save WAV instead of playing")
     parser.add_argument("--sapi-enabled", action="store_true", help="Allow SAPI fallback on Windows")
     parser.add_argument("--text", default=None, help="Optional text to synthesize (otherwise read from stdin)")
+    parser.add_argument("--serve", action="store_true", help="Run as a persistent worker (framed stdin/stdout)")
 
     args = parser.parse_args()
 
+    if args.serve:
+        sys.exit(serve(voice=args.voice, sample_rate=args.sample_rate, device=args.device))
+
     try:
         text_to_speak = args.text if args.text is not None else _read_text_from_stdin()
         synth_and_play(
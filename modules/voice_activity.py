@@ -0,0 +1,246 @@
+"""
+Voice activity detection for the STT/wake word pipeline
+
+Лёгкий VAD на NumPy перед распознаванием Vosk: чанк делится на кадры по frame_ms,
+по каждому кадру векторно считаются энергия (dBFS) и доля переходов через ноль.
+Кадр — речь, если энергия выше адаптивного уровня шума на threshold_db и не похожа
+на шипение (высокий ZCR при слабой энергии). Начало речи требует start_ms подряд,
+конец — hangover_ms тишины после последнего речевого кадра.
+
+Уровень шума в тишине следует за энергией кадров, а во время «речи» медленно
+подтягивается к минимуму энергии за последние noise_window_ms: в настоящей речи
+есть паузы между словами на уровне шума, поэтому минимум остаётся внизу, а
+выросший фоновый шум (вентилятор, шум улицы) поднимает и минимум — иначе после
+скачка шума каждый кадр считался бы речью и запись шла бы до max_utterance_ms.
+
+SpeechGate пропускает к распознавателю только речь с небольшим контекстом до и после
+(постоянное прослушивание wake word не гоняет тишину через Kaldi), а
+UtteranceEndpointer завершает фразу по реальной границе речи (end_silence_ms тишины
+после речи) или по таймауту ожидания/длины фразы.
+"""
+
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_INT16_SCALE = 1.0 / 32768.0
+
+
+class VoiceActivityDetector:
+    """Детектор речи по энергии, ZCR и адаптивному уровню шума (с hangover)"""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = 9.0,
+        min_energy_dbfs: float = -55.0,
+        zcr_max: float = 0.35,
+        start_ms: int = 60,
+        hangover_ms: int = 300,
+        noise_rise: float = 0.02,
+        noise_fall: float = 0.3,
+        noise_window_ms: int = 1500,
+    ):
+        self.sample_rate = int(sample_rate)
+        self.frame_len = max(16, int(self.sample_rate * frame_ms / 1000))
+        self.frame_ms = 1000.0 * self.frame_len / self.sample_rate
+        self.threshold_db = float(threshold_db)
+        self.min_energy_dbfs = float(min_energy_dbfs)
+        self.zcr_max = float(zcr_max)
+        self.start_frames = max(1, int(round(start_ms / self.frame_ms)))
+        self.hangover_frames = max(0, int(round(hangover_ms / self.frame_ms)))
+        # Шум отслеживается асимметрично: быстро вниз (тишина), медленно вверх (речь не «поднимает» пол)
+        self.noise_rise = float(noise_rise)
+        self.noise_fall = float(noise_fall)
+        self.noise_window_frames = max(1, int(round(noise_window_ms / self.frame_ms)))
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config, sample_rate: int) -> "VoiceActivityDetector":
+        get = config.get
+        return cls(
+            sample_rate=sample_rate,
+            frame_ms=int(get("stt.vad.frame_ms", 20) or 20),
+            threshold_db=float(get("stt.vad.threshold_db", 9.0)),
+            min_energy_dbfs=float(get("stt.vad.min_energy_dbfs", -55.0)),
+            zcr_max=float(get("stt.vad.zcr_max", 0.35)),
+            start_ms=int(get("stt.vad.start_ms", 60)),
+            hangover_ms=int(get("stt.vad.hangover_ms", 300)),
+            noise_window_ms=int(get("stt.vad.noise_window_ms", 1500)),
+        )
+
+    def reset(self):
+        self.noise_db: Optional[float] = None
+        self.in_speech = False
+        self._onset = 0
+        self._hang = 0
+        self._tail = np.zeros(0, dtype=np.int16)
+        self.last_db = -120.0
+        # Монотонная очередь (номер кадра, dB) — минимум энергии за noise_window_frames
+        self._frame_index = 0
+        self._window_min: deque = deque()
+
+    def _features(self, samples: np.ndarray):
+        """Энергия (dBFS) и доля переходов через ноль по кадрам — векторно"""
+        count = samples.size // self.frame_len
+        frames = samples[: count * self.frame_len].reshape(count, self.frame_len).astype(np.float32) * _INT16_SCALE
+        energy = np.einsum("ij,ij->i", frames, frames) / self.frame_len
+        db = 10.0 * np.log10(energy + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(self.frame_len - 1)
+        return db, zcr
+
+    def process(self, chunk: bytes) -> bool:
+        """Обработать чанк PCM 16-bit; True, если в чанке есть речь (с учётом hangover)"""
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if self._tail.size:
+            samples = np.concatenate((self._tail, samples))
+        usable = samples.size - samples.size % self.frame_len
+        self._tail = samples[usable:].copy()
+        if usable == 0:
+            return self.in_speech
+
+        db, zcr = self._features(samples[:usable])
+        if self.noise_db is None:
+            self.noise_db = float(np.min(db))
+        # Грубое решение по кадру — векторно относительно шума на начало чанка
+        loud = db > max(self.min_energy_dbfs, self.noise_db + self.threshold_db)
+        voiced = loud & ((zcr <= self.zcr_max) | (db > self.noise_db + 2 * self.threshold_db))
+
+        speech_in_chunk = False
+        noise = self.noise_db
+        window = self._window_min
+        for frame_db, is_voiced in zip(db.tolist(), voiced.tolist()):
+            self._frame_index += 1
+            while window and window[-1][1] >= frame_db:
+                window.pop()
+            window.append((self._frame_index, frame_db))
+            if window[0][0] <= self._frame_index - self.noise_window_frames:
+                window.popleft()
+            if is_voiced:
+                self._onset += 1
+                if self._onset >= self.start_frames:
+                    self.in_speech = True
+                    self._hang = self.hangover_frames
+                # Даже самый тихий кадр окна громче пола — вырос фон, а не началась речь
+                floor = window[0][1]
+                if floor > noise:
+                    noise += self.noise_rise * (floor - noise)
+            else:
+                self._onset = 0
+                if self.in_speech:
+                    if self._hang > 0:
+                        self._hang -= 1
+                    else:
+                        self.in_speech = False
+                rate = self.noise_fall if frame_db < noise else self.noise_rise
+                noise += rate * (frame_db - noise)
+            speech_in_chunk = speech_in_chunk or self.in_speech
+        self.noise_db = noise
+        self.last_db = float(db[-1])
+        return speech_in_chunk
+
+
+class UtteranceEndpointer:
+    """Границы фразы по VAD: ожидание речи -> речь -> конец (или таймаут)"""
+
+    WAITING = "waiting"
+    SPEECH = "speech"
+    END = "end"
+    TIMEOUT = "timeout"
+
+    def __init__(
+        self,
+        vad: VoiceActivityDetector,
+        end_silence_ms: int = 700,
+        no_speech_timeout_ms: int = 10000,
+        max_utterance_ms: int = 30000,
+    ):
+        self.vad = vad
+        self.end_silence_ms = max(0, int(end_silence_ms))
+        self.no_speech_timeout_ms = max(0, int(no_speech_timeout_ms))
+        self.max_utterance_ms = max(0, int(max_utterance_ms))
+        self.state = self.WAITING
+        self.speech_detected = False
+        self._waited_ms = 0.0
+        self._silence_ms = 0.0
+        self._speech_ms = 0.0
+
+    @classmethod
+    def from_config(cls, config, sample_rate: int) -> "UtteranceEndpointer":
+        get = config.get
+        return cls(
+            VoiceActivityDetector.from_config(config, sample_rate),
+            end_silence_ms=int(get("stt.vad.end_silence_ms", 700)),
+            no_speech_timeout_ms=int(get("stt.vad.no_speech_timeout_ms", 10000)),
+            max_utterance_ms=int(get("stt.vad.max_utterance_ms", 30000)),
+        )
+
+    def feed(self, chunk: bytes) -> str:
+        """Состояние после чанка: waiting | speech | end | timeout"""
+        if self.state in (self.END, self.TIMEOUT):
+            return self.state
+        is_speech = self.vad.process(chunk)
+        chunk_ms = 1000.0 * (len(chunk) // 2) / self.vad.sample_rate
+        if self.state == self.WAITING:
+            if is_speech:
+                self.state = self.SPEECH
+                self.speech_detected = True
+                self._speech_ms = chunk_ms
+            else:
+                self._waited_ms += chunk_ms
+                if self.no_speech_timeout_ms and self._waited_ms >= self.no_speech_timeout_ms:
+                    self.state = self.TIMEOUT
+            return self.state
+
+        self._speech_ms += chunk_ms
+        if is_speech:
+            self._silence_ms = 0.0
+        else:
+            self._silence_ms += chunk_ms
+            if self._silence_ms >= self.end_silence_ms:
+                self.state = self.END
+        if self.max_utterance_ms and self._speech_ms >= self.max_utterance_ms:
+            self.state = self.END
+        return self.state
+
+
+class SpeechGate:
+    """Пропускает к распознавателю только речевые чанки (+ lead до и trail после)"""
+
+    def __init__(self, vad: VoiceActivityDetector, lead_chunks: int = 2, trail_chunks: int = 3):
+        self.vad = vad
+        self.trail_chunks = max(0, int(trail_chunks))
+        self._held: deque = deque(maxlen=max(0, int(lead_chunks)))
+        self._trail = 0
+        self.active = False
+        self.skipped_chunks = 0
+
+    @classmethod
+    def from_config(cls, config, sample_rate: int) -> "SpeechGate":
+        return cls(
+            VoiceActivityDetector.from_config(config, sample_rate),
+            lead_chunks=int(config.get("stt.vad.gate_lead_chunks", 2)),
+            trail_chunks=int(config.get("stt.vad.gate_trail_chunks", 3)),
+        )
+
+    def feed(self, chunk: bytes) -> Tuple[List[bytes], bool]:
+        """(чанки для распознавателя, фраза закончилась — пора взять FinalResult)"""
+        if self.vad.process(chunk):
+            passed = list(self._held)
+            passed.append(chunk)
+            self._held.clear()
+            self.active = True
+            self._trail = self.trail_chunks
+            return passed, False
+        if self.active:
+            if self._trail > 0:
+                self._trail -= 1
+                return [chunk], False
+            self.active = False
+            return [chunk], True
+        self._held.append(chunk)
+        self.skipped_chunks += 1
+        return [], False
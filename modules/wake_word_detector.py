@@ -6,23 +6,15 @@ import time
 from pathlib import Path
 from typing import List, Optional, Tuple
 
-try:
-    import pyaudio
-except ImportError:
-    pyaudio = None
-
 import vosk
 from PyQt6.QtCore import QObject, pyqtSignal
 
 from config.config import Config
+from modules.audio_bus import AudioSubscription, get_audio_bus
+from modules.voice_activity import SpeechGate
+from modules.wake_word_matcher import WakeWordMatcher
 from utils.logger import ModuleLogger
 
-# If pyaudio is not available, define fallback constants
-if pyaudio is None:
-    class PyAudioFallback:
-        paInt16 = 2  # Standard PCM format constant
-    pyaudio = PyAudioFallback()
-
 
 def _safe_float(value, default: float) -> float:
     try:
@@ -66,31 +58,31 @@ class KaldiWakeWordDetector(QObject):
         # Configuration
         self._base_wake_word = str(self.config.get("stt.wake_word", "Арвис"))
         self.model_path = str(self.config.get("stt.kaldi_model_path", self.config.get("stt.model_path", "")))
+        # Частота распознавателя; при старте выравнивается по фактической частоте общей шины захвата
         self.sample_rate = _safe_int(self.config.get("stt.kaldi_sample_rate", 16000), 16000)
-        self.chunk_size = max(512, _safe_int(self.config.get("stt.kaldi_chunk_size", 2048), 2048))
         self.cooldown_sec = max(0.1, _safe_float(self.config.get("stt.kaldi_cooldown", 1.0), 1.0))
         self.use_grammar = bool(self.config.get("stt.kaldi_use_grammar", True))
         self.debug_log = bool(self.config.get("stt.kaldi_debug_log", False))
-        # Поддержка выбора микрофона из config.audio.input_device (индекс или имя)
-        try:
-            self.input_device_pref = self.config.get("audio.input_device", None)
-        except Exception:
-            self.input_device_pref = None
         variants = self.config.get("stt.kaldi_wake_words", [])
         self._wake_variants = self._build_variant_list(variants)
         # Максимальная дистанция Левенштейна для нестрогого совпадения
         self._fuzzy_max_distance = _safe_int(self.config.get("stt.kaldi_fuzzy_distance", 1), 1)
+        self._matcher = WakeWordMatcher(self._wake_variants, self._fuzzy_max_distance)
+        # Как часто (секунд аудио) писать в лог стоимость сопоставления
+        self._stats_interval_sec = max(0.0, _safe_float(self.config.get("stt.kaldi_stats_interval_sec", 300), 300.0))
 
         # State
         self.model: Optional[vosk.Model] = None
         self.recognizer: Optional[vosk.KaldiRecognizer] = None
-        self.audio_interface: Optional[pyaudio.PyAudio] = None
-        self.audio_stream = None
+        # Подписка на общую шину микрофона (modules.audio_bus) на время детекции
+        self._subscription: Optional[AudioSubscription] = None
         self.is_listening = False
         self._detection_thread: Optional[threading.Thread] = None
         self._last_trigger_ts = 0.0
         self._shared_model = shared_model
         self._owns_model = False
+        self._audio_seconds = 0.0
+        self._next_stats_log = self._stats_interval_sec
 
         self.init_detector()
 
@@ -143,6 +135,7 @@ class KaldiWakeWordDetector(QObject):
             return False
 
     def _create_recognizer(self):
+        self._matcher.reset()
         if not self.model:
             return
         try:
@@ -158,44 +151,6 @@ class KaldiWakeWordDetector(QObject):
             self.logger.error(f"Failed to create Kaldi recognizer: {exc}")
             self.recognizer = None
 
-    def _ensure_audio_interface(self) -> bool:
-        if self.audio_interface:
-            return True
-        try:
-            self.audio_interface = pyaudio.PyAudio()
-            return True
-        except Exception as exc:
-            self.logger.error(f"Failed to initialize audio interface for Kaldi wake word: {exc}")
-            return False
-
-    def _resolve_input_device_index(self) -> Optional[int]:
-        """Определить индекс входного устройства на основе предпочтения пользователя."""
-        if not self.audio_interface:
-            return None
-        pref = self.input_device_pref
-        if pref is None or pref == "" or str(pref).lower() == "default":
-            return None
-        try:
-            device_count = self.audio_interface.get_device_count()
-            # Если указан индекс
-            if isinstance(pref, int) or (isinstance(pref, str) and pref.isdigit()):
-                idx = int(pref)
-                if 0 <= idx < device_count:
-                    return idx
-                return None
-            # Иначе — по имени (частичное совпадение, без регистра)
-            pref_low = str(pref).lower()
-            for i in range(device_count):
-                try:
-                    info = self.audio_interface.get_device_info_by_index(i)
-                    if int(info.get("maxInputChannels", 0)) > 0 and pref_low in str(info.get("name", "")).lower():
-                        return i
-                except Exception:
-                    continue
-        except Exception:
-            pass
-        return None
-
     # ------------------------------------------------------------------
     # Control methods
     # ------------------------------------------------------------------
@@ -211,74 +166,28 @@ class KaldiWakeWordDetector(QObject):
             if not self.init_detector():
                 return False
 
-        if not self._ensure_audio_interface() or not self.recognizer:
+        bus = get_audio_bus(self.config)
+        subscription = bus.subscribe("kaldi_wake_word") if bus is not None else None
+        if subscription is None:
+            self.logger.error("Audio capture unavailable for Kaldi wake word detector")
             return False
 
-        if not self.audio_interface:
-            self.logger.error("Audio interface unavailable for Kaldi wake word detector")
-            return False
+        if subscription.sample_rate != self.sample_rate:
+            # Микрофон открылся на другой частоте — пересоздаём распознаватель под неё
+            self.logger.info(f"Kaldi recognizer follows capture rate {subscription.sample_rate} Hz")
+            self.sample_rate = subscription.sample_rate
+            self._create_recognizer()
+            if not self.recognizer:
+                subscription.close()
+                return False
 
-        try:
-            input_index = self._resolve_input_device_index()
-            if self.debug_log:
-                self.logger.debug(
-                    f"Opening audio stream for Kaldi: rate={self.sample_rate}, chunk={self.chunk_size}, device={input_index if input_index is not None else 'default'}"
-                )
-            self.audio_stream = self.audio_interface.open(
-                rate=self.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                input_device_index=input_index,
-                frames_per_buffer=self.chunk_size,
-            )
-            self.is_listening = True
-            self._last_trigger_ts = 0.0
-            self._detection_thread = threading.Thread(target=self._detection_loop, daemon=True)
-            self._detection_thread.start()
-            self.logger.info("Kaldi wake word detection started")
-            return True
-        except Exception as exc:
-            self.logger.error(f"Error starting Kaldi wake word detection: {exc}")
-            # Попробуем альтернативные частоты, если не удалось запустить на заданной
-            for alt_rate in (44100, 48000):
-                try:
-                    if self.debug_log:
-                        self.logger.debug(f"Retrying audio stream with rate={alt_rate}")
-                    self.audio_stream = self.audio_interface.open(
-                        rate=alt_rate,
-                        channels=1,
-                        format=pyaudio.paInt16,
-                        input=True,
-                        input_device_index=self._resolve_input_device_index(),
-                        frames_per_buffer=self.chunk_size,
-                    )
-                    # Пересоздаём распознаватель с новой частотой
-                    if self.model:
-                        if self.use_grammar:
-                            self.recognizer = vosk.KaldiRecognizer(self.model, alt_rate, self._grammar())
-                        else:
-                            self.recognizer = vosk.KaldiRecognizer(self.model, alt_rate)
-                        self.recognizer.SetWords(True)
-                    self.sample_rate = alt_rate
-                    self.is_listening = True
-                    self._last_trigger_ts = 0.0
-                    self._detection_thread = threading.Thread(target=self._detection_loop, daemon=True)
-                    self._detection_thread.start()
-                    self.logger.info(f"Kaldi wake word detection started at alt rate {alt_rate}")
-                    return True
-                except Exception as exc2:
-                    if self.debug_log:
-                        self.logger.debug(f"Alt rate {alt_rate} failed: {exc2}")
-                    try:
-                        if self.audio_stream:
-                            self.audio_stream.stop_stream()
-                            self.audio_stream.close()
-                    except Exception:
-                        pass
-                    self.audio_stream = None
-            self.cleanup()
-            return False
+        self._subscription = subscription
+        self.is_listening = True
+        self._last_trigger_ts = 0.0
+        self._detection_thread = threading.Thread(target=self._detection_loop, daemon=True)
+        self._detection_thread.start()
+        self.logger.info("Kaldi wake word detection started")
+        return True
 
     def stop_detection(self):
         if not self.is_listening:
@@ -289,14 +198,11 @@ class KaldiWakeWordDetector(QObject):
         if thread and thread.is_alive():
             thread.join(timeout=2.0)
         self._detection_thread = None
+        self._log_matcher_stats()
 
-        if self.audio_stream:
-            try:
-                self.audio_stream.stop_stream()
-                self.audio_stream.close()
-            except Exception:
-                pass
-            self.audio_stream = None
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
 
         if self.recognizer and self.model:
             self._create_recognizer()
@@ -309,14 +215,6 @@ class KaldiWakeWordDetector(QObject):
         except Exception:
             pass
 
-        if self.audio_interface:
-            try:
-                self.audio_interface.terminate()
-            except Exception:
-                pass
-            self.audio_interface = None
-
-        self.audio_stream = None
         self.recognizer = None
 
         if self._owns_model:
@@ -328,37 +226,42 @@ class KaldiWakeWordDetector(QObject):
     # Detection loop
     # ------------------------------------------------------------------
     def _detection_loop(self):
-        if not self.audio_stream or not self.recognizer:
+        subscription = self._subscription
+        if subscription is None or not self.recognizer:
             return
 
+        # VAD: тишина не доходит до Kaldi (ни AcceptWaveform, ни разбора partial JSON)
+        gate = None
+        if self.config.get("stt.vad.gate_wake_word", True):
+            gate = SpeechGate.from_config(self.config, subscription.sample_rate)
+
         self.logger.debug("Kaldi wake word loop started")
         try:
-            while self.is_listening and self.audio_stream and self.recognizer:
-                try:
-                    data = self.audio_stream.read(self.chunk_size, exception_on_overflow=False)
-                except Exception as exc:
-                    if self.is_listening:
-                        self.logger.debug(f"Kaldi wake word audio read error: {exc}")
-                    time.sleep(0.05)
-                    continue
-
+            while self.is_listening and self.recognizer:
+                data = subscription.read(timeout=0.5)
                 if not data:
+                    if not subscription.is_active():
+                        if self.is_listening:
+                            self.logger.warning("Audio capture stopped, Kaldi wake word loop ended")
+                        self.is_listening = False
+                        subscription.close()
+                        break
                     continue
 
+                self._audio_seconds += len(data) / (2.0 * subscription.sample_rate)
+                if self._stats_interval_sec and self._audio_seconds >= self._next_stats_log:
+                    self._next_stats_log = self._audio_seconds + self._stats_interval_sec
+                    self._log_matcher_stats()
+
                 try:
-                    triggered = False
-                    if self.recognizer.AcceptWaveform(data):
-                        result = json.loads(self.recognizer.Result())
-                        text = result.get("text", "")
+                    chunks, utterance_ended = gate.feed(data) if gate is not None else ([data], False)
+                    triggered = any(self._recognize_chunk(chunk) for chunk in chunks)
+                    if not triggered and utterance_ended:
+                        # Конец фразы по VAD: забираем финальный результат и сбрасываем распознаватель
+                        text = json.loads(self.recognizer.FinalResult()).get("text", "")
                         if self.debug_log and text:
-                            self.logger.debug(f"Kaldi full: {text}")
+                            self.logger.debug(f"Kaldi final: {text}")
                         triggered = self._check_transcript(text)
-                    else:
-                        partial = json.loads(self.recognizer.PartialResult())
-                        ptext = partial.get("partial", "")
-                        if self.debug_log and ptext:
-                            self.logger.debug(f"Kaldi partial: {ptext}")
-                        triggered = self._check_transcript(ptext)
 
                     if triggered:
                         now = time.time()
@@ -380,42 +283,32 @@ class KaldiWakeWordDetector(QObject):
         finally:
             self.logger.debug("Kaldi wake word loop ended")
 
-    def _check_transcript(self, text: str) -> bool:
-        if not text:
-            return False
-        normalized = self._normalize_phrase(text)
-        if not normalized:
-            return False
-        # Быстрая проверка: подстрока
-        for variant in self._wake_variants:
-            if variant in normalized:
-                return True
-        # Нестрогая проверка по словам с расстоянием Левенштейна
-        tokens = normalized.split()
-        for token in tokens:
-            for variant in self._wake_variants:
-                if self._levenshtein_distance(token, variant) <= self._fuzzy_max_distance:
-                    return True
-        return False
+    def _recognize_chunk(self, data: bytes) -> bool:
+        if self.recognizer.AcceptWaveform(data):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if self.debug_log and text:
+                self.logger.debug(f"Kaldi full: {text}")
+            return self._check_transcript(text)
+        ptext = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if self.debug_log and ptext:
+            self.logger.debug(f"Kaldi partial: {ptext}")
+        return self._check_transcript(ptext)
 
-    @staticmethod
-    def _levenshtein_distance(a: str, b: str) -> int:
-        """Классический алгоритм Левенштейна (O(len(a)*len(b)))."""
-        if a == b:
-            return 0
-        if len(a) == 0:
-            return len(b)
-        if len(b) == 0:
-            return len(a)
-        # Инициализация DP-таблицы
-        prev = list(range(len(b) + 1))
-        for i, ca in enumerate(a, 1):
-            cur = [i]
-            for j, cb in enumerate(b, 1):
-                cost = 0 if ca == cb else 1
-                cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost))  # удаление  # вставка  # замена
-            prev = cur
-        return prev[-1]
+    def _check_transcript(self, text: str) -> bool:
+        # Префиксное дерево вариантов + кэш слов; из partial проверяются только новые слова
+        return self._matcher.match(text)
+
+    def get_matcher_stats(self) -> dict:
+        """Стоимость сопоставления транскриптов (мс CPU на секунду прослушанного аудио)"""
+        return self._matcher.get_stats(self._audio_seconds)
+
+    def _log_matcher_stats(self):
+        stats = self.get_matcher_stats()
+        if stats.get("audio_sec"):
+            self.logger.info(
+                f"Wake word matcher: {stats['cpu_ms_per_audio_sec']} ms per audio second "
+                f"({stats['calls']} checks, {stats['tokens_evaluated']} evaluated, {stats['cache_hits']} cached)"
+            )
 
     @staticmethod
     def _normalize_phrase(text: str) -> str:
@@ -436,6 +329,7 @@ class KaldiWakeWordDetector(QObject):
         self._base_wake_word = wake_word
         self.config.set("stt.wake_word", wake_word)
         self._wake_variants = self._build_variant_list(self._wake_variants)
+        self._matcher = WakeWordMatcher(self._wake_variants, self._fuzzy_max_distance)
         self._create_recognizer()
 
         if was_listening:
@@ -447,6 +341,7 @@ class KaldiWakeWordDetector(QObject):
             self.stop_detection()
 
         self._wake_variants = self._build_variant_list(variants)
+        self._matcher = WakeWordMatcher(self._wake_variants, self._fuzzy_max_distance)
         try:
             self.config.set("stt.kaldi_wake_words", self._wake_variants)
         except Exception:
@@ -0,0 +1,132 @@
+"""
+Incremental wake word matcher
+
+Partial-результаты Kaldi приходят на каждый чанк и почти всегда продолжают
+предыдущий текст («привет ар» -> «привет арвис»). Поэтому:
+- варианты wake word один раз собираются в префиксное дерево, нечёткое сравнение
+  слова идёт обходом дерева с одной строкой DP Левенштейна на узел и отсечением
+  ветвей, где минимум строки уже больше допустимой дистанции (автомат Левенштейна);
+- результат по слову кэшируется (слова в partial повторяются десятки раз);
+- уже проверенный префикс транскрипта запоминается: при следующем partial
+  оцениваются только изменившиеся и новые слова.
+
+Семантика как у прежней проверки: вариант — подстрока нормализованного текста,
+или слово текста на расстоянии Левенштейна не больше max_distance от варианта.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional
+
+_TOKEN_CACHE_LIMIT = 4096
+
+
+class _TrieNode:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terminal = False
+
+
+class WakeWordMatcher:
+    """Проверка транскриптов на wake word: trie + ограниченный Левенштейн + память префикса"""
+
+    def __init__(self, variants: Iterable[str], max_distance: int = 1):
+        self.max_distance = max(0, int(max_distance))
+        self.variants: List[str] = list(dict.fromkeys(v for v in (self.normalize(x) for x in variants) if v))
+        self._root = _TrieNode()
+        for variant in self.variants:
+            node = self._root
+            for ch in variant:
+                node = node.children.setdefault(ch, _TrieNode())
+            node.terminal = True
+        self._word_variants = [v for v in self.variants if " " not in v]
+        self._phrase_variants = [v for v in self.variants if " " in v]
+        self._phrase_span = max((len(v.split()) for v in self._phrase_variants), default=1)
+        self._token_cache: Dict[str, bool] = {}
+        self._prev_tokens: List[str] = []
+        # Статистика для оценки стоимости на секунду аудио
+        self.calls = 0
+        self.tokens_evaluated = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(str(text).strip().lower().split())
+
+    def reset(self):
+        """Забыть проверенный префикс (новая фраза / новый распознаватель)"""
+        self._prev_tokens = []
+
+    def match(self, text: str) -> bool:
+        if not text:
+            return False
+        start = time.perf_counter()
+        try:
+            return self._match(self.normalize(text).split())
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - start
+
+    def _match(self, tokens: List[str]) -> bool:
+        if not tokens or not self.variants:
+            return False
+        # Общий префикс с прошлым (несовпавшим) транскриптом уже проверен
+        prev = self._prev_tokens
+        first = 0
+        limit = min(len(prev), len(tokens))
+        while first < limit and prev[first] == tokens[first]:
+            first += 1
+
+        matched = False
+        for token in tokens[first:]:
+            if self._token_matches(token):
+                matched = True
+                break
+        if not matched and self._phrase_variants:
+            tail = " ".join(tokens[max(0, first - self._phrase_span + 1) :])
+            matched = any(variant in tail for variant in self._phrase_variants)
+
+        self._prev_tokens = [] if matched else tokens
+        return matched
+
+    def _token_matches(self, token: str) -> bool:
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        self.tokens_evaluated += 1
+        result = any(variant in token for variant in self._word_variants) or self._within_distance(token)
+        if len(self._token_cache) >= _TOKEN_CACHE_LIMIT:
+            self._token_cache.clear()
+        self._token_cache[token] = result
+        return result
+
+    def _within_distance(self, token: str) -> bool:
+        """Есть ли вариант на расстоянии <= max_distance: обход trie со строками DP"""
+        limit = self.max_distance
+        first_row = list(range(len(token) + 1))
+        stack = [(child, ch, first_row) for ch, child in self._root.children.items()]
+        while stack:
+            node, ch, prev_row = stack.pop()
+            row = [prev_row[0] + 1]
+            for j, tc in enumerate(token, 1):
+                row.append(min(row[j - 1] + 1, prev_row[j] + 1, prev_row[j - 1] + (tc != ch)))
+            if node.terminal and row[-1] <= limit:
+                return True
+            if min(row) <= limit:
+                stack.extend((child, next_ch, row) for next_ch, child in node.children.items())
+        return False
+
+    def get_stats(self, audio_seconds: Optional[float] = None) -> dict:
+        stats = {
+            "calls": self.calls,
+            "tokens_evaluated": self.tokens_evaluated,
+            "cache_hits": self.cache_hits,
+            "cpu_ms": round(self.seconds * 1000.0, 3),
+        }
+        if audio_seconds:
+            stats["audio_sec"] = round(audio_seconds, 3)
+            stats["cpu_ms_per_audio_sec"] = round(self.seconds * 1000.0 / audio_seconds, 4)
+        return stats
@@ -2,18 +2,38 @@
 Weather module for Arvis
 """
 
+import re
 from datetime import datetime
-from typing import Any, Dict, Optional
-
-import requests
+from typing import Any, Dict, List, Optional, Sequence
 
 from config.config import Config
+from utils.fetch_cache import ERROR_CONNECTION, ERROR_TIMEOUT, get_fetcher
 from utils.logger import ModuleLogger
 
 
 class WeatherModule:
     """Weather information module using OpenWeatherMap API"""
 
+    # Триггеры интента "weather" (IntentRouter) и разбор города из фразы
+    INTENT_TRIGGERS = ("погода", "температура", "weather")
+    CITY_PREPOSITIONS = ("в", "во", "in", "для")
+    # Слова после предлога, которые не бывают городом («погода в выходные», «в течение дня», «в градусах»):
+    # отсекаются до запроса к API, иначе каждая форма слова — отдельный запрос с ответом 404
+    _NOT_CITY_RE = re.compile(
+        r"понедельник|вторник|сред[уаеы]|четверг|пятниц[уаеы]|суббот[уаеы]|воскресень[ея]"
+        r"|выходн\w*|будн\w*|праздник\w*|ближайш\w*|следующ\w*|течени[ея]|начал[еао]|конц[еау]"
+        r"|январ[ьея]|феврал[ьея]|март[еа]?|апрел[ьея]|ма[йея]|июн[ьея]|июл[ьея]|август[еа]?"
+        r"|сентябр[ьея]|октябр[ьея]|ноябр[ьея]|декабр[ьея]"
+        r"|утр[оаеу]|вечер[оаеу]?|ноч[ьи]|полдень|обед|цел(?:ом|ый)|средн\w*"
+        r"|градус\w*|цельси\w*|фаренгейт\w*|город[еау]?|мир[еау]?|стран[еау]|регион[еау]?|район[еау]?"
+        r"|дом[еау]?|квартир[еау]|комнат[еау]|офис[еау]?|помещени[ия]"
+        r"|эт(?:от|и|у|ом|ой)|т(?:от|у|ом|ой)|наш\w*|мо(?:ей|ём|ем)|тво\w*|котор\w*|как\w*"
+    )
+    # Основы (после отбрасывания -е), которые у названий городов обычно женского рода:
+    # «в москве» -> москва, «в одессе» -> одесса, но «в киеве» -> киев, «в минске» -> минск
+    _FEMININE_STEM_ENDINGS = ("кв", "ав", "сс", "аг", "иг", "уг", "уф", "нн", "иц", "тк", "лт")
+    _UNKNOWN_CITIES_LIMIT = 256
+
     def __init__(self, config: Config):
         self.config = config
         self.logger = ModuleLogger("WeatherModule")
@@ -25,8 +45,29 @@ class WeatherModule:
         self.lang = "ru"
         self.brief = config.get("weather.brief", True)
 
-        self.session = requests.Session()
+        # Общий пул соединений и кэш ответов (utils.fetch_cache)
+        self.fetcher = get_fetcher(config)
         self.request_timeout = 10
+        self.cache_ttl = float(config.get("weather.cache_ttl_sec", 600) or 0)
+        # Формы, которые OpenWeatherMap не знает (404): повторно не запрашиваем
+        self._unknown_cities: set = set()
+        self._schedule_default_refresh()
+
+    def _params(self, city: str) -> Dict[str, Any]:
+        return {"q": city, "appid": self.api_key, "units": self.units, "lang": self.lang}
+
+    def _schedule_default_refresh(self):
+        """Держать погоду для города по умолчанию тёплой в кэше"""
+        if not self.api_key or not self.cache_ttl or not self.config.get("fetch.refresh_defaults", True):
+            self.fetcher.unregister_refresh("weather.default_city")
+            return
+        self.fetcher.register_refresh(
+            "weather.default_city",
+            self.api_url,
+            self._params(self.default_city),
+            interval=self.cache_ttl * 0.9,
+            timeout=self.request_timeout,
+        )
 
     def get_weather(self, city: Optional[str] = None) -> str:
         """Get current weather information"""
@@ -38,30 +79,76 @@ class WeatherModule:
         try:
             self.logger.info(f"Getting weather for {target_city}")
 
-            # Prepare request parameters
-            params = {"q": target_city, "appid": self.api_key, "units": self.units, "lang": self.lang}
+            # Make API request (повторный вопрос в пределах weather.cache_ttl_sec — из кэша)
+            result = self.fetcher.get(
+                self.api_url, params=self._params(target_city), ttl=self.cache_ttl, timeout=self.request_timeout
+            )
 
-            # Make API request
-            response = self.session.get(self.api_url, params=params, timeout=self.request_timeout)
+            if result.error_kind == ERROR_TIMEOUT:
+                return "❌ Превышено время ожидания при запросе погоды."
+            elif result.error_kind == ERROR_CONNECTION:
+                return "❌ Нет подключения к интернету для получения погоды."
+            elif result.error_kind:
+                raise RuntimeError(result.error)
 
-            if response.status_code == 200:
-                data = response.json()
+            if result.status_code == 200:
+                data = result.data
                 return self.format_weather_brief_response(data) if self.brief else self.format_weather_response(data)
-            elif response.status_code == 401:
+            elif result.status_code == 401:
                 return "❌ Неверный API ключ для погоды. Проверьте настройки."
-            elif response.status_code == 404:
+            elif result.status_code == 404:
                 return f"❌ Город '{target_city}' не найден. Проверьте название города."
             else:
-                return f"❌ Ошибка получения погоды: {response.status_code}"
+                return f"❌ Ошибка получения погоды: {result.status_code}"
 
-        except requests.exceptions.Timeout:
-            return "❌ Превышено время ожидания при запросе погоды."
-        except requests.exceptions.ConnectionError:
-            return "❌ Нет подключения к интернету для получения погоды."
         except Exception as e:
             self.logger.error(f"Weather API error: {e}")
             return f"❌ Ошибка при получении погоды: {str(e)}"
 
+    @classmethod
+    def city_candidates(cls, tokens: Sequence[str]) -> List[str]:
+        """Варианты названия города из слова после предлога: «в киеве» -> киев, киева, киеве
+
+        Распознавание даёт косвенный падеж; окончание -е пробуем заменить на «» и «а»
+        (более вероятная форма — первой). Слова, которые не бывают городом, отсекаются.
+        """
+        for prev, word in zip(tokens, tokens[1:]):
+            if prev not in cls.CITY_PREPOSITIONS or len(word) < 3 or not word.isalpha():
+                continue
+            if cls._NOT_CITY_RE.fullmatch(word):
+                continue
+            if word.endswith("е"):
+                stem = word[:-1]
+                if stem.endswith(cls._FEMININE_STEM_ENDINGS):
+                    return [stem + "а", stem, word]
+                return [stem, stem + "а", word]
+            return [word]
+        return []
+
+    def get_weather_for_candidates(self, candidates: Sequence[str]) -> str:
+        """Погода для варианта города, который знает OpenWeatherMap, иначе — для города по умолчанию
+
+        За вызов — не больше одного запроса с ответом 404: варианты отсортированы по
+        вероятности, а отвергнутая форма запоминается, так что следующий такой же вопрос
+        сразу пробует следующую форму.
+        """
+        if self.api_key:
+            for city in candidates:
+                if city in self._unknown_cities:
+                    continue
+                result = self.fetcher.get(
+                    self.api_url, params=self._params(city), ttl=self.cache_ttl, timeout=self.request_timeout
+                )
+                if result.status_code == 200:
+                    # Ответ уже в кэше — get_weather его только форматирует
+                    return self.get_weather(city)
+                if result.status_code == 404:
+                    if len(self._unknown_cities) >= self._UNKNOWN_CITIES_LIMIT:
+                        self._unknown_cities.clear()
+                    self._unknown_cities.add(city)
+                break
+        return self.get_weather()
+
     def format_weather_response(self, data: Dict[str, Any]) -> str:
         """Format weather API response into readable text"""
         try:
@@ -168,13 +255,14 @@ class WeatherModule:
                 "cnt": days * 8,  # 8 forecasts per day (every 3 hours)
             }
 
-            response = self.session.get(forecast_url, params=params)
+            result = self.fetcher.get(forecast_url, params=params, ttl=self.cache_ttl, timeout=self.request_timeout)
+            if result.error_kind:
+                raise RuntimeError(result.error)
 
-            if response.status_code == 200:
-                data = response.json()
-                return self.format_forecast_response(data, days)
+            if result.status_code == 200:
+                return self.format_forecast_response(result.data, days)
             else:
-                return f"❌ Ошибка получения прогноза: {response.status_code}"
+                return f"❌ Ошибка получения прогноза: {result.status_code}"
 
         except Exception as e:
             self.logger.error(f"Forecast API error: {e}")
@@ -223,12 +311,14 @@ class WeatherModule:
         self.api_key = api_key
         self.config.set("weather.api_key", api_key)
         self.logger.info("Weather API key updated")
+        self._schedule_default_refresh()
 
     def set_default_city(self, city: str):
         """Set default city for weather"""
         self.default_city = city
         self.config.set("weather.default_city", city)
         self.logger.info(f"Default city set to: {city}")
+        self._schedule_default_refresh()
 
     def test_api_connection(self) -> bool:
         """Test weather API connection"""
@@ -238,8 +328,9 @@ class WeatherModule:
         try:
             params = {"q": "London", "appid": self.api_key, "units": self.units}
 
-            response = self.session.get(self.api_url, params=params, timeout=self.request_timeout)
-            return response.status_code == 200
+            # get_status дёргается часто — результат проверки живёт минуту
+            result = self.fetcher.get(self.api_url, params=params, ttl=60, stale_sec=0, timeout=self.request_timeout)
+            return result.status_code == 200
 
         except Exception as e:
             self.logger.error(f"API test failed: {e}")
@@ -253,13 +344,14 @@ class WeatherModule:
         try:
             params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": self.units, "lang": self.lang}
 
-            response = self.session.get(self.api_url, params=params, timeout=self.request_timeout)
+            result = self.fetcher.get(self.api_url, params=params, ttl=self.cache_ttl, timeout=self.request_timeout)
+            if result.error_kind:
+                raise RuntimeError(result.error)
 
-            if response.status_code == 200:
-                data = response.json()
-                return self.format_weather_response(data)
+            if result.status_code == 200:
+                return self.format_weather_response(result.data)
             else:
-                return f"❌ Ошибка получения погоды по координатам: {response.status_code}"
+                return f"❌ Ошибка получения погоды по координатам: {result.status_code}"
 
         except Exception as e:
             self.logger.error(f"Weather by coordinates error: {e}")
@@ -268,8 +360,8 @@ class WeatherModule:
     def cleanup(self):
         """Cleanup weather module resources"""
         try:
-            if self.session:
-                self.session.close()
+            # Пул соединений общий (utils.fetch_cache) — снимаем только своё фоновое обновление
+            self.fetcher.unregister_refresh("weather.default_city")
             self.logger.info("Weather module cleanup complete")
         except Exception as e:
             self.logger.error(f"Error during weather cleanup: {e}")
@@ -0,0 +1,125 @@
+"""
+Микробенчмарк доступа к SQLite: validate_session и выборки календаря
+
+Заполняет временные users.db / calendar.db (сессии, напоминания, события) и печатает
+p50 / p99 для горячих запросов. Рабочие data/ не затрагиваются: скрипт работает
+во временном каталоге.
+
+    python scripts/bench_sqlite_access.py
+    python scripts/bench_sqlite_access.py --sessions 2000 --reminders 20000 --events 5000
+
+Для сравнения «до / после» запустите тот же скрипт на другой ревизии
+(git worktree add /tmp/arvis-before <commit>).
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def measure(fn: Callable[[], object], iterations: int) -> str:
+    """p50 / p99 времени вызова fn"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {p50 * 1e6:8.0f} us   p99 {p99 * 1e6:8.0f} us"
+
+
+def make_config(session_cache: bool) -> SimpleNamespace:
+    settings = {"audit.enabled": False, "auth.cache.enabled": session_cache}
+    return SimpleNamespace(get=lambda key, default=None: settings.get(key, default))
+
+
+def bench_sessions(args):
+    from utils.security.auth import AuthManager, Session
+    from utils.security.rbac import Role
+
+    # По умолчанию без кэша сессий — мерится именно запрос к users.db
+    auth = AuthManager(make_config(session_cache=args.session_cache))
+    user = auth.create_user("bench", "Bench-Passw0rd!42", Role.USER)
+    now = datetime.now()
+    for i in range(args.sessions):
+        auth.storage.save_session(Session(f"s{i}", user.user_id, now, now + timedelta(hours=1)))
+
+    session_id = f"s{args.sessions // 2}"
+    assert auth.validate_session(session_id) is not None
+    print(f"validate_session        {measure(lambda: auth.validate_session(session_id), args.iterations)}")
+
+    close = getattr(auth, "close", None)
+    if close is not None:
+        close()
+
+
+def bench_calendar(args):
+    from modules.calendar_module import CalendarModule
+
+    calendar = CalendarModule(make_config(session_cache=False))
+    now = datetime.now()
+    # Напоминания и события равномерно раскиданы вокруг «сейчас», каждое третье выполнено
+    reminders = [
+        (f"r{i}", "", (now + timedelta(minutes=53 * (i - args.reminders // 2))).isoformat(), i % 3 == 0)
+        for i in range(args.reminders)
+    ]
+    events = [
+        (f"e{i}", "", (now + timedelta(minutes=97 * (i - args.events // 2))).isoformat()) for i in range(args.events)
+    ]
+    with sqlite3.connect(calendar.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO reminders (title, description, datetime, is_completed) VALUES (?, ?, ?, ?)", reminders
+        )
+        conn.executemany("INSERT INTO events (title, description, start_datetime) VALUES (?, ?, ?)", events)
+    conn.close()
+
+    slow = max(1, args.iterations // 4)
+    print(f"get_upcoming_reminders  {measure(lambda: calendar.get_upcoming_reminders(7), slow)}")
+    print(f"get_today_schedule      {measure(calendar.get_today_schedule, slow)}")
+    print(f"get_overdue_reminders   {measure(calendar.get_overdue_reminders, max(1, slow // 2))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000, help="сколько сессий создать")
+    parser.add_argument("--reminders", type=int, default=20000, help="сколько напоминаний создать")
+    parser.add_argument("--events", type=int, default=5000, help="сколько событий создать")
+    parser.add_argument("--iterations", type=int, default=2000, help="повторов validate_session")
+    parser.add_argument("--session-cache", action="store_true", help="мерить validate_session с кэшем сессий")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory(prefix="arvis-bench-") as workdir:
+        # data/users.db и data/calendar.db открываются относительно текущего каталога
+        os.chdir(workdir)
+        print(f"{args.sessions} sessions, {args.reminders} reminders, {args.events} events")
+        try:
+            bench_sessions(args)
+            bench_calendar(args)
+        finally:
+            # На ревизиях до пула соединений utils.sqlite_pool ещё нет
+            try:
+                from utils.sqlite_pool import close_pools
+
+                close_pools()
+            except ImportError:
+                pass
+            os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
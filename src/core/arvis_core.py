@@ -8,7 +8,7 @@ import time
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
 from PyQt6.QtWidgets import QApplication
 
 
@@ -23,6 +23,7 @@ class GenerationState(Enum):
 
 from config.config import Config
 from i18n import _
+from modules.audio_bus import get_audio_bus
 from modules.calendar_module import CalendarModule
 from modules.llm_client import LLMClient
 from modules.news_module import NewsModule
@@ -32,10 +33,22 @@ from modules.system_control import SystemControlModule
 from modules.tts_engine import TTSEngine
 from modules.tts_factory import TTSFactory  # NEW: Factory pattern (Days 4-5)
 from modules.tts_base import TTSEngineBase  # NEW: Base class for type hints
+from modules.tts_pipeline import StreamingTTSPipeline
 from modules.wake_word_detector import KaldiWakeWordDetector
 from modules.weather_module import WeatherModule
 from utils.conversation_history import ConversationHistory
+from utils.fetch_cache import shutdown_fetcher
+from utils.intent_router import IntentMatch, IntentRouter, IntentSpec
+from utils.llm_request_engine import (
+    REASON_CANCELLED,
+    REASON_PREEMPTED,
+    REASON_TIMEOUT,
+    LLMRequestPriority,
+    get_llm_request_engine,
+)
 from utils.logger import ModuleLogger
+from utils.startup_graph import StartupGraph, StartupResult
+from utils.tracing import get_tracer
 from utils.security import (
     AuditEventType,
     AuditSeverity,
@@ -46,13 +59,15 @@ from utils.security import (
     get_rbac_manager,
 )
 
+from .fast_path import FastPathResponder
+
 
 class ArvisCore(QObject):
     """Main core class for Arvis functionality"""
 
     # Signals
     response_ready = pyqtSignal(str)
-    partial_response = pyqtSignal(str)
+    partial_response = pyqtSignal(str)  # Только новая порция текста стрима (дельта)
     processing_started = pyqtSignal()
     processing_finished = pyqtSignal()
     status_changed = pyqtSignal(dict)
@@ -60,6 +75,7 @@ class ArvisCore(QObject):
     voice_activation_detected = pyqtSignal()
     voice_message_recognized = pyqtSignal(str)  # Сигнал для распознанного голосового сообщения
     components_initialized = pyqtSignal()
+    component_ready = pyqtSignal(str, bool, float)  # узел графа запуска, успех, секунды
     stt_model_ready = pyqtSignal(str)
     voice_assets_ready = pyqtSignal()
     tts_engine_switched = pyqtSignal(str)  # NEW: Emits engine type when switched
@@ -103,6 +119,8 @@ class ArvisCore(QObject):
         self._tts_engine_type: Optional[str] = None  # Track current engine type
         self._available_tts_engines: List[str] = []  # Available engines from config
         self._tts_engine_priority: List[str] = []  # Fallback priority list
+        # Конвейер потоковой озвучки ответа LLM (создаётся лениво под текущий движок)
+        self._tts_pipeline: Optional[StreamingTTSPipeline] = None
 
         # Modules
         self.weather_module = None
@@ -110,6 +128,12 @@ class ArvisCore(QObject):
         self.system_control_module = None
         self.calendar_module = None
         self.search_module = None
+        # Маршрутизатор команд модулей (одно дерево терминов по словарям всех интентов)
+        self.intent_router = IntentRouter(cache_size=int(config.get("performance.intent_cache_size", 512) or 0))
+        self._register_builtin_intents()
+        # Быстрые ответы без LLM (время, дата, расписание, сведения о системе)
+        self.fast_path = FastPathResponder(self, config)
+        self.fast_path.register(self.intent_router)
 
         # Conversation history manager (с постоянным хранением)
         self.conversation_history_manager = ConversationHistory(config)
@@ -125,8 +149,13 @@ class ArvisCore(QObject):
         # Источник начала записи: 'none' | 'user' | 'wake'
         self._recording_source = "none"
         # LLM stream/autocontinue state
+        self._current_llm_request = None  # Активный запрос в LLMRequestEngine
+        # Трассировка задержек хода: wake word -> STT -> LLM -> TTS (performance.tracing.*)
+        self.tracer = get_tracer(config)
+        self._ack_span = None
         self._is_streaming_current = False
-        self._stream_buffer_text = ""
+        # Порции текущего стрима (склеиваются только при необходимости)
+        self._stream_chunks: List[str] = []
         self._auto_continue_attempts = 0
         self._pending_search_results: Optional[Dict[str, Any]] = None
         try:
@@ -150,6 +179,9 @@ class ArvisCore(QObject):
         self._ready_greeting_pending = True
         self._initial_ack_retry_attempts = 0
 
+        # Граф параллельной инициализации компонентов (init_components_async)
+        self._startup_graph: Optional[StartupGraph] = None
+
         # Async task manager
         from utils.async_manager import task_manager
 
@@ -180,184 +212,197 @@ class ArvisCore(QObject):
             pass
 
     def init_components_async(self):
-        """Initialize all core components asynchronously"""
-
-        def init_task():
-            try:
-                self.logger.info("Initializing Arvis core components...")
-
-                # Initialize LLM client (быстро)
-                self.llm_client = LLMClient(self.config)
-                self.logger.info("LLM client initialized")
-
-                # Initialize TTS engine using Factory pattern (Days 4-5: NEW)
-                self.logger.info("Initializing TTS engine using Factory pattern...")
-                try:
-                    self._build_engine_priority_list()
-                    engine_type = self.config.get("tts.default_engine", "silero")
-                    
-                    # Query server for engine negotiation (if hybrid mode)
-                    if self.config.get("auth.use_remote_server", False):
-                        server_engine = self._negotiate_engine_with_server()
-                        if server_engine:
-                            engine_type = server_engine
-                            self.logger.info(f"Server negotiated engine: {engine_type}")
-                    
-                    # Create engine with fallback
-                    self.tts_engine = self._create_tts_engine_with_fallback(engine_type)
-                    self.logger.info(f"TTS engine initialized: {self._tts_engine_type}")
-                    # Явно предупреждаем, если произошёл фолбэк с выбранного движка
-                    try:
-                        if str(self._tts_engine_type).lower() != str(engine_type).lower():
-                            self.logger.warning(
-                                f"Requested TTS engine '{engine_type}' not used — fell back to '{self._tts_engine_type}'."
-                            )
-                    except Exception:
-                        pass
-                except Exception as e:
-                    self.logger.error(f"Failed to initialize TTS engine: {e}")
-                    # Fallback to basic TTSEngine if factory fails
-                    self.tts_engine = TTSEngine(self.config)
-                    self._tts_engine_type = "legacy"
-                    self.logger.info("TTS engine initialized (fallback to legacy)")
-                # Признак проигрывания TTS можно будет интегрировать при добавлении сигналов в TTSEngine
-
-                # Initialize STT engine (может быть медленно)
-                stt_duration = 0.0
-                stt_start = time.time()
-                try:
-                    self.status_changed.emit({"stt_loading": "started"})
-                except Exception:
-                    pass
-                # Создаём STT engine и сохраняем сильную ссылку
-                stt_instance = STTEngine(self.config)
-                stt_duration = time.time() - stt_start
+        """Initialize all core components asynchronously
 
-                # Проверяем, что объект не был удалён во время создания
-                if stt_instance is None:
-                    self.logger.error("STT engine creation returned None")
-                    raise RuntimeError("STT engine failed to initialize")
-
-                try:
-                    self.status_changed.emit({"stt_loading": "finished", "stt_load_seconds": round(stt_duration, 3)})
-                except Exception:
-                    pass
-
-                self.logger.info(f"STT engine initialized (load {stt_duration:.2f}s)")
-
-                # Подключаем сигналы ДО присваивания self.stt_engine
-                # Распознанная речь → обработка
-                stt_instance.speech_recognized.connect(self.process_voice_input)
+        Компоненты описаны графом зависимостей (utils.startup_graph): независимые узлы
+        (LLM, TTS, STT, модули) грузятся параллельно, детектор wake word ждёт модель STT.
+        О готовности каждого узла сообщает сигнал component_ready(name, ok, seconds).
+        """
+        if self._startup_graph is not None and self._startup_graph.is_running():
+            self.logger.debug("Core initialization already in progress")
+            return
 
-                # Следим за началом/окончанием записи
-                try:
-                    stt_instance.recording_started.connect(lambda: self._set_voice_recording(True))
-                    stt_instance.recording_stopped.connect(lambda: self._set_voice_recording(False))
-                except Exception:
-                    pass
+        self.logger.info("Initializing Arvis core components...")
+        graph = StartupGraph(max_workers=int(self.config.get("startup.init_workers", 4) or 4), name="core_init")
+        graph.add("llm", self._init_llm_component)
+        graph.add("tts", self._init_tts_component)
+        graph.add("stt", self._init_stt_component)
+        graph.add("wake_word", self._init_wake_word_component, depends_on=("stt",))
+        for module_name in self._MODULE_FACTORIES:
+            graph.add(module_name, lambda name=module_name: self._init_module(name))
+        # Конфигурируем голосовую активацию (wake word), когда детектор готов
+        graph.add("voice_activation", self._configure_voice_activation, depends_on=("wake_word",))
+        self._startup_graph = graph
+        graph.run(on_node_done=self._on_startup_node_done, on_finished=self._on_startup_finished)
+
+    def is_component_ready(self, name: str) -> bool:
+        """Узел графа запуска завершился успешно ("llm", "tts", "stt", "wake_word", модули...)"""
+        graph = self._startup_graph
+        result = graph.result(name) if graph is not None else None
+        return bool(result and result.ok)
+
+    def is_component_done(self, name: str) -> bool:
+        """Узел графа запуска завершился (успешно, с ошибкой или пропущен)"""
+        graph = self._startup_graph
+        return graph is not None and graph.result(name) is not None
+
+    def _on_startup_node_done(self, result: StartupResult):
+        if result.ok:
+            self.logger.info(f"Startup: {result.name} ready in {result.seconds:.2f}s")
+        elif result.skipped:
+            self.logger.warning(f"Startup: {result.name} skipped ({result.error})")
+        else:
+            self.logger.error(f"Startup: {result.name} failed after {result.seconds:.2f}s: {result.error}")
+        try:
+            self.component_ready.emit(result.name, result.ok, round(result.seconds, 3))
+        except Exception:
+            pass
 
-                try:
-                    stt_instance.model_ready.connect(self._on_stt_model_ready)
-                except Exception as connect_error:
-                    self.logger.debug(f"Failed to connect STT model_ready signal: {connect_error}")
+    def _on_startup_finished(self, results: Dict[str, StartupResult]):
+        graph = self._startup_graph
+        total = graph.total_seconds if graph is not None else 0.0
+        timings = ", ".join(
+            f"{r.name} {r.seconds:.2f}s" for r in sorted(results.values(), key=lambda r: r.seconds, reverse=True)
+        )
+        busy = sum(r.seconds for r in results.values())
+        self.logger.info(f"Startup finished in {total:.2f}s (nodes busy {busy:.2f}s): {timings}")
+        failed = [name for name, r in results.items() if not r.ok]
+        if failed:
+            self.error_occurred.emit(f"Ошибка инициализации компонентов: {', '.join(failed)}")
+        else:
+            self.logger.info("All core components initialized successfully")
+        try:
+            self.components_initialized.emit()
+        except Exception:
+            pass
 
-                # Только после всех подключений присваиваем self.stt_engine
-                self.stt_engine = stt_instance
-                self.logger.info("STT engine connections established")
+    def _init_llm_component(self):
+        # Initialize LLM client (быстро)
+        self.llm_client = LLMClient(self.config)
+        self.logger.info("LLM client initialized")
 
-                # Initialize Wake Word Detector (для работы с ключевым словом)
-                wake_word_engine = str(self.config.get("stt.wake_word_engine", "vosk") or "vosk").lower()
-                if wake_word_engine == "porcupine":
+    def _init_tts_component(self):
+        # Initialize TTS engine using Factory pattern (Days 4-5: NEW)
+        self.logger.info("Initializing TTS engine using Factory pattern...")
+        try:
+            self._build_engine_priority_list()
+            engine_type = self.config.get("tts.default_engine", "silero")
+
+            # Query server for engine negotiation (if hybrid mode)
+            if self.config.get("auth.use_remote_server", False):
+                server_engine = self._negotiate_engine_with_server()
+                if server_engine:
+                    engine_type = server_engine
+                    self.logger.info(f"Server negotiated engine: {engine_type}")
+
+            # Create engine with fallback
+            self.tts_engine = self._create_tts_engine_with_fallback(engine_type)
+            self.logger.info(f"TTS engine initialized: {self._tts_engine_type}")
+            # Явно предупреждаем, если произошёл фолбэк с выбранного движка
+            try:
+                if str(self._tts_engine_type).lower() != str(engine_type).lower():
                     self.logger.warning(
-                        "Picovoice Porcupine wake word detection is no longer supported; falling back to Vosk."
+                        f"Requested TTS engine '{engine_type}' not used — fell back to '{self._tts_engine_type}'."
                     )
-                    wake_word_engine = "vosk"
-                    try:
-                        self.config.set("stt.wake_word_engine", "vosk")
-                    except Exception:
-                        pass
+            except Exception:
+                pass
+        except Exception as e:
+            self.logger.error(f"Failed to initialize TTS engine: {e}")
+            # Fallback to basic TTSEngine if factory fails
+            self.tts_engine = TTSEngine(self.config)
+            self._tts_engine_type = "legacy"
+            self.logger.info("TTS engine initialized (fallback to legacy)")
+        # Признак проигрывания TTS можно будет интегрировать при добавлении сигналов в TTSEngine
+
+    def _init_stt_component(self):
+        # Initialize STT engine (может быть медленно)
+        stt_duration = 0.0
+        stt_start = time.time()
+        try:
+            self.status_changed.emit({"stt_loading": "started"})
+        except Exception:
+            pass
+        # Создаём STT engine и сохраняем сильную ссылку
+        stt_instance = STTEngine(self.config)
+        stt_duration = time.time() - stt_start
 
-                self.wake_word_detector = None
+        # Проверяем, что объект не был удалён во время создания
+        if stt_instance is None:
+            self.logger.error("STT engine creation returned None")
+            raise RuntimeError("STT engine failed to initialize")
 
-                if wake_word_engine == "kaldi":
-                    self.logger.info("Initializing Kaldi wake word detector...")
-                    # Проверяем, что STT engine всё ещё существует
-                    if self.stt_engine and hasattr(self.stt_engine, "get_model"):
-                        shared_model = self.stt_engine.get_model()
-                    else:
-                        shared_model = None
-                        self.logger.warning("STT engine not available for Kaldi wake word detector")
-
-                    detector = KaldiWakeWordDetector(self.config, shared_model=shared_model)
-                    if detector and detector.is_ready():
-                        detector.wake_word_detected.connect(self._on_wake_word_detected)
-                        self.wake_word_detector = detector
-                        self.logger.info("Kaldi wake word detector initialized")
-                    else:
-                        self.logger.error("Failed to initialize Kaldi wake word detector")
-                        if detector:
-                            try:
-                                detector.cleanup()
-                            except Exception:
-                                pass
+        try:
+            self.status_changed.emit({"stt_loading": "finished", "stt_load_seconds": round(stt_duration, 3)})
+        except Exception:
+            pass
 
-                if not self.wake_word_detector:
-                    # Fallback к встроенному детектору в Vosk
-                    self.logger.info("Using built-in Vosk wake word detection")
-                    if self.stt_engine and hasattr(self.stt_engine, "wake_word_detected"):
-                        try:
-                            self.stt_engine.wake_word_detected.connect(self._on_wake_word_detected)
-                        except Exception as e:
-                            self.logger.warning(f"Failed to connect built-in wake word signal: {e}")
+        self.logger.info(f"STT engine initialized (load {stt_duration:.2f}s)")
 
-                # Initialize modules
-                self.init_modules()
-                # Конфигурируем голосовую активацию (wake word)
-                self._configure_voice_activation()
+        # Подключаем сигналы ДО присваивания self.stt_engine
+        # Распознанная речь → обработка
+        stt_instance.speech_recognized.connect(self.process_voice_input)
 
-                return True
+        # Следим за началом/окончанием записи
+        try:
+            stt_instance.recording_started.connect(lambda: self._set_voice_recording(True))
+            stt_instance.recording_stopped.connect(lambda: self._set_voice_recording(False))
+        except Exception:
+            pass
 
-            except Exception as e:
-                self.logger.error(f"Failed to initialize core components: {e}")
-                return False
+        try:
+            stt_instance.model_ready.connect(self._on_stt_model_ready)
+        except Exception as connect_error:
+            self.logger.debug(f"Failed to connect STT model_ready signal: {connect_error}")
+
+        # Только после всех подключений присваиваем self.stt_engine
+        self.stt_engine = stt_instance
+        self.logger.info("STT engine connections established")
+
+    def _init_wake_word_component(self):
+        # Initialize Wake Word Detector (для работы с ключевым словом)
+        wake_word_engine = str(self.config.get("stt.wake_word_engine", "vosk") or "vosk").lower()
+        if wake_word_engine == "porcupine":
+            self.logger.warning(
+                "Picovoice Porcupine wake word detection is no longer supported; falling back to Vosk."
+            )
+            wake_word_engine = "vosk"
+            try:
+                self.config.set("stt.wake_word_engine", "vosk")
+            except Exception:
+                pass
 
-        def on_init_complete(task_id, result):
-            if task_id == "core_init":
-                # Отключаем сигналы чтобы избежать повторных вызовов
-                try:
-                    self.task_manager.task_completed.disconnect(on_init_complete)
-                    self.task_manager.task_failed.disconnect(on_init_error)
-                except:
-                    pass
+        self.wake_word_detector = None
 
-                if result:
-                    self.logger.info("All core components initialized successfully")
+        if wake_word_engine == "kaldi":
+            self.logger.info("Initializing Kaldi wake word detector...")
+            # Проверяем, что STT engine всё ещё существует
+            if self.stt_engine and hasattr(self.stt_engine, "get_model"):
+                shared_model = self.stt_engine.get_model()
+            else:
+                shared_model = None
+                self.logger.warning("STT engine not available for Kaldi wake word detector")
+
+            detector = KaldiWakeWordDetector(self.config, shared_model=shared_model)
+            if detector and detector.is_ready():
+                detector.wake_word_detected.connect(self._on_wake_word_detected)
+                self.wake_word_detector = detector
+                self.logger.info("Kaldi wake word detector initialized")
+            else:
+                self.logger.error("Failed to initialize Kaldi wake word detector")
+                if detector:
                     try:
-                        self.components_initialized.emit()
+                        detector.cleanup()
                     except Exception:
                         pass
-                else:
-                    self.error_occurred.emit("Ошибка инициализации компонентов")
 
-        def on_init_error(task_id, error):
-            if task_id == "core_init":
-                # Отключаем сигналы чтобы избежать повторных вызовов
+        if not self.wake_word_detector:
+            # Fallback к встроенному детектору в Vosk
+            self.logger.info("Using built-in Vosk wake word detection")
+            if self.stt_engine and hasattr(self.stt_engine, "wake_word_detected"):
                 try:
-                    self.task_manager.task_completed.disconnect(on_init_complete)
-                    self.task_manager.task_failed.disconnect(on_init_error)
-                except:
-                    pass
-
-                self.logger.error(f"Core initialization failed: {error}")
-                self.error_occurred.emit(f"Ошибка инициализации: {error}")
-
-        # Проверяем, не запущена ли уже инициализация
-        if not self.task_manager.is_task_running("core_init"):
-            self.task_manager.task_completed.connect(on_init_complete)
-            self.task_manager.task_failed.connect(on_init_error)
-            self.task_manager.run_async("core_init", init_task)
-        else:
-            self.logger.debug("Core initialization already in progress")
+                    self.stt_engine.wake_word_detected.connect(self._on_wake_word_detected)
+                except Exception as e:
+                    self.logger.warning(f"Failed to connect built-in wake word signal: {e}")
 
     def _set_voice_recording(self, active: bool):
         """Безопасно установить флаг записи и оповестить UI."""
@@ -677,11 +722,13 @@ class ArvisCore(QObject):
             self._last_wake_ts = now
 
             # Не активируемся во время проигрывания TTS или активной обработки
-            if self._is_tts_playing or self.is_processing:
+            pipeline_active = self._tts_pipeline is not None and self._tts_pipeline.is_active()
+            if self._is_tts_playing or pipeline_active or self.is_processing:
                 self.logger.debug("Wake ignored: TTS playing or processing in progress")
                 return
 
             self.logger.info("Wake word detected, preparing acknowledgement")
+            self.tracer.begin_turn("voice_turn", source="wake")
 
             # ОСТАНАВЛИВАЕМ СЛЕЖЕНИЕ ЗА WAKE WORD ПЕРЕД ОТВЕТОМ
             try:
@@ -727,6 +774,7 @@ class ArvisCore(QObject):
         # Обработка пустого ввода (пользователь молчал)
         if not text.strip():
             self.logger.info("No speech detected from user, restarting wake word detection")
+            self.tracer.end_turn(status="no_speech")
             # Перезапуск wake word listening после короткой задержки
             QTimer.singleShot(300, lambda: self._restart_wake_listening_if_enabled())
             return
@@ -753,6 +801,7 @@ class ArvisCore(QObject):
 
             if is_name_only:
                 self.logger.info("Detected name-only call, responding...")
+                self.tracer.end_turn(status="name_only")
                 self._respond_to_name_only()
                 return
         except Exception as e:
@@ -818,34 +867,34 @@ class ArvisCore(QObject):
             # При ошибке пытаемся просто начать слушать
             self.toggle_voice_recording(source="wake")
 
-    def init_modules(self):
-        """Initialize functional modules"""
+    # Узел графа запуска -> (атрибут, класс модуля); модули не зависят друг от друга
+    _MODULE_FACTORIES = {
+        "weather": ("weather_module", WeatherModule),
+        "news": ("news_module", NewsModule),
+        "system_control": ("system_control_module", SystemControlModule),
+        "calendar": ("calendar_module", CalendarModule),
+        "search": ("search_module", SearchModule),
+    }
+
+    def _init_module(self, name: str):
+        attr, factory = self._MODULE_FACTORIES[name]
         try:
-            # Weather module
-            self.weather_module = WeatherModule(self.config)
-
-            # News module
-            self.news_module = NewsModule(self.config)
-
-            # System control module
-            self.system_control_module = SystemControlModule(self.config)
-
-            # Calendar module
-            self.calendar_module = CalendarModule(self.config)
+            module = factory(self.config)
+        except Exception:
+            setattr(self, attr, None)
+            raise
+        setattr(self, attr, module)
+        if name == "search" and not module.is_enabled():
+            self.logger.info("Search module initialized but currently disabled")
 
-            # Web search module
+    def init_modules(self):
+        """Initialize functional modules (последовательно; при старте их грузит граф запуска)"""
+        for name in self._MODULE_FACTORIES:
             try:
-                self.search_module = SearchModule(self.config)
-                if not self.search_module.is_enabled():
-                    self.logger.info("Search module initialized but currently disabled")
-            except Exception as search_error:
-                self.search_module = None
-                self.logger.error(f"Failed to initialize search module: {search_error}")
-
-            self.logger.info("All modules initialized")
-
-        except Exception as e:
-            self.logger.error(f"Failed to initialize modules: {e}")
+                self._init_module(name)
+            except Exception as e:
+                self.logger.error(f"Failed to initialize {name} module: {e}")
+        self.logger.info("All modules initialized")
 
     def _update_status_fast(self):
         """Лёгкий монитор ресурсов и предупреждения в UI"""
@@ -890,12 +939,15 @@ class ArvisCore(QObject):
         except Exception:
             pass
 
-    def process_message(self, message: str, is_regeneration: bool = False):
+    def process_message(
+        self, message: str, is_regeneration: bool = False, priority: LLMRequestPriority = LLMRequestPriority.USER
+    ):
         """Process user message with performance monitoring
 
         Args:
             message: User message to process
             is_regeneration: If True, do not add message to history (for retry functionality)
+            priority: Priority of the LLM request (auto-continue uses CONTINUATION)
         """
         # RBAC: Проверка прав на использование чата (v1.5.0+)
         if self.rbac and not self.rbac.has_permission(Permission.CHAT_USE):
@@ -950,154 +1002,208 @@ class ArvisCore(QObject):
 
         # Сброс счетчиков автопродолжения и буфера на новый запрос
         self._auto_continue_attempts = 0
-        self._stream_buffer_text = ""
+        self._stream_chunks = []
         self._is_streaming_current = False
 
         self.is_processing = True
         self._processing_start_time = start_time  # Отслеживаем время начала
 
-        # Очищаем предыдущий timeout timer если есть
-        if hasattr(self, "_timeout_timer") and self._timeout_timer:
+        self.processing_started.emit()
+
+        if not self.tracer.current_turn():
+            source = "continuation" if priority == LLMRequestPriority.CONTINUATION else "chat"
+            self.tracer.begin_turn("text_turn", source=source)
+        with self.tracer.span("process_message", chars=len(message), regeneration=is_regeneration):
             try:
-                self._timeout_timer.stop()
-                self._timeout_timer.deleteLater()
-                self._timeout_timer = None
-            except Exception:
-                pass
+                # Add to conversation history только если это НЕ регенерация
+                if not is_regeneration:
+                    self.logger.info(f"Processing message: {message}")
+                    self.conversation_history_manager.add_message("user", message)
+                    # Обновляем временный список для обратной совместимости
+                    self.conversation_history = self.conversation_history_manager.get_all()
+                else:
+                    self.logger.info(f"Regenerating response for: {message}")
+                    # При регенерации НЕ добавляем сообщение пользователя повторно
+
+                # Сбрасываем результаты веб-поиска, ожидая новую обработку
+                self._pending_search_results = None
+
+                # Check if this is a module command (non-AI)
+                with self.tracer.span("handle_module_commands"):
+                    module_response = self.handle_module_commands(message)
+                if module_response:
+                    self.response_ready.emit(module_response)
+                    # Сохраняем ответ модуля в истории
+                    self.conversation_history_manager.add_message(
+                        "assistant", module_response, metadata={"source": "module"}
+                    )
+                    self.conversation_history = self.conversation_history_manager.get_all()
+                    # Finish processing immediately for module commands
+                    self.is_processing = False
+                    self.generation_state = GenerationState.IDLE  # Сбрасываем состояние
+                    self.processing_finished.emit()
+                    # Перезапускаем wake word detection после модульной команды
+                    # Увеличенная задержка (3 сек) дает TTS время озвучить ответ
+                    QTimer.singleShot(3000, lambda: self._restart_wake_listening_if_enabled())
+                    performance_monitor.record_operation_time("module_command", time.time() - start_time)
+                    self.tracer.end_turn(status="module")
+                else:
+                    # Process with LLM (время будет измерено в process_with_llm)
+                    self.process_with_llm(message, priority=priority)
 
-        self.processing_started.emit()
+            except Exception as e:
+                self.logger.error(f"Error processing message: {e}")
+                self.error_occurred.emit(f"Ошибка обработки: {e}")
+                # Ensure proper cleanup
+                self._force_reset_processing_state()
+                performance_monitor.record_operation_time("message_error", time.time() - start_time)
+
+    def _register_builtin_intents(self):
+        """Интенты встроенных модулей; порядок priority повторяет прежнюю цепочку проверок"""
+        router = self.intent_router
+        router.register(
+            IntentSpec(
+                "weather",
+                WeatherModule.INTENT_TRIGGERS,
+                self._handle_weather_intent,
+                priority=50,
+                slots=lambda m: {"city": WeatherModule.city_candidates(m.tokens)},
+                module="weather",
+                denied_message="❌ У вас нет прав для использования модуля погоды (требуется роль User или выше)",
+            )
+        )
+        router.register(
+            IntentSpec(
+                "news",
+                NewsModule.INTENT_TRIGGERS,
+                lambda m: self.news_module.get_news() if self.news_module else None,
+                priority=40,
+                module="news",
+                denied_message="❌ У вас нет прав для использования модуля новостей (требуется роль User или выше)",
+            )
+        )
+        router.register(
+            IntentSpec(
+                "system",
+                SystemControlModule.COMMAND_TRIGGERS,
+                self._handle_system_intent,
+                priority=30,
+                keywords=SystemControlModule.COMMAND_KEYWORDS,
+                slots=lambda m: {"action": SystemControlModule.detect_command_action(m.has)},
+            )
+        )
+        router.register(
+            IntentSpec(
+                "audio",
+                SystemControlModule.AUDIO_TRIGGERS,
+                self._handle_audio_intent,
+                priority=20,
+                keywords=SystemControlModule.AUDIO_KEYWORDS,
+                slots=self._audio_intent_slots,
+            )
+        )
+        router.register(IntentSpec("calendar", CalendarModule.INTENT_TRIGGERS, lambda m: None, priority=10))
+        router.register(IntentSpec("search", SearchModule.TRIGGERS, self._handle_search_intent, fallback=True))
+
+    @staticmethod
+    def _audio_intent_slots(match: IntentMatch) -> Dict[str, Any]:
+        slots: Dict[str, Any] = {"action": SystemControlModule.detect_audio_action(match.has)}
+        # «громкость больше на 20» — шаг в процентах
+        step = next((int(token) for token in match.tokens if token.isdigit()), None)
+        if step and 0 < step <= 100:
+            slots["step"] = step
+        return slots
+
+    def _handle_weather_intent(self, match: IntentMatch) -> Optional[str]:
+        if not self.weather_module:
+            return None
+        city = match.slots.get("city")
+        if city:
+            return self.weather_module.get_weather_for_candidates(city)
+        return self.weather_module.get_weather()
 
+    def _handle_system_intent(self, match: IntentMatch) -> Optional[str]:
+        if not self.system_control_module:
+            return None
+        # Проверка прав будет внутри SystemControlModule
+        action = match.slots.get("action")
+        app_name = self.system_control_module.extract_app_name(match.normalized) if action == "launch" else None
+        return self.system_control_module.execute_command(match.text, action=action, app_name=app_name)
+
+    def _handle_audio_intent(self, match: IntentMatch) -> Optional[str]:
+        if not self.system_control_module:
+            return None
+        return self.system_control_module.control_audio(
+            match.text, action=match.slots.get("action"), step=match.slots.get("step")
+        )
+
+    def _handle_search_intent(self, match: IntentMatch) -> Optional[str]:
+        """Веб-поиск: результаты уходят в контекст LLM, поэтому всегда None"""
+        if not (self.search_module and self.search_module.is_enabled()):
+            return None
         try:
-            # Add to conversation history только если это НЕ регенерация
-            if not is_regeneration:
-                self.logger.info(f"Processing message: {message}")
-                self.conversation_history_manager.add_message("user", message)
-                # Обновляем временный список для обратной совместимости
-                self.conversation_history = self.conversation_history_manager.get_all()
-            else:
-                self.logger.info(f"Regenerating response for: {message}")
-                # При регенерации НЕ добавляем сообщение пользователя повторно
-
-            # Сбрасываем результаты веб-поиска, ожидая новую обработку
-            self._pending_search_results = None
-
-            # Check if this is a module command (non-AI)
-            module_response = self.handle_module_commands(message)
-            if module_response:
-                self.response_ready.emit(module_response)
-                # Сохраняем ответ модуля в истории
-                self.conversation_history_manager.add_message(
-                    "assistant", module_response, metadata={"source": "module"}
+            search_payload = self.search_module.search(match.text)
+            if search_payload and search_payload.get("results"):
+                self._pending_search_results = search_payload
+                self.logger.info(
+                    f"Collected {len(search_payload['results'])} web results for query '{search_payload['query']}'"
                 )
-                self.conversation_history = self.conversation_history_manager.get_all()
-                # Finish processing immediately for module commands
-                self.is_processing = False
-                self.generation_state = GenerationState.IDLE  # Сбрасываем состояние
-                self.processing_finished.emit()
-                # Перезапускаем wake word detection после модульной команды
-                # Увеличенная задержка (3 сек) дает TTS время озвучить ответ
-                QTimer.singleShot(3000, lambda: self._restart_wake_listening_if_enabled())
-                performance_monitor.record_operation_time("module_command", time.time() - start_time)
+                # Продолжаем обработку через LLM, чтобы сформировать ответ с источниками
+            elif search_payload and search_payload.get("error"):
+                self.logger.warning(f"Search module error: {search_payload.get('error')}")
+                self.error_occurred.emit(_("Не удалось выполнить веб-поиск. Проверьте соединение."))
             else:
-                # Process with LLM (время будет измерено в process_with_llm)
-                self.process_with_llm(message)
+                self.logger.info("Search module returned no results")
+                self.error_occurred.emit(_("Мне не удалось найти актуальные источники в сети."))
+        except Exception as search_exception:
+            self.logger.error(f"Search module failure: {search_exception}")
+            self.error_occurred.emit(_("Ошибка веб-поиска: {error}").format(error=search_exception))
+        return None
 
-        except Exception as e:
-            self.logger.error(f"Error processing message: {e}")
-            self.error_occurred.emit(f"Ошибка обработки: {e}")
-            # Ensure proper cleanup
-            self._force_reset_processing_state()
-            performance_monitor.record_operation_time("message_error", time.time() - start_time)
+    def get_fast_path_stats(self) -> Dict[str, Any]:
+        """Сколько ходов обошли LLM и сколько времени это сэкономило"""
+        return self.fast_path.get_stats()
 
     def handle_module_commands(self, message: str) -> Optional[str]:
-        """Handle non-AI module commands with RBAC checks (v1.5.0+)"""
-        message_lower = message.lower()
-
-        # Weather commands - ПРИОРИТЕТ: специализированный модуль
-        if any(word in message_lower for word in ["погода", "температура", "weather"]):
-            # RBAC: Проверка прав на модуль погоды
-            if self.rbac and not self.rbac.can_use_module("weather"):
-                self.logger.warning(f"Permission denied: MODULE_WEATHER for role {self.rbac.get_role()}")
-                if self.audit:
-                    self.audit.log_event(
-                        AuditEventType.PERMISSION_DENIED,
-                        "Attempted to use weather module without permission",
-                        username=self.current_user.username if self.current_user else None,
-                        success=False,
-                        severity=AuditSeverity.INFO,
-                    )
-                return "❌ У вас нет прав для использования модуля погоды (требуется роль User или выше)"
-
-            if self.weather_module:
-                return self.weather_module.get_weather()
+        """Handle non-AI module commands with RBAC checks (v1.5.0+)
 
-        # News commands - ПРИОРИТЕТ: специализированный модуль
-        if any(word in message_lower for word in ["новости", "news"]):
-            # RBAC: Проверка прав на модуль новостей
-            if self.rbac and not self.rbac.can_use_module("news"):
-                self.logger.warning(f"Permission denied: MODULE_NEWS for role {self.rbac.get_role()}")
+        Интент определяет IntentRouter (один проход по всем словарям модулей);
+        обработчик, вернувший None, передаёт ход следующему интенту, а затем LLM.
+        """
+        for match in self.intent_router.route(message):
+            spec = match.spec
+            # RBAC: Проверка прав на модуль
+            if spec.module and self.rbac and not self.rbac.can_use_module(spec.module):
+                self.logger.warning(f"Permission denied: MODULE_{spec.module.upper()} for role {self.rbac.get_role()}")
                 if self.audit:
                     self.audit.log_event(
                         AuditEventType.PERMISSION_DENIED,
-                        "Attempted to use news module without permission",
+                        f"Attempted to use {spec.module} module without permission",
                         username=self.current_user.username if self.current_user else None,
                         success=False,
                         severity=AuditSeverity.INFO,
                     )
-                return "❌ У вас нет прав для использования модуля новостей (требуется роль User или выше)"
-
-            if self.news_module:
-                return self.news_module.get_news()
-
-        # System control commands - ПРИОРИТЕТ: специализированный модуль
-        if any(word in message_lower for word in ["запусти", "открой", "включи", "выключи"]):
-            if self.system_control_module:
-                # Проверка прав будет внутри SystemControlModule
-                return self.system_control_module.execute_command(message)
-
-        # Audio control commands - ПРИОРИТЕТ: специализированный модуль
-        if any(word in message_lower for word in ["громкость", "звук", "музыка"]):
-            if self.system_control_module:
-                return self.system_control_module.control_audio(message)
-
-        # Web search commands - FALLBACK: только если специализированные модули не сработали
-        if self.search_module and self.search_module.is_enabled():
-            try:
-                if self.search_module.should_handle(message):
-                    search_payload = self.search_module.search(message)
-                    if search_payload and search_payload.get("results"):
-                        self._pending_search_results = search_payload
-                        self.logger.info(
-                            f"Collected {len(search_payload['results'])} web results for query '{search_payload['query']}'"
-                        )
-                        # Продолжаем обработку через LLM, чтобы сформировать ответ с источниками
-                        return None
-                    elif search_payload and search_payload.get("error"):
-                        self.logger.warning(f"Search module error: {search_payload.get('error')}")
-                        self.error_occurred.emit(_("Не удалось выполнить веб-поиск. Проверьте соединение."))
-                        return None
-                    else:
-                        self.logger.info("Search module returned no results")
-                        self.error_occurred.emit(_("Мне не удалось найти актуальные источники в сети."))
-                        return None
-            except Exception as search_exception:
-                self.logger.error(f"Search module failure: {search_exception}")
-                self.error_occurred.emit(_("Ошибка веб-поиска: {error}").format(error=search_exception))
-                return None
+                return spec.denied_message
+            response = spec.handler(match)
+            if response is not None:
+                return response
 
         return None
 
-    def process_with_llm(self, message: str):
-        """Process message with LLM"""
+    def process_with_llm(self, message: str, priority: LLMRequestPriority = LLMRequestPriority.USER):
+        """Process message with LLM (через общий LLMRequestEngine: очередь, дедлайны, отмена)"""
         if not self.llm_client:
             self.error_occurred.emit("LLM клиент не инициализирован")
             return
 
+        # Спан живёт до последнего токена/ошибки; колбэки приходят из потоков движка запросов
+        llm_span = self.tracer.start_span("process_with_llm", priority=priority.name)
         try:
             search_payload = self._pending_search_results
 
             # Prepare context
-            context = self.build_context(search_payload)
+            with self.tracer.span("llm.build_context", parent=llm_span):
+                context = self.build_context(search_payload)
 
             # Decide streaming or full-response mode
             use_stream = bool(self.config.get("llm.stream", True))
@@ -1128,44 +1234,28 @@ class ArvisCore(QObject):
             except Exception:
                 pass
 
-            # Run LLM request in a background thread to avoid blocking UI
-            if use_stream:
-                # Check if stream_response method exists
-                if not hasattr(self.llm_client, "stream_response"):
-                    self.logger.error("LLM client does not have stream_response method, falling back to regular mode")
-                    use_stream = False
-
-            if use_stream:
-                worker = _LLMStreamWorker(
-                    llm_client=self.llm_client,
-                    message=message,
-                    context=context,
-                    history=self.conversation_history_manager.get_recent(6),  # Последние 6 для контекста
-                )
-            else:
-                worker = _LLMWorker(
-                    llm_client=self.llm_client,
-                    message=message,
-                    context=context,
-                    history=self.conversation_history_manager.get_recent(6),  # Последние 6 для контекста
-                )
-
-            # Keep a reference to prevent GC
-            self._current_llm_worker = worker
-            self._is_streaming_current = bool(use_stream)
+            history = self.conversation_history_manager.get_recent(6)  # Последние 6 для контекста
 
-            # Set timeout for worker to prevent hanging (configurable)
+            # Таймауты: ожидание первого токена и простой между чанками (настраиваются)
             try:
                 wt = self.config.get("llm.worker_timeout_ms", 45000)
                 worker_timeout_ms = wt if isinstance(wt, int) and wt > 0 else 45000
             except Exception:
                 worker_timeout_ms = 45000
             self._worker_timeout_ms = worker_timeout_ms
+            try:
+                sct = self.config.get("llm.stream_chunk_timeout_ms", None)
+                chunk_timeout_ms = sct if isinstance(sct, int) and sct > 0 else worker_timeout_ms
+            except Exception:
+                chunk_timeout_ms = worker_timeout_ms
+
+            self._is_streaming_current = bool(use_stream)
+            # Колбэки устаревшего запроса (после отмены/сброса) игнорируются
+            request_ref: Dict[str, Any] = {"request": None}
+            llm_span.set(stream=bool(use_stream))
 
-            self._timeout_timer = QTimer()
-            self._timeout_timer.setSingleShot(True)
-            self._timeout_timer.timeout.connect(self._check_worker_timeout)
-            self._timeout_timer.start(worker_timeout_ms)
+            def is_current() -> bool:
+                return request_ref["request"] is not None and request_ref["request"] is self._current_llm_request
 
             def on_success(resp: str):
                 try:
@@ -1175,6 +1265,12 @@ class ArvisCore(QObject):
                             enriched_resp = self._append_search_sources(resp, search_payload)
 
                         self.response_ready.emit(enriched_resp)
+                        started = getattr(self, "_processing_start_time", None)
+                        if started:
+                            from utils.performance_monitor import performance_monitor
+
+                            # Типичное время ответа LLM — база для оценки экономии быстрых ответов
+                            performance_monitor.record_operation_time("llm_response", time.time() - started)
 
                         metadata = {"source": "llm", "model": getattr(self.llm_client, "default_model", "unknown")}
                         if search_payload and search_payload.get("results"):
@@ -1193,6 +1289,7 @@ class ArvisCore(QObject):
                     self._cleanup_processing_state()
 
             def on_error(err: str):
+                llm_span.end(error=err)
                 try:
                     self.logger.error(f"Error processing with LLM (worker): {err}")
                     self.error_occurred.emit(f"Ошибка LLM: {err}")
@@ -1202,38 +1299,40 @@ class ArvisCore(QObject):
                     self._cleanup_processing_state()
 
             if use_stream:
-                # Accumulate chunks; also forward partials
-                buffer = {"text": ""}
-                self._stream_buffer_text = ""
+                # Accumulate chunks; UI получает только новые порции (дельты)
+                chunks: List[str] = []
+                # Общий буфер для возможного автопродолжения/таймаута
+                self._stream_chunks = chunks
+                # Озвучка по предложениям параллельно с генерацией (режим realtime)
+                tts_pipeline = self._get_tts_pipeline()
 
                 def on_chunk(chunk: str):
-                    if not chunk:
+                    if not chunk or not is_current():
                         return
-                    buffer["text"] += chunk
-                    # Дублируем в общий буфер для возможного автопродолжения/таймаута
-                    self._stream_buffer_text = buffer["text"]
-                    # Перезапуск таймаута на каждый чанк (по желанию из конфига отдельный таймаут)
-                    try:
-                        sct = self.config.get("llm.stream_chunk_timeout_ms", None)
-                        chunk_timeout = (
-                            sct if isinstance(sct, int) and sct > 0 else getattr(self, "_worker_timeout_ms", 45000)
-                        )
-                        if hasattr(self, "_timeout_timer") and self._timeout_timer:
-                            self._timeout_timer.stop()
-                            self._timeout_timer.start(chunk_timeout)
-                    except Exception:
-                        pass
-                    self.partial_response.emit(buffer["text"])  # emit accumulated for safety
+                    if not chunks:
+                        llm_span.mark("llm.first_token")
+                    chunks.append(chunk)
+                    if tts_pipeline is not None:
+                        tts_pipeline.feed(chunk)
+                    self.partial_response.emit(chunk)
 
                 def on_done():
+                    if not is_current():
+                        return
+                    llm_span.mark("llm.last_token")
+                    llm_span.end(chunks=len(chunks))
+                    if tts_pipeline is not None:
+                        tts_pipeline.finish()
                     # Проверяем что получили хотя бы какой-то текст
-                    final_text = buffer["text"].strip()
+                    final_text = "".join(chunks).strip()
                     if not final_text:
                         self.logger.warning("Stream completed but no text was received")
                         self.error_occurred.emit("Получен пустой ответ от LLM. Попробуйте повторить запрос.")
-                        # Очистка состояния стрима
+                        # Очистка состояния стрима и хода — иначе is_processing так и останется True
                         self._is_streaming_current = False
-                        self._stream_buffer_text = ""
+                        self._stream_chunks = []
+                        self._pending_search_results = None
+                        self._cleanup_processing_state()
                         return
 
                     # Эвристика: если ответ оборван (нет завершающего знака) и включено автопродолжение
@@ -1264,7 +1363,10 @@ class ArvisCore(QObject):
                             # Завершаем текущий цикл обработки и сразу запускаем продолжение
                             self._cleanup_processing_state()
                             # Небольшая задержка для UI
-                            QTimer.singleShot(100, lambda: self.process_message("Продолжи"))
+                            QTimer.singleShot(
+                                100,
+                                lambda: self.process_message("Продолжи", priority=LLMRequestPriority.CONTINUATION),
+                            )
                             return
                         except Exception as e:
                             self.logger.debug(f"Auto-continue scheduling failed: {e}")
@@ -1272,79 +1374,164 @@ class ArvisCore(QObject):
                     self.logger.info(f"Stream completed successfully with {len(final_text)} characters")
                     # Очистка признаков стрима
                     self._is_streaming_current = False
-                    self._stream_buffer_text = ""
+                    self._stream_chunks = []
                     on_success(final_text)  # finalize
 
-                # Подписываемся на сигналы стрим-воркера (_LLMStreamWorker)
-                if isinstance(worker, _LLMStreamWorker):
-                    worker.chunk.connect(on_chunk)
-                    worker.done.connect(on_done)
-
-                    # Оборачиваем ошибку стрима, чтобы попытаться автопродолжить частичный текст
-                    def _stream_on_error_bridge(err: str):
-                        txt = (buffer.get("text") or "").strip()
-                        if (
-                            txt
-                            and self._auto_continue_enabled
-                            and self._auto_continue_attempts < self._auto_continue_max_attempts
-                        ):
-                            self._auto_continue_attempts += 1
-                            self.logger.warning(
-                                f"LLM stream error; auto-continue attempt #{self._auto_continue_attempts}"
-                            )
-                            try:
-                                self.response_ready.emit(txt)
-                            except Exception:
-                                pass
-                            try:
-                                self.conversation_history.append({"role": "assistant", "content": txt})
-                            except Exception:
-                                pass
-                            self._force_reset_processing_state()
-                            self.error_occurred.emit("⚠️ Ошибка стрима. Продолжаю генерацию...")
-                            QTimer.singleShot(150, lambda: self.process_message("Продолжи"))
-                        else:
-                            on_error(err)
-
-                    worker.error.connect(_stream_on_error_bridge)
-            else:
-                # Подписываемся на сигналы обычного воркера (_LLMWorker)
-                if isinstance(worker, _LLMWorker):
-                    # Для нестримового режима добавляем автопродолжение в on_success
-                    def _non_stream_success_bridge(resp: str):
+                # Оборачиваем ошибку стрима, чтобы попытаться автопродолжить частичный текст
+                def _stream_on_error_bridge(reason: str, err: str):
+                    llm_span.end(reason=reason)
+                    if not is_current() or reason in (REASON_CANCELLED, REASON_PREEMPTED):
+                        return
+                    if tts_pipeline is not None:
+                        tts_pipeline.finish()
+                    if reason == REASON_TIMEOUT:
+                        self._handle_llm_timeout()
+                        return
+                    txt = "".join(chunks).strip()
+                    if (
+                        txt
+                        and self._auto_continue_enabled
+                        and self._auto_continue_attempts < self._auto_continue_max_attempts
+                    ):
+                        self._auto_continue_attempts += 1
+                        self.logger.warning(f"LLM stream error; auto-continue attempt #{self._auto_continue_attempts}")
                         try:
-                            if resp and resp.strip():
-                                text = resp.strip()
-                                if (
-                                    self._auto_continue_enabled
-                                    and not self._is_streaming_current
-                                    and self._auto_continue_attempts < self._auto_continue_max_attempts
-                                    and self._should_auto_continue(text)
-                                    and ("Ошибка" not in text)
-                                    and ("Не удается" not in text)
-                                    and ("Извините" not in text)
-                                ):
-                                    self._auto_continue_attempts += 1
-                                    self.response_ready.emit(text)
-                                    self.conversation_history.append({"role": "assistant", "content": text})
-                                    self.logger.info(
-                                        f"Non-stream auto-continue #{self._auto_continue_attempts} scheduled"
-                                    )
-                                    self._cleanup_processing_state()
-                                    QTimer.singleShot(120, lambda: self.process_message("Продолжи"))
-                                    return
+                            self.response_ready.emit(txt)
                         except Exception:
                             pass
-                        on_success(resp)
+                        try:
+                            self.conversation_history.append({"role": "assistant", "content": txt})
+                        except Exception:
+                            pass
+                        self._force_reset_processing_state()
+                        self.error_occurred.emit("⚠️ Ошибка стрима. Продолжаю генерацию...")
+                        QTimer.singleShot(
+                            150, lambda: self.process_message("Продолжи", priority=LLMRequestPriority.CONTINUATION)
+                        )
+                    else:
+                        on_error(err)
+
+                callbacks = {
+                    "on_chunk": on_chunk,
+                    "on_done": lambda result: on_done(),
+                    "on_error": _stream_on_error_bridge,
+                }
+            else:
+                # Для нестримового режима добавляем автопродолжение в on_success
+                def _non_stream_success_bridge(resp: str):
+                    try:
+                        if resp and resp.strip():
+                            text = resp.strip()
+                            if (
+                                self._auto_continue_enabled
+                                and not self._is_streaming_current
+                                and self._auto_continue_attempts < self._auto_continue_max_attempts
+                                and self._should_auto_continue(text)
+                                and ("Ошибка" not in text)
+                                and ("Не удается" not in text)
+                                and ("Извините" not in text)
+                            ):
+                                self._auto_continue_attempts += 1
+                                self.response_ready.emit(text)
+                                self.conversation_history.append({"role": "assistant", "content": text})
+                                self.logger.info(
+                                    f"Non-stream auto-continue #{self._auto_continue_attempts} scheduled"
+                                )
+                                self._cleanup_processing_state()
+                                QTimer.singleShot(
+                                    120,
+                                    lambda: self.process_message("Продолжи", priority=LLMRequestPriority.CONTINUATION),
+                                )
+                                return
+                    except Exception:
+                        pass
+                    on_success(resp)
 
-                    worker.success.connect(_non_stream_success_bridge)
-                    worker.error.connect(on_error)
-            worker.start()
+                def _non_stream_on_error(reason: str, err: str):
+                    llm_span.end(reason=reason)
+                    if not is_current() or reason in (REASON_CANCELLED, REASON_PREEMPTED):
+                        return
+                    if reason == REASON_TIMEOUT:
+                        self._handle_llm_timeout()
+                        return
+                    on_error(err)
+
+                def _non_stream_on_done(result: Dict[str, Any]):
+                    llm_span.end()
+                    if is_current():
+                        _non_stream_success_bridge(result.get("text", ""))
+
+                callbacks = {"on_done": _non_stream_on_done, "on_error": _non_stream_on_error}
+
+            request = get_llm_request_engine(self.llm_client, self.config).submit(
+                message,
+                context,
+                history,
+                priority=priority,
+                stream=use_stream,
+                first_token_timeout_sec=worker_timeout_ms / 1000.0,
+                idle_timeout_sec=chunk_timeout_ms / 1000.0,
+                # Без стрима прогресса не видно — ограничиваем весь запрос прежним таймаутом
+                deadline_sec=None if use_stream else worker_timeout_ms / 1000.0,
+                **callbacks,
+            )
+            request_ref["request"] = request
+            self._current_llm_request = request
 
         except Exception as e:
+            llm_span.end(error=str(e))
             self.logger.error(f"Error scheduling LLM processing: {e}")
             self.error_occurred.emit(f"Ошибка LLM: {e}")
 
+    def _get_tts_pipeline(self) -> Optional[StreamingTTSPipeline]:
+        """Конвейер потоковой озвучки для режима realtime (None, если озвучивать стрим не нужно)."""
+        engine = self.tts_engine
+        if engine is None:
+            return None
+        # Движок должен уметь отдавать PCM без воспроизведения
+        synth = getattr(type(engine), "synthesize_audio", None)
+        if synth is None or synth is TTSEngineBase.synthesize_audio:
+            return None
+        try:
+            if not bool(self.config.get("tts.pipeline.enabled", True)):
+                return None
+            if not bool(getattr(engine, "tts_enabled", self.config.get("tts.enabled", True))):
+                return None
+            if str(self.config.get("tts.mode", "realtime") or "realtime") != "realtime":
+                return None
+        except Exception:
+            return None
+
+        if self._tts_pipeline is None or self._tts_pipeline.engine is not engine:
+            if self._tts_pipeline is not None:
+                self._tts_pipeline.shutdown()
+            self._tts_pipeline = StreamingTTSPipeline(engine, self.config, on_metrics=self._on_tts_pipeline_metrics)
+        return self._tts_pipeline
+
+    def _stop_tts_pipeline(self):
+        """Прервать потоковую озвучку, если она идёт."""
+        if self._tts_pipeline is not None:
+            try:
+                self._tts_pipeline.stop()
+            except Exception as e:
+                self.logger.debug(f"TTS pipeline stop error: {e}")
+
+    def _on_tts_pipeline_metrics(self, metrics: Dict[str, Any]):
+        """Метрики озвученной реплики (вызывается из потока воспроизведения)."""
+        turn = self.tracer.current_turn()
+        if turn and metrics.get("trace_id") == turn.trace_id and not self.is_processing:
+            self.tracer.end_turn(status="spoken", time_to_first_audio_ms=metrics.get("time_to_first_audio_ms"))
+        ttfa = metrics.get("time_to_first_audio_ms")
+        if ttfa is not None:
+            self.logger.info(
+                f"TTS pipeline: first audio after {ttfa:.0f} ms, "
+                f"{metrics.get('sentences', 0)} sentence(s), {metrics.get('audio_seconds', 0):.1f}s audio"
+            )
+        try:
+            self.status_changed.emit({"tts_pipeline": metrics})
+        except Exception:
+            pass
+
     def _append_search_sources(self, response_text: str, search_payload: Dict[str, Any]) -> str:
         """Append formatted search sources to the assistant response."""
         try:
@@ -1424,10 +1611,11 @@ class ArvisCore(QObject):
 
     # process_voice_input реализован выше с перезапуском wake listening
 
-    def toggle_voice_recording(self, source: str = "user"):
+    def toggle_voice_recording(self, source: str = "user", preroll_since: Optional[float] = None):
         """Toggle voice recording state.
 
         source: 'user' (кнопка) | 'wake' (ключевое слово) — влияет на UI-индикацию.
+        preroll_since: time.monotonic(), раньше которого pre-roll записи не берётся.
         """
         if not self.stt_engine:
             self.error_occurred.emit("STT движок не инициализирован")
@@ -1441,7 +1629,12 @@ class ArvisCore(QObject):
             self.logger.info("Voice recording stopped")
         else:
             self.logger.info(f"Starting voice recording (source: {source})")
-            self.stt_engine.start_recording()
+            if self._ack_span is not None:
+                self._ack_span.end()
+                self._ack_span = None
+            if source == "user":
+                self.tracer.begin_turn("voice_turn", source="button")
+            self.stt_engine.start_recording(preroll_since=preroll_since, trace_parent=self.tracer.current_turn())
             self.is_voice_recording = True
             self._recording_source = "user" if source == "user" else "wake"
             self.logger.info("Voice recording started")
@@ -1450,6 +1643,7 @@ class ArvisCore(QObject):
         """Озвучить фразу подтверждения и после завершения TTS начать запись (wake)."""
         try:
             self.logger.info(f"Speak and start recording: '{phrase}'")
+            self._ack_span = self.tracer.start_span("wake.ack", phrase=phrase)
 
             if self.tts_engine and self.tts_engine.is_ready():
                 clip_used = False
@@ -1479,8 +1673,14 @@ class ArvisCore(QObject):
                         else:
                             self.logger.info("TTS completed, starting recording")
                             # УВЕЛИЧЕННАЯ задержка перед началом записи чтобы микрофон точно не услышал остаток TTS
-                            # 500мс достаточно для завершения проигрывания и очистки аудио буфера
-                            QTimer.singleShot(500, lambda: self.toggle_voice_recording(source="wake"))
+                            # 500мс достаточно для завершения проигрывания и очистки аудио буфера.
+                            # Речь пользователя за это время не теряется: запись берёт pre-roll из общей
+                            # шины микрофона, отбросив только хвост подтверждения (stt.tts_tail_guard_ms)
+                            guard_ms = int(self.config.get("stt.tts_tail_guard_ms", 200) or 0)
+                            since = time.monotonic() + guard_ms / 1000.0
+                            QTimer.singleShot(
+                                500, lambda: self.toggle_voice_recording(source="wake", preroll_since=since)
+                            )
                     except Exception as e:
                         self.logger.error(f"Error in TTS polling: {e}")
                         # Даже при ошибке используем увеличенную задержку
@@ -1499,6 +1699,9 @@ class ArvisCore(QObject):
         """Toggle audio playback state"""
         self.is_audio_playback_paused = not self.is_audio_playback_paused
 
+        if self.is_audio_playback_paused:
+            self._stop_tts_pipeline()
+
         if self.tts_engine:
             if self.is_audio_playback_paused:
                 self.tts_engine.pause()
@@ -1528,9 +1731,13 @@ class ArvisCore(QObject):
 
     def clear_conversation_history(self):
         """Clear conversation history (с архивацией текущей сессии)"""
+        self._stop_tts_pipeline()
         # Очищаем через менеджер (автоматически архивирует)
         self.conversation_history_manager.clear()
         self.conversation_history = []
+        # KV-контекст Ollama описывает старый разговор
+        if self.llm_client and hasattr(self.llm_client, "reset_context"):
+            self.llm_client.reset_context("conversation cleared")
         # Также сбрасываем состояние обработки для чистого старта
         if self.is_processing:
             self._force_reset_processing_state()
@@ -1539,32 +1746,21 @@ class ArvisCore(QObject):
     def _force_reset_processing_state(self):
         """Принудительно сбросить состояние обработки при зависании"""
         try:
-            # Очищаем timeout timer
-            if hasattr(self, "_timeout_timer") and self._timeout_timer:
-                try:
-                    self._timeout_timer.stop()
-                    self._timeout_timer.deleteLater()
-                    self._timeout_timer = None
-                except Exception:
-                    pass
-
-            # Остановить текущий worker если есть
-            if hasattr(self, "_current_llm_worker") and self._current_llm_worker:
+            # Отменить текущий запрос: соединение закрывается, Ollama прекращает генерацию
+            if self._current_llm_request is not None:
                 try:
-                    if hasattr(self._current_llm_worker, "terminate"):
-                        self._current_llm_worker.terminate()
-                    if hasattr(self._current_llm_worker, "quit"):
-                        self._current_llm_worker.quit()
+                    self._current_llm_request.cancel()
                 except Exception as e:
-                    self.logger.debug(f"Error terminating worker: {e}")
+                    self.logger.debug(f"Error cancelling LLM request: {e}")
                 finally:
-                    self._current_llm_worker = None
+                    self._current_llm_request = None
 
             # Сбросить флаги состояния
             self.is_processing = False
             self.generation_state = GenerationState.IDLE  # Сбрасываем состояние генерации
             if hasattr(self, "_processing_start_time"):
                 delattr(self, "_processing_start_time")
+            self.tracer.end_turn(status="reset")
 
             # Уведомить UI о завершении обработки
             self.processing_finished.emit()
@@ -1579,7 +1775,7 @@ class ArvisCore(QObject):
             self.logger.error(f"Error during force reset: {e}")
             # В любом случае сбрасываем флаги
             self.is_processing = False
-            self._current_llm_worker = None
+            self._current_llm_request = None
             # Попытка перезапуска wake word даже при ошибке
             try:
                 QTimer.singleShot(3000, lambda: self._restart_wake_listening_if_enabled())
@@ -1593,8 +1789,11 @@ class ArvisCore(QObject):
             self.generation_state = GenerationState.IDLE  # Сбрасываем состояние генерации
             if hasattr(self, "_processing_start_time"):
                 delattr(self, "_processing_start_time")
-            self._current_llm_worker = None
+            self._current_llm_request = None
             self.processing_finished.emit()
+            # Ход заканчивается с концом озвучки (см. _on_tts_pipeline_metrics), если она идёт
+            if self._tts_pipeline is None or not self._tts_pipeline.is_active():
+                self.tracer.end_turn(status="done")
 
             # Перезапускаем wake word detection после завершения обработки
             # Увеличенная задержка (3 сек) дает TTS время озвучить ответ перед началом прослушивания
@@ -1604,20 +1803,19 @@ class ArvisCore(QObject):
             # Fallback to force reset
             self._force_reset_processing_state()
 
-    def _check_worker_timeout(self):
-        """Проверить таймаут worker и принудительно сбросить если необходимо"""
-        if self.is_processing and hasattr(self, "_current_llm_worker"):
-            if self._current_llm_worker is not None:
+    def _handle_llm_timeout(self):
+        """Запрос оборван по таймауту (LLMRequestEngine): автопродолжение или сброс"""
+        if self.is_processing:
+            if self._current_llm_request is not None:
                 # Если это стрим и у нас есть частичный текст — пробуем автопродолжение
+                partial = "".join(self._stream_chunks).strip() if self._is_streaming_current else ""
                 if (
-                    self._is_streaming_current
-                    and self._stream_buffer_text.strip()
+                    partial
                     and self._auto_continue_enabled
                     and self._auto_continue_attempts < self._auto_continue_max_attempts
                 ):
-                    partial = self._stream_buffer_text.strip()
                     self._auto_continue_attempts += 1
-                    self.logger.warning(f"LLM worker timeout; auto-continue attempt #{self._auto_continue_attempts}")
+                    self.logger.warning(f"LLM request timeout; auto-continue attempt #{self._auto_continue_attempts}")
                     # Завершаем текущий воркер и фиксируем частичный текст в истории
                     self._force_reset_processing_state()
                     try:
@@ -1627,13 +1825,15 @@ class ArvisCore(QObject):
                     # Мягкое уведомление и запуск продолжения
                     self.error_occurred.emit("⏱️ Таймаут. Продолжаю генерацию...")
                     # Очистим буфер и признак стрима, новый запуск создаст свои значения
-                    self._stream_buffer_text = ""
+                    self._stream_chunks = []
                     self._is_streaming_current = False
-                    QTimer.singleShot(150, lambda: self.process_message("Продолжи"))
+                    QTimer.singleShot(
+                        150, lambda: self.process_message("Продолжи", priority=LLMRequestPriority.CONTINUATION)
+                    )
                     return
 
                 # Иначе — обычный сброс и уведомление
-                self.logger.warning("LLM worker timeout detected, forcing reset")
+                self.logger.warning("LLM request timeout detected, forcing reset")
                 self._force_reset_processing_state()
                 self.error_occurred.emit(
                     "⏱️ Время ожидания ответа истекло (45с). Попробуйте сократить запрос или повторить позже."
@@ -1641,6 +1841,7 @@ class ArvisCore(QObject):
 
     def cancel_current_request(self):
         """Cancel current request if any"""
+        self._stop_tts_pipeline()
         if self.is_processing:
             self.logger.info("User cancelled current request")
             self._force_reset_processing_state()
@@ -1698,6 +1899,9 @@ class ArvisCore(QObject):
                 else:
                     self.logger.warning("Failed to remove last assistant message")
 
+            # Старый ответ больше не нужен — прерываем его озвучку
+            self._stop_tts_pipeline()
+
             # Запускаем регенерацию с флагом is_regeneration=True
             self.logger.info(f"Starting regeneration for: {last_user_msg[:50]}...")
             self.process_message(last_user_msg, is_regeneration=True)
@@ -1740,7 +1944,7 @@ class ArvisCore(QObject):
             self.task_manager.task_completed.connect(on_status_ready)
             self.task_manager.run_async("status_update", status_task)
 
-    # Дубликаты toggle_audio_playback и _check_worker_timeout удалены (см. верхние реализации)
+    # Дубликаты toggle_audio_playback и _handle_llm_timeout удалены (см. верхние реализации)
 
     def shutdown(self):
         """Shutdown Arvis core"""
@@ -1759,10 +1963,33 @@ class ArvisCore(QObject):
             if self.stt_engine and self.is_voice_recording:
                 self.stt_engine.stop_recording()
 
+            # Release the shared microphone capture
+            audio_bus = get_audio_bus()
+            if audio_bus is not None:
+                audio_bus.shutdown()
+
+            # Cancel queued/active LLM requests (closes the Ollama connection)
+            llm_engine = get_llm_request_engine()
+            if llm_engine is not None:
+                llm_engine.shutdown()
+
             # Stop TTS
+            if self._tts_pipeline is not None:
+                self._tts_pipeline.shutdown()
+                self._tts_pipeline = None
             if self.tts_engine:
                 self.tts_engine.stop()
 
+            # Close the latency trace files
+            self.tracer.shutdown()
+
+            fast_path_stats = self.get_fast_path_stats()
+            if fast_path_stats["answered"]:
+                self.logger.info(
+                    f"Fast path: {fast_path_stats['answered']} turns skipped the LLM, "
+                    f"~{fast_path_stats['estimated_saved_sec']:.1f}s saved (avg {fast_path_stats['avg_ms']:.2f} ms)"
+                )
+
             # Cleanup modules
             if self.weather_module:
                 self.weather_module.cleanup()
@@ -1772,6 +1999,11 @@ class ArvisCore(QObject):
                 self.system_control_module.cleanup()
             if self.calendar_module:
                 self.calendar_module.cleanup()
+            # Shared HTTP pool and response cache of the modules
+            shutdown_fetcher()
+            # Дописать очередь аудита (логгер общий, закрывается через atexit)
+            if self.audit:
+                self.audit.flush()
 
             self.logger.info("Arvis core shutdown complete")
 
@@ -1785,9 +2017,14 @@ class ArvisCore(QObject):
             user_id: User ID from authentication system, None for guest
         """
         try:
+            previous_user_id = self.current_user_id
             self.current_user_id = user_id
             self.logger.info(f"Set current user: {user_id or 'Guest'}")
 
+            # Контекст LLM не должен переходить от одного пользователя к другому
+            if previous_user_id != user_id and self.llm_client and hasattr(self.llm_client, "reset_context"):
+                self.llm_client.reset_context("user switched")
+
             # Propagate to RBAC
             if self.rbac:
                 self.rbac.set_current_user(user_id)
@@ -2000,55 +2237,3 @@ class ArvisCore(QObject):
         except Exception as e:
             self.logger.error(f"Failed to switch engine: {e}")
             return False
-
-
-class _LLMWorker(QThread):
-    """Worker thread to perform LLM requests without blocking UI."""
-
-    success = pyqtSignal(str)
-    error = pyqtSignal(str)
-
-    def __init__(self, llm_client: LLMClient, message: str, context: str, history: list):
-        super().__init__()
-        self._llm = llm_client
-        self._message = message
-        self._context = context
-        self._history = history
-
-    def run(self):
-        try:
-            resp = self._llm.get_response(self._message, self._context, self._history)
-            # Ensure string type to keep signal typing consistent
-            if resp is None:
-                self.success.emit("")
-            else:
-                self.success.emit(str(resp))
-        except Exception as e:
-            self.error.emit(str(e))
-
-
-class _LLMStreamWorker(QThread):
-    """Worker thread for streaming LLM responses chunk-by-chunk."""
-
-    chunk = pyqtSignal(str)
-    done = pyqtSignal()
-    error = pyqtSignal(str)
-
-    def __init__(self, llm_client: LLMClient, message: str, context: str, history: list):
-        super().__init__()
-        self._llm = llm_client
-        self._message = message
-        self._context = context
-        self._history = history
-
-    def run(self):
-        try:
-            for part in self._llm.stream_response(self._message, self._context, self._history):
-                if part is None:
-                    continue
-                # Emit the latest chunk (could be empty on errors/timeouts)
-                if part:
-                    self.chunk.emit(str(part))
-            self.done.emit()
-        except Exception as e:
-            self.error.emit(str(e))
@@ -0,0 +1,211 @@
+"""
+Быстрые ответы без LLM на детерминированные вопросы
+
+Время, дата, «что ты умеешь», расписание на сегодня (CalendarModule) и сведения
+о системе (SystemControlModule) отвечаются по шаблону за миллисекунды: без сборки
+контекста, очереди LLMRequestEngine и риска выдуманного ответа. Фразы регистрируются
+интентами в IntentRouter ядра, но срабатывают только если триггер — вся фраза (вокруг
+допустимы лишь слова-паразиты и пунктуация): «сколько времени варить яйцо» или
+«какое число у пи» содержат триггер, но это другие вопросы, и они идут в LLM.
+Проверка — predicate интента, то есть ещё при маршрутизации, до RBAC: роль без
+календаря на «что у меня сегодня на ужин» получает ответ LLM, а не отказ в доступе.
+
+Статистика: сколько ходов обошли LLM и сколько времени это сэкономило — по медиане
+llm_response из performance_monitor (до первых замеров — fast_path.assumed_llm_sec).
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from utils.intent_router import IntentMatch, IntentRouter, IntentSpec, normalize, tokenize
+from utils.logger import ModuleLogger
+from utils.performance_monitor import performance_monitor
+
+_WEEKDAYS = ("понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье")
+_MONTHS = (
+    "января",
+    "февраля",
+    "марта",
+    "апреля",
+    "мая",
+    "июня",
+    "июля",
+    "августа",
+    "сентября",
+    "октября",
+    "ноября",
+    "декабря",
+)
+
+# Слова, которые могут окружать триггер, не меняя вопроса («скажи, пожалуйста, который час»)
+_FILLERS = frozenset(
+    "а ну и так эй слушай скажи скажите подскажи подскажите ка пожалуйста мне сейчас сегодня арвис "
+    "hey please tell me now today".split()
+)
+
+
+class FastPathResponder:
+    """Шаблонные ответы ядра: интенты fast.* в IntentRouter и учёт сэкономленного времени"""
+
+    TRIGGERS = {
+        "fast.time": ("который час", "сколько времени", "сколько сейчас времени", "what time is it"),
+        "fast.date": (
+            "какое сегодня число",
+            "какое число",
+            "какой сегодня день",
+            "какая сегодня дата",
+            "какой день недели",
+            "какой сегодня день недели",
+            "what day is it",
+        ),
+        "fast.capabilities": ("что ты умеешь", "что ты можешь", "твои возможности", "what can you do"),
+        "fast.schedule": (
+            "что у меня сегодня",
+            "что сегодня запланировано",
+            "расписание на сегодня",
+            "планы на сегодня",
+            "дела на сегодня",
+        ),
+        "fast.system_info": ("информация о системе", "информацию о системе", "состояние системы", "system info"),
+    }
+    # Ниже встроенных модулей: «что сегодня по погоде» остаётся за погодой
+    PRIORITY = 5
+    _RBAC = {
+        "fast.schedule": ("calendar", "❌ У вас нет прав для использования календаря (требуется роль User или выше)")
+    }
+    BUDGET_SEC = 0.010
+
+    def __init__(self, core, config):
+        self.core = core
+        self.logger = ModuleLogger("FastPath")
+        self.enabled = bool(config.get("fast_path.enabled", True))
+        self.max_words = int(config.get("fast_path.max_words", 6) or 0)
+        self.assumed_llm_sec = float(config.get("fast_path.assumed_llm_sec", 2.0) or 0.0)
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.by_intent: Dict[str, int] = {}
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self.over_budget = 0
+        self.saved_sec = 0.0
+        self._trigger_tokens = {
+            name: tuple(tuple(tokenize(normalize(trigger))) for trigger in triggers)
+            for name, triggers in self.TRIGGERS.items()
+        }
+
+    def register(self, router: IntentRouter):
+        if not self.enabled:
+            return
+        handlers: Dict[str, Callable[[IntentMatch], Optional[str]]] = {
+            "fast.time": self._answer_time,
+            "fast.date": self._answer_date,
+            "fast.capabilities": self._answer_capabilities,
+            "fast.schedule": self._answer_schedule,
+            "fast.system_info": self._answer_system_info,
+        }
+        for name, handler in handlers.items():
+            module, denied = self._RBAC.get(name, (None, ""))
+            router.register(
+                IntentSpec(
+                    name,
+                    self.TRIGGERS[name],
+                    self._timed(name, handler),
+                    priority=self.PRIORITY,
+                    max_words=self.max_words,
+                    module=module,
+                    denied_message=denied,
+                    predicate=lambda match, name=name: self.is_whole_utterance(name, match.tokens),
+                )
+            )
+
+    def _timed(self, name: str, handler: Callable[[IntentMatch], Optional[str]]):
+        def run(match: IntentMatch) -> Optional[str]:
+            start = time.perf_counter()
+            answer = handler(match)
+            if answer is not None:
+                self._record(name, time.perf_counter() - start)
+            return answer
+
+        return run
+
+    def is_whole_utterance(self, name: str, tokens) -> bool:
+        """Триггер интента занимает всю фразу, кроме слов-паразитов вокруг него"""
+        for trigger in self._trigger_tokens.get(name, ()):
+            size = len(trigger)
+            for start in range(len(tokens) - size + 1):
+                if tuple(tokens[start : start + size]) != trigger:
+                    continue
+                rest = tokens[:start] + tokens[start + size :]
+                if all(token in _FILLERS for token in rest):
+                    return True
+        return False
+
+    def _record(self, name: str, elapsed: float):
+        # Сэкономлено — типичное время ответа LLM за вычетом времени быстрого ответа
+        llm_sec = performance_monitor.operation_percentile("llm_response", 0.5)
+        if llm_sec is None:
+            llm_sec = self.assumed_llm_sec
+        with self._lock:
+            self.answered += 1
+            self.by_intent[name] = self.by_intent.get(name, 0) + 1
+            self.total_sec += elapsed
+            self.max_sec = max(self.max_sec, elapsed)
+            self.saved_sec += max(0.0, llm_sec - elapsed)
+            if elapsed > self.BUDGET_SEC:
+                self.over_budget += 1
+        performance_monitor.record_operation_time("fast_path", elapsed)
+        if elapsed > self.BUDGET_SEC:
+            self.logger.warning(
+                f"Fast path '{name}' took {elapsed * 1000:.1f} ms (budget {self.BUDGET_SEC * 1000:.0f} ms)"
+            )
+        else:
+            self.logger.debug(f"Fast path '{name}' answered in {elapsed * 1000:.2f} ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "answered": self.answered,
+                "by_intent": dict(self.by_intent),
+                "avg_ms": round(self.total_sec * 1000.0 / self.answered, 3) if self.answered else 0.0,
+                "max_ms": round(self.max_sec * 1000.0, 3),
+                "over_budget": self.over_budget,
+                "estimated_saved_sec": round(self.saved_sec, 2),
+            }
+
+    # ------------------------------------------------------------------ answers
+
+    def _answer_time(self, match: IntentMatch) -> str:
+        return f"🕒 Сейчас {datetime.now():%H:%M}"
+
+    def _answer_date(self, match: IntentMatch) -> str:
+        now = datetime.now()
+        return f"📅 Сегодня {_WEEKDAYS[now.weekday()]}, {now.day} {_MONTHS[now.month - 1]} {now.year} года"
+
+    def _answer_capabilities(self, match: IntentMatch) -> str:
+        core = self.core
+        lines = ["Я умею:"]
+        if core.weather_module:
+            lines.append("🌤️ рассказать о погоде («какая погода в Киеве»)")
+        if core.news_module:
+            lines.append("📰 прочитать главные новости")
+        if core.calendar_module:
+            lines.append("📅 напомнить о делах и показать расписание на сегодня")
+        if core.system_control_module:
+            lines.append("💻 запускать приложения и сайты, управлять громкостью и музыкой")
+        if core.search_module and core.search_module.is_enabled():
+            lines.append("🔎 искать информацию в интернете («найди ...»)")
+        lines.append("🕒 подсказать время и дату")
+        lines.append("💬 отвечать на вопросы и помогать с кодом")
+        return "\n".join(lines)
+
+    def _answer_schedule(self, match: IntentMatch) -> Optional[str]:
+        if not self.core.calendar_module:
+            return None
+        return self.core.calendar_module.get_today_schedule()
+
+    def _answer_system_info(self, match: IntentMatch) -> Optional[str]:
+        if not self.core.system_control_module:
+            return None
+        return self.core.system_control_module.get_system_info()
@@ -11,13 +11,11 @@ from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import (
     QDialog,
-    QFrame,
     QHBoxLayout,
     QLabel,
     QLineEdit,
     QMessageBox,
     QPushButton,
-    QScrollArea,
     QTextEdit,
     QVBoxLayout,
     QWidget,
@@ -26,169 +24,14 @@ from PyQt6.QtWidgets import (
 from i18n import _
 from utils.logger import ModuleLogger
 
+from .message_list import STYLE_HISTORY, MessageListView
 
-class HistoryMessageItem(QFrame):
-    """Single message item in history view"""
+# Поиск запускается после паузы в наборе, результаты подгружаются страницами
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_PAGE_SIZE = 50
 
-    def __init__(self, message_data: dict, parent=None):
-        super().__init__(parent)
-        self.message_data = message_data
-        self._build_ui()
-
-    def _build_ui(self):
-        """Build message item UI"""
-        layout = QVBoxLayout()
-        layout.setContentsMargins(12, 8, 12, 8)
-        layout.setSpacing(4)
-
-        # Header: role + timestamp
-        header_layout = QHBoxLayout()
-        header_layout.setSpacing(10)
-
-        role = self.message_data.get("role", "unknown")
-        is_user = role == "user"
-
-        role_label = QLabel(_("👤 Вы") if is_user else _("🤖 Arvis"))
-        role_label.setStyleSheet(
-            f"""
-            QLabel {{
-                color: {'#4a9eff' if is_user else '#8bc34a'};
-                font-weight: bold;
-                font-size: 13px;
-                background: transparent;
-            }}
-        """
-        )
-
-        timestamp = self.message_data.get("timestamp", "")
-        try:
-            dt = datetime.fromisoformat(timestamp)
-            time_str = dt.strftime("%d.%m.%Y %H:%M:%S")
-        except Exception:
-            time_str = timestamp
-
-        time_label = QLabel(time_str)
-        time_label.setStyleSheet(
-            """
-            QLabel {
-                color: rgba(255, 255, 255, 0.5);
-                font-size: 11px;
-                background: transparent;
-            }
-        """
-        )
-
-        header_layout.addWidget(role_label)
-        header_layout.addWidget(time_label)
-
-        # Metadata (source, model if available)
-        metadata = self.message_data.get("metadata", {}) or {}
-        meta_label = None
-        if metadata:
-            source = metadata.get("source", "")
-            model = metadata.get("model", "")
-            meta_text = []
-            if source:
-                meta_text.append(f"📍 {source}")
-            if model:
-                meta_text.append(f"🧠 {model}")
-            if meta_text:
-                meta_label = QLabel(" • ".join(meta_text))
-                meta_label.setStyleSheet(
-                    """
-                    QLabel {
-                        color: rgba(255, 255, 255, 0.4);
-                        font-size: 10px;
-                        font-style: italic;
-                        background: transparent;
-                    }
-                """
-                )
-
-        feedback_value = self.message_data.get("feedback") or metadata.get("feedback")
-        if meta_label:
-            header_layout.addWidget(meta_label)
-
-        if feedback_value:
-            if feedback_value == "positive":
-                feedback_text = _("👍 Хороший ответ")
-                color = "#8bc34a"
-                background = "rgba(139, 195, 74, 0.15)"
-            else:
-                feedback_text = _("👎 Плохой ответ")
-                color = "#f44336"
-                background = "rgba(244, 67, 54, 0.15)"
-
-            feedback_label = QLabel(feedback_text)
-            feedback_label.setStyleSheet(
-                f"""
-                QLabel {{
-                    color: {color};
-                    font-size: 11px;
-                    font-weight: bold;
-                    background-color: {background};
-                    border-radius: 6px;
-                    padding: 3px 8px;
-                }}
-            """
-            )
-            header_layout.addWidget(feedback_label)
-
-        header_layout.addStretch()
-
-        layout.addLayout(header_layout)
-
-        # Message content
-        content = self.message_data.get("content", "")
-        content_label = QLabel(content)
-        content_label.setWordWrap(True)
-        # PyQt6 requires using the explicit TextInteractionFlag enum
-        # This enables text selection with the mouse in the history view
-        try:
-            content_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        except Exception:
-            # Fallback for safety on older bindings
-            pass
-        content_label.setStyleSheet(
-            """
-            QLabel {
-                color: rgba(255, 255, 255, 0.9);
-                font-size: 13px;
-                padding: 6px;
-                background: transparent;
-            }
-        """
-        )
-
-        layout.addWidget(content_label)
-
-        self.setLayout(layout)
-
-        # Styling
-        if is_user:
-            self.setStyleSheet(
-                """
-                QFrame {
-                    background: qlineargradient(x1: 0, y1: 0, x2: 1, y2: 0,
-                        stop: 0 rgba(74, 158, 255, 0.15),
-                        stop: 1 rgba(26, 94, 255, 0.15));
-                    border-radius: 8px;
-                    border-left: 3px solid #4a9eff;
-                    margin: 2px 0px;
-                }
-            """
-            )
-        else:
-            self.setStyleSheet(
-                """
-                QFrame {
-                    background-color: rgba(60, 60, 60, 0.5);
-                    border-radius: 8px;
-                    border-left: 3px solid #8bc34a;
-                    margin: 2px 0px;
-                }
-            """
-            )
+# Сколько сообщений истории показывать сразу; более старые подгружаются при прокрутке вверх
+HISTORY_PAGE_SIZE = 200
 
 
 class ChatHistoryDialog(QDialog):
@@ -202,6 +45,12 @@ class ChatHistoryDialog(QDialog):
         self.logger = ModuleLogger("ChatHistoryDialog")
         self.history_manager = conversation_history_manager
         self.filtered_messages = []
+        self._search_query = ""
+        self._search_has_more = False
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._search_timer.timeout.connect(self._run_search)
         self.init_ui()
         self.load_history()
 
@@ -235,15 +84,17 @@ class ChatHistoryDialog(QDialog):
         search_layout = self._create_search_bar()
         content_layout.addLayout(search_layout)
 
-        # Messages scroll area
-        self.messages_scroll = QScrollArea()
-        self.messages_scroll.setWidgetResizable(True)
-        self.messages_scroll.setStyleSheet(
+        # Messages list (virtualized: only visible rows are painted)
+        self.messages_view = MessageListView(STYLE_HISTORY, page_size=HISTORY_PAGE_SIZE)
+        self.messages_model = self.messages_view.message_model
+        self.messages_view.top_reached.connect(self.load_older_messages)
+        self.messages_view.setStyleSheet(
             """
-            QScrollArea {
+            QListView {
                 border: 1px solid rgba(255, 255, 255, 0.1);
                 border-radius: 8px;
                 background-color: rgba(30, 30, 30, 0.8);
+                padding: 6px 0px;
             }
             QScrollBar:vertical {
                 background-color: rgba(255, 255, 255, 0.05);
@@ -261,14 +112,13 @@ class ChatHistoryDialog(QDialog):
         """
         )
 
-        self.messages_container = QWidget()
-        self.messages_layout = QVBoxLayout()
-        self.messages_layout.setContentsMargins(10, 10, 10, 10)
-        self.messages_layout.setSpacing(8)
-        self.messages_container.setLayout(self.messages_layout)
-        self.messages_scroll.setWidget(self.messages_container)
+        # Empty / error state shown instead of the list
+        self.empty_label = QLabel()
+        self.empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.empty_label.hide()
 
-        content_layout.addWidget(self.messages_scroll, 1)
+        content_layout.addWidget(self.messages_view, 1)
+        content_layout.addWidget(self.empty_label, 1)
 
         # Bottom action buttons
         actions_layout = self._create_action_buttons()
@@ -485,12 +335,18 @@ class ChatHistoryDialog(QDialog):
         self.clear_btn.clicked.connect(self.clear_history)
         self.clear_btn.setToolTip(_("Очистить всю историю (с архивацией)"))
 
+        self.load_more_btn = QPushButton(_("Показать ещё"))
+        self.load_more_btn.clicked.connect(self.load_more_results)
+        self.load_more_btn.setToolTip(_("Следующая страница результатов поиска"))
+        self.load_more_btn.setVisible(False)
+
         self.close_btn = QPushButton(_("Закрыть"))
         self.close_btn.clicked.connect(self.close)
 
         layout.addWidget(self.export_btn)
         layout.addWidget(self.clear_btn)
         layout.addStretch()
+        layout.addWidget(self.load_more_btn)
         layout.addWidget(self.close_btn)
 
         return layout
@@ -505,63 +361,96 @@ class ChatHistoryDialog(QDialog):
             self.logger.error(f"Failed to load history: {e}")
             self.show_error_message(_("Ошибка загрузки истории"))
 
-    def display_messages(self, messages: list):
-        """Display messages in scroll area"""
-        # Clear existing items
-        while self.messages_layout.count():
-            item = self.messages_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+    def load_older_messages(self):
+        """Prepend the previous page from the history journal (messages trimmed from memory)"""
+        if self._search_query or not self.filtered_messages:
+            return
 
+        try:
+            older = self.history_manager.load_older(self.filtered_messages[0].get("id"), HISTORY_PAGE_SIZE)
+            if older:
+                self.filtered_messages = older + self.filtered_messages
+                self.messages_view.prepend_preserving_position(older)
+        except Exception as e:
+            self.logger.error(f"Failed to load older history: {e}")
+
+    def display_messages(self, messages: list, scroll_to_end: bool = True):
+        """Display messages in the list view
+
+        Only the newest HISTORY_PAGE_SIZE messages are put into the model; older ones
+        are prepended page by page when the user scrolls to the top.
+        """
+        messages = list(messages or [])
         if not messages:
-            empty_label = QLabel(_("📭 История пуста"))
-            empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            empty_label.setStyleSheet(
-                """
-                QLabel {
-                    color: rgba(255, 255, 255, 0.4);
-                    font-size: 16px;
-                    font-style: italic;
-                    padding: 40px;
-                }
-            """
+            self.messages_view.clear_messages()
+            self._show_empty_state(
+                _("📭 История пуста"),
+                "color: rgba(255, 255, 255, 0.4); font-size: 16px; font-style: italic; padding: 40px;",
             )
-            self.messages_layout.addWidget(empty_label)
-            self.messages_layout.addStretch()
             return
 
-        # Add message items
-        for msg in messages:
-            item = HistoryMessageItem(msg)
-            self.messages_layout.addWidget(item)
-
-        self.messages_layout.addStretch()
+        self.empty_label.hide()
+        self.messages_view.show()
+        self.messages_view.set_messages(messages, scroll_to_end=scroll_to_end)
 
-        # Scroll to bottom
-        QTimer.singleShot(100, self.scroll_to_bottom)
+    def _show_empty_state(self, text: str, style: str):
+        self.messages_view.hide()
+        self.empty_label.setText(text)
+        self.empty_label.setStyleSheet(f"QLabel {{ {style} }}")
+        self.empty_label.show()
 
     def scroll_to_bottom(self):
         """Scroll to bottom of messages"""
-        scrollbar = self.messages_scroll.verticalScrollBar()
-        if scrollbar:
-            scrollbar.setValue(scrollbar.maximum())
+        self.messages_view.scroll_to_bottom()
 
     def on_search_changed(self, text: str):
-        """Handle search text change"""
-        if not text.strip():
+        """Handle search text change (debounced: the index is queried once typing pauses)"""
+        self._search_query = text.strip()
+        if not self._search_query:
+            self._search_timer.stop()
+            self._set_search_has_more(False)
             self.display_messages(self.history_manager.get_all())
             return
 
+        self._search_timer.start()
+
+    def _run_search(self):
+        """Run search for the current query and show the first page of ranked results"""
+        query = self._search_query
+        if not query:
+            return
+
         try:
-            results = self.history_manager.search(text, limit=100)
+            results, has_more = self.history_manager.search_page(query, limit=SEARCH_PAGE_SIZE, offset=0)
             self.filtered_messages = results
-            self.display_messages(results)
+            self._set_search_has_more(has_more)
+            # Results are ranked, best match first
+            self.display_messages(results, scroll_to_end=False)
 
             if not results:
-                self.show_info_message(_("Ничего не найдено по запросу: {query}").format(query=text))
+                self.show_info_message(_("Ничего не найдено по запросу: {query}").format(query=query))
         except Exception as e:
             self.logger.error(f"Search failed: {e}")
 
+    def load_more_results(self):
+        """Append the next page of search results"""
+        if not self._search_query or not self._search_has_more:
+            return
+
+        try:
+            results, has_more = self.history_manager.search_page(
+                self._search_query, limit=SEARCH_PAGE_SIZE, offset=len(self.filtered_messages)
+            )
+            self.filtered_messages = self.filtered_messages + results
+            self._set_search_has_more(has_more)
+            self.messages_model.append_messages(results)
+        except Exception as e:
+            self.logger.error(f"Search failed: {e}")
+
+    def _set_search_has_more(self, has_more: bool):
+        self._search_has_more = has_more
+        self.load_more_btn.setVisible(has_more)
+
     def clear_search(self):
         """Clear search input"""
         self.search_input.clear()
@@ -608,18 +497,7 @@ class ChatHistoryDialog(QDialog):
 
     def show_error_message(self, message: str):
         """Show error message in messages area"""
-        error_label = QLabel(f"❌ {message}")
-        error_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        error_label.setStyleSheet(
-            """
-            QLabel {
-                color: rgba(255, 100, 100, 0.9);
-                font-size: 14px;
-                padding: 20px;
-            }
-        """
-        )
-        self.messages_layout.addWidget(error_label)
+        self._show_empty_state(f"❌ {message}", "color: rgba(255, 100, 100, 0.9); font-size: 14px; padding: 20px;")
 
     def show_info_message(self, message: str):
         """Show info message"""
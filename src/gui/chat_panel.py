@@ -4,146 +4,24 @@ Chat panel for Arvis application (restored clean version)
 
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from PyQt6.QtCore import QRectF, Qt, QTimer, pyqtSignal
+from PyQt6.QtCore import QModelIndex, QPersistentModelIndex, QRectF, Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import QColor, QPainter
 from PyQt6.QtWidgets import (
     QApplication,
     QFrame,
     QHBoxLayout,
     QLabel,
-    QLayout,
     QLineEdit,
     QPushButton,
-    QScrollArea,
     QVBoxLayout,
     QWidget,
 )
 
 from i18n import _
 
-
-class MessageBubble(QFrame):
-    """Message bubble widget for chat messages"""
-
-    # Feedback signals
-    message_liked = pyqtSignal(str)
-    message_disliked = pyqtSignal(str)
-    message_retry = pyqtSignal(str)
-    message_voice_over = pyqtSignal(str)
-
-    def __init__(self, message: str, is_user: bool = True, parent=None):
-        super().__init__(parent)
-        self.message = message
-        self.is_user = is_user
-        self._build_ui()
-
-    def _build_ui(self):
-        layout = QVBoxLayout()
-        layout.setContentsMargins(15, 10, 15, 10)
-
-        # text
-        msg = QLabel(self.message)
-        msg.setWordWrap(True)
-        try:
-            # PyQt6: use explicit enum for text interaction flags
-            msg.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        except Exception:
-            pass
-
-        # time
-        time_label = QLabel(datetime.now().strftime("%H:%M"))
-        try:
-            time_label.setAlignment(Qt.AlignmentFlag.AlignRight if self.is_user else Qt.AlignmentFlag.AlignLeft)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-
-        layout.addWidget(msg)
-        layout.addWidget(time_label)
-
-        if not self.is_user:
-            self._add_feedback(layout)
-
-        self.setLayout(layout)
-
-        if self.is_user:
-            self.setStyleSheet(
-                """
-                QFrame {
-                    background: qlineargradient(x1: 0, y1: 0, x2: 1, y2: 0, stop: 0 #4a9eff, stop: 1 #1a5eff);
-                    border-radius: 15px;
-                    border-bottom-right-radius: 5px;
-                }
-                QLabel { color: white; background: transparent; font-size: 14px; }
-                """
-            )
-            time_label.setStyleSheet("font-size: 11px; color: rgba(255, 255, 255, 0.7);")
-        else:
-            self.setStyleSheet(
-                """
-                QFrame { background-color: rgba(60, 60, 60, 1); border-radius: 15px; border-bottom-left-radius: 5px; border: none; }
-                QLabel { color: white; background: transparent; font-size: 14px; }
-                """
-            )
-            time_label.setStyleSheet("font-size: 11px; color: rgba(255, 255, 255, 0.5);")
-
-    def _add_feedback(self, layout: QVBoxLayout) -> None:
-        buttons_layout = QHBoxLayout()
-        buttons_layout.setContentsMargins(0, 8, 0, 5)
-        buttons_layout.setSpacing(8)
-
-        def mk_btn(svg: str, tip: str) -> QPushButton:
-            b = QPushButton()
-            b.setFixedSize(18, 18)
-            try:
-                b.setFocusPolicy(Qt.NoFocus)  # type: ignore[attr-defined]
-            except Exception:
-                pass
-            b.setToolTip(_(tip))
-            b.setStyleSheet(
-                """
-                QPushButton { border: none; background-color: rgba(255,255,255,0.05); border-radius: 9px; }
-                QPushButton:hover { background-color: rgba(255,255,255,0.15); border: none; }
-                QPushButton:pressed { background-color: rgba(255,255,255,0.25); border: none; }
-                """
-            )
-            if Path(svg).exists():
-                from PyQt6.QtSvg import QSvgRenderer
-
-                def paint(ev):
-                    QPushButton.paintEvent(b, ev)
-                    p = QPainter(b)
-                    try:
-                        p.setRenderHint(QPainter.RenderHint.Antialiasing)
-                    except Exception:
-                        try:
-                            p.setRenderHint(QPainter.Antialiasing)  # type: ignore[attr-defined]
-                        except Exception:
-                            pass
-                    r = QSvgRenderer(svg)
-                    rect = b.rect().adjusted(2, 2, -2, -2)
-                    r.render(p, QRectF(rect))
-
-                b.paintEvent = paint  # type: ignore[assignment]
-            else:
-                b.setText("?")
-            return b
-
-        voice_btn = mk_btn("UXUI/Button/Button_voice-over.svg", "Озвучить")
-        like_btn = mk_btn("UXUI/Button/Button_like.svg", "Хороший ответ")
-        dislike_btn = mk_btn("UXUI/Button/Button_dislike.svg", "Плохой ответ")
-        retry_btn = mk_btn("UXUI/Button/Button_tryagen.svg", "Попробовать ещё раз")
-
-        voice_btn.clicked.connect(lambda: self.message_voice_over.emit(self.message))
-        like_btn.clicked.connect(lambda: self.message_liked.emit(self.message))
-        dislike_btn.clicked.connect(lambda: self.message_disliked.emit(self.message))
-        retry_btn.clicked.connect(lambda: self.message_retry.emit(self.message))
-
-        for b in (voice_btn, like_btn, dislike_btn, retry_btn):
-            buttons_layout.addWidget(b)
-        buttons_layout.addStretch()
-        layout.addLayout(buttons_layout)
+from .message_list import STYLE_CHAT, MessageListView
 
 
 class TypingIndicator(QWidget):
@@ -255,9 +133,17 @@ class ChatPanel(QWidget):
         self.typing_indicator: Optional[TypingIndicator] = None
         self.typing_label: Optional[QLabel] = None
         self.streaming_started = False
-        self._stream_container: Optional[QWidget] = None
-        self._stream_bubble: Optional[MessageBubble] = None
+        # Строка модели с ответом, который сейчас стримится
+        self._stream_index: Optional[QPersistentModelIndex] = None
+        # Дельты стрима копятся и выводятся не чаще раза за кадр
+        self._stream_pending: List[str] = []
+        self._stream_frame_timer = QTimer(self)
+        self._stream_frame_timer.setSingleShot(True)
+        self._stream_frame_timer.setInterval(max(1, int(self.config.get("ui.stream_frame_ms", 16))))
+        self._stream_frame_timer.timeout.connect(self._flush_stream_frame)
         self.orb_button_enabled = True
+        # Отправка доступна, когда ядро создало LLM-клиент (остальное догружается параллельно)
+        self._chat_ready = True
 
         from utils.logger import ModuleLogger
 
@@ -269,24 +155,23 @@ class ChatPanel(QWidget):
         layout = QVBoxLayout()
         layout.setContentsMargins(5, 10, 5, 10)
 
-        # Chat area
-        self.chat_scroll = QScrollArea()
-        self.chat_scroll.setWidgetResizable(True)
-        try:
-            self.chat_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # type: ignore[attr-defined]
-            self.chat_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)  # type: ignore[attr-defined]
-        except Exception:
-            pass
+        # Chat area: виртуализированный список, рисуются только видимые сообщения
+        self.chat_view = MessageListView(STYLE_CHAT, max_rows=int(self.config.get("ui.chat_max_rows", 300)))
+        self.chat_model = self.chat_view.message_model
+        self.chat_view.message_delegate.action_triggered.connect(self._on_message_action)
 
-        self.chat_content = QWidget()
-        self.chat_layout = QVBoxLayout()
-        try:
-            self.chat_layout.setAlignment(Qt.AlignmentFlag.AlignTop)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-        self.chat_layout.setSpacing(10)
-        self.chat_content.setLayout(self.chat_layout)
-        self.chat_scroll.setWidget(self.chat_content)
+        # Индикатор «Arvis думает…» под списком сообщений
+        self.typing_container = QWidget()
+        typing_layout = QHBoxLayout()
+        typing_layout.setContentsMargins(5, 0, 50, 0)
+        self.typing_label = QLabel(_("Arvis думает…"))
+        self.typing_label.setStyleSheet("color: rgba(255,255,255,0.8);")
+        self.typing_indicator = TypingIndicator()
+        typing_layout.addWidget(self.typing_label)
+        typing_layout.addWidget(self.typing_indicator)
+        typing_layout.addStretch()
+        self.typing_container.setLayout(typing_layout)
+        self.typing_container.hide()
 
         # Input area
         input_frame = QFrame()
@@ -404,14 +289,15 @@ class ChatPanel(QWidget):
         input_layout.addWidget(self.cancel_button)
         input_frame.setLayout(input_layout)
 
-        layout.addWidget(self.chat_scroll, 1)
+        layout.addWidget(self.chat_view, 1)
+        layout.addWidget(self.typing_container)
         if not self.external_input_bar:
             layout.addWidget(input_frame)
         self.setLayout(layout)
 
-        self.chat_scroll.setStyleSheet(
+        self.chat_view.setStyleSheet(
             """
-            QScrollArea { border: none; background-color: transparent; }
+            QListView { border: none; background-color: transparent; }
             QScrollBar:vertical { background-color: rgba(255,255,255,0.1); width: 8px; border-radius: 4px; }
             QScrollBar::handle:vertical { background-color: rgba(255,255,255,0.3); border-radius: 4px; min-height: 20px; }
             QScrollBar::handle:vertical:hover { background-color: rgba(255,255,255,0.5); }
@@ -432,6 +318,20 @@ class ChatPanel(QWidget):
             arvis_core.processing_started.connect(self.on_processing_started)
             arvis_core.processing_finished.connect(self.on_processing_finished)
             arvis_core.error_occurred.connect(self.on_processing_finished)
+            arvis_core.component_ready.connect(self._on_component_ready)
+            self._set_chat_ready(arvis_core.is_component_done("llm"))
+
+    def _on_component_ready(self, name: str, ok: bool, seconds: float):
+        if name == "llm":
+            # Даже при ошибке LLM разблокируем ввод: ядро сообщит об ошибке на отправку
+            self._set_chat_ready(True)
+
+    def _set_chat_ready(self, ready: bool):
+        self._chat_ready = bool(ready)
+        self.send_button.setEnabled(self._chat_ready)
+        self.message_input.setPlaceholderText(
+            _("Введите сообщение...") if self._chat_ready else _("Загрузка языковой модели…")
+        )
 
     def on_processing_started(self):
         self.cancel_button.show()
@@ -451,7 +351,7 @@ class ChatPanel(QWidget):
 
     def send_message(self):
         message = self.message_input.text().strip()
-        if not message:
+        if not message or not self._chat_ready:
             return
         if hasattr(self, "_sending_message") and self._sending_message:
             self.logger.debug("Message sending already in progress, ignoring duplicate")
@@ -470,21 +370,27 @@ class ChatPanel(QWidget):
             raise
 
     def add_user_message(self, message: str):
-        bubble = MessageBubble(message, is_user=True)
-        container = QWidget()
-        layout = QHBoxLayout()
-        layout.setContentsMargins(50, 0, 0, 0)
-        layout.addStretch()
-        layout.addWidget(bubble)
-        container.setLayout(layout)
-        self.chat_layout.addWidget(container)
+        self.chat_view.append_message({"role": "user", "content": message, "time": _now_hm()})
         self.scroll_to_bottom()
 
-    def _connect_feedback_signals(self, bubble: MessageBubble):
-        bubble.message_liked.connect(self.message_liked.emit)
-        bubble.message_disliked.connect(self.message_disliked.emit)
-        bubble.message_retry.connect(self.message_retry_requested.emit)
-        bubble.message_voice_over.connect(self.message_voice_over_requested.emit)
+    def _on_message_action(self, action: str, index: QModelIndex):
+        message = self.chat_model.message_at(index)
+        if message is None:
+            return
+        text = message.get("content", "")
+        if action == "like":
+            self.chat_model.update_message(index, feedback="positive")
+            self.message_liked.emit(text)
+        elif action == "dislike":
+            self.chat_model.update_message(index, feedback="negative")
+            self.message_disliked.emit(text)
+        elif action == "retry":
+            self.message_retry_requested.emit(text)
+        elif action == "voice":
+            self.message_voice_over_requested.emit(text)
+
+    def _append_assistant_row(self, text: str) -> QPersistentModelIndex:
+        return self.chat_view.append_message({"role": "assistant", "content": text, "time": _now_hm()})
 
     def _simulate_streaming(self, full_text: str):
         if not full_text:
@@ -497,195 +403,100 @@ class ChatPanel(QWidget):
             return
         if self.typing_label is not None:
             self.typing_label.setText(_("Arvis печатает…"))
-        container = QWidget()
-        layout = QHBoxLayout()
-        layout.setContentsMargins(0, 0, 50, 0)
-        bubble = MessageBubble("", is_user=False)
-        self._connect_feedback_signals(bubble)
-        layout.addWidget(bubble)
-        layout.addStretch()
-        container.setLayout(layout)
-        self.chat_layout.addWidget(container)
+        row = self._append_assistant_row("")
         self.scroll_to_bottom()
         state = {"i": 0}
 
         def step():
+            if not row.isValid():
+                timer.stop()
+                return
             i = state["i"]
             next_i = min(i + chunk, len(full_text))
-            b_layout = bubble.layout()
-            if b_layout is None:
-                return
-            msg_label = b_layout.itemAt(0).widget()  # type: ignore[union-attr]
-            if msg_label is not None:
-                msg_label.setText(full_text[:next_i])
             state["i"] = next_i
-            self.scroll_to_bottom()
             if next_i >= len(full_text):
-                time_label = bubble.layout().itemAt(1).widget()  # type: ignore[union-attr]
-                if time_label is not None:
-                    time_label.setText(datetime.now().strftime("%H:%M"))
+                self.chat_model.update_message(row, content=full_text, time=_now_hm())
                 timer.stop()
+            else:
+                self.chat_model.update_message(row, content=full_text[:next_i])
+            self.scroll_to_bottom()
 
         timer = QTimer(self)
         timer.timeout.connect(step)
         timer.start(max(8, interval_ms))
 
-    def update_streaming_message(self, text: str):
-        if self._stream_bubble is None:
+    def update_streaming_message(self, delta: str):
+        """Новая порция стримящегося ответа (partial_response передаёт только дельту)"""
+        if not delta:
+            return
+        self._stream_pending.append(delta)
+        if not self._stream_frame_timer.isActive():
+            self._stream_frame_timer.start()
+
+    def _flush_stream_frame(self):
+        if not self._stream_pending:
+            return
+        delta = "".join(self._stream_pending)
+        self._stream_pending.clear()
+        if self._stream_index is None or not self._stream_index.isValid():
             if self.typing_label is not None and not self.streaming_started:
                 self.typing_label.setText(_("Arvis печатает…"))
                 self.streaming_started = True
-            container = QWidget()
-            layout = QHBoxLayout()
-            layout.setContentsMargins(0, 0, 50, 0)
-            bubble = MessageBubble("", is_user=False)
-            self._connect_feedback_signals(bubble)
-            layout.addWidget(bubble)
-            layout.addStretch()
-            container.setLayout(layout)
-            self.chat_layout.addWidget(container)
-            self._stream_container = container
-            self._stream_bubble = bubble
-        bubble_obj = self._stream_bubble
-        if bubble_obj is None:
-            return
-        b_layout = bubble_obj.layout()
-        if b_layout is None:
-            return
-        msg_label = b_layout.itemAt(0).widget()  # type: ignore[union-attr]
-        if msg_label is not None:
-            msg_label.setText(text)
-        time_label = b_layout.itemAt(1).widget()  # type: ignore[union-attr]
-        if time_label is not None:
-            time_label.setText(datetime.now().strftime("%H:%M"))
-        if not hasattr(self, "_scroll_timer") or not self._scroll_timer.isActive():
-            self._scroll_timer = QTimer()
-            self._scroll_timer.setSingleShot(True)
-            self._scroll_timer.timeout.connect(self.scroll_to_bottom)
-            self._scroll_timer.start(50)
+            self._stream_index = self._append_assistant_row("")
+        self.chat_model.append_text(self._stream_index, delta, time=_now_hm())
+        self.scroll_to_bottom()
+
+    def _drop_stream_pending(self):
+        self._stream_frame_timer.stop()
+        self._stream_pending.clear()
 
     def add_assistant_message(self, message: str):
         self.hide_typing_indicator()
-        if self._stream_bubble is not None:
-            b_layout = self._stream_bubble.layout()
-            if b_layout is not None:
-                msg_label = b_layout.itemAt(0).widget()  # type: ignore[union-attr]
-                if msg_label is not None:
-                    msg_label.setText(message)
-                time_label = b_layout.itemAt(1).widget()  # type: ignore[union-attr]
-                if time_label is not None:
-                    time_label.setText(datetime.now().strftime("%H:%M"))
-            if not hasattr(self._stream_bubble, "_signals_connected"):
-                self._connect_feedback_signals(self._stream_bubble)
-                self._stream_bubble._signals_connected = True  # type: ignore[attr-defined]
+        # Финальный текст целиком заменяет накопленные дельты
+        self._drop_stream_pending()
+        if self._stream_index is not None and self._stream_index.isValid():
+            self.chat_model.update_message(self._stream_index, content=message, time=_now_hm())
             self.scroll_to_bottom()
-            self._stream_bubble = None
-            self._stream_container = None
+            self._stream_index = None
             self.streaming_started = False
             return
+        self._stream_index = None
         if self.config.get("ui.simulate_streaming", True):
             self._simulate_streaming(message)
             return
-        bubble = MessageBubble(message, is_user=False)
-        self._connect_feedback_signals(bubble)
-        container = QWidget()
-        layout = QHBoxLayout()
-        layout.setContentsMargins(0, 0, 50, 0)
-        layout.addWidget(bubble)
-        layout.addStretch()
-        container.setLayout(layout)
-        self.chat_layout.addWidget(container)
+        self._append_assistant_row(message)
         self.scroll_to_bottom()
 
     def _reset_streaming_state(self):
-        if self._stream_bubble is not None:
-            b_layout = self._stream_bubble.layout()
-            current_text = ""
-            if b_layout is not None:
-                msg_label = b_layout.itemAt(0).widget()  # type: ignore[union-attr]
-                if msg_label is not None:
-                    current_text = msg_label.text()
-            if current_text.strip():
-                if b_layout is not None:
-                    time_label = b_layout.itemAt(1).widget()  # type: ignore[union-attr]
-                    if time_label is not None:
-                        time_label.setText(datetime.now().strftime("%H:%M"))
+        self._stream_frame_timer.stop()
+        self._flush_stream_frame()
+        if self._stream_index is not None and self._stream_index.isValid():
+            message = self.chat_model.message_at(self._stream_index)
+            if message is not None and message.get("content", "").strip():
+                self.chat_model.update_message(self._stream_index, time=_now_hm())
             else:
-                if self._stream_container:
-                    self.chat_layout.removeWidget(self._stream_container)
-                    self._stream_container.deleteLater()
-            self._stream_bubble = None
-            self._stream_container = None
+                self.chat_model.remove_message(self._stream_index)
+        self._stream_index = None
         self.hide_typing_indicator()
         self.streaming_started = False
 
     def add_system_message(self, message: str):
-        lbl = QLabel(message)
-        try:
-            lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-        lbl.setWordWrap(True)
-        lbl.setStyleSheet(
-            """
-            QLabel { color: rgba(255,255,255,0.6); font-style: italic; padding: 10px; background-color: rgba(255,255,255,0.02); border-radius: 8px; border: 1px solid rgba(255,255,255,0.1); }
-            """
-        )
-        self.chat_layout.addWidget(lbl)
+        self.chat_view.append_message({"role": "system", "content": message})
         self.scroll_to_bottom()
 
     def show_typing_indicator(self):
         self.streaming_started = False
-        if not self.typing_indicator:
-            self.typing_indicator = TypingIndicator()
-        container = QWidget()
-        layout = QHBoxLayout()
-        layout.setContentsMargins(0, 0, 50, 0)
-        self.typing_label = QLabel(_("Arvis думает…"))
-        self.typing_label.setStyleSheet("color: rgba(255,255,255,0.8);")
-        layout.addWidget(self.typing_label)
-        layout.addWidget(self.typing_indicator)
-        layout.addStretch()
-        container.setLayout(layout)
-        self.chat_layout.addWidget(container)
-        self.typing_indicator.start_animation()
+        if self.typing_label is not None:
+            self.typing_label.setText(_("Arvis думает…"))
+        if self.typing_indicator is not None:
+            self.typing_indicator.start_animation()
+        self.typing_container.show()
         self.scroll_to_bottom()
 
     def hide_typing_indicator(self):
-        if self.typing_indicator:
-            try:
-                self.typing_indicator.stop_animation()
-                # remove container that has typing_indicator
-                for i in range(self.chat_layout.count()):
-                    item = self.chat_layout.itemAt(i)
-                    if not item or not item.widget():
-                        continue
-                    w = item.widget()
-                    if w is None:
-                        continue
-                    # Безопасно получаем layout виджета
-                    lay_getter = getattr(w, "layout", None)
-                    lay = lay_getter() if callable(lay_getter) else None
-                    if lay is None:
-                        continue
-                    # Убедимся, что у layout есть необходимые методы
-                    if isinstance(lay, QLayout):
-                        for j in range(lay.count()):
-                            li = lay.itemAt(j)
-                    else:
-                        continue
-                        if li and li.widget() == self.typing_indicator:
-                            self.chat_layout.removeWidget(w)
-                            # Безопасно удаляем виджет
-                            if hasattr(w, "deleteLater"):
-                                w.deleteLater()
-                            self.typing_indicator = None
-                            self.streaming_started = False
-                            return
-            except RuntimeError as e:
-                self.logger.warning(f"TypingIndicator already removed: {e}")
-                self.typing_indicator = None
-                self.streaming_started = False
+        if self.typing_indicator is not None:
+            self.typing_indicator.stop_animation()
+        self.typing_container.hide()
 
     def set_user_management_visible(self, visible: bool):
         """Show/hide user management button (Admin only)"""
@@ -696,24 +507,13 @@ class ChatPanel(QWidget):
                 self.user_mgmt_button.hide()
 
     def clear_chat(self):
-        for i in reversed(range(self.chat_layout.count())):
-            item = self.chat_layout.itemAt(i)
-            if not item:
-                continue
-            widget = item.widget()
-            if widget:
-                self.chat_layout.removeWidget(widget)
-                widget.deleteLater()
+        self._drop_stream_pending()
+        self._stream_index = None
+        self.chat_view.clear_messages()
         self.add_system_message(_("Чат очищен. Как дела?"))
 
     def scroll_to_bottom(self):
-        def scroll():
-            if self.chat_scroll:
-                sb = self.chat_scroll.verticalScrollBar()
-                if sb:
-                    sb.setValue(sb.maximum())
-
-        QTimer.singleShot(100, scroll)
+        self.chat_view.scroll_to_bottom()
 
     def handle_orb_toggle_click(self):
         if not self.orb_button_enabled:
@@ -726,3 +526,7 @@ class ChatPanel(QWidget):
     def _enable_orb_button(self):
         self.orb_button_enabled = True
         self.orb_toggle_button.setEnabled(True)
+
+
+def _now_hm() -> str:
+    return datetime.now().strftime("%H:%M")
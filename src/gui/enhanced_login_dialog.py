@@ -401,10 +401,40 @@ class EnhancedLoginDialog(QDialog):
             QMessageBox.warning(self, _("Ошибка"), _("Пожалуйста, заполните все поля"))
             return
 
-        try:
-            # Authenticate (local)
-            session = self.auth_manager.authenticate(username, password)
+        # Хеширование пароля (KDF) — сотни миллисекунд: проверяем в пуле задач, окно не замирает
+        from utils.async_manager import task_manager
+
+        self._set_login_busy(True)
+        started = task_manager.run_async(
+            f"login_{id(self)}",
+            self.auth_manager.authenticate,
+            username,
+            password,
+            on_complete=lambda _task_id, session: self._on_login_result(username, session),
+            on_error=lambda _task_id, error: self._on_login_error(error),
+            on_finally=lambda _task_id: self._set_login_busy(False),
+        )
+        if not started:
+            self._set_login_busy(False)
+
+    def _set_login_busy(self, busy: bool):
+        """Заблокировать форму на время проверки пароля"""
+        self.login_button.setEnabled(not busy)
+        self.login_button.setText(_("Проверка...") if busy else _("Войти"))
+        self.username_input.setEnabled(not busy)
+        self.password_input.setEnabled(not busy)
+
+    def _on_login_error(self, error: Exception):
+        if isinstance(error, PermissionError):
+            QMessageBox.warning(self, _("Ошибка"), str(error))
+            self.password_input.clear(); self.password_input.setFocus()
+            return
+        self.logger.error(f"Login error: {error}")
+        QMessageBox.critical(self, _("Ошибка"), _("Не удалось выполнить вход:\n{error}").format(error=str(error)))
 
+    def _on_login_result(self, username: str, session):
+        """Результат authenticate() (в потоке UI)"""
+        try:
             if session:
                 user = self.auth_manager.validate_session(session.session_id)
                 if user:
@@ -427,9 +457,6 @@ class EnhancedLoginDialog(QDialog):
                 QMessageBox.warning(self, _("Ошибка входа"), _("Неверное имя пользователя или пароль"))
                 self.password_input.clear(); self.password_input.setFocus()
 
-        except PermissionError as e:
-            QMessageBox.warning(self, _("Ошибка"), str(e))
-            self.password_input.clear(); self.password_input.setFocus()
         except Exception as e:
             self.logger.error(f"Login error: {e}")
             QMessageBox.critical(self, _("Ошибка"), _("Не удалось выполнить вход:\n{error}").format(error=str(e)))
@@ -23,7 +23,7 @@ from PyQt6.QtWidgets import (
 from i18n import _
 from utils.logger import ModuleLogger
 from utils.security import Role, UserStorage, get_auth_manager
-from utils.security.hybrid_auth import HybridAuthManager
+from utils.security.hybrid_auth import get_hybrid_auth_manager
 from config.config import Config
 
 
@@ -36,9 +36,9 @@ class LoginDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.logger = ModuleLogger("LoginDialog")
-        # Используем HybridAuthManager для поддержки удалённого сервера
-        config = Config()
-        self.auth_manager = HybridAuthManager(config)
+        # Общий HybridAuthManager (поддержка удалённого сервера): свой экземпляр на каждый диалог
+        # оставлял бы за собой поток очистки сессий и подписку на хранилище
+        self.auth_manager = get_hybrid_auth_manager(Config())
         self.init_ui()
 
     def init_ui(self):
@@ -321,10 +321,38 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, _("Ошибка"), _("Пожалуйста, заполните все поля"))
             return
 
-        try:
-            # Authenticate using HybridAuthManager (returns tuple)
-            success, error, user = self.auth_manager.authenticate(username, password)
+        # Проверка пароля (KDF) занимает сотни миллисекунд — выполняем в пуле задач, не блокируя UI
+        from utils.async_manager import task_manager
+
+        self._set_login_busy(True)
+        started = task_manager.run_async(
+            f"login_{id(self)}",
+            self.auth_manager.authenticate,
+            username,
+            password,
+            on_complete=lambda _task_id, result: self._on_login_result(username, result),
+            on_error=lambda _task_id, error: self._on_login_error(error),
+            on_finally=lambda _task_id: self._set_login_busy(False),
+        )
+        if not started:
+            self._set_login_busy(False)
+
+    def _set_login_busy(self, busy: bool):
+        """Заблокировать форму на время проверки пароля"""
+        self.login_button.setEnabled(not busy)
+        self.login_button.setText(_("Проверка...") if busy else _("Войти"))
+        self.username_input.setEnabled(not busy)
+        self.password_input.setEnabled(not busy)
 
+    def _on_login_error(self, error: Exception):
+        self.logger.error(f"Login error: {error}")
+        QMessageBox.critical(self, _("Ошибка"), _("Не удалось выполнить вход:\n{error}").format(error=error))
+
+    def _on_login_result(self, username: str, result):
+        """Результат authenticate() (в потоке UI)"""
+        success, error, user = result
+
+        try:
             if success and user:
                 self.logger.info(f"User authenticated: {username}")
 
@@ -405,9 +433,9 @@ class CreateAccountDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.logger = ModuleLogger("CreateAccountDialog")
-        # Используем HybridAuthManager для поддержки удалённого сервера
-        config = Config()
-        self.auth_manager = HybridAuthManager(config)
+        # Общий HybridAuthManager (поддержка удалённого сервера): свой экземпляр на каждый диалог
+        # оставлял бы за собой поток очистки сессий и подписку на хранилище
+        self.auth_manager = get_hybrid_auth_manager(Config())
         self.created_user_id = None
         self.created_username = None
         self.init_ui()
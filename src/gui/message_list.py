@@ -0,0 +1,756 @@
+"""
+Virtualized message list for chat and history views
+Список сообщений на model/view: рисуются только видимые строки, без виджета на каждое сообщение
+"""
+
+import itertools
+import math
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PyQt6.QtCore import (
+    QAbstractListModel,
+    QEvent,
+    QModelIndex,
+    QPersistentModelIndex,
+    QPointF,
+    QRectF,
+    QSize,
+    Qt,
+    QTimer,
+    pyqtSignal,
+)
+from PyQt6.QtGui import (
+    QBrush,
+    QColor,
+    QFont,
+    QFontMetricsF,
+    QLinearGradient,
+    QPainter,
+    QPainterPath,
+    QPen,
+    QTextLayout,
+    QTextOption,
+)
+from PyQt6.QtWidgets import QApplication, QListView, QMenu, QStyledItemDelegate, QToolTip
+
+from i18n import _
+
+MessageRole = Qt.ItemDataRole.UserRole + 1
+
+STYLE_CHAT = "chat"
+STYLE_HISTORY = "history"
+
+# Кнопки под ответом ассистента: действие -> (иконка, подсказка)
+MESSAGE_ACTIONS: Dict[str, Tuple[str, str]] = {
+    "voice": ("UXUI/Button/Button_voice-over.svg", "Озвучить"),
+    "like": ("UXUI/Button/Button_like.svg", "Хороший ответ"),
+    "dislike": ("UXUI/Button/Button_dislike.svg", "Плохой ответ"),
+    "retry": ("UXUI/Button/Button_tryagen.svg", "Попробовать ещё раз"),
+}
+
+_LAYOUT_CACHE_SIZE = 512
+
+_key_counter = itertools.count(1)
+_svg_renderers: Dict[str, Any] = {}
+
+
+def _svg_renderer(path: str):
+    """QSvgRenderer на каждый файл создаётся один раз, а не при каждой отрисовке"""
+    if path not in _svg_renderers:
+        renderer = None
+        if Path(path).exists():
+            from PyQt6.QtSvg import QSvgRenderer
+
+            renderer = QSvgRenderer(path)
+        _svg_renderers[path] = renderer
+    return _svg_renderers[path]
+
+
+class MessageListModel(QAbstractListModel):
+    """Сообщения чата/истории. Каждая строка — словарь с role/content/time/feedback/metadata"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: List[Dict[str, Any]] = []
+
+    # Qt API
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._messages):
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return message.get("content", "")
+        if role == MessageRole:
+            return message
+        return None
+
+    # Изменение
+
+    @staticmethod
+    def _prepare(message: Dict[str, Any]) -> Dict[str, Any]:
+        # Копия: модель хранит служебные поля (_key/_rev для кеша раскладок) и не трогает чужие словари
+        item = dict(message)
+        item["content"] = str(item.get("content") or "")
+        item["_key"] = next(_key_counter)
+        item["_rev"] = 0
+        return item
+
+    def append_message(self, message: Dict[str, Any]) -> QPersistentModelIndex:
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(self._prepare(message))
+        self.endInsertRows()
+        return QPersistentModelIndex(self.index(row, 0))
+
+    def append_messages(self, messages: Iterable[Dict[str, Any]]):
+        items = [self._prepare(m) for m in messages]
+        if not items:
+            return
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row + len(items) - 1)
+        self._messages.extend(items)
+        self.endInsertRows()
+
+    def prepend_messages(self, messages: Iterable[Dict[str, Any]], prepared: bool = False):
+        """Добавить более старые сообщения в начало (ленивая подгрузка при прокрутке вверх)"""
+        items = list(messages) if prepared else [self._prepare(m) for m in messages]
+        if not items:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(items) - 1)
+        self._messages[:0] = items
+        self.endInsertRows()
+
+    def set_messages(self, messages: Iterable[Dict[str, Any]]):
+        self.beginResetModel()
+        self._messages = [self._prepare(m) for m in messages]
+        self.endResetModel()
+
+    def clear(self):
+        self.set_messages([])
+
+    def take_first(self, count: int) -> List[Dict[str, Any]]:
+        """Вынуть самые старые строки из модели (вместе с кешами раскладки)"""
+        count = min(max(0, count), len(self._messages))
+        if count == 0:
+            return []
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        taken = self._messages[:count]
+        del self._messages[:count]
+        self.endRemoveRows()
+        return taken
+
+    def message_at(self, index) -> Optional[Dict[str, Any]]:
+        row = index.row() if hasattr(index, "row") else int(index)
+        if 0 <= row < len(self._messages):
+            return self._messages[row]
+        return None
+
+    def update_message(self, index, **fields) -> bool:
+        """Обновить поля сообщения (content, time, feedback, ...) и перерисовать строку"""
+        message = self.message_at(index)
+        if message is None:
+            return False
+        if "content" in fields:
+            fields["content"] = str(fields["content"] or "")
+        message.update(fields)
+        message["_rev"] += 1
+        row = index.row() if hasattr(index, "row") else int(index)
+        model_index = self.index(row, 0)
+        self.dataChanged.emit(model_index, model_index, [Qt.ItemDataRole.DisplayRole, MessageRole])
+        return True
+
+    def append_text(self, index, text: str, **fields) -> bool:
+        """Дописать текст в конец сообщения (стриминг: делегат перераскладывает только хвост)"""
+        if not text and not fields:
+            return False
+        message = self.message_at(index)
+        if message is None:
+            return False
+        return self.update_message(index, content=message.get("content", "") + str(text or ""), **fields)
+
+    def remove_message(self, index) -> bool:
+        row = index.row() if hasattr(index, "row") else int(index)
+        if not 0 <= row < len(self._messages):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._messages[row]
+        self.endRemoveRows()
+        return True
+
+
+class _TextBlock:
+    """Текст сообщения, разложенный по абзацам (по QTextLayout на абзац)"""
+
+    __slots__ = ("paragraphs", "layouts", "bottoms", "naturals", "height", "natural")
+
+    def __init__(self):
+        self.paragraphs: List[str] = []
+        self.layouts: List[QTextLayout] = []
+        # Нижняя граница каждого абзаца и его фактическая ширина — чтобы переиспользовать префикс
+        self.bottoms: List[float] = []
+        self.naturals: List[float] = []
+        self.height = 0.0
+        self.natural = 0.0
+
+    @classmethod
+    def build(
+        cls, paragraphs: List[str], font: QFont, width: float, previous: Optional["_TextBlock"] = None
+    ) -> "_TextBlock":
+        block = cls()
+        reuse = 0
+        if previous is not None:
+            limit = min(len(paragraphs), len(previous.paragraphs))
+            while reuse < limit and paragraphs[reuse] == previous.paragraphs[reuse]:
+                reuse += 1
+            block.paragraphs = paragraphs[:reuse]
+            block.layouts = previous.layouts[:reuse]
+            block.bottoms = previous.bottoms[:reuse]
+            block.naturals = previous.naturals[:reuse]
+
+        option = QTextOption()
+        option.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
+        empty_height = QFontMetricsF(font).height()
+        y = block.bottoms[-1] if block.bottoms else 0.0
+        for text in paragraphs[reuse:]:
+            layout = QTextLayout(text, font)
+            layout.setTextOption(option)
+            layout.setCacheEnabled(True)
+            natural = 0.0
+            top = y
+            layout.beginLayout()
+            while True:
+                line = layout.createLine()
+                if not line.isValid():
+                    break
+                line.setLineWidth(width)
+                line.setPosition(QPointF(0.0, y))
+                y += line.height()
+                natural = max(natural, line.naturalTextWidth())
+            layout.endLayout()
+            if y == top:
+                y += empty_height
+            block.paragraphs.append(text)
+            block.layouts.append(layout)
+            block.bottoms.append(y)
+            block.naturals.append(natural)
+
+        block.height = y
+        block.natural = max(block.naturals, default=0.0)
+        return block
+
+    def draw(self, painter: QPainter, pos: QPointF):
+        for layout in self.layouts:
+            layout.draw(painter, pos)
+
+
+class _Geometry(NamedTuple):
+    height: float
+    frame: QRectF
+    text_pos: QPointF
+    layout: "_TextBlock"
+    time_rect: QRectF
+    actions: Dict[str, QRectF]
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """Рисует пузыри чата (STYLE_CHAT) или карточки истории (STYLE_HISTORY)
+
+    Раскладки текста (QTextLayout по абзацам) кешируются по (сообщение, ширина) с ревизией,
+    поэтому прокрутка и перерисовка не пересчитывают перенос строк, а дописывание
+    текста в конец перераскладывает только последний абзац.
+    """
+
+    action_triggered = pyqtSignal(str, QModelIndex)
+
+    # Чат
+    SIDE_GAP = 50
+    ROW_MARGIN = 5
+    PAD_H = 15
+    PAD_V = 10
+    TIME_GAP = 4
+    ACTION_SIZE = 18
+    ACTION_SPACING = 8
+    ACTIONS_TOP = 8
+    ACTIONS_BOTTOM = 5
+
+    # История
+    CARD_MARGIN_H = 8
+    CARD_MARGIN_V = 4
+    CARD_BORDER = 3
+    CARD_PAD_H = 12
+    CARD_PAD_V = 8
+    HEADER_SPACING = 10
+    CONTENT_PAD = 6
+
+    def __init__(self, style: str = STYLE_CHAT, parent=None):
+        super().__init__(parent)
+        self.style = style
+        self._layout_cache: "OrderedDict[tuple, Tuple[int, Tuple[_TextBlock, float, float]]]" = OrderedDict()
+        self._hover: Optional[Tuple[int, str]] = None
+
+        base = QApplication.font()
+        self._text_font = QFont(base)
+        self._text_font.setPixelSize(14 if style == STYLE_CHAT else 13)
+        self._time_font = QFont(base)
+        self._time_font.setPixelSize(11)
+        self._role_font = QFont(base)
+        self._role_font.setPixelSize(13)
+        self._role_font.setBold(True)
+        self._meta_font = QFont(base)
+        self._meta_font.setPixelSize(10)
+        self._meta_font.setItalic(True)
+        self._feedback_font = QFont(base)
+        self._feedback_font.setPixelSize(11)
+        self._feedback_font.setBold(True)
+        self._system_font = QFont(base)
+        self._system_font.setPixelSize(13)
+        self._system_font.setItalic(True)
+
+    # ------------------------------------------------------------------
+    # Раскладка
+    # ------------------------------------------------------------------
+
+    def clear_cache(self):
+        self._layout_cache.clear()
+
+    def _text_layout(self, message: Dict[str, Any], font: QFont, width: float) -> Tuple["_TextBlock", float, float]:
+        """Раскладка текста с переносом строк: (блок, высота, фактическая ширина)
+
+        Текст раскладывается по абзацам; при новой ревизии сообщения (стриминг ответа)
+        совпадающие начальные абзацы берутся из прошлой раскладки и заново
+        раскладывается только изменившийся хвост.
+        """
+        width = max(20.0, float(int(width)))
+        key = (message.get("_key"), width, font.pixelSize(), font.italic())
+        rev = message.get("_rev")
+        cached = self._layout_cache.get(key)
+        if cached is not None:
+            self._layout_cache.move_to_end(key)
+            if cached[0] == rev:
+                return cached[1]
+
+        text = str(message.get("content") or "").replace("\r\n", "\n")
+        previous = cached[1][0] if cached is not None else None
+        block = _TextBlock.build(text.split("\n"), font, width, previous)
+
+        result = (block, block.height, block.natural)
+        self._layout_cache[key] = (rev, result)
+        while len(self._layout_cache) > _LAYOUT_CACHE_SIZE:
+            self._layout_cache.popitem(last=False)
+        return result
+
+    def _geometry(self, rect: QRectF, message: Dict[str, Any]) -> _Geometry:
+        if self.style == STYLE_HISTORY:
+            return self._history_geometry(rect, message)
+        if message.get("role") == "system":
+            return self._system_geometry(rect, message)
+        return self._chat_geometry(rect, message)
+
+    def _chat_geometry(self, rect: QRectF, message: Dict[str, Any]) -> _Geometry:
+        is_user = message.get("role") == "user"
+        max_bubble = rect.width() - self.SIDE_GAP - 2 * self.ROW_MARGIN
+        layout, text_h, natural = self._text_layout(message, self._text_font, max_bubble - 2 * self.PAD_H)
+
+        time_fm = QFontMetricsF(self._time_font)
+        time_h = time_fm.height()
+        content_w = max(natural, time_fm.horizontalAdvance(str(message.get("time") or "")))
+        actions_w = len(MESSAGE_ACTIONS) * self.ACTION_SIZE + (len(MESSAGE_ACTIONS) - 1) * self.ACTION_SPACING
+        if not is_user:
+            content_w = max(content_w, actions_w)
+        content_w = math.ceil(content_w)
+
+        bubble_w = min(content_w + 2 * self.PAD_H, max_bubble)
+        bubble_h = self.PAD_V + text_h + self.TIME_GAP + time_h + self.PAD_V
+        if not is_user:
+            bubble_h += self.ACTIONS_TOP + self.ACTION_SIZE + self.ACTIONS_BOTTOM
+
+        left = rect.right() - self.ROW_MARGIN - bubble_w if is_user else rect.left() + self.ROW_MARGIN
+        frame = QRectF(left, rect.top() + self.ROW_MARGIN, bubble_w, math.ceil(bubble_h))
+        text_pos = QPointF(frame.left() + self.PAD_H, frame.top() + self.PAD_V)
+        time_rect = QRectF(text_pos.x(), text_pos.y() + text_h + self.TIME_GAP, bubble_w - 2 * self.PAD_H, time_h)
+
+        actions: Dict[str, QRectF] = {}
+        if not is_user:
+            y = time_rect.bottom() + self.ACTIONS_TOP
+            for i, name in enumerate(MESSAGE_ACTIONS):
+                x = text_pos.x() + i * (self.ACTION_SIZE + self.ACTION_SPACING)
+                actions[name] = QRectF(x, y, self.ACTION_SIZE, self.ACTION_SIZE)
+
+        return _Geometry(frame.height() + 2 * self.ROW_MARGIN, frame, text_pos, layout, time_rect, actions)
+
+    def _system_geometry(self, rect: QRectF, message: Dict[str, Any]) -> _Geometry:
+        frame_w = rect.width() - 2 * self.ROW_MARGIN
+        layout, text_h, natural = self._text_layout(message, self._system_font, frame_w - 20)
+        frame = QRectF(rect.left() + self.ROW_MARGIN, rect.top() + self.ROW_MARGIN, frame_w, math.ceil(text_h + 20))
+        text_pos = QPointF(frame.left() + (frame_w - natural) / 2, frame.top() + 10)
+        return _Geometry(frame.height() + 2 * self.ROW_MARGIN, frame, text_pos, layout, QRectF(), {})
+
+    def _history_geometry(self, rect: QRectF, message: Dict[str, Any]) -> _Geometry:
+        frame = rect.adjusted(self.CARD_MARGIN_H, self.CARD_MARGIN_V, -self.CARD_MARGIN_H, -self.CARD_MARGIN_V)
+        inner_left = frame.left() + self.CARD_BORDER + self.CARD_PAD_H
+        inner_w = frame.right() - self.CARD_PAD_H - inner_left
+
+        header_h = max(QFontMetricsF(self._role_font).height(), QFontMetricsF(self._feedback_font).height() + 6)
+        header_rect = QRectF(inner_left, frame.top() + self.CARD_PAD_V, inner_w, header_h)
+
+        layout, text_h, _natural = self._text_layout(message, self._text_font, inner_w - 2 * self.CONTENT_PAD)
+        text_pos = QPointF(inner_left + self.CONTENT_PAD, header_rect.bottom() + 4 + self.CONTENT_PAD)
+
+        card_h = math.ceil(
+            self.CARD_PAD_V + header_h + 4 + self.CONTENT_PAD + text_h + self.CONTENT_PAD + self.CARD_PAD_V
+        )
+        frame.setHeight(card_h)
+        return _Geometry(card_h + 2 * self.CARD_MARGIN_V, frame, text_pos, layout, header_rect, {})
+
+    def _viewport_width(self, option) -> float:
+        view = self.parent()
+        if view is not None and hasattr(view, "viewport"):
+            return float(view.viewport().width())
+        return float(option.rect.width())
+
+    def sizeHint(self, option, index: QModelIndex) -> QSize:  # noqa: N802
+        message = _message_for(index)
+        if not message:
+            return QSize(0, 0)
+        width = self._viewport_width(option)
+        # Высота строки запоминается в самом сообщении: полная перераскладка списка
+        # (ресайз, новая строка) не должна заново раскладывать текст всех сообщений
+        size_key = (message.get("_rev"), width)
+        cached = message.get("_size")
+        if cached is not None and cached[0] == size_key:
+            return cached[1]
+        geometry = self._geometry(QRectF(0, 0, width, 0), message)
+        size = QSize(int(width), int(math.ceil(geometry.height)))
+        message["_size"] = (size_key, size)
+        return size
+
+    # ------------------------------------------------------------------
+    # Отрисовка
+    # ------------------------------------------------------------------
+
+    def paint(self, painter: QPainter, option, index: QModelIndex):
+        message = _message_for(index)
+        if not message:
+            return
+        geometry = self._geometry(QRectF(option.rect), message)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setClipRect(option.rect)
+        try:
+            if self.style == STYLE_HISTORY:
+                self._paint_history(painter, geometry, message)
+            elif message.get("role") == "system":
+                self._paint_system(painter, geometry)
+            else:
+                self._paint_chat(painter, geometry, message, index.row())
+        finally:
+            painter.restore()
+
+    def _paint_chat(self, painter: QPainter, geometry: _Geometry, message: Dict[str, Any], row: int):
+        is_user = message.get("role") == "user"
+        frame = geometry.frame
+
+        if is_user:
+            gradient = QLinearGradient(frame.topLeft(), frame.topRight())
+            gradient.setColorAt(0.0, QColor("#4a9eff"))
+            gradient.setColorAt(1.0, QColor("#1a5eff"))
+            brush = QBrush(gradient)
+        else:
+            brush = QBrush(QColor(60, 60, 60))
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(brush)
+        painter.drawPath(_bubble_path(frame, 15.0, 5.0, small_corner="bottom_right" if is_user else "bottom_left"))
+
+        painter.setPen(QColor("white"))
+        geometry.layout.draw(painter, geometry.text_pos)
+
+        painter.setFont(self._time_font)
+        painter.setPen(QColor(255, 255, 255, 178 if is_user else 128))
+        align = Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft
+        painter.drawText(geometry.time_rect, int(align | Qt.AlignmentFlag.AlignVCenter), str(message.get("time") or ""))
+
+        feedback = message.get("feedback")
+        for name, rect in geometry.actions.items():
+            active = (name == "like" and feedback == "positive") or (name == "dislike" and feedback == "negative")
+            hovered = self._hover == (row, name)
+            alpha = 64 if active else 38 if hovered else 13
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(255, 255, 255, alpha))
+            painter.drawEllipse(rect)
+            renderer = _svg_renderer(MESSAGE_ACTIONS[name][0])
+            if renderer is not None:
+                renderer.render(painter, rect.adjusted(2, 2, -2, -2))
+            else:
+                painter.setPen(QColor("white"))
+                painter.setFont(self._time_font)
+                painter.drawText(rect, int(Qt.AlignmentFlag.AlignCenter), "?")
+
+    def _paint_system(self, painter: QPainter, geometry: _Geometry):
+        painter.setPen(QPen(QColor(255, 255, 255, 25), 1))
+        painter.setBrush(QColor(255, 255, 255, 5))
+        painter.drawRoundedRect(geometry.frame, 8, 8)
+        painter.setPen(QColor(255, 255, 255, 153))
+        geometry.layout.draw(painter, geometry.text_pos)
+
+    def _paint_history(self, painter: QPainter, geometry: _Geometry, message: Dict[str, Any]):
+        is_user = message.get("role") == "user"
+        frame = geometry.frame
+        accent = QColor("#4a9eff") if is_user else QColor("#8bc34a")
+
+        painter.setPen(Qt.PenStyle.NoPen)
+        if is_user:
+            gradient = QLinearGradient(frame.topLeft(), frame.topRight())
+            gradient.setColorAt(0.0, QColor(74, 158, 255, 38))
+            gradient.setColorAt(1.0, QColor(26, 94, 255, 38))
+            painter.setBrush(QBrush(gradient))
+        else:
+            painter.setBrush(QColor(60, 60, 60, 128))
+        painter.drawRoundedRect(frame, 8, 8)
+        painter.setBrush(accent)
+        painter.drawRect(QRectF(frame.left(), frame.top() + 2, self.CARD_BORDER, frame.height() - 4))
+
+        # Шапка: роль, время, источник/модель, оценка
+        header = geometry.time_rect
+        x = header.left()
+
+        def draw_part(text: str, font: QFont, color: QColor) -> float:
+            painter.setFont(font)
+            painter.setPen(color)
+            width = QFontMetricsF(font).horizontalAdvance(text)
+            painter.drawText(
+                QRectF(x, header.top(), width + 1, header.height()), int(Qt.AlignmentFlag.AlignVCenter), text
+            )
+            return width + self.HEADER_SPACING
+
+        x += draw_part(_("👤 Вы") if is_user else _("🤖 Arvis"), self._role_font, accent)
+        x += draw_part(_history_time(message), self._time_font, QColor(255, 255, 255, 128))
+
+        metadata = message.get("metadata") or {}
+        meta_text = []
+        if metadata.get("source"):
+            meta_text.append(f"📍 {metadata['source']}")
+        if metadata.get("model"):
+            meta_text.append(f"🧠 {metadata['model']}")
+        if meta_text:
+            x += draw_part(" • ".join(meta_text), self._meta_font, QColor(255, 255, 255, 102))
+
+        feedback = message.get("feedback") or metadata.get("feedback")
+        if feedback:
+            positive = feedback == "positive"
+            text = _("👍 Хороший ответ") if positive else _("👎 Плохой ответ")
+            color = QColor("#8bc34a") if positive else QColor("#f44336")
+            background = QColor(139, 195, 74, 38) if positive else QColor(244, 67, 54, 38)
+            width = QFontMetricsF(self._feedback_font).horizontalAdvance(text) + 16
+            pill = QRectF(x, header.top(), width, header.height())
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(background)
+            painter.drawRoundedRect(pill, 6, 6)
+            painter.setFont(self._feedback_font)
+            painter.setPen(color)
+            painter.drawText(pill, int(Qt.AlignmentFlag.AlignCenter), text)
+
+        painter.setPen(QColor(255, 255, 255, 230))
+        geometry.layout.draw(painter, geometry.text_pos)
+
+    # ------------------------------------------------------------------
+    # Кнопки действий и подсказки
+    # ------------------------------------------------------------------
+
+    def _action_at(self, option, index: QModelIndex, pos) -> Optional[str]:
+        message = _message_for(index)
+        if not message:
+            return None
+        geometry = self._geometry(QRectF(option.rect), message)
+        for name, rect in geometry.actions.items():
+            if rect.contains(QPointF(pos)):
+                return name
+        return None
+
+    def editorEvent(self, event, model, option, index: QModelIndex) -> bool:  # noqa: N802
+        event_type = event.type()
+        if event_type == QEvent.Type.MouseMove:
+            action = self._action_at(option, index, event.position())
+            hover = (index.row(), action) if action else None
+            if hover != self._hover:
+                self._hover = hover
+                view = self.parent()
+                if view is not None and hasattr(view, "viewport"):
+                    view.viewport().update()
+            return False
+        if event_type == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            action = self._action_at(option, index, event.position())
+            if action:
+                self.action_triggered.emit(action, index)
+                return True
+        return False
+
+    def helpEvent(self, event, view, option, index: QModelIndex) -> bool:  # noqa: N802
+        if event is not None and event.type() == QEvent.Type.ToolTip:
+            action = self._action_at(option, index, event.pos())
+            if action:
+                QToolTip.showText(event.globalPos(), _(MESSAGE_ACTIONS[action][1]), view)
+                return True
+            QToolTip.hideText()
+            return True
+        return super().helpEvent(event, view, option, index)
+
+    def clear_hover(self):
+        self._hover = None
+
+
+class MessageListView(QListView):
+    """Виртуализированный список сообщений с подгрузкой старых при прокрутке вверх
+
+    QListView с разной высотой строк перераскладывает все строки модели при каждом
+    изменении, поэтому в модели держится не больше max_rows сообщений: более старые
+    уходят в отдельный список и возвращаются страницами при прокрутке к началу.
+    """
+
+    top_reached = pyqtSignal()
+
+    def __init__(self, style: str = STYLE_CHAT, parent=None, max_rows: int = 300, page_size: int = 200):
+        super().__init__(parent)
+        self.max_rows = max(0, int(max_rows))
+        self.page_size = max(1, int(page_size))
+        self._older: List[Dict[str, Any]] = []
+        # Пользователь у нижнего края (не листает историю) — тогда новые строки вытесняют старые
+        self._follow_bottom = True
+        self.message_model = MessageListModel(self)
+        self.message_delegate = MessageDelegate(style, self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.message_delegate)
+
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setUniformItemSizes(False)
+        self.setMouseTracking(True)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+    def leaveEvent(self, event):  # noqa: N802
+        self.message_delegate.clear_hover()
+        self.viewport().update()
+        super().leaveEvent(event)
+
+    def set_messages(self, messages: Iterable[Dict[str, Any]], scroll_to_end: bool = True):
+        """Показать список сообщений: в модель попадает последняя страница, остальное — по прокрутке"""
+        messages = list(messages)
+        self.message_delegate.clear_cache()
+        self._older = []
+        if scroll_to_end and len(messages) > self.page_size:
+            self._older = [MessageListModel._prepare(m) for m in messages[: -self.page_size]]
+            messages = messages[-self.page_size :]
+        self.message_model.set_messages(messages)
+        if scroll_to_end:
+            self.scroll_to_bottom()
+        else:
+            self.scrollToTop()
+
+    def append_message(self, message: Dict[str, Any]) -> QPersistentModelIndex:
+        """Добавить сообщение в конец; если список прокручен вниз — отцепить лишние старые строки"""
+        index = self.message_model.append_message(message)
+        overflow = self.message_model.rowCount() - self.max_rows
+        if self.max_rows and self._follow_bottom and overflow > 0:
+            self._older.extend(self.message_model.take_first(overflow))
+        return index
+
+    def clear_messages(self):
+        self._older = []
+        self.message_model.clear()
+        self.message_delegate.clear_cache()
+
+    def is_at_bottom(self, tolerance: int = 4) -> bool:
+        scrollbar = self.verticalScrollBar()
+        return scrollbar.value() >= scrollbar.maximum() - tolerance
+
+    def scroll_to_bottom(self):
+        # Отложенно: раскладка новых строк происходит в ближайшем цикле событий
+        self._follow_bottom = True
+        QTimer.singleShot(0, self.scrollToBottom)
+
+    def prepend_preserving_position(self, messages: List[Dict[str, Any]], prepared: bool = False):
+        """Добавить старые сообщения сверху, не сдвигая видимую часть"""
+        if not messages:
+            return
+        scrollbar = self.verticalScrollBar()
+        distance_from_bottom = scrollbar.maximum() - scrollbar.value()
+        self.message_model.prepend_messages(messages, prepared=prepared)
+        self.doItemsLayout()
+        scrollbar.setValue(scrollbar.maximum() - distance_from_bottom)
+
+    def _on_scroll(self, value: int):
+        scrollbar = self.verticalScrollBar()
+        self._follow_bottom = value >= scrollbar.maximum() - 4
+        if value != scrollbar.minimum() or scrollbar.maximum() <= 0:
+            return
+        if self._older:
+            page = self._older[-self.page_size :]
+            del self._older[-self.page_size :]
+            self.prepend_preserving_position(page, prepared=True)
+        else:
+            self.top_reached.emit()
+
+    def _show_context_menu(self, pos):
+        index = self.indexAt(pos)
+        message = self.message_model.message_at(index) if index.isValid() else None
+        if not message or not message.get("content"):
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction(_("Копировать"))
+        if menu.exec(self.viewport().mapToGlobal(pos)) == copy_action:
+            QApplication.clipboard().setText(message["content"])
+
+
+def _message_for(index: QModelIndex) -> Optional[Dict[str, Any]]:
+    """Словарь сообщения напрямую из модели: index.data() через QVariant отдал бы копию"""
+    model = index.model()
+    if isinstance(model, MessageListModel):
+        return model.message_at(index)
+    return index.data(MessageRole)
+
+
+def _history_time(message: Dict[str, Any]) -> str:
+    cached = message.get("_display_time")
+    if cached is None:
+        timestamp = message.get("timestamp", "") or ""
+        try:
+            cached = datetime.fromisoformat(timestamp).strftime("%d.%m.%Y %H:%M:%S")
+        except Exception:
+            cached = str(timestamp)
+        message["_display_time"] = cached
+    return cached
+
+
+def _bubble_path(rect: QRectF, radius: float, small_radius: float, small_corner: str) -> QPainterPath:
+    """Скруглённый прямоугольник, у которого один нижний угол скруглён меньше («хвостик» пузыря)"""
+    radius = min(radius, rect.width() / 2, rect.height() / 2)
+    br = small_radius if small_corner == "bottom_right" else radius
+    bl = small_radius if small_corner == "bottom_left" else radius
+    left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+
+    path = QPainterPath()
+    path.moveTo(left + radius, top)
+    path.lineTo(right - radius, top)
+    path.arcTo(QRectF(right - 2 * radius, top, 2 * radius, 2 * radius), 90, -90)
+    path.lineTo(right, bottom - br)
+    path.arcTo(QRectF(right - 2 * br, bottom - 2 * br, 2 * br, 2 * br), 0, -90)
+    path.lineTo(left + bl, bottom)
+    path.arcTo(QRectF(left, bottom - 2 * bl, 2 * bl, 2 * bl), 270, -90)
+    path.lineTo(left, top + radius)
+    path.arcTo(QRectF(left, top, 2 * radius, 2 * radius), 180, -90)
+    path.closeSubpath()
+    return path
@@ -12,7 +12,7 @@ from PyQt6.QtWidgets import QDialog, QHBoxLayout, QLabel, QLineEdit, QMessageBox
 
 from i18n import _
 from utils.logger import ModuleLogger
-from utils.security import AuditEventType, AuditLogger, User, UserStorage, get_totp_manager
+from utils.security import AuditEventType, User, UserStorage, get_audit_logger, get_totp_manager
 
 
 class TwoFactorVerificationDialog(QDialog):
@@ -24,7 +24,7 @@ class TwoFactorVerificationDialog(QDialog):
         self.user = user
         self.storage = storage
         self.totp = get_totp_manager()
-        self.audit = AuditLogger()
+        self.audit = get_audit_logger()
 
         # Timer for TOTP countdown
         self.remaining_seconds = 30
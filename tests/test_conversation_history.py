@@ -0,0 +1,69 @@
+"""История: окно в памяти ограничено max_messages, вытесненное подгружается из журнала и ищется"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.conversation_history import ConversationHistory
+
+
+def make_history(tmp_path, index=True, **overrides):
+    settings = {
+        "paths.data": str(tmp_path),
+        "history.max_messages": 3,
+        "history.search_index.enabled": index,
+        "history.journal.compact_after_records": 1000,
+    }
+    settings.update(overrides)
+    return ConversationHistory(SimpleNamespace(get=lambda key, default=None: settings.get(key, default)))
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = make_history(tmp_path)
+    for i in range(8):
+        history.add_message("user", f"сообщение номер {i}")
+    yield history
+    history.shutdown()
+
+
+def contents(messages):
+    return [msg["content"] for msg in messages]
+
+
+def test_window_is_bounded_and_older_pages_come_from_journal(history):
+    assert contents(history.get_all()) == [f"сообщение номер {i}" for i in (5, 6, 7)]
+
+    page = history.load_older(count=2)
+    assert contents(page) == ["сообщение номер 3", "сообщение номер 4"]
+    assert contents(history.load_older(page[0]["id"], count=10)) == [f"сообщение номер {i}" for i in (0, 1, 2)]
+    assert history.load_older(history.load_older(count=10)[0]["id"]) == []
+
+
+def test_trimmed_messages_stay_searchable(history):
+    if history.search_index is None:
+        pytest.skip("SQLite FTS5 недоступен")
+    assert contents(history.search("номер 1")) == ["сообщение номер 1"]
+
+
+def test_compaction_and_reload_keep_older_messages(tmp_path, history):
+    history.remove_last_message()
+    history.compact()
+    history.shutdown()
+
+    reloaded = make_history(tmp_path)
+    try:
+        assert contents(reloaded.get_all()) == [f"сообщение номер {i}" for i in (4, 5, 6)]
+        assert contents(reloaded.load_older(count=10)) == [f"сообщение номер {i}" for i in range(4)]
+    finally:
+        reloaded.shutdown()
+
+
+def test_linear_search_without_index_covers_journal(tmp_path):
+    history = make_history(tmp_path, index=False)
+    try:
+        for i in range(6):
+            history.add_message("user", f"фраза {i}")
+        assert contents(history.search("фраза 0")) == ["фраза 0"]
+    finally:
+        history.shutdown()
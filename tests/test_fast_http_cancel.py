@@ -0,0 +1,60 @@
+"""Отмена потокового запроса: сокет рвётся сразу, даже если сервер ещё не прислал заголовки"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from utils.fast_http import FastHTTPClient, StreamHandle
+
+
+@pytest.fixture
+def slow_server():
+    """Сервер, который читает запрос и молчит, пока клиент не закроет соединение"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    state = {"closed_after": None}
+
+    def serve():
+        conn, _ = listener.accept()
+        started = time.monotonic()
+        conn.settimeout(10)
+        try:
+            while conn.recv(4096):
+                pass
+        except OSError:
+            pass
+        state["closed_after"] = time.monotonic() - started
+        conn.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}", state, thread
+    listener.close()
+
+
+def test_abort_before_headers_closes_socket(slow_server):
+    url, state, server = slow_server
+    client = FastHTTPClient(url)
+    handle = StreamHandle()
+    threading.Timer(0.2, handle.abort).start()
+
+    started = time.monotonic()
+    events = list(client.stream_ndjson("/api/generate", {}, timeout=(2.0, 10.0), handle=handle))
+    elapsed = time.monotonic() - started
+    server.join(5)
+    client.close()
+
+    assert events == []
+    assert elapsed < 2.0
+    assert state["closed_after"] is not None and state["closed_after"] < 2.0
+
+
+def test_abort_before_request_skips_it():
+    handle = StreamHandle()
+    handle.abort()
+    client = FastHTTPClient("http://127.0.0.1:9")
+    assert list(client.stream_ndjson("/api/generate", {}, handle=handle)) == []
+    client.close()
@@ -0,0 +1,105 @@
+"""Быстрые ответы: триггер должен быть всей фразой, иначе вопрос уходит в LLM"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.core.fast_path import FastPathResponder
+from utils.intent_router import IntentRouter
+
+
+class FakeCalendar:
+    def get_today_schedule(self):
+        return "📅 На сегодня ничего не запланировано"
+
+
+@pytest.fixture
+def ask():
+    core = SimpleNamespace(
+        weather_module=None,
+        news_module=None,
+        calendar_module=FakeCalendar(),
+        system_control_module=None,
+        search_module=None,
+    )
+    config = SimpleNamespace(get=lambda key, default=None: default)
+    router = IntentRouter()
+    FastPathResponder(core, config).register(router)
+
+    def ask(message):
+        for match in router.route(message):
+            answer = match.spec.handler(match)
+            if answer is not None:
+                return match.name, answer
+        return None
+
+    return ask
+
+
+@pytest.mark.parametrize(
+    "message, intent",
+    [
+        ("Который час?", "fast.time"),
+        ("Скажи, пожалуйста, сколько сейчас времени", "fast.time"),
+        ("какое сегодня число", "fast.date"),
+        ("Арвис, какой сегодня день недели?", "fast.date"),
+        ("что ты умеешь?", "fast.capabilities"),
+        ("расписание на сегодня", "fast.schedule"),
+    ],
+)
+def test_whole_utterance_is_answered(ask, message, intent):
+    result = ask(message)
+    assert result is not None
+    assert result[0] == intent
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "сколько времени займёт поездка в москву",
+        "сколько времени варить яйцо",
+        "какое число у пи",
+        "что ты умеешь делать с файлами",
+    ],
+)
+def test_trigger_inside_other_question_goes_to_llm(ask, message):
+    assert ask(message) is None
+
+
+class DenyCalendar:
+    def can_use_module(self, module):
+        return module != "calendar"
+
+    def get_role(self):
+        return "guest"
+
+
+@pytest.fixture
+def core_without_calendar():
+    """ArvisCore.handle_module_commands с ролью без доступа к календарю"""
+    arvis_core = pytest.importorskip("src.core.arvis_core")
+    core = arvis_core.ArvisCore.__new__(arvis_core.ArvisCore)
+    core.logger = MagicMock()
+    core.rbac = DenyCalendar()
+    core.audit = MagicMock()
+    core.current_user = None
+    core.weather_module = core.news_module = core.system_control_module = core.search_module = None
+    core.calendar_module = FakeCalendar()
+    core.intent_router = IntentRouter()
+    FastPathResponder(core, SimpleNamespace(get=lambda key, default=None: default)).register(core.intent_router)
+    return core
+
+
+def test_other_question_is_not_denied_before_whole_utterance_check(core_without_calendar):
+    core = core_without_calendar
+
+    assert core.handle_module_commands("что у меня сегодня на ужин") is None
+    core.audit.log_event.assert_not_called()
+
+
+def test_schedule_is_still_denied_without_calendar_permission(core_without_calendar):
+    core = core_without_calendar
+
+    assert "нет прав" in core.handle_module_commands("что у меня сегодня")
+    core.audit.log_event.assert_called_once()
@@ -0,0 +1,127 @@
+"""CachedFetcher против локального HTTP-сервера: TTL, stale-while-revalidate, склейка, не-2xx"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from utils.fetch_cache import CachedFetcher
+
+
+class StubServer:
+    """Считает запросы по пути; /slow отвечает с задержкой, /missing — 404"""
+
+    def __init__(self):
+        self.hits = {}
+        self.lock = threading.Lock()
+        self.version = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path
+                with stub.lock:
+                    stub.hits[path] = stub.hits.get(path, 0) + 1
+                    version = stub.version
+                if path == "/slow":
+                    time.sleep(0.3)
+                status = 404 if path == "/missing" else 200
+                body = json.dumps({"path": path, "version": version}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def count(self, path: str) -> int:
+        with self.lock:
+            return self.hits.get(path, 0)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = CachedFetcher()
+    yield fetcher
+    fetcher.close()
+
+
+def test_fresh_response_is_served_from_cache(server, fetcher):
+    first = fetcher.get(server.url("/weather"), params={"q": "kyiv"}, ttl=60)
+    second = fetcher.get(server.url("/weather"), params={"q": "kyiv"}, ttl=60)
+
+    assert first.ok and not first.from_cache
+    assert second.from_cache and not second.stale
+    assert second.data == first.data
+    assert server.count("/weather") == 1
+
+
+def test_stale_response_is_served_while_revalidating(server, fetcher):
+    url = server.url("/news")
+    fetcher.get(url, ttl=0.1, stale_sec=60)
+    time.sleep(0.15)
+    server.version = 1
+
+    stale = fetcher.get(url, ttl=0.1, stale_sec=60)
+    assert stale.from_cache and stale.stale
+    assert stale.data["version"] == 0
+
+    deadline = time.time() + 5
+    while server.count("/news") < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    fresh = fetcher.get(url, ttl=10, stale_sec=60)
+    assert server.count("/news") == 2
+    assert fresh.from_cache and fresh.data["version"] == 1
+
+
+def test_concurrent_identical_gets_are_coalesced(server, fetcher):
+    url = server.url("/slow")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fetcher.get(url, ttl=60))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 5 and all(result.ok for result in results)
+    assert server.count("/slow") == 1
+    assert fetcher.get_stats()["coalesced"] >= 1
+
+
+def test_non_2xx_is_not_cached(server, fetcher):
+    first = fetcher.get(server.url("/missing"), ttl=60)
+    second = fetcher.get(server.url("/missing"), ttl=60)
+
+    assert first.status_code == 404 and not second.from_cache
+    assert server.count("/missing") == 2
+
+
+def test_callers_get_independent_data(server, fetcher):
+    first = fetcher.get(server.url("/weather"), ttl=60)
+    first.data["path"] = "changed"
+
+    assert fetcher.get(server.url("/weather"), ttl=60).data["path"] == "/weather"
@@ -0,0 +1,124 @@
+"""Ошибка посреди стрима LLM: ответ/ошибка доходят до UI, состояние обработки сбрасывается"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+arvis_core = pytest.importorskip("src.core.arvis_core")
+QtCore = pytest.importorskip("PyQt6.QtCore")
+
+
+class FakeRequest:
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeEngine:
+    def __init__(self):
+        self.request = None
+
+    def submit(self, message, context, history, **kwargs):
+        callbacks = {key: value for key, value in kwargs.items() if key.startswith("on_")}
+        self.request = FakeRequest(callbacks)
+        return self.request
+
+
+@pytest.fixture
+def qt_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def core(qt_app, monkeypatch):
+    """ArvisCore без инициализации компонентов: только то, что нужно process_with_llm"""
+    core = arvis_core.ArvisCore.__new__(arvis_core.ArvisCore)
+    QtCore.QObject.__init__(core)
+    core.config = SimpleNamespace(get=lambda key, default=None: {"llm.stream": True}.get(key, default))
+    core.logger = MagicMock()
+    core.tracer = MagicMock()
+    core.llm_client = SimpleNamespace(default_model="test-model")
+    core.tts_engine = None
+    core._tts_pipeline = None
+    core.conversation_history = []
+    core.conversation_history_manager = MagicMock()
+    core.conversation_history_manager.get_recent.return_value = []
+    core._pending_search_results = None
+    core._current_llm_request = None
+    core._is_streaming_current = False
+    core._stream_chunks = []
+    core._auto_continue_enabled = False
+    core._auto_continue_attempts = 0
+    core._auto_continue_max_attempts = 2
+    core.is_processing = True
+    core.generation_state = arvis_core.GenerationState.IDLE
+    core.build_context = lambda search_payload=None: "context"
+    core._restart_wake_listening_if_enabled = lambda: None
+
+    engine = FakeEngine()
+    monkeypatch.setattr(arvis_core, "get_llm_request_engine", lambda *args, **kwargs: engine)
+    core.fake_engine = engine
+
+    core.emitted = {"response": [], "error": [], "finished": 0}
+    core.response_ready.connect(core.emitted["response"].append)
+    core.error_occurred.connect(core.emitted["error"].append)
+    core.processing_finished.connect(lambda: core.emitted.__setitem__("finished", core.emitted["finished"] + 1))
+    return core
+
+
+def test_mid_stream_error_reports_error_and_finishes(core):
+    core.process_with_llm("привет")
+    callbacks = core.fake_engine.request.callbacks
+
+    callbacks["on_chunk"]("Частичный ")
+    callbacks["on_chunk"]("ответ")
+    callbacks["on_error"]("error", "connection reset")
+
+    assert core.emitted["error"] == ["Ошибка LLM: connection reset"]
+    assert core.emitted["finished"] == 1
+    assert core.is_processing is False
+    assert core._current_llm_request is None
+
+
+def test_mid_stream_error_auto_continues_partial_text(core):
+    core._auto_continue_enabled = True
+    core.process_with_llm("привет")
+    request = core.fake_engine.request
+
+    request.callbacks["on_chunk"]("Частичный ")
+    request.callbacks["on_chunk"]("ответ")
+    request.callbacks["on_error"]("error", "connection reset")
+
+    assert core.emitted["response"] == ["Частичный ответ"]
+    assert core.conversation_history[-1] == {"role": "assistant", "content": "Частичный ответ"}
+    assert core._auto_continue_attempts == 1
+    assert core.emitted["finished"] == 1
+    assert core.is_processing is False
+    assert request.cancelled
+
+
+def test_error_before_first_chunk_reports_error(core):
+    core._auto_continue_enabled = True
+    core.process_with_llm("привет")
+
+    core.fake_engine.request.callbacks["on_error"]("error", "model not found")
+
+    assert core.emitted["response"] == []
+    assert core.emitted["error"] == ["Ошибка LLM: model not found"]
+    assert core.emitted["finished"] == 1
+
+
+def test_empty_stream_resets_processing_state(core):
+    core.process_with_llm("привет")
+
+    core.fake_engine.request.callbacks["on_done"]({"text": "", "stats": None})
+
+    assert core.emitted["error"] == ["Получен пустой ответ от LLM. Попробуйте повторить запрос."]
+    assert core.emitted["finished"] == 1
+    assert core.is_processing is False
+    assert core._current_llm_request is None
+    core.tracer.end_turn.assert_called_once()
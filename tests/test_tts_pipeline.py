@@ -0,0 +1,53 @@
+"""Конвейер озвучки: короткие предложения синтезируются вместе со следующими"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from modules.tts_pipeline import StreamingTTSPipeline, merge_short_sentences
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    config = SimpleNamespace(get=lambda key, default=None: default)
+    pipeline = StreamingTTSPipeline(SimpleNamespace(), config)
+    # Без потоков синтеза/воспроизведения: проверяем, что попадает в очередь синтеза
+    monkeypatch.setattr(pipeline, "_ensure_threads", lambda: None)
+    return pipeline
+
+
+def queued(pipeline):
+    return [sentence.text for sentence in pipeline._sentences if not sentence.final]
+
+
+def test_merge_short_sentences():
+    assert merge_short_sentences(["Да.", "Сейчас посмотрю."], 8) == (["Да. Сейчас посмотрю."], "")
+    assert merge_short_sentences(["Хорошо, сделаю.", "Да."], 8) == (["Хорошо, сделаю."], "Да.")
+    assert merge_short_sentences(["Да.", "Ок."], 8) == ([], "Да. Ок.")
+
+
+def test_short_sentence_is_merged_into_next_one(pipeline):
+    pipeline.feed("Да. Сейчас посмотрю погоду. ")
+    assert queued(pipeline) == ["Да. Сейчас посмотрю погоду."]
+
+
+def test_held_fragment_waits_for_next_chunk(pipeline):
+    pipeline.feed("Да. ")
+    assert queued(pipeline) == []
+    pipeline.feed("Завтра будет солнечно. Нет")
+    assert queued(pipeline) == ["Да. Завтра будет солнечно."]
+    pipeline.finish()
+    assert queued(pipeline) == ["Да. Завтра будет солнечно.", "Нет"]
+
+
+def test_finish_speaks_held_fragment(pipeline):
+    pipeline.feed("Да. ")
+    pipeline.finish()
+    assert queued(pipeline) == ["Да."]
+
+
+def test_stop_drops_held_fragment(pipeline):
+    pipeline.feed("Да. ")
+    pipeline.stop()
+    pipeline.feed("Новая реплика началась. ")
+    assert queued(pipeline) == ["Новая реплика началась."]
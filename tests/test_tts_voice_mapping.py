@@ -0,0 +1,53 @@
+"""Silero через постоянный воркер: голос маппится так же, как в synthesize_audio"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sounddevice")
+pytest.importorskip("soundfile")
+
+from modules.silero_tts_engine import SileroTTSEngine  # noqa: E402
+from modules.tts_audio_cache import TTSAudioCache  # noqa: E402
+from modules.tts_engine import TTSEngine  # noqa: E402
+
+
+class FakeWorkerClient:
+    def __init__(self):
+        self.voices = []
+
+    def synthesize(self, text, voice=None, sample_rate=None):
+        self.voices.append(voice)
+        return np.ones(16, dtype=np.float32)
+
+    def synthesize_to_file(self, text, output_filename, voice=None, sample_rate=None):
+        self.voices.append(voice)
+        return True
+
+
+@pytest.fixture(params=[TTSEngine, SileroTTSEngine])
+def engine(request, tmp_path):
+    engine = request.param.__new__(request.param)
+    engine.config = None
+    engine.voice = "Default"
+    engine.sample_rate = 48000
+    engine.engine_name = "silero"
+    engine.model = None
+    engine._model_initialized = True
+    engine._audio_cache = TTSAudioCache(tmp_path, 1 << 20, 1 << 20)
+    engine._worker_client = FakeWorkerClient()
+    engine._play_audio_async = lambda audio: None
+    return engine
+
+
+def test_worker_gets_mapped_speaker(engine):
+    assert engine._speak_via_worker("Привет", "Baya")
+    assert engine._speak_via_worker("Привет", None, "out.wav")
+    assert engine._worker_client.voices == ["baya", "aidar"]
+
+
+def test_spoken_clip_is_reused_by_synthesize_audio(engine):
+    assert engine._speak_via_worker("Привет")
+    audio = engine.synthesize_audio("Привет", "aidar")
+
+    assert audio is not None and audio.size == 16
+    assert engine._worker_client.voices == ["aidar"]
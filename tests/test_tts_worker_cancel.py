@@ -0,0 +1,101 @@
+"""Отмена запросов постоянного TTS-воркера: только для ещё не завершённых запросов"""
+
+import json
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from modules.tts_worker_client import TTSWorkerClient, _PendingRequest
+
+
+@pytest.fixture
+def client():
+    client = TTSWorkerClient(SimpleNamespace(get=lambda key, default=None: default))
+    client.sent = []
+    client._send = client.sent.append
+    return client
+
+
+def test_cancel_is_sent_only_for_running_requests(client):
+    pending = _PendingRequest("r1")
+    client._pending["r1"] = pending
+
+    client.cancel("r1")
+    client.cancel("r1")
+    client.cancel("r2")
+
+    assert pending.cancelled and pending.event.is_set()
+    assert client.sent == [{"op": "cancel", "id": "r1"}]
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """serve() в потоке, stdin/stdout — пайпы; синтез подменён и ждёт разрешения"""
+    pytest.importorskip("soundfile")
+    from modules import tts_worker_subprocess as subprocess_worker
+
+    release = {}
+
+    def fake_synthesize(torch_mod, model, text, voice, sample_rate):
+        gate = release.get(text)
+        if gate is not None:
+            gate.wait(5)
+        return np.zeros(4, dtype=np.float32)
+
+    monkeypatch.setattr(subprocess_worker, "_import_torch", lambda: (object(), None))
+    monkeypatch.setattr(subprocess_worker, "_prepare_environment", lambda: None)
+    monkeypatch.setattr(subprocess_worker, "load_silero_model", lambda torch_mod, device: object())
+    monkeypatch.setattr(subprocess_worker, "synthesize", fake_synthesize)
+
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    monkeypatch.setattr(sys, "stdin", SimpleNamespace(buffer=os.fdopen(in_r, "rb")))
+    monkeypatch.setattr(sys, "stdout", SimpleNamespace(buffer=os.fdopen(out_w, "wb")))
+    thread = threading.Thread(target=subprocess_worker.serve, args=("aidar", 48000, "cpu"), daemon=True)
+    thread.start()
+
+    to_worker = os.fdopen(in_w, "wb")
+    from_worker = os.fdopen(out_r, "rb")
+
+    def send(payload):
+        to_worker.write((json.dumps(payload) + "\n").encode())
+        to_worker.flush()
+
+    def receive():
+        header = json.loads(from_worker.readline())
+        from_worker.read(header["bytes"])
+        return header
+
+    assert receive()["op"] == "ready"
+    yield SimpleNamespace(send=send, receive=receive, release=release)
+    send({"op": "shutdown"})
+    thread.join(5)
+
+
+def test_late_cancel_is_not_remembered(worker):
+    worker.send({"op": "synth", "id": "r1", "text": "раз"})
+    assert worker.receive()["ok"]
+
+    # Отмена пришла после ответа: повторный id не должен оказаться отменённым
+    worker.send({"op": "cancel", "id": "r1"})
+    worker.send({"op": "synth", "id": "r1", "text": "два"})
+    header = worker.receive()
+    assert header["ok"] and not header.get("cancelled")
+
+
+def test_cancel_of_queued_request_is_honoured(worker):
+    gate = threading.Event()
+    worker.release["долго"] = gate
+    worker.send({"op": "synth", "id": "r1", "text": "долго"})
+    worker.send({"op": "synth", "id": "r2", "text": "потом"})
+    worker.send({"op": "cancel", "id": "r2"})
+    worker.send({"op": "ping", "id": "p1"})
+    assert worker.receive()["op"] == "pong"
+    gate.set()
+
+    assert worker.receive()["ok"]
+    assert worker.receive() == {"id": "r2", "ok": False, "cancelled": True, "bytes": 0}
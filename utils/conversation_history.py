@@ -1,14 +1,26 @@
 """
 Conversation history manager for Arvis
 Handles persistent storage and retrieval of conversation history
+
+История хранится в append-only журнале JSONL: каждое изменение (add / feedback /
+remove) дописывается одной строкой, поэтому сохранение не зависит от длины истории.
+Журнал периодически компактируется до снимка живых сообщений.
+
+В памяти держится только окно из последних max_messages сообщений. Вытесненные из окна
+сообщения остаются в журнале и в поисковом индексе: load_older() подгружает их из
+журнала страницами по запросу (например, при прокрутке окна истории вверх).
 """
 
+import itertools
 import json
 import os
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from utils.history_search_index import HistorySearchIndex
 from utils.logger import ModuleLogger
 
 
@@ -25,23 +37,39 @@ class ConversationHistory:
         # Настройки
         self.max_messages = config.get("history.max_messages", 50)
         self.save_to_file = config.get("history.save_to_file", True)
-        self.auto_save_interval = config.get("history.auto_save_interval", 5)  # каждые N сообщений
+        # Компактировать журнал, когда мёртвых записей (обрезанных/удалённых/дельт) накопилось столько
+        self.compact_after_records = max(1, int(config.get("history.journal.compact_after_records", 200)))
+        self.fsync_journal = bool(config.get("history.journal.fsync", False))
 
-        # Путь к файлу истории
+        # Журнал истории (и старый JSON-файл — только для миграции)
         data_path = Path(config.get("paths.data", "data"))
         data_path.mkdir(parents=True, exist_ok=True)
-        self.history_file = data_path / "conversation_history.json"
+        self.history_file = data_path / "conversation_history.jsonl"
+        self.legacy_history_file = data_path / "conversation_history.json"
 
         # Папка для архива старых сессий
         self.archive_dir = data_path / "conversation_archive"
         self.archive_dir.mkdir(parents=True, exist_ok=True)
 
-        # Счётчик для автосохранения
-        self._save_counter = 0
+        # Полнотекстовый индекс живой истории и архивов (None — линейный поиск по messages)
+        self.search_index: Optional[HistorySearchIndex] = None
+        if self.save_to_file and config.get("history.search_index.enabled", True):
+            index = HistorySearchIndex(data_path / "history_index.db", self.archive_dir)
+            self.search_index = index if index.available else None
+
+        # Состояние журнала: все изменения messages и записи в файл — под этой блокировкой
+        self._lock = threading.RLock()
+        self._journal_fp = None
+        self._journal_records = 0
+        # Живых сообщений в журнале: окно messages плюс вытесненные из памяти
+        self._live_total = 0
+        self._next_id = 1
+        self._compaction_pending = False
 
         # Загружаем историю при инициализации
         if self.save_to_file:
             self.load_from_file()
+            self._sync_search_index()
 
     def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
         """Добавить сообщение в историю
@@ -62,17 +90,16 @@ class ConversationHistory:
         else:
             message["metadata"] = {}
 
-        self.messages.append(message)
+        with self._lock:
+            self._assign_id(message)
+            self.messages.append(message)
 
-        # Ограничиваем размер истории
-        if self.max_messages > 0 and len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+            # Ограничиваем окно в памяти; вытесненные остаются в журнале и индексе (см. load_older)
+            self._trim_window()
 
-        # Автосохранение каждые N сообщений
-        self._save_counter += 1
-        if self.save_to_file and self._save_counter >= self.auto_save_interval:
-            self._save_counter = 0
-            self.save_to_file_async()
+            self._live_total += 1
+            self._append_record({"op": "add", "message": message})
+            self._update_search_index(added=[message])
 
     def get_recent(self, count: int = 6) -> List[Dict[str, Any]]:
         """Получить последние N сообщений для контекста LLM"""
@@ -82,6 +109,32 @@ class ConversationHistory:
         """Получить всю историю текущей сессии"""
         return self.messages.copy()
 
+    def load_older(self, before_id: Optional[int] = None, count: int = 50) -> List[Dict[str, Any]]:
+        """Подгрузить из журнала страницу сообщений, вытесненных из окна в памяти
+
+        Args:
+            before_id: вернуть сообщения старше этого id (по умолчанию — старше окна messages)
+            count: размер страницы
+
+        Returns:
+            До count сообщений в хронологическом порядке; пустой список — старше ничего нет
+        """
+        if not self.save_to_file or count <= 0:
+            return []
+
+        with self._lock:
+            if before_id is None:
+                before_id = self.messages[0].get("id") if self.messages else self._next_id
+            if not isinstance(before_id, int) or not self.history_file.exists():
+                return []
+            # Под блокировкой: компактирование не подменит файл между проходами чтения
+            try:
+                page: "deque[Dict[str, Any]]" = deque(self._iter_live_journal(before_id), maxlen=count)
+            except Exception as e:
+                self.logger.error(f"Failed to load older history: {e}")
+                return []
+        return list(page)
+
     def remove_last_message(self, role: Optional[str] = None) -> bool:
         """Удалить последнее сообщение из истории
 
@@ -93,25 +146,32 @@ class ConversationHistory:
             bool: True если сообщение удалено, False если не найдено
         """
         try:
-            if not self.messages:
-                self.logger.warning("Cannot remove message: history is empty")
-                return False
-
-            if role is None:
-                # Удаляем последнее сообщение любой роли
-                removed_msg = self.messages.pop()
-                self.logger.info(f"Removed last message (role={removed_msg.get('role')})")
-                return True
-            else:
-                # Ищем последнее сообщение указанной роли
-                for i in range(len(self.messages) - 1, -1, -1):
-                    if self.messages[i].get("role") == role:
-                        removed_msg = self.messages.pop(i)
-                        self.logger.info(f"Removed last '{role}' message at index {i}")
-                        return True
-
-                self.logger.warning(f"No message with role='{role}' found")
-                return False
+            with self._lock:
+                if not self.messages:
+                    self.logger.warning("Cannot remove message: history is empty")
+                    return False
+
+                if role is None:
+                    # Удаляем последнее сообщение любой роли
+                    removed_msg = self.messages.pop()
+                    self._live_total -= 1
+                    self._append_record({"op": "remove", "id": removed_msg.get("id")})
+                    self._update_search_index(removed=[removed_msg])
+                    self.logger.info(f"Removed last message (role={removed_msg.get('role')})")
+                    return True
+                else:
+                    # Ищем последнее сообщение указанной роли
+                    for i in range(len(self.messages) - 1, -1, -1):
+                        if self.messages[i].get("role") == role:
+                            removed_msg = self.messages.pop(i)
+                            self._live_total -= 1
+                            self._append_record({"op": "remove", "id": removed_msg.get("id")})
+                            self._update_search_index(removed=[removed_msg])
+                            self.logger.info(f"Removed last '{role}' message at index {i}")
+                            return True
+
+                    self.logger.warning(f"No message with role='{role}' found")
+                    return False
 
         except Exception as e:
             self.logger.error(f"Error removing last message: {e}")
@@ -119,34 +179,71 @@ class ConversationHistory:
 
     def clear(self):
         """Очистить историю текущей сессии"""
-        # Архивируем текущую сессию перед очисткой
-        if self.save_to_file and self.messages:
-            self._archive_current_session()
-
-        self.messages.clear()
-        self._save_counter = 0
+        with self._lock:
+            # Архивируем текущую сессию перед очисткой
+            archive_file = None
+            if self.save_to_file and self.messages:
+                archive_file = self._archive_current_session()
+
+            # Уже проиндексированные сообщения переезжают в архивный источник без переиндексации
+            if self.search_index is not None:
+                if archive_file is not None:
+                    self.search_index.archive_live(archive_file)
+                else:
+                    self.search_index.clear_live()
+
+            self.messages.clear()
+            self._live_total = 0
+            # Пустой снимок дешевле, чем хранить в журнале запись "clear" поверх всей сессии
+            self.compact()
         self.logger.info("Conversation history cleared")
 
-    def save_to_file_sync(self):
-        """Синхронное сохранение в файл"""
+    def compact(self):
+        """Переписать журнал снимком живых сообщений (атомарно через временный файл)
+
+        Вытесненные из окна сообщения переносятся из старого журнала потоком, окно — из памяти.
+        """
         if not self.save_to_file:
             return
 
-        try:
-            data = {
-                "session_start": self.messages[0]["timestamp"] if self.messages else None,
-                "session_last": self.messages[-1]["timestamp"] if self.messages else None,
-                "message_count": len(self.messages),
-                "messages": self.messages,
-            }
-
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+        with self._lock:
+            self._compaction_pending = False
+            tmp_file = self.history_file.with_suffix(".jsonl.tmp")
+            try:
+                self._close_journal()
+                older: Iterable[Dict[str, Any]] = ()
+                if self._live_total > len(self.messages) and self.history_file.exists():
+                    oldest_id = self.messages[0].get("id") if self.messages else self._next_id
+                    older = self._iter_live_journal(oldest_id)
+                written = 0
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    for message in itertools.chain(older, self.messages):
+                        f.write(json.dumps({"op": "add", "message": message}, ensure_ascii=False))
+                        f.write("\n")
+                        written += 1
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.history_file)
+                self._journal_records = written
+                self._live_total = written
+                self.logger.debug(f"History journal compacted: {written} messages")
+            except Exception as e:
+                self.logger.error(f"Failed to compact history journal: {e}")
 
-            self.logger.debug(f"History saved: {len(self.messages)} messages")
+    def save_to_file_sync(self):
+        """Синхронное сохранение: сброс журнала на диск и компактирование"""
+        if not self.save_to_file:
+            return
 
-        except Exception as e:
-            self.logger.error(f"Failed to save history: {e}")
+        with self._lock:
+            if self._journal_records > self._live_total or not self.history_file.exists():
+                self.compact()
+            elif self._journal_fp is not None:
+                try:
+                    self._journal_fp.flush()
+                    os.fsync(self._journal_fp.fileno())
+                except Exception as e:
+                    self.logger.error(f"Failed to flush history journal: {e}")
 
     def save_to_file_async(self):
         """Асинхронное сохранение в фоне (не блокирует UI)"""
@@ -166,72 +263,291 @@ class ConversationHistory:
             self.save_to_file_sync()
 
     def load_from_file(self):
-        """Загрузить историю из файла"""
+        """Загрузить историю из журнала
+
+        Журнал читается построчно: в памяти держится только окно из последних
+        max_messages сообщений, более старые остаются в журнале для load_older().
+        """
         if not self.history_file.exists():
-            self.logger.info("No existing history file found, starting fresh")
+            if self.legacy_history_file.exists():
+                self._migrate_legacy_file()
+            else:
+                self.logger.info("No existing history file found, starting fresh")
             return
 
+        live: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        records = 0
+        corrupted = 0
+        live_total = 0
+
         try:
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            for record in self._iter_journal():
+                if record is None:
+                    corrupted += 1
+                    continue
+                records += 1
+                op = record.get("op")
+
+                if op == "add":
+                    message = record.get("message")
+                    if not isinstance(message, dict):
+                        continue
+                    message_id = self._assign_id(message)
+                    live[message_id] = message
+                    live_total += 1
+                    if self.max_messages > 0 and len(live) > self.max_messages:
+                        live.popitem(last=False)
+                elif op == "feedback":
+                    message = live.get(record.get("id"))
+                    if message is not None:
+                        self._apply_feedback(message, record.get("feedback"), record.get("timestamp"))
+                elif op == "remove":
+                    live.pop(record.get("id"), None)
+                    live_total -= 1
+                elif op == "clear":
+                    live.clear()
+                    live_total = 0
+
+            with self._lock:
+                self.messages = list(live.values())
+                self._journal_records = records
+                self._live_total = max(live_total, len(self.messages))
+            self.logger.info(f"Loaded {len(self.messages)} messages from history")
 
-            messages = data.get("messages", [])
+        except Exception as e:
+            self.logger.error(f"Failed to load history: {e}")
+            self.messages = []
+            return
+
+        # Битые строки (например, оборванная при сбое последняя запись) убираем компактированием
+        if corrupted:
+            self.logger.warning(f"Skipped {corrupted} corrupted history record(s)")
+        if corrupted or records - self._live_total >= self.compact_after_records:
+            self.compact()
+
+    def _iter_journal(self) -> Iterator[Optional[Dict[str, Any]]]:
+        """Построчно читать журнал. Для нечитаемых строк возвращает None"""
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+                    continue
+                yield record if isinstance(record, dict) else None
+
+    def _iter_live_journal(self, before_id: int) -> Iterator[Dict[str, Any]]:
+        """Живые сообщения журнала с id < before_id в порядке записи (с применённым feedback)
+
+        Два прохода по файлу: сначала собираются удаления и дельты feedback (их мало),
+        затем потоком отдаются сообщения — всю историю в память читать не нужно.
+        """
+        removed = set()
+        feedback: Dict[Any, Dict[str, Any]] = {}
+        last_clear = -1
+        for position, record in enumerate(self._iter_journal()):
+            if record is None:
+                continue
+            op = record.get("op")
+            if op == "remove":
+                removed.add(record.get("id"))
+            elif op == "feedback":
+                feedback[record.get("id")] = record
+            elif op == "clear":
+                last_clear = position
+
+        for position, record in enumerate(self._iter_journal()):
+            if position <= last_clear or record is None or record.get("op") != "add":
+                continue
+            message = record.get("message")
+            if not isinstance(message, dict):
+                continue
+            message_id = message.get("id")
+            if not isinstance(message_id, int) or message_id >= before_id or message_id in removed:
+                continue
+            delta = feedback.get(message_id)
+            if delta is not None:
+                self._apply_feedback(message, delta.get("feedback"), delta.get("timestamp"))
+            yield message
 
-            # Ограничиваем загружаемую историю
+    def _trim_window(self):
+        """Вытеснить из окна в памяти сообщения сверх max_messages (вызывается под блокировкой)"""
+        if self.max_messages > 0 and len(self.messages) > self.max_messages:
+            del self.messages[: len(self.messages) - self.max_messages]
+
+    def _migrate_legacy_file(self):
+        """Однократно перенести историю из старого conversation_history.json в журнал"""
+        try:
+            with open(self.legacy_history_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            messages = [m for m in data.get("messages", []) if isinstance(m, dict)]
             if self.max_messages > 0 and len(messages) > self.max_messages:
                 messages = messages[-self.max_messages :]
 
-            self.messages = messages
-            self.logger.info(f"Loaded {len(messages)} messages from history")
+            with self._lock:
+                for message in messages:
+                    self._assign_id(message)
+                self.messages = messages
+                self.compact()
+
+            os.replace(self.legacy_history_file, self.legacy_history_file.with_suffix(".json.bak"))
+            self.logger.info(f"Migrated {len(messages)} messages to history journal")
 
         except Exception as e:
-            self.logger.error(f"Failed to load history: {e}")
+            self.logger.error(f"Failed to migrate legacy history: {e}")
             self.messages = []
 
-    def _archive_current_session(self):
-        """Архивировать текущую сессию"""
-        if not self.messages:
+    def _assign_id(self, message: Dict[str, Any]) -> int:
+        """Выдать сообщению id для дельта-записей журнала (существующий id сохраняется)"""
+        message_id = message.get("id")
+        if not isinstance(message_id, int):
+            message_id = self._next_id
+            message["id"] = message_id
+        self._next_id = max(self._next_id, message_id + 1)
+        return message_id
+
+    def _append_record(self, record: Dict[str, Any]):
+        """Дописать одну запись в журнал (вызывается под блокировкой)"""
+        if not self.save_to_file:
             return
 
+        try:
+            if self._journal_fp is None:
+                self._journal_fp = open(self.history_file, "a", encoding="utf-8")
+            self._journal_fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal_fp.flush()
+            if self.fsync_journal:
+                os.fsync(self._journal_fp.fileno())
+            self._journal_records += 1
+        except Exception as e:
+            self.logger.error(f"Failed to append history record: {e}")
+            self._close_journal()
+            return
+
+        # Компактирование — в фоне и не чаще одного ожидающего задания
+        if not self._compaction_pending and self._journal_records - self._live_total >= self.compact_after_records:
+            self._compaction_pending = True
+            self.save_to_file_async()
+
+    def _close_journal(self):
+        if self._journal_fp is None:
+            return
+        try:
+            self._journal_fp.close()
+        except Exception:
+            pass
+        self._journal_fp = None
+
+    @staticmethod
+    def _apply_feedback(message: Dict[str, Any], feedback: Optional[str], timestamp: Optional[str]):
+        message["feedback"] = feedback
+        message.setdefault("metadata", {})["feedback"] = feedback
+        message["feedback_timestamp"] = timestamp
+
+    def _archive_current_session(self) -> Optional[Path]:
+        """Архивировать текущую сессию. Возвращает путь к архиву или None"""
+        if not self.messages:
+            return None
+
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             archive_file = self.archive_dir / f"session_{timestamp}.json"
 
+            # В архив идёт вся сессия, включая вытесненные из окна сообщения
+            messages = self.messages
+            if self._live_total > len(self.messages) and self.history_file.exists():
+                messages = list(self._iter_live_journal(self.messages[0].get("id"))) + self.messages
+
             data = {
-                "session_start": self.messages[0]["timestamp"],
-                "session_end": self.messages[-1]["timestamp"],
-                "message_count": len(self.messages),
-                "messages": self.messages,
+                "session_start": messages[0]["timestamp"],
+                "session_end": messages[-1]["timestamp"],
+                "message_count": len(messages),
+                "messages": messages,
             }
 
             with open(archive_file, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
 
             self.logger.info(f"Session archived: {archive_file.name}")
+            return archive_file
 
         except Exception as e:
             self.logger.error(f"Failed to archive session: {e}")
+            return None
 
-    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def _update_search_index(self, added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = ()):
+        """Инкрементально обновить живую часть индекса (вызывается под блокировкой)"""
+        if self.search_index is None:
+            return
+        removed_ids = [msg.get("id") for msg in removed]
+        if removed_ids:
+            self.search_index.remove_live(removed_ids)
+        added = list(added)
+        if added:
+            self.search_index.add_live(added)
+
+    def _sync_search_index(self):
+        """Сверить индекс с загруженной историей и доиндексировать архивы в фоне"""
+        if self.search_index is None:
+            return
+
+        with self._lock:
+            # Вытесненные из окна сообщения тоже остаются в индексе
+            live = self.messages
+            if self._live_total > len(self.messages) and self.history_file.exists():
+                live = itertools.chain(self._iter_live_journal(self.messages[0].get("id")), self.messages)
+            self.search_index.sync_live(live)
+
+        index = self.search_index
+        try:
+            from utils.async_manager import task_manager
+
+            task_manager.run_async("history_index_sync", index.sync_archives)
+        except Exception as e:
+            self.logger.debug(f"Background archive indexing unavailable, indexing now: {e}")
+            index.sync_archives()
+
+    def search(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
         """Поиск в истории по тексту
 
         Args:
             query: поисковый запрос
             limit: максимум результатов
+            offset: сколько результатов пропустить (для постраничной выдачи)
 
         Returns:
             Список сообщений, содержащих запрос
         """
-        query_lower = query.lower()
-        results = []
+        return self.search_page(query, limit=limit, offset=offset)[0]
 
-        for msg in reversed(self.messages):  # Начинаем с конца (свежие первыми)
-            if query_lower in msg.get("content", "").lower():
-                results.append(msg)
-                if len(results) >= limit:
-                    break
+    def search_page(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """Страница результатов поиска по живой истории и архивам
 
-        return results
+        С индексом результаты ранжированы (bm25), слова ищутся по префиксу и по основе.
+        Без индекса — подстрочный поиск по текущей сессии (включая вытесненные из окна
+        сообщения журнала), свежие первыми.
+
+        Returns:
+            (сообщения, есть_ли_следующая_страница)
+        """
+        if not (query or "").strip():
+            return [], False
+
+        if self.search_index is not None:
+            return self.search_index.search(query, limit=limit, offset=offset)
+
+        query_lower = query.lower()
+        with self._lock:
+            messages: Iterable[Dict[str, Any]] = list(self.messages)
+            if self.save_to_file and self._live_total > len(self.messages) and self.history_file.exists():
+                messages = itertools.chain(self._iter_live_journal(self.messages[0].get("id")), messages)
+            matches = [msg for msg in messages if query_lower in msg.get("content", "").lower()]
+        matches.reverse()
+        return matches[offset : offset + limit], len(matches) > offset + limit
 
     def set_message_feedback(self, message_content: str, feedback: str) -> bool:
         """Сохранить оценку для последнего подходящего ответа ассистента."""
@@ -241,21 +557,24 @@ class ConversationHistory:
 
         content_to_match = (message_content or "").strip()
 
-        for msg in reversed(self.messages):
-            if msg.get("role") != "assistant":
-                continue
-            if (msg.get("content") or "").strip() != content_to_match:
-                continue
-
-            msg["feedback"] = feedback
-            msg.setdefault("metadata", {})["feedback"] = feedback
-            msg["feedback_timestamp"] = datetime.now().isoformat()
-
-            if self.save_to_file:
-                self.save_to_file_async()
-
-            self.logger.debug(f"Feedback '{feedback}' saved for assistant message")
-            return True
+        with self._lock:
+            for msg in reversed(self.messages):
+                if msg.get("role") != "assistant":
+                    continue
+                if (msg.get("content") or "").strip() != content_to_match:
+                    continue
+
+                timestamp = datetime.now().isoformat()
+                self._apply_feedback(msg, feedback, timestamp)
+                if self.search_index is not None:
+                    self.search_index.set_feedback(msg.get("id"), feedback)
+                # В журнал пишется только дельта, а не всё сообщение
+                self._append_record(
+                    {"op": "feedback", "id": msg.get("id"), "feedback": feedback, "timestamp": timestamp}
+                )
+
+                self.logger.debug(f"Feedback '{feedback}' saved for assistant message")
+                return True
 
         self.logger.warning("Failed to match assistant message for feedback")
         return False
@@ -373,11 +692,22 @@ class ConversationHistory:
                 return
 
             # Добавляем к текущей истории (не заменяем)
-            self.messages.extend(messages)
-
-            # Ограничиваем размер
-            if self.max_messages > 0 and len(self.messages) > self.max_messages:
-                self.messages = self.messages[-self.max_messages :]
+            with self._lock:
+                imported = []
+                for message in messages:
+                    if not isinstance(message, dict):
+                        continue
+                    message = dict(message)
+                    message.pop("id", None)
+                    self._assign_id(message)
+                    self.messages.append(message)
+                    imported.append(message)
+                    self._append_record({"op": "add", "message": message})
+
+                # Ограничиваем окно в памяти; всё импортированное остаётся в журнале и индексе
+                self._trim_window()
+                self._live_total += len(imported)
+                self._update_search_index(added=imported)
 
             self.logger.info(f"Imported {len(messages)} messages from {file_path}")
 
@@ -389,3 +719,7 @@ class ConversationHistory:
         if self.save_to_file:
             self.logger.info("Saving conversation history on shutdown...")
             self.save_to_file_sync()
+            with self._lock:
+                self._close_journal()
+                if self.search_index is not None:
+                    self.search_index.close()
@@ -2,16 +2,174 @@
 Быстрый HTTP клиент с пулом соединений для предотвращения зависаний
 """
 
+import codecs
+import json
+import re
+import socket
 import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from urllib3.util.retry import Retry
 
 from utils.logger import ModuleLogger
 
+# Размер чтения из сокета для потоковых ответов (urllib3 всё равно отдаёт chunked-куски по мере прихода)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_NDJSON_WS = re.compile(r"[ \t\r\n]*")
+_json_decoder = json.JSONDecoder()
+
+# StreamHandle запроса, который сейчас отправляет этот поток (см. _TrackingPoolMixin)
+_sending = threading.local()
+
+
+def iter_ndjson(chunks: Iterable[bytes], on_error=None) -> Iterator[Dict[str, Any]]:
+    """Инкрементально разобрать NDJSON-поток из байтовых кусков.
+
+    Куски декодируются инкрементальным UTF-8 декодером (многобайтные символы могут
+    разрываться между кусками), объекты разбираются прямо из буфера через raw_decode
+    без нарезки на строки. Повреждённая строка пропускается целиком.
+
+    Args:
+        chunks: Итератор байтовых кусков (например, response.iter_content())
+        on_error: Необязательный callback(str) для пропущенных строк
+
+    Yields:
+        Разобранные JSON-объекты
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += decoder.decode(chunk)
+        pos = 0
+        end = len(buffer)
+        while True:
+            pos = _NDJSON_WS.match(buffer, pos).end()
+            # Объект считаем полным только когда пришёл перевод строки
+            newline = buffer.find("\n", pos)
+            if pos >= end or newline == -1:
+                break
+            try:
+                obj, pos = _json_decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if on_error is not None:
+                    on_error(buffer[pos:newline][:80])
+                pos = newline + 1
+                continue
+            yield obj
+        # Один сдвиг буфера на кусок, а не на каждую строку
+        buffer = buffer[pos:]
+
+    buffer += decoder.decode(b"", final=True)
+    tail = buffer.strip()
+    if tail:
+        try:
+            yield json.loads(tail)
+        except ValueError:
+            if on_error is not None:
+                on_error(tail[:80])
+
+
+class StreamHandle:
+    """Ручка потокового запроса: позволяет оборвать чтение из другого потока.
+
+    abort() делает shutdown() сокета — блокирующий recv() в читающем потоке сразу
+    получает ошибку/EOF, а сервер (Ollama) видит разрыв и прекращает генерацию.
+    Сокет известен ещё до заголовков ответа (соединение берётся из пула через
+    _TrackingPoolMixin), так что отмена во время загрузки модели или разбора
+    промпта тоже рвёт соединение сразу, а не после первого токена.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._response: Optional[requests.Response] = None
+        self._connection = None
+        self.aborted = False
+
+    def bind_connection(self, connection) -> None:
+        """Соединение из пула, по которому уходит запрос (до получения заголовков)"""
+        with self._lock:
+            self._connection = connection
+            aborted = self.aborted
+        if aborted:
+            _shutdown(connection)
+
+    def attach(self, response: requests.Response) -> bool:
+        """Привязать ответ. False — ручку уже оборвали, ответ нужно закрыть"""
+        with self._lock:
+            if self.aborted:
+                return False
+            self._response = response
+            return True
+
+    def detach(self) -> None:
+        with self._lock:
+            self._response = None
+            self._connection = None
+
+    def abort(self) -> None:
+        """Оборвать соединение (идемпотентно, безопасно из любого потока)"""
+        with self._lock:
+            self.aborted = True
+            response = self._response
+            connection = self._connection
+            self._response = None
+            self._connection = None
+        if response is not None:
+            connection = getattr(response.raw, "_connection", None) or connection
+        if connection is not None:
+            _shutdown(connection)
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+
+def _shutdown(connection) -> None:
+    """shutdown() сокета urllib3-соединения, если он уже открыт"""
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _TrackingPoolMixin:
+    """Пул urllib3, сообщающий StreamHandle текущего потока, какое соединение он выдал"""
+
+    def _get_conn(self, timeout=None):
+        connection = super()._get_conn(timeout)
+        handle = getattr(_sending, "handle", None)
+        if handle is not None:
+            handle.bind_connection(connection)
+        return connection
+
+
+class _TrackingHTTPConnectionPool(_TrackingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackingHTTPSConnectionPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _TrackingHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackingHTTPConnectionPool,
+            "https": _TrackingHTTPSConnectionPool,
+        }
+
 
 class FastHTTPClient:
     """Быстрый HTTP клиент с пулом соединений и таймаутами"""
@@ -41,7 +199,9 @@ class FastHTTPClient:
         )
 
         # HTTP адаптер с пулом соединений
-        adapter = HTTPAdapter(pool_connections=5, pool_maxsize=10, max_retries=retry_strategy, pool_block=False)
+        adapter = _TrackingHTTPAdapter(
+            pool_connections=5, pool_maxsize=10, max_retries=retry_strategy, pool_block=False
+        )
 
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
@@ -148,6 +308,50 @@ class FastHTTPClient:
         except Exception as e:
             return {"success": False, "status_code": 0, "data": None, "error": str(e)}
 
+    def stream_ndjson(
+        self,
+        endpoint: str,
+        json_data: Dict[str, Any],
+        timeout: Union[float, Tuple[float, float]] = (2.0, 120.0),
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        handle: Optional[StreamHandle] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Потоковый POST с NDJSON-ответом через пул keep-alive соединений.
+
+        Ответ дочитывается до конца, поэтому соединение возвращается в пул и
+        следующий запрос не платит за новый TCP handshake. Через handle запрос
+        можно оборвать из другого потока (соединение при этом закрывается).
+
+        Raises:
+            requests.exceptions.RequestException: ошибки соединения/таймауты/HTTP статус
+        """
+        url = f"{self.base_url}{endpoint}"
+        if handle is not None and handle.aborted:
+            return
+        _sending.handle = handle
+        try:
+            response = self.session.post(url, json=json_data, stream=True, timeout=timeout)
+        except requests.exceptions.RequestException:
+            # Разрыв, сделанный abort() до заголовков — это отмена, а не ошибка сети
+            if handle is not None and handle.aborted:
+                return
+            raise
+        finally:
+            _sending.handle = None
+        if handle is not None and not handle.attach(response):
+            response.close()
+            return
+        try:
+            response.raise_for_status()
+            yield from iter_ndjson(
+                response.iter_content(chunk_size=chunk_size),
+                on_error=lambda line: self.logger.debug(f"Non-JSON line received (ignoring): {line[:50]}..."),
+            )
+        finally:
+            if handle is not None:
+                handle.detach()
+            response.close()
+
     def is_alive(self) -> bool:
         """Быстрая проверка доступности сервера"""
         result = self.get("/api/tags", use_cache=True)
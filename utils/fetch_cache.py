@@ -0,0 +1,299 @@
+"""
+Общий слой HTTP-запросов модулей (погода, новости, поиск) с кэшем
+
+- один пул keep-alive соединений (requests.Session + HTTPAdapter) на все модули;
+- кэш ответов по (url, параметры, заголовки) с TTL и stale-while-revalidate:
+  свежий ответ отдаётся сразу, устаревший (в пределах stale_sec) — тоже сразу,
+  а обновление уходит в фон; совсем старый — запрашивается синхронно;
+- одинаковые запросы «в полёте» склеиваются: второй вызов ждёт первый, а не идёт в сеть;
+- кэш ограничен (LRU на fetch.max_entries записей), кэшируются только ответы 2xx;
+  FetchResult.data у каждого вызывающего своя (глубокая копия), менять её безопасно;
+- фоновое обновление зарегистрированных запросов (город по умолчанию, топ новостей),
+  чтобы первый вопрос пользователя попадал в тёплый кэш.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import ModuleLogger
+
+ERROR_TIMEOUT = "timeout"
+ERROR_CONNECTION = "connection_error"
+ERROR_OTHER = "error"
+
+
+@dataclass
+class FetchResult:
+    """Ответ слоя: status_code=0 и error_kind при сетевой ошибке"""
+
+    status_code: int = 0
+    data: Any = None
+    error_kind: Optional[str] = None
+    error: Optional[str] = None
+    fetched_at: float = 0.0
+    from_cache: bool = False
+    stale: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300 and self.error_kind is None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at if self.fetched_at else 0.0
+
+
+@dataclass
+class _InFlight:
+    event: threading.Event = field(default_factory=threading.Event)
+    result: Optional[FetchResult] = None
+
+
+@dataclass
+class _RefreshJob:
+    name: str
+    url: str
+    params: Dict[str, Any]
+    headers: Dict[str, str]
+    interval: float
+    timeout: float
+    next_due: float = 0.0
+
+
+class CachedFetcher:
+    """GET с пулом соединений, TTL/SWR-кэшем, склейкой запросов и фоновым обновлением"""
+
+    def __init__(self, config=None):
+        self.logger = ModuleLogger("CachedFetcher")
+        get = config.get if config is not None else (lambda key, default=None: default)
+        self.max_entries = max(16, int(get("fetch.max_entries", 256) or 256))
+        self.default_stale_sec = float(get("fetch.stale_sec", 600) or 0)
+        pool_size = max(2, int(get("fetch.pool_size", 10) or 10))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": "Arvis/1.1.0"})
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, FetchResult]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._revalidating: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="Arvis-fetch")
+        self._jobs: Dict[str, _RefreshJob] = {}
+        self._refresh_wakeup = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0}
+
+    # ------------------------------------------------------------------ public API
+
+    @staticmethod
+    def cache_key(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> str:
+        payload = json.dumps([url, sorted((params or {}).items()), sorted((headers or {}).items())], default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        ttl: float = 300.0,
+        stale_sec: Optional[float] = None,
+        timeout: float = 10.0,
+        force: bool = False,
+    ) -> FetchResult:
+        """GET с кэшем: ttl — свежесть, stale_sec — сколько после ttl отдавать старое с фоновым обновлением"""
+        key = self.cache_key(url, params, headers)
+        stale_window = self.default_stale_sec if stale_sec is None else float(stale_sec)
+
+        if not force and ttl > 0:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    age = time.time() - cached.fetched_at
+                    if age < ttl:
+                        self._cache.move_to_end(key)
+                        self.stats["hits"] += 1
+                        return self._copy(cached, stale=False)
+                    if age < ttl + stale_window:
+                        self._cache.move_to_end(key)
+                        self.stats["stale_hits"] += 1
+                        self._schedule_revalidate_locked(key, url, params, headers, timeout)
+                        return self._copy(cached, stale=True)
+        return self._fetch_coalesced(key, url, params, headers, timeout, store=ttl > 0)
+
+    def register_refresh(
+        self,
+        name: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        interval: float = 600.0,
+        timeout: float = 10.0,
+    ):
+        """Периодически обновлять запрос в фоне (первое обновление — сразу)"""
+        if self._closed:
+            return
+        job = _RefreshJob(name, url, dict(params or {}), dict(headers or {}), max(30.0, interval), timeout)
+        with self._lock:
+            self._jobs[name] = job
+            if self._refresh_thread is None:
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_loop, name="Arvis-fetch-refresh", daemon=True
+                )
+                self._refresh_thread.start()
+        self._refresh_wakeup.set()
+
+    def unregister_refresh(self, name: str):
+        with self._lock:
+            self._jobs.pop(name, None)
+
+    def clear(self):
+        """Сбросить кэш ответов"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._cache), in_flight=len(self._in_flight), jobs=len(self._jobs))
+
+    def close(self):
+        self._closed = True
+        self._refresh_wakeup.set()
+        self._executor.shutdown(wait=False)
+        try:
+            self.session.close()
+        except Exception as e:
+            self.logger.error(f"Error closing fetch session: {e}")
+
+    # ------------------------------------------------------------------ internals
+
+    @staticmethod
+    def _copy(result: FetchResult, stale: bool = False, from_cache: bool = True) -> FetchResult:
+        # Каждый вызывающий получает свою копию data: правка ответа одним модулем не должна
+        # попадать в кэш и к другим вызывающим
+        return FetchResult(
+            result.status_code,
+            copy.deepcopy(result.data),
+            result.error_kind,
+            result.error,
+            result.fetched_at,
+            from_cache,
+            stale,
+        )
+
+    def _fetch_coalesced(self, key, url, params, headers, timeout, store: bool) -> FetchResult:
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.event.wait(timeout + 5.0)
+            if flight.result is not None:
+                return self._copy(flight.result, from_cache=False)
+            return FetchResult(error_kind=ERROR_TIMEOUT, error="coalesced request timed out")
+
+        result = FetchResult()
+        try:
+            result = self._request(url, params, headers, timeout)
+        finally:
+            with self._lock:
+                if store and result.ok:
+                    self._cache[key] = result
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+                self._in_flight.pop(key, None)
+            flight.result = result
+            flight.event.set()
+        return self._copy(result, from_cache=False) if store and result.ok else result
+
+    def _request(self, url, params, headers, timeout) -> FetchResult:
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            return FetchResult(response.status_code, data, fetched_at=time.time())
+        except requests.exceptions.Timeout as e:
+            return FetchResult(error_kind=ERROR_TIMEOUT, error=str(e))
+        except requests.exceptions.ConnectionError as e:
+            return FetchResult(error_kind=ERROR_CONNECTION, error=str(e))
+        except Exception as e:
+            return FetchResult(error_kind=ERROR_OTHER, error=str(e))
+
+    def _schedule_revalidate_locked(self, key, url, params, headers, timeout):
+        if key in self._revalidating or key in self._in_flight or self._closed:
+            return
+        self._revalidating.add(key)
+
+        def revalidate():
+            try:
+                self._fetch_coalesced(key, url, params, headers, timeout, store=True)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        try:
+            self._executor.submit(revalidate)
+        except RuntimeError:
+            self._revalidating.discard(key)
+
+    def _refresh_loop(self):
+        while not self._closed:
+            now = time.time()
+            with self._lock:
+                due = [job for job in self._jobs.values() if job.next_due <= now]
+            for job in due:
+                key = self.cache_key(job.url, job.params, job.headers)
+                result = self._fetch_coalesced(key, job.url, job.params, job.headers, job.timeout, store=True)
+                with self._lock:
+                    self.stats["refreshes"] += 1
+                # Неудача — повтор через минуту, а не через полный интервал
+                job.next_due = time.time() + (job.interval if result.ok else min(60.0, job.interval))
+                if not result.ok:
+                    self.logger.debug(f"Background refresh '{job.name}' failed: {result.error or result.status_code}")
+            with self._lock:
+                upcoming = [job.next_due for job in self._jobs.values()]
+            wait = max(1.0, min(upcoming) - time.time()) if upcoming else 60.0
+            self._refresh_wakeup.wait(wait)
+            self._refresh_wakeup.clear()
+
+
+_fetcher: Optional[CachedFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(config=None) -> CachedFetcher:
+    """Общий слой запросов модулей (создаётся при первом вызове)"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = CachedFetcher(config)
+        return _fetcher
+
+
+def shutdown_fetcher():
+    """Закрыть общий слой (пул соединений, фоновое обновление)"""
+    global _fetcher
+    with _fetcher_lock:
+        fetcher, _fetcher = _fetcher, None
+    if fetcher is not None:
+        fetcher.close()
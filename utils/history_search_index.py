@@ -0,0 +1,501 @@
+"""
+Full-text search index for conversation history
+Полнотекстовый индекс истории разговоров (SQLite FTS5)
+
+Индексируются живые сообщения ConversationHistory и архивы session_*.json.
+Индекс инкрементальный: живые сообщения добавляются/удаляются по одному,
+архивы переиндексируются только при изменении файла (mtime/size).
+
+Для русского текста рядом с исходным текстом хранится колонка основ слов
+(упрощённый стеммер Snowball), поэтому «погоду» находит «погода», «погоде».
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.logger import ModuleLogger
+
+LIVE_SOURCE = "live"
+
+_SCHEMA_VERSION = 1
+
+# bm25 считается только для стольких самых свежих совпадений: частые слова
+# совпадают с десятками тысяч сообщений, а ранжировать их все — сотни миллисекунд
+_RANK_CANDIDATES = 1000
+
+# Пачка для доиндексации живой истории при sync_live (одна транзакция на пачку)
+_SYNC_BATCH_SIZE = 500
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# ---------------------------------------------------------------------------
+# Стеммер русского языка (алгоритм Snowball, без словаря исключений)
+# ---------------------------------------------------------------------------
+
+_VOWELS = set("аеиоуыэюя")
+
+_PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")
+_PERFECTIVE_GERUND_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+_REFLEXIVE = ("ся", "сь")
+_ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)  # fmt: skip
+_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+_VERB_1 = ("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н")
+_VERB_2 = (
+    "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют", "ены", "ить",
+    "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю",
+)  # fmt: skip
+_NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)  # fmt: skip
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    """Начало областей RV и R2 (индексы в слове)"""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _cut(rv: str, endings: Iterable[str], after_a_ya: bool = False) -> Optional[str]:
+    """Отрезать самое длинное подходящее окончание (для группы 1 — только после «а»/«я»)"""
+    for ending in endings:
+        if rv.endswith(ending):
+            if after_a_ya and not rv[: -len(ending)].endswith(("а", "я")):
+                continue
+            return rv[: -len(ending)]
+    return None
+
+
+def _cut_grouped(rv: str, group2: Iterable[str], group1: Iterable[str]) -> Optional[str]:
+    cut = _cut(rv, group2)
+    return cut if cut is not None else _cut(rv, group1, after_a_ya=True)
+
+
+@lru_cache(maxsize=65536)
+def stem_russian(word: str) -> str:
+    """Основа русского слова (нижний регистр, «ё» → «е»)"""
+    word = word.lower().replace("ё", "е")
+    if len(word) < 3 or not _CYRILLIC_RE.search(word):
+        return word
+
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    cut = _cut_grouped(rv, _PERFECTIVE_GERUND_2, _PERFECTIVE_GERUND_1)
+    if cut is not None:
+        rv = cut
+    else:
+        cut = _cut(rv, _REFLEXIVE)
+        if cut is not None:
+            rv = cut
+        cut = _cut(rv, _ADJECTIVE)
+        if cut is not None:
+            participle = _cut_grouped(cut, _PARTICIPLE_2, _PARTICIPLE_1)
+            rv = participle if participle is not None else cut
+        else:
+            cut = _cut_grouped(rv, _VERB_2, _VERB_1)
+            if cut is None:
+                cut = _cut(rv, _NOUN)
+            if cut is not None:
+                rv = cut
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2
+    for ending in _DERIVATIONAL:
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2_start:
+            rv = rv[: -len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        cut = _cut(rv, _SUPERLATIVE)
+        if cut is not None:
+            rv = cut[:-1] if cut.endswith("нн") else cut
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower().replace("ё", "е") for token in _WORD_RE.findall(text or "")]
+
+
+def stems_for(text: str) -> str:
+    """Колонка основ для FTS"""
+    return " ".join(stem_russian(token) for token in tokenize(text))
+
+
+# ---------------------------------------------------------------------------
+# Индекс
+# ---------------------------------------------------------------------------
+
+
+class HistorySearchIndex:
+    """Инкрементальный FTS5 индекс живой истории и архивов сессий"""
+
+    def __init__(self, db_path: Path, archive_dir: Optional[Path] = None):
+        self.db_path = Path(db_path)
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.logger = ModuleLogger("HistorySearchIndex")
+
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.available = False
+
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # Иначе INSERT OR REPLACE не вызывает триггер удаления и FTS получает дубликаты
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self._init_schema()
+            self.available = True
+        except sqlite3.Error as e:
+            # Например, SQLite собран без FTS5 — тогда работает линейный поиск ConversationHistory
+            self.logger.warning(f"History search index unavailable: {e}")
+            self.close()
+
+    def _init_schema(self):
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, _SCHEMA_VERSION):
+            conn.executescript("""
+                DROP TABLE IF EXISTS messages_fts;
+                DROP TABLE IF EXISTS messages;
+                DROP TABLE IF EXISTS sources;
+                """)
+
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                mtime REAL,
+                size INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                msg_id INTEGER NOT NULL,
+                role TEXT,
+                timestamp TEXT,
+                feedback TEXT,
+                metadata TEXT,
+                content TEXT,
+                stems TEXT,
+                UNIQUE (source, msg_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, stems,
+                content='messages', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content, stems) VALUES (new.id, new.content, new.stems);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content, stems)
+                VALUES ('delete', old.id, old.content, old.stems);
+            END;
+            """)
+        conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+        conn.commit()
+
+    # ------------------------------------------------------------------
+    # Живая история
+    # ------------------------------------------------------------------
+
+    def add_live(self, messages: Iterable[Dict[str, Any]]):
+        """Проиндексировать новые сообщения текущей сессии"""
+        rows = [self._row(LIVE_SOURCE, msg.get("id"), msg) for msg in messages if isinstance(msg.get("id"), int)]
+        if not rows:
+            return
+        self._write(
+            "INSERT OR REPLACE INTO messages (source, msg_id, role, timestamp, feedback, metadata, content, stems) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def remove_live(self, message_ids: Iterable[Any]):
+        """Убрать из индекса удалённые/вытесненные сообщения текущей сессии"""
+        rows = [(LIVE_SOURCE, msg_id) for msg_id in message_ids if isinstance(msg_id, int)]
+        if rows:
+            self._write("DELETE FROM messages WHERE source = ? AND msg_id = ?", rows)
+
+    def set_feedback(self, message_id: Any, feedback: Optional[str]):
+        if isinstance(message_id, int):
+            self._write(
+                "UPDATE messages SET feedback = ? WHERE source = ? AND msg_id = ?",
+                [(feedback, LIVE_SOURCE, message_id)],
+            )
+
+    def sync_live(self, messages: Iterable[Dict[str, Any]]):
+        """Привести живую часть индекса к сообщениям истории (после загрузки журнала)
+
+        messages читается один раз и потоком: в памяти держатся только id и пачка новых строк.
+        """
+        if not self.available:
+            return
+        with self._lock:
+            try:
+                indexed = {
+                    row[0] for row in self._conn.execute("SELECT msg_id FROM messages WHERE source = ?", (LIVE_SOURCE,))
+                }
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to read live index: {e}")
+                return
+            wanted = set()
+            batch: List[Dict[str, Any]] = []
+            for msg in messages:
+                msg_id = msg.get("id")
+                if not isinstance(msg_id, int):
+                    continue
+                wanted.add(msg_id)
+                if msg_id not in indexed:
+                    batch.append(msg)
+                    if len(batch) >= _SYNC_BATCH_SIZE:
+                        self.add_live(batch)
+                        batch = []
+            self.add_live(batch)
+            self.remove_live(indexed - wanted)
+
+    def archive_live(self, archive_file: Path):
+        """Перевести живые сообщения в архивный источник после _archive_current_session"""
+        if not self.available:
+            return
+        with self._lock:
+            try:
+                stat = archive_file.stat()
+                self._conn.execute("DELETE FROM messages WHERE source = ?", (archive_file.name,))
+                self._conn.execute("UPDATE messages SET source = ? WHERE source = ?", (archive_file.name, LIVE_SOURCE))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sources (source, mtime, size) VALUES (?, ?, ?)",
+                    (archive_file.name, stat.st_mtime, stat.st_size),
+                )
+                self._conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                self._conn.rollback()
+                self.logger.error(f"Failed to move live messages to archive index: {e}")
+
+    def clear_live(self):
+        if self.available:
+            self._write("DELETE FROM messages WHERE source = ?", [(LIVE_SOURCE,)])
+
+    # ------------------------------------------------------------------
+    # Архивы
+    # ------------------------------------------------------------------
+
+    def sync_archives(self) -> int:
+        """Проиндексировать новые/изменённые session_*.json и забыть удалённые.
+
+        Returns:
+            Количество переиндексированных файлов
+        """
+        if not self.available or self.archive_dir is None or not self.archive_dir.exists():
+            return 0
+
+        started = time.perf_counter()
+        with self._lock:
+            known = {row[0]: (row[1], row[2]) for row in self._conn.execute("SELECT source, mtime, size FROM sources")}
+
+        files = {path.name: path for path in self.archive_dir.glob("session_*.json")}
+        reindexed = 0
+
+        for name, path in sorted(files.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if known.get(name) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                messages = data.get("messages", []) if isinstance(data, dict) else []
+            except Exception as e:
+                self.logger.warning(f"Skipping unreadable archive {name}: {e}")
+                continue
+
+            # Архивный файл индексируется одной транзакцией, блокировка не держится между файлами
+            rows = [self._row(name, i, msg) for i, msg in enumerate(messages) if isinstance(msg, dict)]
+            with self._lock:
+                try:
+                    self._conn.execute("DELETE FROM messages WHERE source = ?", (name,))
+                    self._conn.executemany(
+                        "INSERT INTO messages (source, msg_id, role, timestamp, feedback, metadata, content, stems) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sources (source, mtime, size) VALUES (?, ?, ?)",
+                        (name, stat.st_mtime, stat.st_size),
+                    )
+                    self._conn.commit()
+                    reindexed += 1
+                except sqlite3.Error as e:
+                    self._conn.rollback()
+                    self.logger.error(f"Failed to index archive {name}: {e}")
+
+        removed = [name for name in known if name not in files]
+        if removed:
+            with self._lock:
+                try:
+                    self._conn.executemany("DELETE FROM messages WHERE source = ?", [(n,) for n in removed])
+                    self._conn.executemany("DELETE FROM sources WHERE source = ?", [(n,) for n in removed])
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    self._conn.rollback()
+                    self.logger.error(f"Failed to drop removed archives from index: {e}")
+
+        if reindexed or removed:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.logger.info(
+                f"History index synced: {reindexed} archive(s) indexed, {len(removed)} removed in {elapsed_ms:.0f} ms"
+            )
+        return reindexed
+
+    # ------------------------------------------------------------------
+    # Поиск
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def build_match_query(query: str) -> str:
+        """Запрос FTS5: все слова обязательны; слово совпадает как префикс словоформы
+        (поиск по мере набора) или точно по основе (другие падежи и формы)"""
+        clauses = []
+        for token in tokenize(query):
+            term = token.replace('"', '""')
+            stem = stem_russian(token).replace('"', '""')
+            clauses.append(f'(content : "{term}"* OR stems : "{stem}")')
+        return " AND ".join(clauses)
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """Ранжированный поиск (bm25, затем свежесть) с постраничной выдачей.
+
+        Ранжируются самые свежие совпадения (не меньше _RANK_CANDIDATES), поэтому
+        время запроса не растёт с размером истории.
+
+        Returns:
+            (сообщения, есть_ли_ещё_результаты)
+        """
+        match = self.build_match_query(query)
+        if not match or not self.available:
+            return [], False
+
+        limit = max(1, int(limit))
+        offset = max(0, int(offset))
+        candidates = max(_RANK_CANDIDATES, offset + limit + 1)
+        sql = (
+            "SELECT m.source, m.msg_id, m.role, m.timestamp, m.feedback, m.metadata, m.content "
+            "FROM ("
+            "  SELECT rowid, bm25(messages_fts, 1.0, 0.5) AS score FROM messages_fts "
+            "  WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+            ") AS hits JOIN messages AS m ON m.id = hits.rowid "
+            "ORDER BY hits.score, m.timestamp DESC "
+            "LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, (match, candidates, limit + 1, offset)).fetchall()
+            except sqlite3.Error as e:
+                self.logger.debug(f"History search failed for {query!r}: {e}")
+                return [], False
+
+        results = []
+        for source, msg_id, role, timestamp, feedback, metadata, content in rows[:limit]:
+            message: Dict[str, Any] = {
+                "role": role,
+                "content": content,
+                "timestamp": timestamp,
+                "metadata": json.loads(metadata) if metadata else {},
+                "source": source,
+            }
+            if source == LIVE_SOURCE:
+                message["id"] = msg_id
+            if feedback:
+                message["feedback"] = feedback
+            results.append(message)
+        return results, len(rows) > limit
+
+    def get_stats(self) -> Dict[str, Any]:
+        if not self.available:
+            return {"available": False}
+        with self._lock:
+            messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        return {"available": True, "messages": messages, "archives": sources}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+            self.available = False
+
+    # ------------------------------------------------------------------
+    # Внутренняя кухня
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _row(source: str, msg_id: Any, message: Dict[str, Any]) -> Tuple:
+        content = str(message.get("content") or "")
+        metadata = message.get("metadata") or {}
+        return (
+            source,
+            msg_id,
+            message.get("role"),
+            message.get("timestamp"),
+            message.get("feedback"),
+            json.dumps(metadata, ensure_ascii=False, default=str) if metadata else None,
+            content,
+            stems_for(content),
+        )
+
+    def _write(self, sql: str, rows: List[Tuple]):
+        if not self.available:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.logger.error(f"History index write failed: {e}")
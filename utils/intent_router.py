@@ -0,0 +1,266 @@
+"""
+Компилируемый маршрутизатор интентов для команд модулей
+
+Словари всех интентов (триггеры и именованные группы ключевых слов для слотов)
+собираются в одно префиксное дерево, скомпилированное в регулярное выражение.
+Сообщение нормализуется (нижний регистр, схлопнутые пробелы) и проходится один раз:
+на каждой позиции — спуск по дереву, поэтому стоимость O(длина сообщения × глубина
+дерева) и не зависит от числа зарегистрированных модулей.
+
+Совпадение — как у прежних проверок `word in message_lower`: подстрока в любом месте,
+поэтому основы вида «уменьш», «следующ» продолжают ловить все формы слова.
+
+Интенты упорядочиваются по priority (при равенстве — по числу триггеров и позиции
+первого), fallback-интенты (веб-поиск) рассматриваются только если не сработал ни
+один обычный. Решение для нормализованного текста кэшируется (LRU), повторные фразы
+не проходят сопоставление и извлечение слотов заново.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.logger import ModuleLogger
+
+TRIGGER_GROUP = "trigger"
+
+# Кэшируемое решение по интенту: (имя, score, позиция первого триггера, совпадения по группам, слоты)
+_Decision = Tuple[str, float, int, Dict[str, Tuple[str, ...]], Dict[str, Any]]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова нормализованного текста (буквы/цифры)"""
+    return _TOKEN_RE.findall(text)
+
+
+class _TrieMatcher:
+    """Префиксное дерево терминов, скомпилированное в одно регулярное выражение
+
+    Дерево разворачивается во вложенные альтернативы (общие префиксы не повторяются),
+    поэтому на каждой позиции текста движок re спускается по дереву, а не перебирает
+    термины. Просмотр вперёд (?=...) даёт все вхождения, включая перекрывающиеся;
+    на позиции находится самый длинный термин, а более короткие термины-префиксы
+    и их данные добавляются по заранее посчитанной таблице.
+    """
+
+    def __init__(self, terms: Dict[str, Sequence[Any]]):
+        trie: Dict[str, dict] = {}
+        unique = sorted(terms)
+        for term in unique:
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        pattern = self._emit(trie)
+        self._regex = re.compile(f"(?=({pattern}))") if pattern else None
+        # Без просмотра вперёд: search() останавливается на первом вхождении — дешёвый отказ для фраз без терминов
+        self._search = re.compile(pattern).search if pattern else None
+        self._expand = {
+            term: tuple((prefix, item) for prefix in unique if term.startswith(prefix) for item in terms[prefix])
+            for term in unique
+        }
+
+    @classmethod
+    def _emit(cls, node: Dict[str, dict]) -> str:
+        alternatives = [re.escape(ch) + cls._emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # Термин заканчивается в этом узле: продолжение необязательно (жадно — самый длинный)
+        return f"(?:{body})?" if "" in node else body
+
+    def find(self, text: str) -> List[Tuple[int, str, Any]]:
+        """(позиция начала, термин, данные термина) для каждого вхождения"""
+        if self._regex is None or self._search(text) is None:
+            return []
+        expand = self._expand
+        return [(match.start(), term, item) for match in self._regex.finditer(text) for term, item in expand[match[1]]]
+
+
+@dataclass
+class IntentSpec:
+    """Описание интента: триггеры, группы ключевых слов для слотов и обработчик
+
+    handler получает IntentMatch и возвращает ответ или None («не обработано» —
+    маршрутизация продолжается со следующего интента). module — имя модуля для
+    RBAC (can_use_module), denied_message — ответ при отказе. max_words > 0 —
+    интент срабатывает только на короткие фразы (быстрые ответы без LLM).
+    predicate — дополнительное условие совпадения: проверяется при маршрутизации,
+    до RBAC, поэтому отвергнутая фраза не получает отказа в доступе, а идёт дальше.
+    """
+
+    name: str
+    triggers: Sequence[str]
+    handler: Callable[["IntentMatch"], Optional[str]]
+    priority: int = 0
+    fallback: bool = False
+    keywords: Dict[str, Sequence[str]] = field(default_factory=dict)
+    slots: Optional[Callable[["IntentMatch"], Dict[str, Any]]] = None
+    module: Optional[str] = None
+    denied_message: str = ""
+    max_words: int = 0
+    predicate: Optional[Callable[["IntentMatch"], bool]] = None
+
+
+@dataclass
+class IntentMatch:
+    spec: IntentSpec
+    text: str
+    normalized: str
+    tokens: List[str]
+    score: float
+    first_pos: int
+    hits: Dict[str, Tuple[str, ...]]
+    slots: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def has(self, group: str) -> bool:
+        return bool(self.hits.get(group))
+
+
+class IntentRouter:
+    """Реестр интентов модулей с единым деревом терминов и кэшем решений"""
+
+    def __init__(self, cache_size: int = 512):
+        self.logger = ModuleLogger("IntentRouter")
+        self.cache_size = max(0, int(cache_size))
+        self._lock = threading.RLock()
+        self._specs: Dict[str, IntentSpec] = {}
+        self._terms: Dict[str, List[Tuple[str, str]]] = {}
+        self._matcher: Optional[_TrieMatcher] = None
+        self._cache: "OrderedDict[str, Tuple[_Decision, ...]]" = OrderedDict()
+        self.stats = {"routes": 0, "cache_hits": 0, "route_us_total": 0.0}
+
+    # ------------------------------------------------------------------ registry
+
+    def register(self, spec: IntentSpec):
+        """Добавить или заменить интент (дерево пересобирается при следующем route)"""
+        with self._lock:
+            # Копия при записи: route читает реестр без блокировки
+            self._specs = dict(self._specs, **{spec.name: spec})
+            self._invalidate_locked()
+
+    def unregister(self, name: str):
+        with self._lock:
+            if name in self._specs:
+                self._specs = {key: spec for key, spec in self._specs.items() if key != name}
+                self._invalidate_locked()
+
+    def get_spec(self, name: str) -> Optional[IntentSpec]:
+        return self._specs.get(name)
+
+    def intents(self) -> List[str]:
+        with self._lock:
+            return list(self._specs)
+
+    def _invalidate_locked(self):
+        self._matcher = None
+        self._cache.clear()
+
+    def _compile_locked(self) -> _TrieMatcher:
+        terms: Dict[str, List[Tuple[str, str]]] = {}
+        for spec in self._specs.values():
+            groups = [(TRIGGER_GROUP, spec.triggers)] + list(spec.keywords.items())
+            for group, words in groups:
+                for word in words:
+                    term = normalize(word)
+                    if term:
+                        terms.setdefault(term, []).append((spec.name, group))
+        self._terms = terms
+        self._matcher = _TrieMatcher(terms)
+        return self._matcher
+
+    # ------------------------------------------------------------------ routing
+
+    def route(self, message: str) -> List[IntentMatch]:
+        """Сработавшие интенты в порядке рассмотрения (fallback — только если нет обычных)"""
+        start = time.perf_counter()
+        text = normalize(message)
+        with self._lock:
+            cached = self._cache.get(text) if self.cache_size else None
+            if cached is not None:
+                self._cache.move_to_end(text)
+            matcher = self._matcher or self._compile_locked()
+            specs = self._specs
+
+        if cached is None:
+            matches = self._evaluate(matcher, specs, message, text)
+            decision = tuple((m.name, m.score, m.first_pos, m.hits, dict(m.slots)) for m in matches)
+            with self._lock:
+                if self.cache_size and self._matcher is matcher:
+                    self._cache[text] = decision
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        else:
+            tokens = tokenize(text) if cached else []
+            matches = [
+                IntentMatch(specs[name], message, text, tokens, score, pos, hits, dict(slots))
+                for name, score, pos, hits, slots in cached
+                if name in specs
+            ]
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self.stats["routes"] += 1
+            self.stats["cache_hits"] += cached is not None
+            self.stats["route_us_total"] += elapsed_us
+        return matches
+
+    def _evaluate(self, matcher, specs, message, text) -> List[IntentMatch]:
+        found: Dict[str, Dict[str, List[str]]] = {}
+        first: Dict[str, int] = {}
+        for pos, term, (name, group) in matcher.find(text):
+            words = found.setdefault(name, {}).setdefault(group, [])
+            if term not in words:
+                words.append(term)
+            if group == TRIGGER_GROUP and name not in first:
+                first[name] = pos
+        if not first:
+            return []
+
+        tokens = tokenize(text)
+        matches: List[IntentMatch] = []
+        for name, pos in first.items():
+            spec = specs[name]
+            if spec.max_words and len(tokens) > spec.max_words:
+                continue
+            hits = {group: tuple(words) for group, words in found[name].items()}
+            score = spec.priority + min(len(hits[TRIGGER_GROUP]), 9) / 10.0
+            match = IntentMatch(spec, message, text, tokens, score, pos, hits)
+            if spec.predicate is not None and not spec.predicate(match):
+                continue
+            matches.append(match)
+
+        regular = [m for m in matches if not m.spec.fallback]
+        matches = regular or matches
+        matches.sort(key=lambda m: (-m.score, m.first_pos))
+        for match in matches:
+            if match.spec.slots is not None:
+                try:
+                    match.slots = dict(match.spec.slots(match) or {})
+                except Exception as e:
+                    self.logger.error(f"Slot extraction failed for intent '{match.name}': {e}")
+        return matches
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = self.stats["routes"]
+            return {
+                "intents": len(self._specs),
+                "terms": len(self._terms),
+                "routes": routes,
+                "cache_hits": self.stats["cache_hits"],
+                "cache_entries": len(self._cache),
+                "avg_route_us": round(self.stats["route_us_total"] / routes, 2) if routes else 0.0,
+            }
@@ -0,0 +1,441 @@
+"""
+Движок запросов к LLM с приоритетной очередью и настоящей отменой
+
+Вместо отдельного QThread на каждое сообщение все запросы к Ollama проходят через
+один выделенный поток-диспетчер:
+- приоритетная очередь (реплики пользователя раньше автопродолжения и прогрева);
+- дедлайны на запрос и таймаут простоя между токенами (watchdog-поток);
+- отмена закрывает сокет, поэтому Ollama сразу прекращает генерацию;
+- результаты доставляются в Qt через один сигнал-мост (request_event).
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from PyQt6.QtCore import QCoreApplication, QObject, pyqtSignal
+
+from utils.fast_http import StreamHandle
+from utils.logger import ModuleLogger
+
+
+class LLMRequestPriority(IntEnum):
+    """Приоритет запроса (меньше — важнее)"""
+
+    USER = 0
+    CONTINUATION = 1
+    BACKGROUND = 2
+
+
+class LLMRequestState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# Причины завершения без результата
+REASON_CANCELLED = "cancelled"
+REASON_PREEMPTED = "preempted"
+REASON_TIMEOUT = "timeout"
+REASON_ERROR = "error"
+# Внутренняя причина: набрали max_chars, ответ считается успешным
+_REASON_LIMIT = "limit"
+
+
+class LLMRequest:
+    """Один запрос к LLM: состояние, накопленный текст и ручка отмены"""
+
+    def __init__(
+        self,
+        engine: "LLMRequestEngine",
+        request_id: str,
+        message: str,
+        context: str,
+        history: Optional[List[Dict[str, Any]]],
+        priority: LLMRequestPriority,
+        stream: bool,
+        deadline_sec: Optional[float],
+        first_token_timeout_sec: Optional[float],
+        idle_timeout_sec: Optional[float],
+        max_chars: Optional[int],
+        on_chunk: Optional[Callable[[str], None]],
+        on_done: Optional[Callable[[Dict[str, Any]], None]],
+        on_error: Optional[Callable[[str, str], None]],
+    ):
+        self._engine = engine
+        self.request_id = request_id
+        self.message = message
+        self.context = context
+        self.history = list(history or [])
+        self.priority = LLMRequestPriority(priority)
+        self.stream = stream
+        self.first_token_timeout_sec = first_token_timeout_sec
+        self.idle_timeout_sec = idle_timeout_sec
+        self.max_chars = max_chars
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        self.on_error = on_error
+
+        self.state = LLMRequestState.QUEUED
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + deadline_sec if deadline_sec else None
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.last_activity: Optional[float] = None
+        self.parts: List[str] = []
+        self.stats: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.reason: Optional[str] = None
+
+        self._handle = StreamHandle()
+        self._finished = threading.Event()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def is_finished(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self, reason: str = REASON_CANCELLED) -> None:
+        """Отменить запрос (в очереди — убрать, в работе — закрыть сокет)"""
+        self._engine.cancel(self, reason)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Дождаться завершения из фонового потока. Возвращает текст или None при ошибке/отмене"""
+        if not self._finished.wait(timeout):
+            return None
+        return self.text if self.state == LLMRequestState.DONE else None
+
+    def _abort(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+        self._handle.abort()
+
+
+class LLMRequestEngine(QObject):
+    """Один поток-диспетчер для всех запросов к LLM"""
+
+    # request_id, event ("chunk" | "done" | "error"), payload
+    request_event = pyqtSignal(str, str, object)
+
+    def __init__(self, llm_client, config=None):
+        super().__init__()
+        self.logger = ModuleLogger("LLMRequestEngine")
+        self.llm_client = llm_client
+        self.config = config
+
+        # Сигнал должен обрабатываться в GUI-потоке, даже если движок создан из фонового
+        app = QCoreApplication.instance()
+        if app is not None and self.thread() is not app.thread():
+            self.moveToThread(app.thread())
+        self.request_event.connect(self._on_request_event)
+
+        self._cond = threading.Condition()
+        self._queue: List[Any] = []
+        self._seq = itertools.count()
+        self._requests: Dict[str, LLMRequest] = {}
+        self._active: Optional[LLMRequest] = None
+        self._closed = False
+        self._ids = itertools.count(1)
+
+        self._preempt_background = bool(self._cfg("llm.engine.preempt_background", True))
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "timeouts": 0, "preempted": 0}
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="LLMDispatcher", daemon=True)
+        self._dispatcher.start()
+        self._watchdog = threading.Thread(target=self._watchdog_loop, name="LLMWatchdog", daemon=True)
+        self._watchdog.start()
+
+    def _cfg(self, key: str, default: Any) -> Any:
+        try:
+            return self.config.get(key, default) if self.config is not None else default
+        except Exception:
+            return default
+
+    # ------------------------------------------------------------------
+    # Публичный API
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        message: str,
+        context: str = "",
+        history: Optional[List[Dict[str, Any]]] = None,
+        priority: LLMRequestPriority = LLMRequestPriority.USER,
+        stream: bool = True,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_error: Optional[Callable[[str, str], None]] = None,
+        deadline_sec: Optional[float] = None,
+        first_token_timeout_sec: Optional[float] = None,
+        idle_timeout_sec: Optional[float] = None,
+        max_chars: Optional[int] = None,
+    ) -> LLMRequest:
+        """Поставить запрос в очередь.
+
+        Колбэки вызываются в GUI-потоке: on_chunk(delta) для каждого фрагмента (только stream),
+        on_done({"text", "stats"}) по завершении, on_error(reason, message) при ошибке,
+        таймауте или отмене (reason: timeout | cancelled | preempted | error).
+        """
+        if deadline_sec is None:
+            deadline_sec = float(self._cfg("llm.request_deadline_sec", 300))
+        request = LLMRequest(
+            self,
+            f"llm_{next(self._ids)}",
+            message,
+            context,
+            history,
+            priority,
+            stream,
+            deadline_sec,
+            first_token_timeout_sec,
+            idle_timeout_sec,
+            max_chars,
+            on_chunk,
+            on_done,
+            on_error,
+        )
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLM request engine is shut down")
+            self._requests[request.request_id] = request
+            heapq.heappush(self._queue, (int(request.priority), next(self._seq), request))
+            self._stats["submitted"] += 1
+            active = self._active
+            self._cond.notify_all()
+
+        # Фоновый запрос (прогрев) не должен задерживать реплику пользователя
+        if (
+            self._preempt_background
+            and active is not None
+            and active.priority == LLMRequestPriority.BACKGROUND
+            and request.priority < LLMRequestPriority.BACKGROUND
+        ):
+            self.logger.info(f"Preempting background request {active.request_id}")
+            self.cancel(active, REASON_PREEMPTED)
+
+        self.logger.debug(f"Queued {request.request_id} (priority {request.priority.name})")
+        return request
+
+    def cancel(self, request: Any, reason: str = REASON_CANCELLED) -> bool:
+        """Отменить запрос по объекту или request_id"""
+        if isinstance(request, str):
+            with self._cond:
+                request = self._requests.get(request)
+        if request is None or request.is_finished():
+            return False
+
+        with self._cond:
+            if request.state not in (LLMRequestState.QUEUED, LLMRequestState.RUNNING):
+                # Диспетчер уже подвёл итог запроса — отменять нечего
+                return False
+            queued = request.state == LLMRequestState.QUEUED
+            # Из кучи не удаляем — диспетчер пропустит отменённый запрос
+            request.state = LLMRequestState.CANCELLED
+            if request.reason is None:
+                request.reason = reason
+
+        if queued:
+            self._finish(request, "error", {"reason": reason, "message": reason})
+        else:
+            request._abort(reason)
+        return True
+
+    def cancel_all(self, reason: str = REASON_CANCELLED) -> int:
+        """Отменить все запросы (очередь и активный)"""
+        with self._cond:
+            pending = [r for r in self._requests.values() if not r.is_finished()]
+        return sum(1 for r in pending if self.cancel(r, reason))
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._cond:
+            active = self._active
+            status: Dict[str, Any] = dict(self._stats)
+            status["queued"] = sum(1 for _, _, r in self._queue if r.state == LLMRequestState.QUEUED)
+        status["active"] = (
+            {
+                "request_id": active.request_id,
+                "priority": active.priority.name,
+                "elapsed_sec": round(time.monotonic() - (active.started_at or time.monotonic()), 2),
+                "chars": len(active.text),
+            }
+            if active is not None
+            else None
+        )
+        return status
+
+    def shutdown(self) -> None:
+        """Отменить всё и остановить потоки"""
+        self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join(timeout=2.0)
+
+    # ------------------------------------------------------------------
+    # Поток-диспетчер
+    # ------------------------------------------------------------------
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._queue:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, request = heapq.heappop(self._queue)
+                if request.state != LLMRequestState.QUEUED:
+                    continue
+                if request.deadline is not None and time.monotonic() > request.deadline:
+                    request.state = LLMRequestState.FAILED
+                    request.reason = REASON_TIMEOUT
+                    expired = True
+                else:
+                    expired = False
+                    request.state = LLMRequestState.RUNNING
+                    request.started_at = request.last_activity = time.monotonic()
+                    self._active = request
+
+            if expired:
+                self._finish(request, "error", {"reason": REASON_TIMEOUT, "message": "deadline expired in queue"})
+                continue
+
+            try:
+                self._run(request)
+            finally:
+                with self._cond:
+                    self._active = None
+
+    def _run(self, request: LLMRequest) -> None:
+        try:
+            for event in self.llm_client.stream_events(
+                request.message, request.context, request.history, handle=request._handle
+            ):
+                if request.reason is not None:
+                    break
+                if event.get("type") == "token":
+                    text = event.get("text", "")
+                    now = time.monotonic()
+                    if request.first_token_at is None:
+                        request.first_token_at = now
+                    request.last_activity = now
+                    request.parts.append(text)
+                    if request.stream:
+                        self.request_event.emit(request.request_id, "chunk", text)
+                    if request.max_chars and len(request.text) >= request.max_chars:
+                        request._abort(_REASON_LIMIT)
+                        break
+                elif event.get("type") == "done":
+                    request.stats = event.get("stats")
+        except Exception as e:
+            if request.reason is None:
+                request.reason = REASON_ERROR
+                request.error = str(e)
+
+        # Итог — под блокировкой: cancel() из другого потока мог успеть пометить запрос отменённым
+        with self._cond:
+            if request.state == LLMRequestState.CANCELLED:
+                done = False
+            else:
+                done = request.reason in (None, _REASON_LIMIT)
+                request.state = LLMRequestState.DONE if done else LLMRequestState.FAILED
+        if done:
+            self._finish(request, "done", {"text": request.text, "stats": request.stats})
+        else:
+            message = request.error or request.reason
+            self._finish(request, "error", {"reason": request.reason, "message": message})
+
+    def _finish(self, request: LLMRequest, kind: str, payload: Dict[str, Any]) -> None:
+        with self._cond:
+            if kind == "done":
+                self._stats["completed"] += 1
+            elif payload.get("reason") == REASON_TIMEOUT:
+                self._stats["timeouts"] += 1
+            elif payload.get("reason") == REASON_PREEMPTED:
+                self._stats["preempted"] += 1
+            elif payload.get("reason") == REASON_CANCELLED:
+                self._stats["cancelled"] += 1
+            else:
+                self._stats["failed"] += 1
+        if kind == "error":
+            quiet = payload.get("reason") in (REASON_CANCELLED, REASON_PREEMPTED)
+            log = self.logger.debug if quiet else self.logger.warning
+            log(f"{request.request_id} finished: {payload.get('reason')} ({payload.get('message')})")
+        request._finished.set()
+        self.request_event.emit(request.request_id, kind, payload)
+
+    # ------------------------------------------------------------------
+    # Watchdog: дедлайны и простой между токенами
+    # ------------------------------------------------------------------
+
+    def _watchdog_loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                request = self._active
+                self._cond.wait(timeout=0.25)
+            if request is None or request.is_finished() or request.reason is not None:
+                continue
+
+            now = time.monotonic()
+            if request.deadline is not None and now > request.deadline:
+                self.logger.warning(f"{request.request_id} exceeded its deadline, aborting")
+                request._abort(REASON_TIMEOUT)
+                continue
+
+            if request.first_token_at is None:
+                limit = request.first_token_timeout_sec or request.idle_timeout_sec
+            else:
+                limit = request.idle_timeout_sec
+            if limit and request.last_activity is not None and now - request.last_activity > limit:
+                self.logger.warning(f"{request.request_id} idle for more than {limit:.0f}s, aborting")
+                request._abort(REASON_TIMEOUT)
+
+    # ------------------------------------------------------------------
+    # Qt-мост (GUI-поток)
+    # ------------------------------------------------------------------
+
+    def _on_request_event(self, request_id: str, kind: str, payload: Any) -> None:
+        with self._cond:
+            request = self._requests.get(request_id)
+            if request is not None and kind != "chunk":
+                self._requests.pop(request_id, None)
+        if request is None:
+            return
+
+        try:
+            if kind == "chunk":
+                # Чанки отменённого запроса, уже стоящие в очереди Qt, не доставляем
+                if request.state == LLMRequestState.CANCELLED:
+                    return
+                if request.on_chunk is not None:
+                    request.on_chunk(payload)
+            elif kind == "done":
+                if request.on_done is not None:
+                    request.on_done(payload)
+            elif kind == "error":
+                if request.on_error is not None:
+                    request.on_error(payload.get("reason", REASON_ERROR), payload.get("message", ""))
+        except Exception as e:
+            self.logger.error(f"LLM request callback error ({request_id}, {kind}): {e}")
+
+
+_llm_request_engine: Optional[LLMRequestEngine] = None
+
+
+def get_llm_request_engine(llm_client=None, config=None) -> Optional[LLMRequestEngine]:
+    """Общий движок запросов к LLM (создаётся при первом вызове с llm_client)"""
+    global _llm_request_engine
+    if _llm_request_engine is None and llm_client is not None:
+        _llm_request_engine = LLMRequestEngine(llm_client, config)
+    elif _llm_request_engine is not None and llm_client is not None:
+        _llm_request_engine.llm_client = llm_client
+    return _llm_request_engine
@@ -9,6 +9,7 @@ from typing import Optional
 from PyQt6.QtCore import QObject, pyqtSignal
 
 from config.config import Config
+from utils.llm_request_engine import REASON_PREEMPTED, LLMRequestPriority, get_llm_request_engine
 from utils.logger import ModuleLogger
 
 
@@ -27,6 +28,8 @@ class LLMWarmup(QObject):
         self.logger = ModuleLogger("LLMWarmup")
         self._is_warming_up = False
         self._warmup_duration = 0.0
+        self._request_engine = None
+        self._warmup_preempted = False
 
     def set_llm_client(self, llm_client):
         """Set LLM client after initialization"""
@@ -44,6 +47,13 @@ class LLMWarmup(QObject):
             return
 
         self._is_warming_up = True
+        self._warmup_preempted = False
+        # Движок создаём в GUI-потоке: прогрев идёт фоновым запросом и уступает репликам пользователя
+        try:
+            self._request_engine = get_llm_request_engine(self.llm_client, self.config)
+        except Exception as e:
+            self.logger.debug(f"LLM request engine unavailable for warmup: {e}")
+            self._request_engine = None
         self.warmup_started.emit()
 
         # Use async task manager
@@ -74,7 +84,11 @@ class LLMWarmup(QObject):
                 self.warmup_progress.emit(40, f"Прогрев модели {selected_model}...")
                 response = self._send_warmup_prompt(selected_model)
 
-                if not response:
+                if not response and self._warmup_preempted:
+                    # Пользователь уже отправил запрос — он и загрузит модель
+                    self.logger.info("Warmup preempted by a user request")
+                    response = ""
+                elif not response:
                     raise Exception("Модель не ответила")
 
                 # Step 5: Verify response (95%)
@@ -172,7 +186,22 @@ class LLMWarmup(QObject):
                 time.sleep(0.1)
 
             # Send request
-            if hasattr(self.llm_client, "simple_generate"):
+            if self._request_engine is not None:
+                request = self._request_engine.submit(
+                    warmup_prompt,
+                    context="",
+                    history=None,
+                    priority=LLMRequestPriority.BACKGROUND,
+                    stream=False,
+                    max_chars=50,
+                )
+                response = request.wait(timeout=float(self.config.get("llm.request_deadline_sec", 300)))
+                if response is None:
+                    self._warmup_preempted = request.reason == REASON_PREEMPTED
+                    if not request.is_finished():
+                        request.cancel()
+                    response = ""
+            elif hasattr(self.llm_client, "simple_generate"):
                 response = self.llm_client.simple_generate(prompt=warmup_prompt, model=model, max_tokens=50, timeout=10)
             else:
                 # Fallback to stream_response (использует старый формат: message как строка)
@@ -1,25 +1,164 @@
 """
 Диагностика и оптимизация производительности Arvis
+
+- CPU/память системы и процесса — кольцевые буферы на NumPy фиксированного размера
+  (запись O(1), без pop(0));
+- время операций — потоковые гистограммы с логарифмическими корзинами (в духе HDR:
+  относительная точность ~1% на всём диапазоне от микросекунд до часа), p50/p90/p99,
+  max и count без хранения отдельных замеров;
+- процесс: RSS, потоки, открытые файлы/дескрипторы, CPU по потокам (дельты между сэмплами);
+- snapshot() для кода и локальный HTTP endpoint (/metrics — Prometheus text,
+  /metrics.json — JSON) для дашбордов: performance.metrics_endpoint.*.
 """
 
+import json
+import math
 import threading
 import time
-from typing import Any, Dict
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import psutil
 
 from utils.logger import ModuleLogger
 
 
+class RingBuffer:
+    """Кольцевой буфер последних N значений на NumPy"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._data = np.zeros(self.capacity, dtype=np.float64)
+        self._next = 0
+        self.count = 0
+
+    def append(self, value: float):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def values(self) -> np.ndarray:
+        """Значения в хронологическом порядке (копия)"""
+        if self.count < self.capacity:
+            return self._data[: self.count].copy()
+        return np.concatenate((self._data[self._next :], self._data[: self._next]))
+
+    def last(self, default: float = 0.0) -> float:
+        if not self.count:
+            return default
+        return float(self._data[(self._next - 1) % self.capacity])
+
+    def mean(self) -> float:
+        return float(self._data[: self.count].mean()) if self.count else 0.0
+
+    def max(self) -> float:
+        return float(self._data[: self.count].max()) if self.count else 0.0
+
+    def __len__(self):
+        return self.count
+
+
+class LatencyHistogram:
+    """Потоковая гистограмма длительностей (секунды) с логарифмическими корзинами
+
+    Корзина i покрывает [lowest * growth^i, lowest * growth^(i+1)), поэтому ошибка
+    перцентиля не превышает precision относительно значения. Значения ниже lowest
+    попадают в первую корзину, выше highest — в последнюю; min/max/sum считаются точно.
+    """
+
+    def __init__(self, lowest: float = 1e-6, highest: float = 3600.0, precision: float = 0.01):
+        self.lowest = float(lowest)
+        self._log_growth = math.log1p(precision)
+        self._buckets = int(math.ceil(math.log(highest / lowest) / self._log_growth)) + 1
+        self._counts = np.zeros(self._buckets, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float):
+        value = max(0.0, float(value))
+        if value <= self.lowest:
+            index = 0
+        else:
+            index = min(self._buckets - 1, int(math.log(value / self.lowest) / self._log_growth))
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)) -> List[float]:
+        if not self.count:
+            return [0.0 for _ in quantiles]
+        cumulative = np.cumsum(self._counts)
+        result = []
+        for q in quantiles:
+            rank = max(1, int(math.ceil(q * self.count)))
+            index = int(np.searchsorted(cumulative, rank))
+            # Середина корзины (геометрическая), но не за пределами реальных min/max
+            value = self.lowest * math.exp((index + 0.5) * self._log_growth)
+            result.append(min(self.max, max(self.min, value)))
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        p50, p90, p99 = self.percentiles((0.5, 0.9, 0.99))
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+        }
+
+
 class PerformanceMonitor:
     """Монитор производительности для диагностики зависаний"""
 
-    def __init__(self):
+    OPEN_FILES_EVERY = 30
+
+    def __init__(self, sample_interval: float = 1.0, history_size: int = 300):
         self.logger = ModuleLogger("PerformanceMonitor")
         self.start_time = time.time()
+        self.sample_interval = max(0.1, float(sample_interval))
         self.is_monitoring = False
         self.monitor_thread = None
-        self.stats = {"cpu_usage": [], "memory_usage": [], "response_times": {}, "slow_operations": []}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        # Последние history_size сэмплов (по умолчанию 5 минут при интервале 1 с)
+        self.cpu_usage = RingBuffer(history_size)
+        self.memory_usage = RingBuffer(history_size)
+        self.process_cpu = RingBuffer(history_size)
+        self.process_rss = RingBuffer(history_size)
+
+        self.operations: Dict[str, LatencyHistogram] = {}
+        self.slow_operations: deque = deque(maxlen=200)
+        self.slow_threshold_sec = 1.0
+
+        self._process = psutil.Process()
+        self._process_info: Dict[str, Any] = {}
+        self._thread_cpu: Dict[int, float] = {}
+        self._thread_stats: List[Dict[str, Any]] = []
+        self._last_sample_ts: Optional[float] = None
+        self._samples_taken = 0
+        self._open_files: Optional[int] = None
+        self._metrics_server: Optional[ThreadingHTTPServer] = None
+
+    def configure(self, config):
+        """Параметры из конфига (performance.*); вызывается до start_monitoring"""
+        try:
+            self.sample_interval = max(0.1, float(config.get("performance.sample_interval_sec", 1.0) or 1.0))
+            self.slow_threshold_sec = float(config.get("performance.slow_operation_sec", 1.0) or 1.0)
+        except Exception as e:
+            self.logger.debug(f"Invalid performance monitor settings: {e}")
 
     def start_monitoring(self):
         """Запустить мониторинг производительности"""
@@ -27,56 +166,118 @@ class PerformanceMonitor:
             return
 
         self.is_monitoring = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._stop_event.clear()
+        # Первый вызов cpu_percent(None) задаёт базу для следующих неблокирующих замеров
+        psutil.cpu_percent(interval=None)
+        try:
+            self._process.cpu_percent(interval=None)
+        except Exception:
+            pass
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, name="PerformanceMonitor", daemon=True)
         self.monitor_thread.start()
         self.logger.info("Performance monitoring started")
 
     def stop_monitoring(self):
         """Остановить мониторинг"""
         self.is_monitoring = False
+        self._stop_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1)
+        self.stop_metrics_server()
         self.logger.info("Performance monitoring stopped")
 
     def _monitor_loop(self):
-        """Основной цикл мониторинга"""
+        """Основной цикл мониторинга: один неблокирующий сэмпл на интервал"""
         while self.is_monitoring:
             try:
-                # CPU и память
-                cpu_percent = psutil.cpu_percent(interval=1)
-                memory = psutil.virtual_memory()
-
-                self.stats["cpu_usage"].append(cpu_percent)
-                self.stats["memory_usage"].append(memory.percent)
-
-                # Логируем высокую нагрузку
-                if cpu_percent > 80:
-                    self.logger.warning(f"High CPU usage: {cpu_percent}%")
-
-                if memory.percent > 80:
-                    self.logger.warning(f"High memory usage: {memory.percent}%")
-
-                # Ограничиваем размер истории
-                if len(self.stats["cpu_usage"]) > 60:  # 1 минута
-                    self.stats["cpu_usage"].pop(0)
-                    self.stats["memory_usage"].pop(0)
-
+                self._sample()
             except Exception as e:
                 self.logger.error(f"Monitoring error: {e}")
-
-            time.sleep(1)
+            if self._stop_event.wait(self.sample_interval):
+                break
+
+    def _sample(self):
+        now = time.monotonic()
+        cpu_percent = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+
+        process_info = self._sample_process(now)
+        with self._lock:
+            self.cpu_usage.append(cpu_percent)
+            self.memory_usage.append(memory.percent)
+            self.process_cpu.append(process_info.get("cpu_percent", 0.0))
+            self.process_rss.append(process_info.get("rss_bytes", 0))
+            self._process_info = process_info
+            self._last_sample_ts = now
+
+        # Логируем высокую нагрузку
+        if cpu_percent > 80:
+            self.logger.warning(f"High CPU usage: {cpu_percent}%")
+
+        if memory.percent > 80:
+            self.logger.warning(f"High memory usage: {memory.percent}%")
+
+    def _sample_process(self, now: float) -> Dict[str, Any]:
+        proc = self._process
+        info: Dict[str, Any] = {}
+        with proc.oneshot():
+            memory = proc.memory_info()
+            info["rss_bytes"] = memory.rss
+            info["vms_bytes"] = memory.vms
+            info["cpu_percent"] = proc.cpu_percent(interval=None)
+            info["threads"] = proc.num_threads()
+            # Дескрипторы (Unix) / хендлы (Windows) — дёшево; список open_files() на Windows медленный
+            if hasattr(proc, "num_fds"):
+                info["open_fds"] = proc.num_fds()
+            elif hasattr(proc, "num_handles"):
+                info["open_handles"] = proc.num_handles()
+            thread_times = proc.threads()
+        # Полный список открытых файлов дорогой (особенно на Windows) — раз в OPEN_FILES_EVERY сэмплов
+        self._samples_taken += 1
+        if self._samples_taken % self.OPEN_FILES_EVERY == 1:
+            try:
+                self._open_files = len(proc.open_files())
+            except Exception:
+                self._open_files = None
+        if self._open_files is not None:
+            info["open_files"] = self._open_files
+
+        # CPU по потокам: прирост user+system между сэмплами
+        elapsed = (now - self._last_sample_ts) if self._last_sample_ts is not None else None
+        names = {t.native_id: t.name for t in threading.enumerate() if getattr(t, "native_id", None) is not None}
+        previous = self._thread_cpu
+        current: Dict[int, float] = {}
+        stats: List[Dict[str, Any]] = []
+        for entry in thread_times:
+            cpu_time = entry.user_time + entry.system_time
+            current[entry.id] = cpu_time
+            percent = None
+            if elapsed and entry.id in previous:
+                percent = max(0.0, (cpu_time - previous[entry.id]) / elapsed * 100.0)
+            stats.append(
+                {
+                    "id": entry.id,
+                    "name": names.get(entry.id, str(entry.id)),
+                    "cpu_seconds": round(cpu_time, 3),
+                    "cpu_percent": round(percent, 1) if percent is not None else None,
+                }
+            )
+        stats.sort(key=lambda s: (s["cpu_percent"] or 0.0, s["cpu_seconds"]), reverse=True)
+        self._thread_cpu = current
+        self._thread_stats = stats
+        return info
 
     def measure_operation(self, operation_name: str):
         """Декоратор для измерения времени операций"""
 
         def decorator(func):
             def wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 try:
                     result = func(*args, **kwargs)
                     return result
                 finally:
-                    duration = time.time() - start_time
+                    duration = time.perf_counter() - start_time
                     self.record_operation_time(operation_name, duration)
 
             return wrapper
@@ -85,81 +286,220 @@ class PerformanceMonitor:
 
     def record_operation_time(self, operation: str, duration: float):
         """Записать время выполнения операции"""
-        if operation not in self.stats["response_times"]:
-            self.stats["response_times"][operation] = []
-
-        self.stats["response_times"][operation].append(duration)
+        with self._lock:
+            histogram = self.operations.get(operation)
+            if histogram is None:
+                histogram = self.operations[operation] = LatencyHistogram()
+            histogram.record(duration)
 
         # Логируем медленные операции
-        if duration > 1.0:  # Более 1 секунды
-            self.stats["slow_operations"].append(
-                {"operation": operation, "duration": duration, "timestamp": time.time()}
-            )
+        if duration > self.slow_threshold_sec:
+            self.slow_operations.append({"operation": operation, "duration": duration, "timestamp": time.time()})
             self.logger.warning(f"Slow operation: {operation} took {duration:.2f}s")
 
-        # Ограничиваем размер истории
-        if len(self.stats["response_times"][operation]) > 100:
-            self.stats["response_times"][operation].pop(0)
+    def operation_percentile(self, operation: str, quantile: float = 0.5) -> Optional[float]:
+        """Перцентиль времени операции в секундах (None, если замеров ещё нет)"""
+        with self._lock:
+            histogram = self.operations.get(operation)
+            if histogram is None or not histogram.count:
+                return None
+            return histogram.percentiles((quantile,))[0]
+
+    # ------------------------------------------------------------------ snapshots
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние: система, процесс, потоки и перцентили операций"""
+        with self._lock:
+            operations = {name: hist.summary() for name, hist in self.operations.items()}
+            process = dict(self._process_info)
+            threads = list(self._thread_stats)
+            system = {
+                "cpu_percent": self.cpu_usage.last(),
+                "cpu_percent_avg": self.cpu_usage.mean(),
+                "cpu_percent_max": self.cpu_usage.max(),
+                "memory_percent": self.memory_usage.last(),
+                "memory_percent_avg": self.memory_usage.mean(),
+                "samples": len(self.cpu_usage),
+            }
+            if len(self.process_cpu):
+                process["cpu_percent_avg"] = self.process_cpu.mean()
+                process["rss_bytes_max"] = self.process_rss.max()
+        return {
+            "timestamp": time.time(),
+            "uptime": time.time() - self.start_time,
+            "system": system,
+            "process": process,
+            "threads": threads,
+            "operations": operations,
+            "slow_operations": len(self.slow_operations),
+        }
 
     def get_performance_report(self) -> Dict[str, Any]:
         """Получить отчёт о производительности"""
+        snap = self.snapshot()
         report = {
-            "uptime": time.time() - self.start_time,
+            "uptime": snap["uptime"],
             "current_cpu": psutil.cpu_percent(),
             "current_memory": psutil.virtual_memory().percent,
-            "avg_cpu": sum(self.stats["cpu_usage"]) / len(self.stats["cpu_usage"]) if self.stats["cpu_usage"] else 0,
-            "avg_memory": (
-                sum(self.stats["memory_usage"]) / len(self.stats["memory_usage"]) if self.stats["memory_usage"] else 0
-            ),
-            "slow_operations_count": len(self.stats["slow_operations"]),
+            "avg_cpu": snap["system"]["cpu_percent_avg"],
+            "avg_memory": snap["system"]["memory_percent_avg"],
+            "slow_operations_count": snap["slow_operations"],
+            "process": snap["process"],
             "operations_stats": {},
         }
 
         # Статистика по операциям
-        for op, times in self.stats["response_times"].items():
-            if times:
+        for op, stats in snap["operations"].items():
+            if stats["count"]:
                 report["operations_stats"][op] = {
-                    "count": len(times),
-                    "avg_time": sum(times) / len(times),
-                    "max_time": max(times),
-                    "min_time": min(times),
+                    "count": stats["count"],
+                    "avg_time": stats["mean"],
+                    "max_time": stats["max"],
+                    "min_time": stats["min"],
+                    "p50": stats["p50"],
+                    "p90": stats["p90"],
+                    "p99": stats["p99"],
                 }
 
         return report
 
+    def to_prometheus(self) -> str:
+        """Снимок в текстовом формате Prometheus"""
+        snap = self.snapshot()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        system, process = snap["system"], snap["process"]
+        metric("arvis_uptime_seconds", "gauge", "Monitor uptime", [({}, round(snap["uptime"], 3))])
+        metric("arvis_system_cpu_percent", "gauge", "System CPU usage", [({}, system["cpu_percent"])])
+        metric("arvis_system_memory_percent", "gauge", "System memory usage", [({}, system["memory_percent"])])
+        for key, name, help_text in (
+            ("cpu_percent", "arvis_process_cpu_percent", "Process CPU usage"),
+            ("rss_bytes", "arvis_process_resident_memory_bytes", "Process resident memory"),
+            ("threads", "arvis_process_threads", "Process thread count"),
+            ("open_files", "arvis_process_open_files", "Process open files"),
+            ("open_fds", "arvis_process_open_fds", "Process open file descriptors"),
+            ("open_handles", "arvis_process_open_handles", "Process open handles"),
+        ):
+            if key in process:
+                metric(name, "gauge", help_text, [({}, process[key])])
+        metric(
+            "arvis_thread_cpu_seconds_total",
+            "counter",
+            "CPU time per thread",
+            [({"thread": t["name"]}, t["cpu_seconds"]) for t in snap["threads"]],
+        )
+
+        lines.append("# HELP arvis_operation_seconds Operation latency")
+        lines.append("# TYPE arvis_operation_seconds summary")
+        for op, stats in sorted(snap["operations"].items()):
+            label = _escape_label(op)
+            for quantile, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99")):
+                lines.append(f'arvis_operation_seconds{{operation="{label}",quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f'arvis_operation_seconds_sum{{operation="{label}"}} {stats["mean"] * stats["count"]:.6f}')
+            lines.append(f'arvis_operation_seconds_count{{operation="{label}"}} {stats["count"]}')
+        metric(
+            "arvis_operation_seconds_max",
+            "gauge",
+            "Maximum operation latency",
+            [({"operation": op}, round(stats["max"], 6)) for op, stats in sorted(snap["operations"].items())],
+        )
+        return "\n".join(lines) + "\n"
+
+    # ------------------------------------------------------------------ HTTP endpoint
+
+    def start_metrics_server(self, host: str = "127.0.0.1", port: int = 9465) -> bool:
+        """Локальный endpoint: /metrics (Prometheus) и /metrics.json"""
+        if self._metrics_server is not None:
+            return True
+        monitor = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/metrics", "/"):
+                    body = monitor.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(monitor.snapshot(), ensure_ascii=False, default=str).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+        except OSError as e:
+            self.logger.error(f"Failed to start metrics endpoint on {host}:{port}: {e}")
+            return False
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsEndpoint", daemon=True).start()
+        self._metrics_server = server
+        self.logger.info(f"Metrics endpoint: http://{host}:{server.server_address[1]}/metrics")
+        return True
+
+    def stop_metrics_server(self):
+        server = self._metrics_server
+        if server is None:
+            return
+        self._metrics_server = None
+        try:
+            server.shutdown()
+            server.server_close()
+        except Exception:
+            pass
+
     def diagnose_performance_issues(self) -> list:
         """Диагностировать проблемы производительности"""
         issues = []
 
         # Проверяем CPU
-        if self.stats["cpu_usage"]:
-            avg_cpu = sum(self.stats["cpu_usage"]) / len(self.stats["cpu_usage"])
+        if len(self.cpu_usage):
+            avg_cpu = self.cpu_usage.mean()
             if avg_cpu > 70:
                 issues.append(f"Высокая нагрузка на CPU: {avg_cpu:.1f}%")
 
         # Проверяем память
-        if self.stats["memory_usage"]:
-            avg_memory = sum(self.stats["memory_usage"]) / len(self.stats["memory_usage"])
+        if len(self.memory_usage):
+            avg_memory = self.memory_usage.mean()
             if avg_memory > 70:
                 issues.append(f"Высокое потребление памяти: {avg_memory:.1f}%")
 
         # Проверяем медленные операции
         recent_slow = [
-            op for op in self.stats["slow_operations"] if time.time() - op["timestamp"] < 300
+            op for op in list(self.slow_operations) if time.time() - op["timestamp"] < 300
         ]  # Последние 5 минут
 
         if len(recent_slow) > 5:
             issues.append(f"Много медленных операций: {len(recent_slow)} за 5 минут")
 
-        # Проверяем времена ответа
-        for op, times in self.stats["response_times"].items():
-            if times:
-                avg_time = sum(times) / len(times)
-                if avg_time > 0.5:  # Более 500мс
-                    issues.append(f"Медленная операция {op}: {avg_time:.2f}s в среднем")
+        # Проверяем времена ответа (по медиане, а не по среднему — выбросы видны в p99)
+        with self._lock:
+            summaries = {op: hist.summary() for op, hist in self.operations.items()}
+        for op, stats in summaries.items():
+            if stats["count"] and stats["p50"] > 0.5:  # Более 500мс
+                issues.append(f"Медленная операция {op}: p50 {stats['p50']:.2f}s, p99 {stats['p99']:.2f}s")
 
         return issues
 
 
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
 # Глобальный монитор производительности
 performance_monitor = PerformanceMonitor()
@@ -142,7 +142,7 @@ class LocalAuthProvider(AuthProvider):
         """Завершить работу локального auth"""
         try:
             if self.auth_manager:
-                # LocalAuthManager не требует явного завершения
+                self.auth_manager.close()
                 self.auth_manager = None
 
             self._initialized = False
@@ -3,14 +3,27 @@ Audit logging system for Arvis
 Система аудита действий пользователей
 """
 
+import atexit
 import json
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import asdict, dataclass
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from utils.logger import ModuleLogger
+from utils.security.audit_index import SegmentIndex, bit_positions, index_path_for
+
+_FSYNC_POLICIES = ("batch", "interval", "never")
+
+# Сигнал остановки фонового писателя
+_STOP = object()
 
 
 class AuditEventType(Enum):
@@ -98,7 +111,20 @@ class AuditEvent:
 
 
 class AuditLogger:
-    """Логгер аудита действий"""
+    """Логгер аудита действий
+
+    Журнал хранится сегментами (audit.jsonl + ротированные audit_*.jsonl, ротация
+    по размеру и смене суток) с индексом на каждый сегмент (см. audit_index):
+    запросы пропускают сегменты и читают только подходящие строки.
+
+    log_event только создаёт событие и кладёт его в ограниченную очередь; запись
+    на диск, индексацию и строку в основной лог делает фоновый поток пачками
+    (group commit по размеру пачки или по времени, fsync — по audit.writer.fsync;
+    при interval хвост последней пачки синхронизируется по таймеру, flush() и close()
+    делают fsync всегда).
+    При переполнении очереди вызывающий поток ждёт, а затем пишет сам — события
+    не теряются. close() (и atexit) дописывает всё, что осталось в очереди.
+    """
 
     def __init__(self, config=None, log_dir: Optional[Path] = None):
         self.logger = ModuleLogger("AuditLogger")
@@ -118,10 +144,54 @@ class AuditLogger:
         # Настройки ротации
         self.max_log_size = self.config.get("audit.max_log_size", 10 * 1024 * 1024)  # 10 MB
         self.max_log_age_days = self.config.get("audit.max_log_age_days", 90)  # 90 дней
+        self.rotate_daily = bool(self.config.get("audit.rotate_daily", True))  # сегмент на сутки
+
+        # Фоновая запись пачками
+        self.writer_enabled = bool(self.config.get("audit.writer.enabled", True))
+        self.queue_size = max(1, int(self.config.get("audit.writer.queue_size", 10000) or 10000))
+        self.batch_size = max(1, int(self.config.get("audit.writer.batch_size", 256) or 256))
+        self.flush_interval = max(0.0, float(self.config.get("audit.writer.flush_interval_ms", 200) or 0) / 1000.0)
+        self.block_timeout = max(0.0, float(self.config.get("audit.writer.block_timeout_ms", 100) or 0) / 1000.0)
+        self.fsync_policy = str(self.config.get("audit.writer.fsync", "interval") or "never").lower()
+        if self.fsync_policy not in _FSYNC_POLICIES:
+            self.logger.warning(f"Unknown audit.writer.fsync '{self.fsync_policy}', using 'interval'")
+            self.fsync_policy = "interval"
+        self.fsync_interval = max(0.0, float(self.config.get("audit.writer.fsync_interval_sec", 1.0) or 0))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._retry: List[AuditEvent] = []
+        self._last_fsync = time.monotonic()
+        # Записано, но ещё не fsync: при политике interval писатель досинхронизирует по таймеру
+        self._unsynced = False
+        self._closed = False
+        self._writer_thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "written": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "queue_high_watermark": 0,
+            "blocked": 0,
+            "blocked_sec": 0.0,
+            "sync_writes": 0,
+            "fsyncs": 0,
+            "write_errors": 0,
+            "dropped": 0,
+            "write_sec": 0.0,
+        }
 
-        # Буфер событий (для производительности)
-        self.event_buffer: List[AuditEvent] = []
-        self.buffer_size = 10
+        # Индексы сегментов: текущий держим в памяти, ротированные — в небольшом LRU
+        self._lock = threading.RLock()
+        self._index_cache: "OrderedDict[str, SegmentIndex]" = OrderedDict()
+        self._index_cache_size = max(1, int(self.config.get("audit.index_cache_segments", 16) or 16))
+        self._active_index = SegmentIndex.load(self.current_log_file)
+        self._active_ino = self._file_ino()
+        if self._active_index.dirty:
+            self._save_index(self._active_index)
+
+        if self.writer_enabled:
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="Arvis-audit-writer", daemon=True)
+            self._writer_thread.start()
+        atexit.register(self.close)
 
         self.logger.info("Audit logger initialized")
 
@@ -137,9 +207,7 @@ class AuditLogger:
         severity: AuditSeverity = AuditSeverity.INFO,
         error_message: Optional[str] = None,
     ):
-        """Записать событие аудита"""
-        import secrets
-
+        """Записать событие аудита (запись на диск — в фоновом потоке)"""
         event = AuditEvent(
             event_id=secrets.token_urlsafe(16),
             timestamp=datetime.now(),
@@ -154,20 +222,45 @@ class AuditLogger:
             error_message=error_message,
         )
 
-        # Добавляем в буфер
-        self.event_buffer.append(event)
-
-        # Записываем буфер если достигнут размер
-        if len(self.event_buffer) >= self.buffer_size:
-            self._flush_buffer()
-
-        # Логируем также в основной лог
-        log_msg = f"[{event_type.value}] {action}"
-        if username:
-            log_msg += f" by {username}"
-        if not success:
-            log_msg += f" FAILED: {error_message}"
+        if self._writer_thread is None or self._closed:
+            self._write_sync([event])
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._enqueue_blocking(event)
 
+    def _enqueue_blocking(self, event: AuditEvent):
+        """Очередь полна: ждём писателя до block_timeout, потом пишем сами"""
+        start = time.perf_counter()
+        try:
+            self._queue.put(event, timeout=self.block_timeout)
+            written_inline = False
+        except queue.Full:
+            written_inline = True
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats["blocked"] += 1
+            self._stats["blocked_sec"] += waited
+        if written_inline:
+            self._write_sync([event])
+
+    def _write_sync(self, events: List[AuditEvent]):
+        with self._stats_lock:
+            self._stats["sync_writes"] += len(events)
+        self._write_batch(events)
+        for event in events:
+            self._log_message(event)
+
+    def _log_message(self, event: AuditEvent):
+        """Строка о событии в основной лог"""
+        log_msg = f"[{event.event_type.value}] {event.action}"
+        if event.username:
+            log_msg += f" by {event.username}"
+        if not event.success:
+            log_msg += f" FAILED: {event.error_message}"
+
+        severity = event.severity
         if severity == AuditSeverity.CRITICAL:
             self.logger.critical(log_msg)
         elif severity == AuditSeverity.ERROR:
@@ -177,47 +270,282 @@ class AuditLogger:
         else:
             self.logger.info(log_msg)
 
-    def _flush_buffer(self):
-        """Записать буфер событий в файл"""
-        if not self.event_buffer:
-            return
+    @staticmethod
+    def _event_to_dict(event: AuditEvent) -> Dict[str, Any]:
+        event_dict = asdict(event)
+        # Конвертируем enum в строки
+        event_dict["event_type"] = event.event_type.value
+        event_dict["severity"] = event.severity.value
+        event_dict["timestamp"] = event.timestamp.isoformat()
+        return event_dict
+
+    @staticmethod
+    def _event_from_dict(event_dict: Dict[str, Any]) -> AuditEvent:
+        # Конвертируем обратно в объекты
+        event_dict["event_type"] = AuditEventType(event_dict["event_type"])
+        event_dict["severity"] = AuditSeverity(event_dict["severity"])
+        event_dict["timestamp"] = datetime.fromisoformat(event_dict["timestamp"])
+        return AuditEvent(**event_dict)
+
+    # ------------------------------------------------------------------ writer
+
+    def _writer_loop(self):
+        """Фоновый писатель: пачка закрывается по batch_size, flush_interval или запросу flush()"""
+        get = self._queue.get
+        while True:
+            try:
+                item = get(timeout=self._fsync_wait())
+            except queue.Empty:
+                # Очередь затихла, а хвост последней пачки ещё не на диске
+                self._sync_pending()
+                continue
+            batch: List[AuditEvent] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
 
+            if batch:
+                with self._stats_lock:
+                    depth = len(batch) + self._queue.qsize()
+                    if depth > self._stats["queue_high_watermark"]:
+                        self._stats["queue_high_watermark"] = depth
+                self._write_batch(batch)
+                for event in batch:
+                    self._log_message(event)
+            if waiters:
+                # flush() обещает, что события на диске, а не только в кэше ОС
+                self._sync_pending()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _fsync_wait(self) -> Optional[float]:
+        """Сколько писателю ждать события до fsync хвоста (None — без ограничения)"""
+        if self.fsync_policy != "interval" or not self._unsynced:
+            return None
+        return max(0.0, self.fsync_interval - (time.monotonic() - self._last_fsync))
+
+    def _sync_pending(self):
+        """fsync текущего сегмента, если в нём есть несинхронизированные записи"""
+        with self._lock:
+            if not self._unsynced:
+                return
+            try:
+                with open(self.current_log_file, "ab") as f:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                self.logger.warning(f"Failed to fsync audit log: {e}")
+                return
+            self._unsynced = False
+            self._last_fsync = time.monotonic()
+        with self._stats_lock:
+            self._stats["fsyncs"] += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи всех событий, поставленных в очередь до вызова"""
+        thread = self._writer_thread
+        if thread is None or not thread.is_alive() or threading.current_thread() is thread:
+            self._drain_queue()
+            self._sync_pending()
+            return True
+        done = threading.Event()
         try:
-            # Проверяем ротацию
-            self._check_rotation()
-
-            # Записываем события
-            with open(self.current_log_file, "a", encoding="utf-8") as f:
-                for event in self.event_buffer:
-                    event_dict = asdict(event)
-                    # Конвертируем enum в строки
-                    event_dict["event_type"] = event.event_type.value
-                    event_dict["severity"] = event.severity.value
-                    event_dict["timestamp"] = event.timestamp.isoformat()
-
-                    f.write(json.dumps(event_dict, ensure_ascii=False) + "\n")
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _drain_queue(self):
+        """Записать остаток очереди в текущем потоке (писатель остановлен)"""
+        batch: List[AuditEvent] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not _STOP:
+                batch.append(item)
+        if batch or self._retry:
+            self._write_sync(batch)
+
+    def _write_batch(self, events: List[AuditEvent]):
+        """Group commit: одна запись в файл на пачку, затем индексация и fsync по политике"""
+        with self._lock:
+            if self._retry:
+                # Пачка, не записанная из-за ошибки, идёт первой
+                events = self._retry + events
+                self._retry = []
+            if not events:
+                return
+
+            start = time.perf_counter()
+            try:
+                self._refresh_active_index()
+                # Проверяем ротацию
+                self._check_rotation(events[0].timestamp)
+
+                records = []
+                lines = []
+                for event in events:
+                    event_dict = self._event_to_dict(event)
+                    records.append(event_dict)
+                    lines.append((json.dumps(event_dict, ensure_ascii=False) + "\n").encode("utf-8"))
+
+                index = self._active_index
+                fsynced = False
+                with open(self.current_log_file, "ab") as f:
+                    self._active_ino = os.fstat(f.fileno()).st_ino
+                    offset = f.seek(0, 2)
+                    if offset != index.size:
+                        # Строка дописана между refresh и открытием файла — догоняем индекс
+                        index.catch_up()
+                        if offset > index.size:
+                            # Оборванная строка после сбоя: отрезаем, иначе склеится со следующей
+                            f.truncate(index.size)
+                            offset = index.size
+                    f.write(b"".join(lines))
+                    f.flush()
+                    if self.fsync_policy == "batch" or (
+                        self.fsync_policy == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval
+                    ):
+                        os.fsync(f.fileno())
+                        self._last_fsync = time.monotonic()
+                        fsynced = True
+                self._unsynced = not fsynced
+
+                for line, event_dict in zip(lines, records):
+                    index.add(offset, len(line), event_dict)
+                    offset += len(line)
+
+                with self._stats_lock:
+                    self._stats["written"] += len(events)
+                    self._stats["batches"] += 1
+                    self._stats["max_batch"] = max(self._stats["max_batch"], len(events))
+                    self._stats["write_sec"] += time.perf_counter() - start
+                    if fsynced:
+                        self._stats["fsyncs"] += 1
 
-            # Очищаем буфер
-            self.event_buffer.clear()
+            except Exception as e:
+                # Индекс не сдвинут — оборванный хвост отрежется при следующей записи
+                self._retry = events[-self.queue_size :]
+                dropped = len(events) - len(self._retry)
+                with self._stats_lock:
+                    self._stats["write_errors"] += 1
+                    self._stats["dropped"] += dropped
+                self.logger.error(f"Failed to write audit events: {e}")
+                if dropped:
+                    self.logger.error(f"Audit retry buffer full: dropped {dropped} oldest events")
+
+    def get_writer_stats(self) -> Dict[str, Any]:
+        """Метрики фонового писателя и обратного давления очереди"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        stats["queued"] = self._queue.qsize()
+        stats["queue_size"] = self.queue_size
+        stats["pending_retry"] = len(self._retry)
+        stats["avg_batch"] = round(stats["written"] / batches, 1) if batches else 0.0
+        stats["avg_write_ms"] = round(stats.pop("write_sec") * 1000.0 / batches, 3) if batches else 0.0
+        stats["blocked_ms"] = round(stats.pop("blocked_sec") * 1000.0, 1)
+        stats["fsync"] = self.fsync_policy
+        stats["unsynced"] = self._unsynced
+        stats["writer_alive"] = bool(self._writer_thread and self._writer_thread.is_alive())
+        return stats
+
+    def _refresh_active_index(self):
+        """Догнать индекс текущего сегмента, если файл дописан или ротирован в обход этого экземпляра
+
+        Например, другим процессом с тем же каталогом аудита. Вызывается под self._lock.
+        """
+        index = self._active_index
+        try:
+            stat = self.current_log_file.stat()
+        except OSError:
+            if index.size:
+                # Сегмент ротирован, новый ещё не создан
+                self._active_index = SegmentIndex(self.current_log_file)
+                self._active_ino = None
+            return
+        if stat.st_ino != self._active_ino or stat.st_size < index.size:
+            # Сегмент ротирован или усечён — проиндексированное относится к другому файлу
+            self._active_index = SegmentIndex.load(self.current_log_file)
+            self._active_ino = stat.st_ino
+        elif stat.st_size > index.size:
+            index.catch_up()
+
+    def _file_ino(self) -> Optional[int]:
+        try:
+            return self.current_log_file.stat().st_ino
+        except OSError:
+            return None
 
+    def _save_index(self, index: SegmentIndex):
+        try:
+            index.save()
         except Exception as e:
-            self.logger.error(f"Failed to flush audit buffer: {e}")
+            self.logger.warning(f"Failed to save audit index for {index.segment.name}: {e}")
 
-    def _check_rotation(self):
-        """Проверить необходимость ротации лога"""
+    def _check_rotation(self, next_event_time: Optional[datetime] = None):
+        """Проверить необходимость ротации лога: по размеру и (audit.rotate_daily) по смене суток
+
+        Сутки сравниваются по времени следующего записываемого события, а не по часам
+        писателя: событие, поставленное в очередь до полуночи, остаётся в своём сегменте.
+        """
         if not self.current_log_file.exists():
             return
 
         # Проверяем размер файла
         file_size = self.current_log_file.stat().st_size
+        index = self._active_index
+        first_ts = index.t_min
+        new_day = (
+            self.rotate_daily
+            and first_ts is not None
+            and datetime.fromtimestamp(first_ts).date() < (next_event_time or datetime.now()).date()
+        )
 
-        if file_size > self.max_log_size:
-            # Ротация по размеру
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if file_size > self.max_log_size or (new_day and file_size > 0):
+            # Ротация: сегмент переименовывается вместе с индексом. В имени — время
+            # последнего события сегмента: запись асинхронная, и часы в момент ротации
+            # могут опережать события, которые ещё лежат в очереди
+            self._sync_pending()
+            index.catch_up()
+            last_ts = index.t_max
+            timestamp = (datetime.fromtimestamp(last_ts) if last_ts else datetime.now()).strftime("%Y%m%d_%H%M%S")
             archive_name = f"audit_{timestamp}.jsonl"
             archive_path = self.log_dir / archive_name
+            suffix = 1
+            while archive_path.exists():
+                archive_name = f"audit_{timestamp}_{suffix}.jsonl"
+                archive_path = self.log_dir / archive_name
+                suffix += 1
 
             self.current_log_file.rename(archive_path)
+            try:
+                index.move_to(archive_path)
+            except Exception as e:
+                self.logger.warning(f"Failed to move audit index to {archive_name}: {e}")
+            self._cache_index(index)
+            self._active_index = SegmentIndex(self.current_log_file)
+            self._active_ino = None
             self.logger.info(f"Rotated audit log to {archive_name}")
 
             # Очистка старых логов
@@ -231,16 +559,179 @@ class AuditLogger:
 
         for log_file in self.log_dir.glob("audit_*.jsonl"):
             try:
-                # Парсим дату из имени файла
-                timestamp_str = log_file.stem.replace("audit_", "")
+                # Парсим дату из имени файла (audit_YYYYmmdd_HHMMSS[_N])
+                timestamp_str = log_file.stem.replace("audit_", "")[:15]
                 file_date = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
 
                 if file_date < cutoff_date:
                     log_file.unlink()
+                    sidecar = index_path_for(log_file)
+                    if sidecar.exists():
+                        sidecar.unlink()
+                    self._index_cache.pop(log_file.name, None)
                     self.logger.info(f"Deleted old audit log: {log_file.name}")
             except Exception as e:
                 self.logger.warning(f"Failed to process log file {log_file}: {e}")
 
+    # ------------------------------------------------------------------ segments
+
+    def _cache_index(self, index: SegmentIndex):
+        self._index_cache[index.segment.name] = index
+        self._index_cache.move_to_end(index.segment.name)
+        while len(self._index_cache) > self._index_cache_size:
+            self._index_cache.popitem(last=False)
+
+    def _load_index(self, path: Path) -> Optional[SegmentIndex]:
+        with self._lock:
+            index = self._index_cache.get(path.name)
+            if index is None:
+                try:
+                    index = SegmentIndex.load(path)
+                except Exception as e:
+                    self.logger.error(f"Failed to index audit log {path}: {e}")
+                    return None
+                if index.dirty:
+                    self._save_index(index)
+            self._cache_index(index)
+            return index
+
+    @staticmethod
+    def _segment_order(path: Path) -> Tuple[str, int]:
+        # audit_YYYYmmdd_HHMMSS[_N]: N сравнивается как число (_10 новее _9)
+        stem = path.stem.replace("audit_", "")
+        suffix = stem[16:]
+        return stem[:15], int(suffix) if suffix.isdigit() else 0
+
+    @staticmethod
+    def _rotated_at(path: Path) -> Optional[float]:
+        try:
+            return datetime.strptime(path.stem.replace("audit_", "")[:15], "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            return None
+
+    def _iter_segments(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[SegmentIndex]:
+        """Индексы сегментов от новых к старым; сегменты вне [start, end] не загружаются
+
+        Время в имени файла (последнее событие сегмента) ограничивает события сегмента
+        сверху, а время в имени следующего (более старого) сегмента — снизу.
+        """
+        with self._lock:
+            self._refresh_active_index()
+            active = self._active_index
+        yield active
+        rotated = sorted(self.log_dir.glob("audit_*.jsonl"), key=self._segment_order, reverse=True)
+        times = [self._rotated_at(path) for path in rotated]
+        for i, path in enumerate(rotated):
+            # +1 с: в имени время ротации без долей секунды
+            if start is not None and times[i] is not None and times[i] + 1.0 < start:
+                break
+            older = times[i + 1] if i + 1 < len(rotated) else None
+            if end is not None and older is not None and older - 1.0 > end:
+                continue
+            index = self._load_index(path)
+            if index is not None:
+                yield index
+
+    @staticmethod
+    def _filters(
+        event_types: Optional[List[AuditEventType]],
+        user_id: Optional[str],
+        username: Optional[str],
+        severity: Optional[AuditSeverity],
+    ) -> Dict[str, Optional[List[str]]]:
+        return {
+            "event_type": [t.value for t in event_types] if event_types else None,
+            "user_id": [user_id] if user_id else None,
+            "username": [username] if username else None,
+            "severity": [severity.value] if severity else None,
+        }
+
+    def _iter_matches(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        filters: Dict[str, Optional[List[str]]],
+        success: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> Iterator[Tuple[str, AuditEvent]]:
+        """(курсор, событие) от новых к старым, начиная после cursor"""
+        start = start_date.timestamp() if start_date else None
+        end = end_date.timestamp() if end_date else None
+        after_segment, after_position = None, None
+        if cursor:
+            created, _, position = cursor.partition(":")
+            after_segment, after_position = round(float(created), 6), int(position)
+
+        for index in self._iter_segments(start, end):
+            segment_key = round(index.created, 6)
+            if after_segment is not None and segment_key > after_segment:
+                continue
+            with self._lock:
+                mask = index.select(start, end, filters, success)
+            if after_segment is not None and segment_key == after_segment:
+                mask &= (1 << after_position) - 1
+            if not mask:
+                continue
+            positions = bit_positions(mask, newest_first=True)
+            if not index.monotonic:
+                positions.sort(key=index.timestamp_at, reverse=True)
+            try:
+                for position, event_dict in index.read(positions):
+                    try:
+                        event = self._event_from_dict(event_dict)
+                    except Exception as e:
+                        self.logger.warning(f"Failed to parse audit event: {e}")
+                        continue
+                    yield f"{index.created:.6f}:{position}", event
+            except OSError as e:
+                self.logger.error(f"Failed to read audit log {index.segment}: {e}")
+
+    # ------------------------------------------------------------------ queries
+
+    def iter_events(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        event_types: Optional[List[AuditEventType]] = None,
+        user_id: Optional[str] = None,
+        username: Optional[str] = None,
+        severity: Optional[AuditSeverity] = None,
+        success: Optional[bool] = None,
+    ) -> Iterator[AuditEvent]:
+        """Потоковая выдача событий (новые первыми) без построения списка"""
+        self.flush()
+        filters = self._filters(event_types, user_id, username, severity)
+        for _, event in self._iter_matches(start_date, end_date, filters, success):
+            yield event
+
+    def query_page(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        event_types: Optional[List[AuditEventType]] = None,
+        user_id: Optional[str] = None,
+        username: Optional[str] = None,
+        severity: Optional[AuditSeverity] = None,
+        success: Optional[bool] = None,
+        page_size: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[AuditEvent], Optional[str]]:
+        """Страница событий (новые первыми) и курсор следующей страницы (None — конец)
+
+        Курсор привязан к сегменту, а не к имени файла, поэтому переживает ротацию.
+        """
+        if cursor is None:
+            self.flush()
+        filters = self._filters(event_types, user_id, username, severity)
+        page: List[AuditEvent] = []
+        next_cursor = None
+        for position_cursor, event in self._iter_matches(start_date, end_date, filters, success, cursor):
+            if len(page) >= page_size:
+                return page, next_cursor
+            page.append(event)
+            next_cursor = position_cursor
+        return page, None
+
     def query_events(
         self,
         start_date: Optional[datetime] = None,
@@ -263,92 +754,85 @@ class AuditLogger:
             limit: Максимальное количество результатов
 
         Returns:
-            Список событий
+            Список событий (новые первыми)
         """
-        # Сначала записываем буфер
-        self._flush_buffer()
-
         events = []
-
-        # Читаем все log файлы
-        log_files = sorted(list(self.log_dir.glob("audit*.jsonl")), reverse=True)  # Новые первыми
-
-        for log_file in log_files:
-            try:
-                with open(log_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        try:
-                            event_dict = json.loads(line)
-
-                            # Конвертируем обратно в объекты
-                            event_dict["event_type"] = AuditEventType(event_dict["event_type"])
-                            event_dict["severity"] = AuditSeverity(event_dict["severity"])
-                            event_dict["timestamp"] = datetime.fromisoformat(event_dict["timestamp"])
-
-                            event = AuditEvent(**event_dict)
-
-                            # Применяем фильтры
-                            if start_date and event.timestamp < start_date:
-                                continue
-                            if end_date and event.timestamp > end_date:
-                                continue
-                            if event_types and event.event_type not in event_types:
-                                continue
-                            if user_id and event.user_id != user_id:
-                                continue
-                            if username and event.username != username:
-                                continue
-                            if severity and event.severity != severity:
-                                continue
-
-                            events.append(event)
-
-                            if len(events) >= limit:
-                                break
-                        except Exception as e:
-                            self.logger.warning(f"Failed to parse audit event: {e}")
-                            continue
-
-                if len(events) >= limit:
-                    break
-
-            except Exception as e:
-                self.logger.error(f"Failed to read audit log {log_file}: {e}")
-                continue
-
+        for event in self.iter_events(start_date, end_date, event_types, user_id, username, severity):
+            events.append(event)
+            if len(events) >= limit:
+                break
         return events
 
     def get_user_activity(self, username: str, days: int = 7) -> Dict[str, Any]:
         """Получить активность пользователя за период
 
+        Считается по битовым картам индекса, без чтения самих событий.
+
         Returns:
             Статистика активности
         """
         from collections import Counter
         from datetime import timedelta
 
-        start_date = datetime.now() - timedelta(days=days)
-        events = self.query_events(start_date=start_date, username=username, limit=10000)
-
-        # Подсчитываем статистику
-        event_types = Counter([e.event_type.value for e in events])
-        severities = Counter([e.severity.value for e in events])
-
-        failed_events = [e for e in events if not e.success]
+        self.flush()
+        start = (datetime.now() - timedelta(days=days)).timestamp()
+        filters = {"username": [username]}
+
+        total = 0
+        failed = 0
+        event_types: Counter = Counter()
+        severities: Counter = Counter()
+        last_ts: Optional[float] = None
+
+        for index in self._iter_segments(start):
+            with self._lock:
+                mask = index.select(start, None, filters)
+                if not mask:
+                    continue
+                total += mask.bit_count()
+                failed += (mask & index.failed).bit_count()
+                for value, bitmap in index.bitmaps["event_type"].items():
+                    count = (mask & bitmap).bit_count()
+                    if count:
+                        event_types[value] += count
+                for value, bitmap in index.bitmaps["severity"].items():
+                    count = (mask & bitmap).bit_count()
+                    if count:
+                        severities[value] += count
+                if index.monotonic:
+                    segment_last = index.timestamps[mask.bit_length() - 1]
+                else:
+                    segment_last = max(index.timestamps[p] for p in bit_positions(mask))
+            last_ts = segment_last if last_ts is None else max(last_ts, segment_last)
 
         return {
             "username": username,
             "period_days": days,
-            "total_events": len(events),
+            "total_events": total,
             "event_types": dict(event_types),
             "severities": dict(severities),
-            "failed_events": len(failed_events),
-            "last_activity": events[0].timestamp.isoformat() if events else None,
+            "failed_events": failed,
+            "last_activity": datetime.fromtimestamp(last_ts).isoformat() if last_ts is not None else None,
         }
 
-    def close(self):
-        """Закрыть аудит-логгер"""
-        self._flush_buffer()
+    def close(self, timeout: float = 5.0):
+        """Закрыть аудит-логгер: дописать очередь, остановить писателя, сохранить индекс"""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._writer_thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        # События, попавшие в очередь после _STOP или не дописанные писателем
+        self._drain_queue()
+        self._sync_pending()
+        with self._lock:
+            if self._active_index.dirty:
+                self._save_index(self._active_index)
         self.logger.info("Audit logger closed")
 
 
@@ -0,0 +1,290 @@
+"""
+Индекс сегментов журнала аудита
+
+Сегмент — один файл audit*.jsonl (текущий audit.jsonl или ротированный
+audit_YYYYmmdd_HHMMSS.jsonl). Рядом лежит индекс <сегмент>.idx (JSON):
+- смещения строк в байтах и время каждого события (epoch);
+- диапазон времени сегмента (t_min/t_max);
+- битовые карты по event_type, username, user_id, severity и неуспешным событиям
+  (бит i — строка i; Python int, в файле — hex).
+
+Запрос сначала отбрасывает сегменты целиком (время вне диапазона, нет такого
+пользователя/типа), затем пересекает битовые карты и читает только подходящие
+строки через seek. Индекс дописывается при записи событий; если файл длиннее
+проиндексированного (сбой до сохранения индекса, старый журнал без индекса),
+недостающий хвост индексируется при загрузке.
+"""
+
+import bisect
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+# Индексируемые поля записи -> битовые карты по значению
+INDEXED_FIELDS = ("event_type", "username", "user_id", "severity")
+
+
+def index_path_for(segment: Path) -> Path:
+    return segment.with_suffix(INDEX_SUFFIX)
+
+
+def _timestamp(record: Dict[str, Any]) -> float:
+    value = record.get("timestamp")
+    try:
+        return datetime.fromisoformat(value).timestamp() if isinstance(value, str) else float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def bit_positions(bitmap: int, newest_first: bool = True) -> List[int]:
+    """Номера установленных битов (строк) — поиск по двоичной строке идёт в C"""
+    if not bitmap:
+        return []
+    bits = bin(bitmap)[:1:-1]  # младший бит первым
+    positions = []
+    pos = bits.find("1")
+    while pos != -1:
+        positions.append(pos)
+        pos = bits.find("1", pos + 1)
+    if newest_first:
+        positions.reverse()
+    return positions
+
+
+class SegmentIndex:
+    """Индекс одного сегмента: смещения, время и битовые карты полей"""
+
+    def __init__(self, segment: Path, created: Optional[float] = None):
+        self.segment = Path(segment)
+        # Порядковый ключ сегмента для курсоров постраничной выдачи (не меняется при ротации)
+        self.created = float(created if created is not None else time.time())
+        self.size = 0
+        self.offsets: List[int] = []
+        self.timestamps: List[float] = []
+        self.monotonic = True
+        self.bitmaps: Dict[str, Dict[str, int]] = {name: {} for name in INDEXED_FIELDS}
+        self.failed = 0
+        self.dirty = False
+
+    # ------------------------------------------------------------------ build
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def t_min(self) -> Optional[float]:
+        if not self.timestamps:
+            return None
+        return self.timestamps[0] if self.monotonic else min(self.timestamps)
+
+    @property
+    def t_max(self) -> Optional[float]:
+        if not self.timestamps:
+            return None
+        return self.timestamps[-1] if self.monotonic else max(self.timestamps)
+
+    def add(self, offset: int, length: int, record: Dict[str, Any]):
+        """Проиндексировать строку, записанную по смещению offset (length байт с переводом строки)"""
+        position = len(self.offsets)
+        bit = 1 << position
+        ts = _timestamp(record)
+        if self.timestamps and ts < self.timestamps[-1]:
+            self.monotonic = False
+        self.offsets.append(offset)
+        self.timestamps.append(ts)
+        for name in INDEXED_FIELDS:
+            value = record.get(name)
+            if value is not None:
+                bitmaps = self.bitmaps[name]
+                key = str(value)
+                bitmaps[key] = bitmaps.get(key, 0) | bit
+        if not record.get("success", True):
+            self.failed |= bit
+        self.size = max(self.size, offset + length)
+        self.dirty = True
+
+    def catch_up(self) -> int:
+        """Дочитать в индекс строки файла после self.size; возвращает число новых строк"""
+        try:
+            file_size = self.segment.stat().st_size
+        except OSError:
+            return 0
+        if file_size <= self.size:
+            return 0
+        added = 0
+        with open(self.segment, "rb") as f:
+            f.seek(self.size)
+            offset = self.size
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # недописанная строка — дочитаем позже
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    self.add(offset, len(raw), record)
+                    added += 1
+                else:
+                    self.size = offset + len(raw)
+                offset += len(raw)
+        return added
+
+    # ------------------------------------------------------------------ persistence
+
+    @classmethod
+    def load(cls, segment: Path) -> "SegmentIndex":
+        """Загрузить индекс сегмента (или построить заново) и дочитать новые строки"""
+        segment = Path(segment)
+        index = None
+        sidecar = index_path_for(segment)
+        if sidecar.exists():
+            try:
+                index = cls._from_dict(segment, json.loads(sidecar.read_text(encoding="utf-8")))
+                if index.size > segment.stat().st_size:
+                    index = None  # файл заменён или усечён
+            except Exception:
+                index = None
+        if index is None:
+            index = cls(segment, created=cls._legacy_created(segment))
+            index.dirty = True
+        index.catch_up()
+        return index
+
+    @staticmethod
+    def _legacy_created(segment: Path) -> float:
+        # audit_YYYYmmdd_HHMMSS.jsonl -> время ротации; иначе время изменения файла
+        try:
+            return datetime.strptime(segment.stem.replace("audit_", ""), "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            try:
+                return segment.stat().st_mtime
+            except OSError:
+                return time.time()
+
+    @classmethod
+    def _from_dict(cls, segment: Path, data: Dict[str, Any]) -> "SegmentIndex":
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("unsupported audit index version")
+        index = cls(segment, created=data.get("created"))
+        index.size = int(data["size"])
+        index.offsets = list(data["offsets"])
+        index.timestamps = list(data["timestamps"])
+        index.monotonic = bool(data.get("monotonic", True))
+        index.bitmaps = {
+            name: {key: int(value, 16) for key, value in data.get("bitmaps", {}).get(name, {}).items()}
+            for name in INDEXED_FIELDS
+        }
+        index.failed = int(data.get("failed", "0"), 16)
+        return index
+
+    def save(self):
+        """Атомарно записать индекс рядом с сегментом"""
+        data = {
+            "version": INDEX_VERSION,
+            "created": self.created,
+            "size": self.size,
+            "count": self.count,
+            "t_min": self.t_min,
+            "t_max": self.t_max,
+            "monotonic": self.monotonic,
+            "offsets": self.offsets,
+            "timestamps": self.timestamps,
+            "bitmaps": {
+                name: {key: format(bm, "x") for key, bm in maps.items()} for name, maps in self.bitmaps.items()
+            },
+            "failed": format(self.failed, "x"),
+        }
+        sidecar = index_path_for(self.segment)
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, sidecar)
+        self.dirty = False
+
+    def move_to(self, segment: Path):
+        """Сегмент переименован при ротации: индекс переезжает вместе с ним"""
+        old_sidecar = index_path_for(self.segment)
+        self.segment = Path(segment)
+        self.save()
+        if old_sidecar.exists() and old_sidecar != index_path_for(self.segment):
+            try:
+                old_sidecar.unlink()
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------ queries
+
+    def _time_mask(self, start: Optional[float], end: Optional[float]) -> int:
+        count = self.count
+        full = (1 << count) - 1
+        if start is None and end is None:
+            return full
+        if self.monotonic:
+            lo = bisect.bisect_left(self.timestamps, start) if start is not None else 0
+            hi = bisect.bisect_right(self.timestamps, end) if end is not None else count
+            return ((1 << hi) - 1) ^ ((1 << lo) - 1) if hi > lo else 0
+        mask = 0
+        for position, ts in enumerate(self.timestamps):
+            if (start is None or ts >= start) and (end is None or ts <= end):
+                mask |= 1 << position
+        return mask
+
+    def select(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        filters: Optional[Dict[str, Optional[Iterable[str]]]] = None,
+        success: Optional[bool] = None,
+    ) -> int:
+        """Битовая карта строк под фильтры; 0 — сегмент можно пропустить"""
+        if not self.count:
+            return 0
+        t_min, t_max = self.t_min, self.t_max
+        if (start is not None and t_max is not None and t_max < start) or (
+            end is not None and t_min is not None and t_min > end
+        ):
+            return 0
+        mask = None
+        for name, values in (filters or {}).items():
+            if values is None:
+                continue
+            bitmaps = self.bitmaps.get(name, {})
+            field_mask = 0
+            for value in values:
+                field_mask |= bitmaps.get(str(value), 0)
+            if not field_mask:
+                return 0
+            mask = field_mask if mask is None else mask & field_mask
+            if not mask:
+                return 0
+        time_mask = self._time_mask(start, end)
+        mask = time_mask if mask is None else mask & time_mask
+        if success is not None and mask:
+            mask = mask & ~self.failed if success else mask & self.failed
+        return mask
+
+    def timestamp_at(self, position: int) -> float:
+        return self.timestamps[position]
+
+    def read(self, positions: Iterable[int], handle=None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Прочитать строки по номерам (seek по смещениям) -> (номер, запись)"""
+        own = handle is None
+        f = open(self.segment, "rb") if own else handle
+        try:
+            for position in positions:
+                f.seek(self.offsets[position])
+                raw = f.readline()
+                try:
+                    yield position, json.loads(raw)
+                except ValueError:
+                    continue
+        finally:
+            if own:
+                f.close()
@@ -3,15 +3,13 @@ Authentication system for Arvis
 Система аутентификации пользователей
 """
 
-import hashlib
-import hmac
 import os
 import secrets
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 
 from utils.logger import ModuleLogger
 from utils.security.rbac import Role
@@ -78,6 +76,11 @@ class AuthManager:
         self.max_login_attempts = self.config.get("auth.max_login_attempts", self.DEFAULT_MAX_LOGIN_ATTEMPTS)
         self.lockout_duration = self.config.get("auth.lockout_duration", self.DEFAULT_LOCKOUT_DURATION)
 
+        # KDF паролей (auth.password_hashing); параметры хранятся в самом хэше
+        from utils.security.password_hashing import PasswordHasher
+
+        self.hasher = PasswordHasher.from_config(self.config)
+
         # Хранилище (v1.5.0: SQLite)
         self.use_storage = self.config.get("auth.use_storage", True)
         self.storage = _get_storage() if self.use_storage else None
@@ -87,6 +90,23 @@ class AuthManager:
         self.sessions: Dict[str, Session] = {}
         self.login_attempts: Dict[str, list] = {}  # username -> [timestamps]
 
+        # Кэш проверенных сессий и пользователей (горячий путь validate_session)
+        self.session_cache = None
+        if self.config.get("auth.cache.enabled", True):
+            from utils.security.session_cache import SessionCache
+
+            self.session_cache = SessionCache(
+                max_sessions=self.config.get("auth.cache.max_sessions", 1024),
+                max_users=self.config.get("auth.cache.max_users", 256),
+                user_ttl_sec=self.config.get("auth.cache.user_ttl_sec", 60),
+                sweep_interval_sec=self.config.get("auth.cache.sweep_interval_sec", 60),
+            )
+            if self.storage:
+                from utils.security.storage import add_change_listener
+
+                add_change_listener(self._on_storage_change)
+            self.session_cache.start_sweeper(self.cleanup_expired_sessions)
+
         # Создаём админа по умолчанию (если нет пользователей)
         self._init_default_admin()
 
@@ -136,18 +156,25 @@ class AuthManager:
         Returns:
             (password_hash, salt)
         """
-        if salt is None:
-            salt = secrets.token_hex(32)
-
-        # Используем PBKDF2 с SHA-256 (100000 итераций)
-        password_hash = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), 100000).hex()
+        # Алгоритм и стоимость — из auth.password_hashing (по умолчанию PBKDF2-SHA256, 100000 итераций)
+        return self.hasher.hash(password, salt)
 
-        return password_hash, salt
+    def _rehash_password(self, user: User, password: str):
+        """Пересчитать хэш пароля текущим алгоритмом (rehash-on-login)"""
+        try:
+            user.password_hash, user.salt = self._hash_password(password)
+            if self.storage:
+                self.storage.save_user(user)
+            else:
+                self.users[user.username] = user
+            self._invalidate_user(user.user_id)
+            self.logger.info(f"Password hash for '{user.username}' upgraded to {self.hasher.algorithm}")
+        except Exception as e:
+            self.logger.error(f"Failed to rehash password for '{user.username}': {e}")
 
     def _verify_password(self, password: str, password_hash: str, salt: str) -> bool:
-        """Проверить пароль"""
-        computed_hash, _ = self._hash_password(password, salt)
-        return hmac.compare_digest(computed_hash, password_hash)
+        """Проверить пароль (по параметрам, сохранённым в хэше)"""
+        return self.hasher.verify(password, password_hash, salt)
 
     def validate_password_strength(self, password: str) -> tuple[bool, str]:
         """Проверить надёжность пароля
@@ -250,6 +277,10 @@ class AuthManager:
         # Сброс счётчика неудачных попыток
         self.login_attempts.pop(username, None)
 
+        # Настройки KDF изменились — пересчитываем хэш, пока пароль известен
+        if self.hasher.needs_rehash(user.password_hash):
+            self._rehash_password(user, password)
+
         # Создаём сессию
         session = self._create_session(user, ip_address)
 
@@ -276,6 +307,10 @@ class AuthManager:
         else:
             self.sessions[session.session_id] = session
 
+        if self.session_cache is not None:
+            self.session_cache.put_session(session)
+            self.session_cache.put_user(user)
+
         return session
 
     def validate_session(self, session_id: str) -> Optional[User]:
@@ -284,11 +319,15 @@ class AuthManager:
         Returns:
             User если сессия валидна, None если нет
         """
-        # Получаем сессию из хранилища или памяти
-        if self.storage:
-            session = self.storage.get_session(session_id)
-        else:
-            session = self.sessions.get(session_id)
+        # Сначала кэш, затем хранилище или память
+        cache = self.session_cache
+        session, cached = cache.get_session(session_id) if cache is not None else (None, False)
+        generation = cache.generation if cache is not None else 0
+        if not cached:
+            if self.storage:
+                session = self.storage.get_session(session_id)
+            else:
+                session = self.sessions.get(session_id)
 
         if session is None:
             return None
@@ -296,17 +335,18 @@ class AuthManager:
         # Проверяем срок действия
         if datetime.now() > session.expires_at:
             self.logger.debug(f"Session {session_id} expired")
+            if cache is not None:
+                cache.invalidate_session(session_id)
             if self.storage:
                 self.storage.delete_session(session_id)
             else:
-                del self.sessions[session_id]
+                self.sessions.pop(session_id, None)
             return None
 
-        # Получаем пользователя из хранилища или памяти
-        if self.storage:
-            user = self.storage.get_user_by_id(session.user_id)
-        else:
-            user = next((u for u in self.users.values() if u.user_id == session.user_id), None)
+        if cache is not None and not cached:
+            cache.put_session(session, generation)
+
+        user = self.get_user_by_id(session.user_id)
 
         if user is None or not user.is_active:
             return None
@@ -315,6 +355,10 @@ class AuthManager:
 
     def logout(self, session_id: str):
         """Завершить сессию"""
+        if self.session_cache is not None:
+            self.session_cache.invalidate_session(session_id)
+        if self.storage:
+            self.storage.delete_session(session_id)
         if session_id in self.sessions:
             del self.sessions[session_id]
             self.logger.debug(f"Session {session_id} logged out")
@@ -350,6 +394,7 @@ class AuthManager:
             self.storage.save_user(user)
         else:
             self.users[username] = user
+        self._invalidate_user(user.user_id)
 
         self.logger.info(f"Password changed for user '{username}'")
         return True
@@ -376,22 +421,70 @@ class AuthManager:
         return len(recent_attempts) >= self.max_login_attempts
 
     def cleanup_expired_sessions(self):
-        """Очистить истёкшие сессии"""
+        """Очистить истёкшие сессии (при включённом кэше вызывается фоновым потоком)"""
         now = datetime.now()
-        expired = [sid for sid, session in self.sessions.items() if now > session.expires_at]
+        expired = [sid for sid, session in list(self.sessions.items()) if now > session.expires_at]
 
         for sid in expired:
-            del self.sessions[sid]
+            self.sessions.pop(sid, None)
+
+        removed = len(expired)
+        if self.storage:
+            removed += self.storage.cleanup_expired_sessions(now)
+
+        if removed:
+            self.logger.debug(f"Cleaned up {removed} expired sessions")
+
+    def _invalidate_user(self, user_id: str):
+        if self.session_cache is not None:
+            self.session_cache.invalidate_user(user_id)
+
+    def _on_storage_change(self, kind: str, key: str):
+        """Изменение в UserStorage (в том числе в обход AuthManager) — сброс кэша"""
+        cache = self.session_cache
+        if cache is None:
+            return
+        if kind == "session":
+            cache.invalidate_session(key)
+        elif kind == "username":
+            cache.invalidate_user(username=key)
+        else:
+            cache.invalidate_user(key)
+
+    def close(self):
+        """Остановить фоновую очистку сессий и отписаться от изменений хранилища"""
+        cache = self.session_cache
+        if cache is None:
+            return
+        cache.stop_sweeper()
+        if self.storage:
+            from utils.security.storage import remove_change_listener
 
-        if expired:
-            self.logger.debug(f"Cleaned up {len(expired)} expired sessions")
+            remove_change_listener(self._on_storage_change)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша сессий (hit rate и размеры)"""
+        if self.session_cache is None:
+            return {"enabled": False}
+        return dict(self.session_cache.get_stats(), enabled=True)
 
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by ID"""
+        cache = self.session_cache
+        if cache is not None:
+            user = cache.get_user(user_id)
+            if user is not None:
+                return user
+            generation = cache.generation
+
         if self.storage:
-            return self.storage.get_user_by_id(user_id)
+            user = self.storage.get_user_by_id(user_id)
         else:
-            return next((u for u in self.users.values() if u.user_id == user_id), None)
+            user = next((u for u in self.users.values() if u.user_id == user_id), None)
+
+        if user is not None and cache is not None:
+            cache.put_user(user, generation)
+        return user
 
     def list_users(self) -> list:
         """List all users"""
@@ -420,11 +513,13 @@ class AuthManager:
                 if u.user_id == user_id:
                     self.users[username] = user
                     break
+        self._invalidate_user(user_id)
 
         return True
 
     def delete_user(self, user_id: str) -> bool:
         """Delete user"""
+        self._invalidate_user(user_id)
         if self.storage:
             return self.storage.delete_user(user_id)
         else:
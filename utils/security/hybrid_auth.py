@@ -219,6 +219,11 @@ class HybridAuthManager:
             require_2fa=False, # 2FA пока не поддерживается в этой логике
         )
 
+    def close(self):
+        """Освободить локальный менеджер (поток очистки сессий, подписка на хранилище)"""
+        if self.local_auth is not None:
+            self.local_auth.close()
+
 # Global instance
 _hybrid_auth_manager: Optional[HybridAuthManager] = None
 
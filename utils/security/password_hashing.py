@@ -0,0 +1,275 @@
+"""
+Хэширование паролей с настраиваемой функцией KDF
+
+Поддерживаются PBKDF2-SHA256 (стоимость — число итераций), scrypt из hashlib
+(n, r, p) и argon2id, если установлен argon2-cffi. Параметры хранятся вместе с
+хэшем, поэтому смена auth.password_hashing не ломает старые пароли: проверка идёт
+по параметрам из хэша, а needs_rehash() подсказывает AuthManager пересчитать хэш
+при следующем успешном входе.
+
+Форматы password_hash:
+- pbkdf2_sha256$<iterations>$<hex>
+- scrypt$<n>$<r>$<p>$<hex>
+- $argon2id$v=19$m=...,t=...,p=...$<salt>$<hash> (строка argon2-cffi, соль внутри)
+- <hex> без префикса — прежний формат, PBKDF2-SHA256 со 100 000 итераций
+
+Подбор стоимости под целевое время проверки на этой машине:
+
+    python -m utils.security.password_hashing --algorithm scrypt --target-ms 250
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import secrets
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logger import ModuleLogger
+
+ALGORITHMS = ("pbkdf2_sha256", "scrypt", "argon2id")
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+_SCRYPT_MAX_N = 1 << 20
+
+
+def _scrypt_maxmem(n: int, r: int, p: int) -> int:
+    # hashlib.scrypt по умолчанию ограничен 32 МБ; нужно 128 * r * (n + p) байт с запасом
+    return 128 * r * (n + p) + 16 * 1024 * 1024
+
+
+def _load_argon2():
+    try:
+        from argon2 import PasswordHasher as Argon2Hasher
+        from argon2 import exceptions as argon2_exceptions
+    except ImportError:
+        return None, None
+    return Argon2Hasher, argon2_exceptions
+
+
+class PasswordHasher:
+    """Хэширование и проверка паролей по параметрам из конфигурации"""
+
+    def __init__(
+        self,
+        algorithm: str = "pbkdf2_sha256",
+        pbkdf2_iterations: int = LEGACY_PBKDF2_ITERATIONS,
+        scrypt_n: int = 1 << 14,
+        scrypt_r: int = 8,
+        scrypt_p: int = 1,
+        argon2_time_cost: int = 3,
+        argon2_memory_kib: int = 65536,
+        argon2_parallelism: int = 1,
+    ):
+        self.logger = ModuleLogger("PasswordHasher")
+        self.pbkdf2_iterations = max(1000, int(pbkdf2_iterations))
+        self.scrypt_n = int(scrypt_n)
+        self.scrypt_r = max(1, int(scrypt_r))
+        self.scrypt_p = max(1, int(scrypt_p))
+        if self.scrypt_n < 2 or self.scrypt_n & (self.scrypt_n - 1):
+            raise ValueError(f"scrypt_n must be a power of two, got {scrypt_n}")
+        self.argon2_time_cost = max(1, int(argon2_time_cost))
+        self.argon2_memory_kib = max(8 * 1024, int(argon2_memory_kib))
+        self.argon2_parallelism = max(1, int(argon2_parallelism))
+
+        algorithm = str(algorithm or "pbkdf2_sha256").lower()
+        if algorithm not in ALGORITHMS:
+            self.logger.warning(f"Unknown password hashing algorithm '{algorithm}', using pbkdf2_sha256")
+            algorithm = "pbkdf2_sha256"
+        self._argon2 = None
+        if algorithm == "argon2id":
+            self._argon2 = self._argon2_hasher()
+            if self._argon2 is None:
+                self.logger.warning("argon2-cffi not installed (pip install argon2-cffi), using scrypt")
+                algorithm = "scrypt"
+        self.algorithm = algorithm
+
+    @classmethod
+    def from_config(cls, config) -> "PasswordHasher":
+        get = config.get if config is not None else (lambda key, default=None: default)
+        return cls(
+            algorithm=get("auth.password_hashing.algorithm", "pbkdf2_sha256"),
+            pbkdf2_iterations=get("auth.password_hashing.pbkdf2_iterations", LEGACY_PBKDF2_ITERATIONS),
+            scrypt_n=get("auth.password_hashing.scrypt_n", 1 << 14),
+            scrypt_r=get("auth.password_hashing.scrypt_r", 8),
+            scrypt_p=get("auth.password_hashing.scrypt_p", 1),
+            argon2_time_cost=get("auth.password_hashing.argon2_time_cost", 3),
+            argon2_memory_kib=get("auth.password_hashing.argon2_memory_kib", 65536),
+            argon2_parallelism=get("auth.password_hashing.argon2_parallelism", 1),
+        )
+
+    def _argon2_hasher(self):
+        Argon2Hasher, _ = _load_argon2()
+        if Argon2Hasher is None:
+            return None
+        return Argon2Hasher(
+            time_cost=self.argon2_time_cost,
+            memory_cost=self.argon2_memory_kib,
+            parallelism=self.argon2_parallelism,
+        )
+
+    # ------------------------------------------------------------------ hashing
+
+    def hash(self, password: str, salt: Optional[str] = None) -> Tuple[str, str]:
+        """(password_hash с параметрами, salt) текущим алгоритмом"""
+        if salt is None:
+            salt = secrets.token_hex(32)
+        secret = password.encode("utf-8")
+        if self.algorithm == "argon2id":
+            # Соль argon2 генерирует сам и хранит в строке хэша; столбец salt остаётся для совместимости
+            return self._argon2.hash(password), salt
+        if self.algorithm == "scrypt":
+            n, r, p = self.scrypt_n, self.scrypt_r, self.scrypt_p
+            digest = hashlib.scrypt(secret, salt=salt.encode("utf-8"), n=n, r=r, p=p, maxmem=_scrypt_maxmem(n, r, p))
+            return f"scrypt${n}${r}${p}${digest.hex()}", salt
+        digest = hashlib.pbkdf2_hmac("sha256", secret, salt.encode("utf-8"), self.pbkdf2_iterations)
+        return f"pbkdf2_sha256${self.pbkdf2_iterations}${digest.hex()}", salt
+
+    def verify(self, password: str, password_hash: str, salt: str) -> bool:
+        """Проверить пароль по параметрам, записанным в самом хэше"""
+        try:
+            if password_hash.startswith("$argon2"):
+                Argon2Hasher, argon2_exceptions = _load_argon2()
+                if Argon2Hasher is None:
+                    self.logger.error("Password hash uses argon2, but argon2-cffi is not installed")
+                    return False
+                try:
+                    return Argon2Hasher().verify(password_hash, password)
+                except argon2_exceptions.VerificationError:
+                    return False
+
+            secret = password.encode("utf-8")
+            algorithm, params, expected = self._parse(password_hash)
+            if algorithm == "scrypt":
+                n, r, p = params
+                digest = hashlib.scrypt(
+                    secret, salt=salt.encode("utf-8"), n=n, r=r, p=p, maxmem=_scrypt_maxmem(n, r, p)
+                )
+            else:
+                digest = hashlib.pbkdf2_hmac("sha256", secret, salt.encode("utf-8"), params[0])
+            return hmac.compare_digest(digest.hex(), expected)
+        except (ValueError, TypeError) as e:
+            self.logger.error(f"Malformed password hash: {e}")
+            return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Хэш посчитан другим алгоритмом или с другой стоимостью, чем в конфигурации"""
+        if password_hash.startswith("$argon2"):
+            if self.algorithm != "argon2id":
+                return True
+            return self._argon2.check_needs_rehash(password_hash)
+        if self.algorithm == "argon2id":
+            return True
+        try:
+            algorithm, params, _ = self._parse(password_hash)
+        except ValueError:
+            return True
+        if algorithm != self.algorithm:
+            return True
+        if algorithm == "scrypt":
+            return params != (self.scrypt_n, self.scrypt_r, self.scrypt_p)
+        return params != (self.pbkdf2_iterations,)
+
+    @staticmethod
+    def _parse(password_hash: str) -> Tuple[str, Tuple[int, ...], str]:
+        """(алгоритм, параметры, hex дайджеста)"""
+        parts = password_hash.split("$")
+        if len(parts) == 1:
+            return "pbkdf2_sha256", (LEGACY_PBKDF2_ITERATIONS,), parts[0]
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 3:
+            return "pbkdf2_sha256", (int(parts[1]),), parts[2]
+        if parts[0] == "scrypt" and len(parts) == 5:
+            return "scrypt", (int(parts[1]), int(parts[2]), int(parts[3])), parts[4]
+        raise ValueError(f"unsupported password hash format '{parts[0]}'")
+
+    def describe(self) -> Dict[str, Any]:
+        """Текущие параметры (для логов и калибровки)"""
+        if self.algorithm == "argon2id":
+            params = {
+                "argon2_time_cost": self.argon2_time_cost,
+                "argon2_memory_kib": self.argon2_memory_kib,
+                "argon2_parallelism": self.argon2_parallelism,
+            }
+        elif self.algorithm == "scrypt":
+            params = {"scrypt_n": self.scrypt_n, "scrypt_r": self.scrypt_r, "scrypt_p": self.scrypt_p}
+        else:
+            params = {"pbkdf2_iterations": self.pbkdf2_iterations}
+        return dict({"algorithm": self.algorithm}, **params)
+
+
+# ---------------------------------------------------------------------- calibration
+
+
+def measure_ms(hasher: PasswordHasher, rounds: int = 3) -> float:
+    """Лучшее из rounds время одной проверки пароля, мс"""
+    password_hash, salt = hasher.hash("calibration-password")
+    best = float("inf")
+    for _ in range(max(1, rounds)):
+        start = time.perf_counter()
+        hasher.verify("calibration-password", password_hash, salt)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def calibrate(algorithm: str = "pbkdf2_sha256", target_ms: float = 250.0, **params) -> Dict[str, Any]:
+    """Подобрать стоимость, при которой проверка пароля занимает около target_ms
+
+    PBKDF2 — число итераций растёт линейно; scrypt — n удваивается (r, p — из params);
+    argon2id — time_cost при фиксированной памяти.
+    """
+    if algorithm == "pbkdf2_sha256":
+        probe = 20000
+        elapsed = measure_ms(PasswordHasher("pbkdf2_sha256", pbkdf2_iterations=probe))
+        iterations = max(10000, int(round(probe * target_ms / max(elapsed, 1e-3), -3)))
+        hasher = PasswordHasher("pbkdf2_sha256", pbkdf2_iterations=iterations)
+    elif algorithm == "scrypt":
+        r, p = int(params.get("scrypt_r", 8)), int(params.get("scrypt_p", 1))
+        n = 1 << 12
+        hasher = PasswordHasher("scrypt", scrypt_n=n, scrypt_r=r, scrypt_p=p)
+        # Удваиваем n, пока следующее значение укладывается в цель (время растёт примерно линейно)
+        while n < _SCRYPT_MAX_N and measure_ms(hasher) * 2 <= target_ms:
+            n <<= 1
+            hasher = PasswordHasher("scrypt", scrypt_n=n, scrypt_r=r, scrypt_p=p)
+    elif algorithm == "argon2id":
+        memory_kib = int(params.get("argon2_memory_kib", 65536))
+        parallelism = int(params.get("argon2_parallelism", 1))
+        hasher = PasswordHasher("argon2id", argon2_time_cost=1, argon2_memory_kib=memory_kib)
+        if hasher.algorithm != "argon2id":
+            raise RuntimeError("argon2-cffi is not installed (pip install argon2-cffi)")
+        per_pass = measure_ms(hasher)
+        time_cost = max(1, int(target_ms // max(per_pass, 1e-3)))
+        hasher = PasswordHasher(
+            "argon2id", argon2_time_cost=time_cost, argon2_memory_kib=memory_kib, argon2_parallelism=parallelism
+        )
+    else:
+        raise ValueError(f"Unknown algorithm '{algorithm}', expected one of {', '.join(ALGORITHMS)}")
+
+    return {"params": hasher.describe(), "measured_ms": round(measure_ms(hasher), 1), "target_ms": target_ms}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate Arvis password hashing cost for this machine")
+    parser.add_argument("-a", "--algorithm", default="pbkdf2_sha256", choices=ALGORITHMS, help="KDF to calibrate")
+    parser.add_argument("-t", "--target-ms", type=float, default=250.0, help="Target verification time, ms")
+    parser.add_argument("--scrypt-r", type=int, default=8, help="scrypt block size r")
+    parser.add_argument("--argon2-memory-kib", type=int, default=65536, help="argon2 memory cost, KiB")
+    args = parser.parse_args(argv)
+
+    try:
+        result = calibrate(
+            args.algorithm, args.target_ms, scrypt_r=args.scrypt_r, argon2_memory_kib=args.argon2_memory_kib
+        )
+    except (RuntimeError, ValueError) as e:
+        print(f"[KDF-CALIBRATE-ERROR] {e}", file=sys.stderr)
+        return 2
+
+    print(f"[KDF-CALIBRATE] {args.algorithm}: {result['measured_ms']} ms (target {args.target_ms} ms)", file=sys.stderr)
+    # Готовый фрагмент для config.json: "auth": {"password_hashing": {...}}
+    print(json.dumps({"password_hashing": result["params"]}, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Кэш проверенных сессий и пользователей для AuthManager
+
+validate_session на каждый вызов читал из хранилища сессию и пользователя. Кэш
+держит в памяти проверенные сессии (до expires_at) и записи пользователей (не дольше
+auth.cache.user_ttl_sec — на случай изменений в обход AuthManager), поэтому горячая
+проверка — поиск в словаре.
+
+Записи сбрасываются при logout, change_password, update_user, delete_user и при
+изменении пользователей/сессий через UserStorage (add_change_listener). Истёкшие
+сессии вычищает фоновый поток раз в sweep_interval_sec, а не проверка при обращении.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from utils.logger import ModuleLogger
+from utils.security.auth import Session, User
+
+
+class SessionCache:
+    """LRU сессий (TTL = expires_at) и пользователей (TTL = user_ttl_sec) со статистикой"""
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        max_users: int = 256,
+        user_ttl_sec: float = 60.0,
+        sweep_interval_sec: float = 60.0,
+    ):
+        self.logger = ModuleLogger("SessionCache")
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_users = max(1, int(max_users))
+        self.user_ttl_sec = max(0.0, float(user_ttl_sec))
+        self.sweep_interval_sec = max(1.0, float(sweep_interval_sec))
+
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[str, Tuple[Session, float]]" = OrderedDict()
+        self._users: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self._user_sessions: Dict[str, Set[str]] = {}
+        # Растёт при каждом сбросе: запись, прочитанная из хранилища до сброса, в кэш не попадёт
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0, "user_hits": 0, "user_misses": 0, "invalidations": 0, "expired": 0}
+
+        self._sweep_callback: Optional[Callable[[], Any]] = None
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ sessions
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_session(self, session_id: str) -> Tuple[Optional[Session], bool]:
+        """(сессия, найдена_в_кэше); истёкшая сессия возвращается — решение за вызывающим"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None, False
+            self._sessions.move_to_end(session_id)
+            self.stats["hits"] += 1
+            return entry[0], True
+
+    def put_session(self, session: Session, generation: Optional[int] = None):
+        """Положить сессию; generation — значение до чтения из хранилища (гонка со сбросом)"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if session.session_id in self._sessions:
+                self._drop_session_locked(session.session_id)
+            self._sessions[session.session_id] = (session, session.expires_at.timestamp())
+            self._user_sessions.setdefault(session.user_id, set()).add(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._drop_session_locked(next(iter(self._sessions)))
+
+    def invalidate_session(self, session_id: str):
+        with self._lock:
+            self._generation += 1
+            if self._drop_session_locked(session_id):
+                self.stats["invalidations"] += 1
+
+    def _drop_session_locked(self, session_id: str) -> bool:
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        user_id = entry[0].user_id
+        sessions = self._user_sessions.get(user_id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._user_sessions[user_id]
+        return True
+
+    # ------------------------------------------------------------------ users
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[1] > time.time():
+                self._users.move_to_end(user_id)
+                self.stats["user_hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._users[user_id]
+            self.stats["user_misses"] += 1
+            return None
+
+    def put_user(self, user: User, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._users[user.user_id] = (user, time.time() + self.user_ttl_sec)
+            self._users.move_to_end(user.user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate_user(self, user_id: Optional[str] = None, username: Optional[str] = None):
+        """Сбросить пользователя (по ID или имени) и все его сессии"""
+        with self._lock:
+            self._generation += 1
+            user_ids = set()
+            if user_id is not None:
+                user_ids.add(user_id)
+            if username is not None:
+                user_ids.update(uid for uid, (user, _) in self._users.items() if user.username == username)
+            for uid in user_ids:
+                self._users.pop(uid, None)
+                for session_id in list(self._user_sessions.get(uid, ())):
+                    self._drop_session_locked(session_id)
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._sessions.clear()
+            self._users.clear()
+            self._user_sessions.clear()
+
+    # ------------------------------------------------------------------ background sweep
+
+    def start_sweeper(self, callback: Optional[Callable[[], Any]] = None):
+        """Фоновое удаление истёкших сессий; callback — очистка самого хранилища"""
+        self._sweep_callback = callback
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="Arvis-session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def sweep(self) -> int:
+        """Удалить из кэша истёкшие сессии и устаревших пользователей"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires_ts) in self._sessions.items() if expires_ts <= now]
+            for session_id in expired:
+                self._drop_session_locked(session_id)
+            for user_id in [uid for uid, (_, until) in self._users.items() if until <= now]:
+                del self._users[user_id]
+            self.stats["expired"] += len(expired)
+        return len(expired)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval_sec):
+            try:
+                self.sweep()
+                if self._sweep_callback is not None:
+                    self._sweep_callback()
+            except Exception as e:
+                self.logger.error(f"Session sweep failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats, sessions=len(self._sessions), users=len(self._users))
+        lookups = stats["hits"] + stats["misses"]
+        user_lookups = stats["user_hits"] + stats["user_misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["user_hit_rate"] = round(stats["user_hits"] / user_lookups, 3) if user_lookups else 0.0
+        return stats
@@ -4,14 +4,30 @@ SQLite storage for RBAC users and sessions
 """
 
 import json
-import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
 from utils.logger import ModuleLogger
 from utils.security.auth import Session, User
 from utils.security.rbac import Role
+from utils.sqlite_pool import get_pool
+
+
+# Подписчики на изменения (кэш AuthManager): callback(kind, key), kind — "user" (user_id),
+# "username" или "session" (session_id). Общие для всех экземпляров UserStorage
+_change_listeners: List[Callable[[str, str], None]] = []
+
+
+def add_change_listener(callback: Callable[[str, str], None]):
+    """Подписаться на изменения пользователей и сессий"""
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def remove_change_listener(callback: Callable[[str, str], None]):
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
 
 
 class UserStorage:
@@ -26,11 +42,14 @@ class UserStorage:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
+        # Соединения по потокам (WAL) вместо нового соединения на каждый запрос
+        self._db = get_pool(self.db_path)
+
         self._init_database()
 
     def _init_database(self):
         """Инициализация схемы БД"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._db.connection() as conn:
             cursor = conn.cursor()
 
             # Таблица пользователей
@@ -92,10 +111,17 @@ class UserStorage:
 
         self.logger.info(f"Database initialized at {self.db_path}")
 
+    def _notify(self, kind: str, key: str):
+        for callback in list(_change_listeners):
+            try:
+                callback(kind, key)
+            except Exception as e:
+                self.logger.error(f"Storage change listener failed: {e}")
+
     def save_user(self, user: User) -> bool:
         """Сохранить пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -118,6 +144,7 @@ class UserStorage:
                     ),
                 )
                 conn.commit()
+            self._notify("user", user.user_id)
             return True
         except Exception as e:
             self.logger.error(f"Failed to save user: {e}")
@@ -126,7 +153,7 @@ class UserStorage:
     def get_user(self, username: str) -> Optional[User]:
         """Получить пользователя по username"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -162,7 +189,7 @@ class UserStorage:
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Получить пользователя по ID"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -199,7 +226,7 @@ class UserStorage:
         """Получить список всех пользователей"""
         users = []
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -236,11 +263,12 @@ class UserStorage:
     def delete_user(self, username: str) -> bool:
         """Удалить пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM users WHERE username = ?", (username,))
                 conn.commit()
-                return cursor.rowcount > 0
+            self._notify("username", username)
+            return cursor.rowcount > 0
         except Exception as e:
             self.logger.error(f"Failed to delete user: {e}")
             return False
@@ -248,7 +276,7 @@ class UserStorage:
     def save_session(self, session: Session) -> bool:
         """Сохранить сессию"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -274,7 +302,7 @@ class UserStorage:
     def get_session(self, session_id: str) -> Optional[Session]:
         """Получить сессию"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -302,11 +330,12 @@ class UserStorage:
     def delete_session(self, session_id: str) -> bool:
         """Удалить сессию"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
                 conn.commit()
-                return cursor.rowcount > 0
+            self._notify("session", session_id)
+            return cursor.rowcount > 0
         except Exception as e:
             self.logger.error(f"Failed to delete session: {e}")
             return False
@@ -317,7 +346,7 @@ class UserStorage:
             now = datetime.now()
 
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -335,7 +364,7 @@ class UserStorage:
         """Получить все сессии пользователя"""
         sessions = []
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -374,7 +403,7 @@ class UserStorage:
             True if successful
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -388,6 +417,7 @@ class UserStorage:
                     (encrypted_secret, hashed_backup_codes, datetime.now().isoformat(), user_id),
                 )
                 conn.commit()
+                self._notify("user", user_id)
 
                 self.logger.info(f"2FA enabled for user: {user_id}")
                 return True
@@ -405,7 +435,7 @@ class UserStorage:
             True if successful
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -419,6 +449,7 @@ class UserStorage:
                     (user_id,),
                 )
                 conn.commit()
+                self._notify("user", user_id)
 
                 self.logger.info(f"2FA disabled for user: {user_id}")
                 return True
@@ -436,7 +467,7 @@ class UserStorage:
             Dict with encrypted_secret and backup_codes, or None
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -465,7 +496,7 @@ class UserStorage:
             True if successful
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -476,6 +507,7 @@ class UserStorage:
                     (hashed_backup_codes, user_id),
                 )
                 conn.commit()
+                self._notify("user", user_id)
 
                 self.logger.info(f"Backup codes updated for user: {user_id}")
                 return True
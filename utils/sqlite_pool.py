@@ -0,0 +1,141 @@
+"""
+Общий слой доступа к SQLite (пользователи и сессии, календарь)
+
+- по одному соединению на поток и на файл БД: открытие соединения и чтение схемы
+  не повторяются на каждый запрос, а подготовленные выражения остаются в кэше
+  соединения (cached_statements) между вызовами;
+- WAL: чтение не блокируется записью, synchronous=NORMAL — без fsync на каждый commit;
+- busy_timeout вместо мгновенного "database is locked" при параллельной записи.
+
+Соединение используется как прежде: `with pool.connection() as conn:` — commit при
+успехе, rollback при исключении, но без закрытия. Соединения завершившихся потоков
+закрываются при следующем открытии соединения.
+"""
+
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import ModuleLogger
+
+
+class SQLitePool:
+    """Соединения с одним файлом SQLite по одному на поток"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        timeout: float = 5.0,
+        wal: bool = True,
+        synchronous: str = "NORMAL",
+        cached_statements: int = 128,
+    ):
+        self.logger = ModuleLogger("SQLitePool")
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self.wal = wal
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # ident потока -> (поток, соединение): для закрытия из close() и после завершения потока
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._closed = False
+        self.stats = {"opened": 0, "reaped": 0}
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (открывается при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"SQLite pool for {self.db_path.name} is closed")
+
+        conn = self._open()
+        self._local.conn = conn
+        current = threading.current_thread()
+        with self._lock:
+            self._reap_locked()
+            self._connections[current.ident] = (current, conn)
+            self.stats["opened"] += 1
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False только ради close() из другого потока; запросы идут из потока-владельца
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        try:
+            if self.wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        except sqlite3.Error as e:
+            # Например, БД на сетевом диске без поддержки WAL — работаем в режиме по умолчанию
+            self.logger.warning(f"Failed to configure {self.db_path.name}: {e}")
+        return conn
+
+    def _reap_locked(self):
+        """Закрыть соединения потоков, которые уже завершились"""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[ident]
+                self.stats["reaped"] += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, open=len(self._connections), wal=self.wal)
+
+    def close(self):
+        """Закрыть все соединения пула"""
+        with self._lock:
+            self._closed = True
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Error closing {self.db_path.name}: {e}")
+        self._local = threading.local()
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Path, **kwargs) -> SQLitePool:
+    """Общий пул для файла БД (один на путь, параметры — при первом вызове)"""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = _pools[key] = SQLitePool(Path(db_path), **kwargs)
+        return pool
+
+
+def close_pools(db_path: Optional[Path] = None):
+    """Закрыть пулы (все или одного файла)"""
+    with _pools_lock:
+        if db_path is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            pool = _pools.pop(str(Path(db_path).resolve()), None)
+            pools = [pool] if pool else []
+    for pool in pools:
+        pool.close()
+
+
+# Закрытие последнего соединения делает checkpoint WAL в основной файл
+atexit.register(close_pools)
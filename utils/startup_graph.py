@@ -0,0 +1,190 @@
+"""
+Граф инициализации компонентов с явными зависимостями
+
+Каждый узел — функция без аргументов и список узлов, от которых он зависит.
+Узлы без незавершённых зависимостей сразу отправляются в пул потоков, поэтому
+независимые тяжёлые загрузки (модель Vosk, torch/Silero) идут параллельно.
+Если зависимость упала, зависимый узел не запускается и помечается пропущенным.
+О завершении каждого узла (с временем выполнения) сообщает колбэк on_node_done.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.logger import ModuleLogger
+
+
+@dataclass
+class StartupNode:
+    name: str
+    func: Callable[[], object]
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class StartupResult:
+    """Итог узла: ok=False и skipped=True, если не дождался упавшей зависимости"""
+
+    name: str
+    ok: bool
+    seconds: float = 0.0
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+class StartupGraph:
+    """Параллельный запуск узлов в порядке зависимостей"""
+
+    def __init__(self, max_workers: int = 4, name: str = "startup"):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.logger = ModuleLogger("StartupGraph")
+        self._nodes: Dict[str, StartupNode] = {}
+        self._results: Dict[str, StartupResult] = {}
+        self._waiting: Dict[str, set] = {}
+        self._dependents: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._on_node_done: Optional[Callable[[StartupResult], None]] = None
+        self._on_finished: Optional[Callable[[Dict[str, StartupResult]], None]] = None
+        self._started_at = 0.0
+        self.total_seconds = 0.0
+
+    def add(self, name: str, func: Callable[[], object], depends_on: Iterable[str] = ()) -> "StartupGraph":
+        if name in self._nodes:
+            raise ValueError(f"Startup node '{name}' already registered")
+        self._nodes[name] = StartupNode(name, func, tuple(depends_on))
+        return self
+
+    def _validate(self):
+        for node in self._nodes.values():
+            for dep in node.depends_on:
+                if dep not in self._nodes:
+                    raise ValueError(f"Startup node '{node.name}' depends on unknown node '{dep}'")
+        # Поиск цикла (DFS с раскраской)
+        state: Dict[str, int] = {}
+
+        def visit(name: str, path: List[str]):
+            mark = state.get(name, 0)
+            if mark == 1:
+                raise ValueError(f"Startup graph cycle: {' -> '.join(path + [name])}")
+            if mark == 2:
+                return
+            state[name] = 1
+            for dep in self._nodes[name].depends_on:
+                visit(dep, path + [name])
+            state[name] = 2
+
+        for name in self._nodes:
+            visit(name, [])
+
+    def run(
+        self,
+        on_node_done: Optional[Callable[[StartupResult], None]] = None,
+        on_finished: Optional[Callable[[Dict[str, StartupResult]], None]] = None,
+    ):
+        """Запустить граф (не блокирует); колбэки вызываются из потоков пула"""
+        if self._executor is not None:
+            raise RuntimeError("Startup graph already started")
+        self._validate()
+        self._on_node_done = on_node_done
+        self._on_finished = on_finished
+        self._started_at = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"Arvis-{self.name}")
+        with self._lock:
+            for node in self._nodes.values():
+                self._waiting[node.name] = set(node.depends_on)
+                for dep in node.depends_on:
+                    self._dependents.setdefault(dep, []).append(node.name)
+            ready = [name for name, deps in self._waiting.items() if not deps]
+        if not self._nodes:
+            self._finish()
+            return
+        for name in ready:
+            self._submit(name)
+
+    def _submit(self, name: str):
+        try:
+            self._executor.submit(self._run_node, self._nodes[name])
+        except RuntimeError as e:
+            # Пул уже остановлен (shutdown во время старта)
+            self._complete(StartupResult(name, False, 0.0, str(e), skipped=True))
+
+    def _run_node(self, node: StartupNode):
+        start = time.perf_counter()
+        try:
+            node.func()
+            result = StartupResult(node.name, True, time.perf_counter() - start)
+        except Exception as e:
+            self.logger.error(f"Startup node '{node.name}' failed: {e}")
+            result = StartupResult(node.name, False, time.perf_counter() - start, str(e))
+        self._complete(result)
+
+    def _complete(self, result: StartupResult):
+        to_submit: List[str] = []
+        to_skip: List[StartupResult] = []
+        with self._lock:
+            if result.name in self._results:
+                return
+            self._results[result.name] = result
+            for dependent in self._dependents.get(result.name, []):
+                if dependent in self._results:
+                    continue
+                if not result.ok:
+                    to_skip.append(
+                        StartupResult(dependent, False, 0.0, f"dependency '{result.name}' failed", skipped=True)
+                    )
+                    continue
+                waiting = self._waiting[dependent]
+                waiting.discard(result.name)
+                if not waiting:
+                    to_submit.append(dependent)
+            done = len(self._results) == len(self._nodes)
+
+        self._notify(result)
+        for skipped in to_skip:
+            self._complete(skipped)
+        for name in to_submit:
+            self._submit(name)
+        if done:
+            self._finish()
+
+    def _notify(self, result: StartupResult):
+        if self._on_node_done is None:
+            return
+        try:
+            self._on_node_done(result)
+        except Exception as e:
+            self.logger.debug(f"on_node_done callback failed for '{result.name}': {e}")
+
+    def _finish(self):
+        with self._lock:
+            if self._finished.is_set():
+                return
+            self.total_seconds = time.perf_counter() - self._started_at
+            self._finished.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._on_finished is not None:
+            try:
+                self._on_finished(self.results())
+            except Exception as e:
+                self.logger.debug(f"on_finished callback failed: {e}")
+
+    def results(self) -> Dict[str, StartupResult]:
+        with self._lock:
+            return dict(self._results)
+
+    def result(self, name: str) -> Optional[StartupResult]:
+        with self._lock:
+            return self._results.get(name)
+
+    def is_running(self) -> bool:
+        return self._executor is not None and not self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
@@ -0,0 +1,321 @@
+"""
+Лёгкая трассировка задержек голосового хода
+
+Спан — интервал на монотонных часах (perf_counter_ns) с trace_id, span_id и
+parent_id. Ход (turn) — корневой спан от wake word / отправки сообщения до конца
+ответа; спаны из других потоков (запись STT, LLM, синтез и воспроизведение TTS)
+привязываются к нему явным parent, в своём потоке — через contextvars.
+
+Завершённые спаны пишутся в performance.tracing.dir:
+- traces.jsonl — одна запись на спан (длительности в мс, атрибуты);
+- trace_events.json — Chrome trace-event format (открывается в chrome://tracing
+  или ui.perfetto.dev; формат массива допускает отсутствие закрывающей скобки).
+
+При performance.tracing.enabled = false все вызовы возвращают пустой спан без затрат.
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.logger import ModuleLogger
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("arvis_current_span", default=None)
+_ids = itertools.count(1)
+
+
+class _NullSpan:
+    """Пустой спан при выключенной трассировке"""
+
+    trace_id = None
+    span_id = None
+    parent_id = None
+    name = ""
+    ended = True
+
+    def set(self, **attrs) -> "_NullSpan":
+        return self
+
+    def end(self, **attrs) -> "_NullSpan":
+        return self
+
+    def mark(self, name: str, **attrs) -> "_NullSpan":
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __bool__(self):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Интервал трассы; завершается end() или выходом из with"""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "thread",
+        "attrs",
+        "instant",
+        "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self.instant = False
+        self._token = None
+
+    @property
+    def ended(self) -> bool:
+        return self.end_ns is not None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def end(self, **attrs) -> "Span":
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+            if attrs:
+                self.attrs.update(attrs)
+            self.tracer._record(self)
+        return self
+
+    def mark(self, name: str, **attrs) -> "Span":
+        """Мгновенное событие внутри спана (первый токен, начало звука)"""
+        return self.tracer.mark(name, parent=self, **attrs)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Выход из with в другом контексте — просто не восстанавливаем
+                pass
+            self._token = None
+        if exc is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.end()
+        return False
+
+    def __bool__(self):
+        return True
+
+
+class Tracer:
+    """Сбор спанов и экспорт в JSONL / Chrome trace-event"""
+
+    def __init__(self, config=None):
+        self.logger = ModuleLogger("Tracer")
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._turn: Optional[Span] = None
+        self._jsonl = None
+        self._chrome = None
+        self._epoch_ns = time.perf_counter_ns()
+        self._wall_epoch = time.time()
+        self.configure(config)
+
+    def configure(self, config=None):
+        get = config.get if config is not None else (lambda key, default=None: default)
+        enabled = bool(get("performance.tracing.enabled", False))
+        trace_dir = str(get("performance.tracing.dir", "logs/traces") or "logs/traces")
+        chrome = bool(get("performance.tracing.chrome_trace", True))
+        with self._lock:
+            self._close_files_locked()
+            self.enabled = enabled
+            if not enabled:
+                return
+            try:
+                directory = Path(trace_dir)
+                directory.mkdir(parents=True, exist_ok=True)
+                self._jsonl = open(directory / "traces.jsonl", "a", encoding="utf-8")
+                if chrome:
+                    chrome_path = directory / "trace_events.json"
+                    fresh = not chrome_path.exists() or chrome_path.stat().st_size == 0
+                    self._chrome = open(chrome_path, "a", encoding="utf-8")
+                    if fresh:
+                        self._chrome.write("[\n")
+                self.logger.info(f"Latency tracing enabled: {directory}")
+            except Exception as e:
+                self.logger.error(f"Failed to open trace files: {e}")
+                self._close_files_locked()
+                self.enabled = False
+
+    # ------------------------------------------------------------------ spans
+
+    def _resolve_parent(self, parent) -> Optional[Span]:
+        if parent is not None:
+            return parent if isinstance(parent, Span) else None
+        current = _current_span.get()
+        if current is not None and not current.ended:
+            return current
+        with self._lock:
+            turn = self._turn
+        return turn if turn is not None and not turn.ended else None
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attrs):
+        """Спан с ручным завершением (end()); parent по умолчанию — текущий спан или ход"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, self._resolve_parent(parent), attrs)
+
+    def span(self, name: str, parent: Optional[Span] = None, **attrs):
+        """Спан для with: становится текущим в этом потоке до выхода из блока"""
+        return self.start_span(name, parent, **attrs)
+
+    def mark(self, name: str, parent: Optional[Span] = None, **attrs):
+        if not self.enabled:
+            return NULL_SPAN
+        span = Span(self, name, self._resolve_parent(parent), attrs)
+        span.instant = True
+        span.end_ns = span.start_ns
+        self._record(span)
+        return span
+
+    # ------------------------------------------------------------------ turns
+
+    def begin_turn(self, name: str, **attrs):
+        """Начать ход; незавершённый предыдущий ход закрывается как прерванный"""
+        if not self.enabled:
+            return NULL_SPAN
+        turn = Span(self, name, None, attrs)
+        # Ход общий для всех потоков (STT, LLM, TTS) — меняем его только под блокировкой;
+        # end() пишет спан под той же блокировкой, поэтому вызывается уже после неё
+        with self._lock:
+            previous, self._turn = self._turn, turn
+        if previous is not None and not previous.ended:
+            previous.end(status="superseded")
+        return turn
+
+    def current_turn(self):
+        with self._lock:
+            turn = self._turn
+        if turn is None or turn.ended:
+            return NULL_SPAN
+        return turn
+
+    def end_turn(self, **attrs):
+        with self._lock:
+            turn = self._turn
+            if turn is None or turn.ended:
+                return NULL_SPAN
+            self._turn = None
+        turn.end(**attrs)
+        self.logger.debug(f"Turn '{turn.name}' finished in {turn.duration_ms:.0f} ms")
+        return turn
+
+    # ------------------------------------------------------------------ export
+
+    def _record(self, span: Span):
+        start_ms = (span.start_ns - self._epoch_ns) / 1e6
+        record = {
+            "trace": span.trace_id,
+            "span": span.span_id,
+            "parent": span.parent_id,
+            "name": span.name,
+            "start_ms": round(start_ms, 3),
+            "duration_ms": round(span.duration_ms, 3),
+            "wall": round(self._wall_epoch + start_ms / 1000.0, 3),
+            "thread": span.thread,
+        }
+        if span.attrs:
+            record["attrs"] = span.attrs
+        event = {
+            "name": span.name,
+            "cat": "turn" if span.parent_id is None else "span",
+            "ph": "i" if span.instant else "X",
+            "ts": round(start_ms * 1000.0, 1),
+            "pid": os.getpid(),
+            "tid": span.thread,
+            "args": dict(span.attrs, trace=span.trace_id, span=span.span_id, parent=span.parent_id),
+        }
+        if span.instant:
+            event["s"] = "p"
+        else:
+            event["dur"] = round(span.duration_ms * 1000.0, 1)
+        with self._lock:
+            try:
+                if self._jsonl is not None:
+                    self._jsonl.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                if self._chrome is not None:
+                    self._chrome.write(json.dumps(event, ensure_ascii=False, default=str) + ",\n")
+                # Корень трассы завершён — сбрасываем буферы на диск
+                if span.parent_id is None:
+                    self._flush_locked()
+            except Exception as e:
+                self.logger.debug(f"Trace export failed: {e}")
+
+    def _flush_locked(self):
+        for handle in (self._jsonl, self._chrome):
+            if handle is not None:
+                handle.flush()
+
+    def _close_files_locked(self):
+        for handle in (self._jsonl, self._chrome):
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
+        self._jsonl = None
+        self._chrome = None
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def shutdown(self):
+        self.end_turn(status="shutdown")
+        with self._lock:
+            self._close_files_locked()
+            self.enabled = False
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer(config=None) -> Tracer:
+    """Общий трассировщик (настраивается конфигом при первом вызове с config)"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(config)
+        elif config is not None and not _tracer.enabled and config.get("performance.tracing.enabled", False):
+            _tracer.configure(config)
+        return _tracer